@@ -296,6 +296,7 @@ class GetRawdataTail(BkBaseResource):
     action = "/v3/databus/rawdatas/{bk_data_id}/tail/"
     url_keys = ["bk_data_id"]
     method = "GET"
+    TIMEOUT = settings.TAIL_LOG_REQUEST_TIMEOUT
 
 
 class GetResultTables(BkBaseResource):
@@ -387,6 +387,7 @@ class GetCollectorTailLog(CollectorsBaseResource):
     RequestSerializer = CollectorRequestSerializer
     ResponseSerializer = GetCollectorTailLogResponseSerializer
     many_response_data = True
+    TIMEOUT = settings.TAIL_LOG_REQUEST_TIMEOUT
 
     def perform_request(self, validated_request_data):
         try:
@@ -29,6 +29,8 @@ IAM_MANAGER_ROLE = "members"
 IAM_SYSTEM_BATCH_SIZE = 10
 IAM_ACTION_BATCH_SIZE = 100
 IAM_RESOURCE_BATCH_SIZE = 100
+# 系统模型哈希缓存时间，过期后全量比对一次
+IAM_SYSTEM_MODEL_HASH_TIMEOUT = 60 * 60 * 24
 
 PAAS_APP_BATCH_SIZE = 20
 
@@ -98,6 +100,18 @@ DEFAULT_DATA_ENCODING = [
 
 GLOBAL_CONFIG_LEVEL_INSTANCE = "global"
 
+# 全局配置缓存
+GLOBAL_META_CONFIG_CACHE_NAMESPACE = "global_meta_config"
+GLOBAL_META_CONFIG_CACHE_SIZE = int(os.getenv("BKAPP_GLOBAL_META_CONFIG_CACHE_SIZE", 1024))
+GLOBAL_META_CONFIG_LOCAL_CACHE_TTL = int(os.getenv("BKAPP_GLOBAL_META_CONFIG_LOCAL_CACHE_TTL", 10))  # s
+GLOBAL_META_CONFIG_REMOTE_CACHE_TTL = int(os.getenv("BKAPP_GLOBAL_META_CONFIG_REMOTE_CACHE_TTL", 3600))  # s
+
+# 数据字典索引缓存
+DATA_MAP_INDEX_CACHE_NAMESPACE = "data_map_index"
+DATA_MAP_INDEX_CACHE_SIZE = int(os.getenv("BKAPP_DATA_MAP_INDEX_CACHE_SIZE", 256))
+DATA_MAP_INDEX_LOCAL_CACHE_TTL = int(os.getenv("BKAPP_DATA_MAP_INDEX_LOCAL_CACHE_TTL", 60))  # s
+DATA_MAP_INDEX_REMOTE_CACHE_TTL = int(os.getenv("BKAPP_DATA_MAP_INDEX_REMOTE_CACHE_TTL", 86400))  # s
+
 
 class ConfigLevelChoices(TextChoices):
     GLOBAL = "global", gettext_lazy("全局配置")
@@ -266,3 +280,12 @@ class SystemPermissionTypeEnum(TextChoices):
 # 未标签
 NO_TAG_ID = "-2"
 NO_TAG_NAME = gettext_lazy("No Tag")
+
+# 系统列表快照缓存键
+SYSTEM_LIST_SNAPSHOT_CACHE_KEY = "meta:system_list_snapshot:{namespace}"
+# 系统列表快照刷新调度标记
+SYSTEM_LIST_SNAPSHOT_REFRESH_CACHE_KEY = "meta:system_list_snapshot_refresh"
+# 系统列表快照缓存时间（秒），同步任务与采集状态变化时会主动刷新
+SYSTEM_LIST_SNAPSHOT_TIMEOUT = int(os.getenv("BKAPP_SYSTEM_LIST_SNAPSHOT_TIMEOUT", 60 * 30))
+# 系统列表快照刷新延迟（秒），延迟期间的多次变更合并为一次刷新
+SYSTEM_LIST_SNAPSHOT_REFRESH_DELAY = int(os.getenv("BKAPP_SYSTEM_LIST_SNAPSHOT_REFRESH_DELAY", 10))
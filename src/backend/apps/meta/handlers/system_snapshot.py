@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+from bk_resource import resource
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.meta.constants import (
+    IAM_MANAGER_ROLE,
+    SYSTEM_LIST_SNAPSHOT_CACHE_KEY,
+    SYSTEM_LIST_SNAPSHOT_REFRESH_CACHE_KEY,
+    SYSTEM_LIST_SNAPSHOT_REFRESH_DELAY,
+    SYSTEM_LIST_SNAPSHOT_TIMEOUT,
+)
+from apps.meta.models import Namespace, System
+from apps.meta.serializers import SystemListSerializer
+from apps.meta.utils.system import wrapper_system_status
+
+
+class SystemListSnapshot:
+    """
+    系统列表快照
+    按 namespace 预先计算系统信息、管理员与系统状态并写入缓存，请求时只需要叠加当前用户的权限
+    同时预先计算每个字段的排序名次，请求时按名次元组排序
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    @property
+    def cache_key(self) -> str:
+        return SYSTEM_LIST_SNAPSHOT_CACHE_KEY.format(namespace=self.namespace)
+
+    @classmethod
+    def get_namespaces(cls) -> List[str]:
+        namespaces = set(Namespace.objects.values_list("namespace", flat=True))
+        namespaces.add(settings.DEFAULT_NAMESPACE)
+        return sorted(namespaces)
+
+    @classmethod
+    def build_sort_ranks(cls, systems: List[dict]) -> Dict[str, Dict[str, int]]:
+        """
+        计算字段取值的排序名次，相同取值名次相同
+        :return: {system_id: {field: rank}}
+        """
+
+        sort_ranks = {system["system_id"]: {} for system in systems}
+        fields = {field for system in systems for field in system}
+        for field in fields:
+            values = [system.get(field) for system in systems]
+            # 仅标量字段参与排序
+            if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+                continue
+            try:
+                ordered_values = sorted(set(values), key=lambda v: (v is not None, v))
+            except TypeError:
+                # 取值类型不一致时不参与排序
+                continue
+            ranks = {value: rank for rank, value in enumerate(ordered_values)}
+            for system, value in zip(systems, values):
+                sort_ranks[system["system_id"]][field] = ranks[value]
+        return sort_ranks
+
+    def build(self) -> dict:
+        """
+        构建快照
+        """
+
+        systems = SystemListSerializer(System.objects.with_action_resource_type_count(), many=True).data
+        # 兼容 IAM V3 管理员
+        system_manager_map = defaultdict(list)
+        for manager in resource.meta.system_role_list(role=IAM_MANAGER_ROLE):
+            system_manager_map[manager["system_id"]].append(manager["username"])
+        for system in systems:
+            system["managers"] = system["managers"] or system_manager_map[system["system_id"]]
+        # 绑定系统状态
+        if systems:
+            systems = wrapper_system_status(namespace=self.namespace, systems=systems)
+        systems = [dict(system) for system in systems]
+        return {"systems": systems, "sort_ranks": self.build_sort_ranks(systems)}
+
+    def get(self) -> dict:
+        """
+        获取快照，不存在时同步构建
+        """
+
+        snapshot = cache.get(self.cache_key)
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    def refresh(self) -> dict:
+        snapshot = self.build()
+        cache.set(self.cache_key, snapshot, timeout=SYSTEM_LIST_SNAPSHOT_TIMEOUT)
+        return snapshot
+
+    @classmethod
+    def refresh_all(cls) -> None:
+        for namespace in cls.get_namespaces():
+            cls(namespace=namespace).refresh()
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        删除所有 namespace 的快照，下次请求时重新构建
+        """
+
+        cache.delete_many([cls(namespace=namespace).cache_key for namespace in cls.get_namespaces()])
+
+    @classmethod
+    def schedule_refresh(cls) -> None:
+        """
+        事务提交后延迟刷新快照，延迟期间重复调度会被合并
+        """
+
+        from apps.meta.tasks import refresh_system_list_snapshot
+
+        if not cache.add(SYSTEM_LIST_SNAPSHOT_REFRESH_CACHE_KEY, 1, timeout=SYSTEM_LIST_SNAPSHOT_REFRESH_DELAY):
+            return
+        transaction.on_commit(
+            lambda: refresh_system_list_snapshot.apply_async(countdown=SYSTEM_LIST_SNAPSHOT_REFRESH_DELAY)
+        )
+
+    @classmethod
+    def build_sort_key(
+        cls, snapshot: dict, sort_keys: List[str], extra_key: Callable[[dict], Tuple] = None
+    ) -> Callable[[dict], Tuple]:
+        """
+        按预先计算的名次生成排序键，"-" 前缀表示倒序
+        """
+
+        sort_ranks = snapshot["sort_ranks"]
+        fields = [(key[1:], -1) if key.startswith("-") else (key, 1) for key in sort_keys]
+
+        def sort_key(system: dict) -> Tuple:
+            ranks = sort_ranks.get(system["system_id"], {})
+            key = tuple(ranks.get(field, 0) * direction for field, direction in fields)
+            return key + extra_key(system) if extra_key else key
+
+        return sort_key
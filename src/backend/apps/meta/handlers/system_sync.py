@@ -16,78 +16,219 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 import abc
+import json
 import operator
 from collections import defaultdict
 from typing import Dict, List
 
 from bk_resource import api
 from bk_resource.settings import bk_resource_settings
+from blueapps.utils.base import md5_sum
 from blueapps.utils.logger import logger_celery as logger
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count, Q
 
 from apps.meta.constants import (
     IAM_ACTION_BATCH_SIZE,
     IAM_MANAGER_ROLE,
     IAM_RESOURCE_BATCH_SIZE,
     IAM_SYSTEM_BATCH_SIZE,
+    IAM_SYSTEM_MODEL_HASH_TIMEOUT,
     SYSTEM_SYNC_BATCH_SIZE,
     SystemSourceTypeEnum,
 )
-from apps.meta.models import Action, Namespace, ResourceType, System, SystemRole
+from apps.meta.models import (
+    Action,
+    Namespace,
+    ResourceType,
+    ResourceTypeActionRelation,
+    System,
+    SystemRole,
+)
 from core.utils.data import group_by
 
 
-def update_instance_attrs(instance, obj: dict, attrs: list) -> (bool, object):
-    need_update = False
-    for attr in attrs:
-        if getattr(instance, attr, None) != obj[attr]:
-            setattr(instance, attr, obj[attr])
-            need_update = True
-    return need_update, instance
+class IamObjectSyncEngine:
+    """
+    IAM 对象（操作/资源类型）差量同步引擎
+    一次性加载已有记录，按行内容哈希计算新增、更新、删除集合，批量写入DB
+    """
+
+    # IAM 字段与DB字段不一致时的映射，ancestors 只保存第一个父节点
+    field_mapping = {"ancestors": "ancestor"}
 
+    def __init__(self, db_model, db_id_field: str, fields: List[str], batch_size: int):
+        self.db_model = db_model
+        self.db_id_field = db_id_field
+        self.fields = fields
+        self.batch_size = batch_size
+        self.bk_username = bk_resource_settings.PLATFORM_AUTH_ACCESS_USERNAME
 
-def sync_iam_objects(
-    system_id: str, iam_objects: List[dict], db_model, db_id_field: str, fields: List[str]
-) -> (list, list, list):
+    @property
+    def db_fields(self) -> List[str]:
+        return [self.field_mapping.get(field, field) for field in self.fields]
+
+    @classmethod
+    def build_content_hash(cls, values: dict) -> str:
+        return md5_sum(json.dumps(values, sort_keys=True, default=str))
+
+    def build_values(self, iam_object: dict) -> dict:
+        """
+        将 IAM 对象转换为DB字段值
+        """
+
+        values = {}
+        for field in self.fields:
+            value = iam_object[field]
+            if field == "ancestors":
+                value = value[:1]
+            values[self.field_mapping.get(field, field)] = value
+        return values
+
+    def diff(self, system_objects: Dict[str, List[dict]]) -> (list, list, list):
+        """
+        return: to_insert, to_update, to_delete
+        to_insert: 待新建的DB实例列表
+        to_update: 待更新的DB实例列表
+        to_delete: 待删除的DB实例列表
+        """
+
+        db_fields = self.db_fields
+        # 一次性加载所有系统的已有记录
+        db_objects = {
+            (db_object.system_id, getattr(db_object, self.db_id_field)): db_object
+            for db_object in self.db_model.objects.filter(system_id__in=list(system_objects))
+        }
+        to_insert = []
+        to_update = []
+        for system_id, iam_objects in system_objects.items():
+            for iam_object in iam_objects:
+                values = self.build_values(iam_object)
+                db_object = db_objects.pop((system_id, iam_object["id"]), None)
+                # 不存在则新增
+                if db_object is None:
+                    to_insert.append(
+                        self.db_model(
+                            system_id=system_id,
+                            created_by=self.bk_username,
+                            updated_by=self.bk_username,
+                            **{self.db_id_field: iam_object["id"]},
+                            **values,
+                        )
+                    )
+                    continue
+                # 存在则按内容哈希判断更新
+                db_values = {field: getattr(db_object, field) for field in db_fields}
+                if self.build_content_hash(db_values) != self.build_content_hash(values):
+                    for field, value in values.items():
+                        setattr(db_object, field, value)
+                    to_update.append(db_object)
+        # 剩余的记录在 IAM 中已不存在
+        to_delete = list(db_objects.values())
+        return to_insert, to_update, to_delete
+
+    def apply(self, to_insert: list, to_update: list, to_delete: list) -> None:
+        """
+        批量写入DB
+        """
+
+        if to_insert:
+            self.db_model.objects.bulk_create(to_insert, batch_size=self.batch_size)
+        if to_update:
+            self.db_model.objects.bulk_update(to_update, fields=self.db_fields, batch_size=self.batch_size)
+        if to_delete:
+            self.db_model.objects.filter(pk__in=[db_object.pk for db_object in to_delete]).delete()
+
+    @transaction.atomic
+    def sync(self, system_objects: Dict[str, List[dict]]) -> (int, int, int):
+        to_insert, to_update, to_delete = self.diff(system_objects)
+        logger.info(
+            "[%s] %s to_insert => %d, to_update => %d, to_delete => %d",
+            self.__class__.__name__,
+            self.db_model.__name__,
+            len(to_insert),
+            len(to_update),
+            len(to_delete),
+        )
+        self.apply(to_insert, to_update, to_delete)
+        return len(to_insert), len(to_update), len(to_delete)
+
+
+class ActionSyncEngine(IamObjectSyncEngine):
     """
-    return: to_insert, to_update, to_delete
-    to_insert: 待新建的DB实例列表
-    to_update: 待更新的DB实例列表
-    to_delete: 待删除的DB实例列表
+    操作同步
     """
-    bk_username = bk_resource_settings.PLATFORM_AUTH_ACCESS_USERNAME
-    # 获取数据库存储实例
-    db_objects = db_model.objects.filter(system_id=system_id)
-    db_object_ids = db_objects.values_list(db_id_field, flat=True)
-    # 构造新增、更新、删除列表
-    to_insert = []
-    to_update = []
-    to_delete = set(db_object_ids)
-    # 遍历 IAM Instances
-    for iam_object in iam_objects:
-        # 获取基本参数
-        object_id = iam_object["id"]
-        # 存在则判断更新
-        if object_id in db_object_ids:
-            db_object = db_objects.get(**{db_id_field: object_id})
-            to_delete.remove(object_id)
-            need_update, db_object = update_instance_attrs(db_object, iam_object, fields)
-            if need_update:
-                to_update.append(db_object)
-            continue
-        # 不存在则新增
-        to_insert.append(
-            db_model(
-                system_id=system_id,
-                created_by=bk_username,
-                updated_by=bk_username,
-                **{db_id_field: object_id},
-                **{field: iam_object[field] for field in fields},
+
+    def __init__(self, fields: List[str]):
+        super().__init__(Action, "action_id", fields, IAM_ACTION_BATCH_SIZE)
+
+    def apply(self, to_insert: List[Action], to_update: List[Action], to_delete: List[Action]) -> None:
+        # bulk_create 不会调用 save，需要提前生成唯一ID
+        for action in to_insert:
+            action.unique_id = Action.gen_unique_id(action.system_id, action.action_id)
+        # 删除操作时同时删除关联的资源类型
+        if to_delete:
+            relation_q = Q()
+            for action in to_delete:
+                relation_q |= Q(system_id=action.system_id, action_id=action.action_id)
+            ResourceTypeActionRelation.objects.filter(relation_q).delete()
+        super().apply(to_insert, to_update, to_delete)
+
+
+class ResourceTypeSyncEngine(IamObjectSyncEngine):
+    """
+    资源类型同步
+    资源类型需要维护树节点，批量写入后仅对新增及父节点变化的记录同步树
+    """
+
+    def __init__(self, fields: List[str]):
+        super().__init__(ResourceType, "resource_type_id", fields, IAM_RESOURCE_BATCH_SIZE)
+
+    @classmethod
+    def sort_by_ancestor(cls, resource_types: List[ResourceType]) -> List[ResourceType]:
+        """
+        父节点优先排序，保证同步树时父节点已存在
+        """
+
+        pending = list(resource_types)
+        ordered = []
+        while pending:
+            pending_keys = {(rt.system_id, rt.resource_type_id) for rt in pending}
+            ready = [rt for rt in pending if not rt.ancestor or (rt.system_id, rt.ancestor[0]) not in pending_keys]
+            # 存在循环依赖时按原顺序处理，由树同步抛出异常
+            if not ready:
+                ready = pending
+            ready_ids = {id(rt) for rt in ready}
+            ordered.extend(ready)
+            pending = [rt for rt in pending if id(rt) not in ready_ids]
+        return ordered
+
+    def apply(
+        self, to_insert: List[ResourceType], to_update: List[ResourceType], to_delete: List[ResourceType]
+    ) -> None:
+        for resource_type in to_insert:
+            resource_type.clean()
+        tree_changed = set()
+        if "ancestor" in self.db_fields and to_update:
+            origin_ancestors = dict(
+                ResourceType.objects.filter(pk__in=[rt.pk for rt in to_update]).values_list("pk", "ancestor")
             )
-        )
-    to_delete = list(db_objects.filter(**{f"{db_id_field}__in": to_delete}).only("pk"))
-    return to_insert, to_update, to_delete
+            tree_changed = {rt.unique_id for rt in to_update if origin_ancestors.get(rt.pk) != rt.ancestor}
+        # 删除资源类型需要调整树节点，逐个删除
+        # 删除时会清空子节点的父节点，需要先于更新执行，避免覆盖本次同步中子节点的新父节点
+        for resource_type in to_delete:
+            resource_type.delete()
+        if to_insert:
+            ResourceType.objects.bulk_create(to_insert, batch_size=self.batch_size)
+            tree_changed.update(rt.unique_id for rt in to_insert)
+        if to_update:
+            ResourceType.objects.bulk_update(to_update, fields=self.db_fields, batch_size=self.batch_size)
+        # bulk_create 在部分数据库下不会回填主键，重新加载后同步树
+        if tree_changed:
+            for resource_type in self.sort_by_ancestor(list(ResourceType.objects.filter(unique_id__in=tree_changed))):
+                ResourceType._sync_tree(resource_type)
 
 
 class IamSystemSyncer(abc.ABC):
@@ -211,7 +352,7 @@ class IamSystemSyncer(abc.ABC):
         to_insert = []
         to_delete = set(db_systems)
         to_update = []
-        for (instance_id, systems) in iam_systems.items():
+        for instance_id, systems in iam_systems.items():
             iam_system = systems[0]
             if instance_id in db_systems:
                 db_system_instance = db_systems[instance_id][0]
@@ -265,6 +406,40 @@ class IamSystemSyncer(abc.ABC):
         """
         pass
 
+    def build_model_hash_key(self, system_id: str) -> str:
+        return f"iam_system_model_hash:{system_id}"
+
+    @classmethod
+    def build_model_hash(cls, system_info: dict) -> str:
+        return md5_sum(json.dumps(system_info, sort_keys=True, default=str))
+
+    def filter_changed_systems(self, system_map: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        过滤上游模型未变化的系统
+        模型哈希一致且DB中资源与操作数量一致时跳过，避免本地数据被删除后无法恢复
+        """
+
+        cached_hashes = cache.get_many([self.build_model_hash_key(system_id) for system_id in system_map])
+        db_counts = {
+            model: dict(
+                model.objects.filter(system_id__in=list(system_map))
+                .values("system_id")
+                .annotate(count=Count("pk"))
+                .values_list("system_id", "count")
+            )
+            for model in (ResourceType, Action)
+        }
+        changed = {}
+        for system_id, system_info in system_map.items():
+            if (
+                cached_hashes.get(self.build_model_hash_key(system_id)) == self.build_model_hash(system_info)
+                and db_counts[ResourceType].get(system_id, 0) == len(system_info.get("resource_types", []))
+                and db_counts[Action].get(system_id, 0) == len(system_info.get("actions", []))
+            ):
+                continue
+            changed[system_id] = system_info
+        return changed
+
     @transaction.atomic
     def sync_resources_actions(self):
         """
@@ -276,60 +451,36 @@ class IamSystemSyncer(abc.ABC):
         # 获取系统信息
         systems = self.get_db_systems()
         system_infos = self.get_resources_actions(list(systems.keys()))
+        system_map: Dict[str, dict] = {
+            System.build_system_id(source_type=self.source_type, instance_id=instance_id): system_info
+            for instance_id, system_info in system_infos.items()
+        }
 
-        # 构造 IAM 所有资源与操作信息
-        resources = defaultdict(list)
-        actions = defaultdict(list)
-        resource_fields = self.resource_type_fields
-        action_fields = self.action_fields
-        system_map: Dict[str, dict] = {}
-        for instance_id, system_info in system_infos.items():
-            system_id = System.build_system_id(source_type=self.source_type, instance_id=instance_id)
-            system_map[system_id] = system_info
-            # 资源
-            to_insert, to_update, to_delete = sync_iam_objects(
-                system_id, system_info.get("resource_types", []), ResourceType, "resource_type_id", resource_fields
-            )
-            resources["to_insert"].extend(to_insert)
-            resources["to_update"].extend(to_update)
-            resources["to_delete"].extend(to_delete)
-            # 操作
-            to_insert, to_update, to_delete = sync_iam_objects(
-                system_id, system_info.get("actions", []), Action, "action_id", action_fields
-            )
-            actions["to_insert"].extend(to_insert)
-            actions["to_update"].extend(to_update)
-            actions["to_delete"].extend(to_delete)
-        logger.info(
-            f"[{self.cls_name}] to_insert => %d, to_update => %d, to_delete => %d",
-            len(resources["to_insert"]),
-            len(resources["to_update"]),
-            len(resources["to_delete"]),
+        # 跳过上游模型未变化的系统
+        changed_system_map = self.filter_changed_systems(system_map)
+        logger.info(f"[{self.cls_name}] systems => %d, changed => %d", len(system_map), len(changed_system_map))
+        if not changed_system_map:
+            logger.info(f"[{self.cls_name}] finished")
+            return
+
+        # 同步 DB
+        ActionSyncEngine(self.action_fields).sync(
+            {system_id: info.get("actions", []) for system_id, info in changed_system_map.items()}
         )
-        logger.info(
-            f"[{self.cls_name}] to_insert => %d, to_update => %d, to_delete => %d",
-            len(actions["to_insert"]),
-            len(actions["to_update"]),
-            len(actions["to_delete"]),
+        ResourceTypeSyncEngine(self.resource_type_fields).sync(
+            {system_id: info.get("resource_types", []) for system_id, info in changed_system_map.items()}
         )
 
-        # 同步 DB
-        sync_db_params = [
-            (actions, Action, action_fields, IAM_ACTION_BATCH_SIZE),
-            (resources, ResourceType, resource_fields, IAM_RESOURCE_BATCH_SIZE),
-        ]
-        for param in sync_db_params:
-            instance_map, db_model, fields, batch_size = param
-            for item in instance_map["to_insert"]:
-                item.save(force_insert=True)
-            for item in instance_map["to_update"]:
-                item.save(force_update=True)
-            for item in instance_map["to_delete"]:
-                item.delete()
+        self._post_sync_resources_actions(changed_system_map)
 
-        logger.info(f"[{self.cls_name}] finished")
+        # 事务提交后记录模型哈希
+        model_hashes = {
+            self.build_model_hash_key(system_id): self.build_model_hash(system_info)
+            for system_id, system_info in changed_system_map.items()
+        }
+        transaction.on_commit(lambda: cache.set_many(model_hashes, timeout=IAM_SYSTEM_MODEL_HASH_TIMEOUT))
 
-        self._post_sync_resources_actions(system_map)
+        logger.info(f"[{self.cls_name}] finished")
 
     def _update_system_info(self, db_system: System, base_info: dict) -> bool:
         """
@@ -493,26 +644,34 @@ class IAMV4SystemSyncer(IamSystemSyncer):
         同步操作对应的资源类型
         """
 
-        action_obj_map: Dict[str, Dict[str, Action]] = {}
+        # 仅关联已存在的资源类型
+        resource_type_ids = defaultdict(set)
+        for system_id, resource_type_id in ResourceType.objects.filter(system_id__in=list(system_map)).values_list(
+            "system_id", "resource_type_id"
+        ):
+            resource_type_ids[system_id].add(resource_type_id)
 
-        # 获取所有已有的 Action 对象
-        action_objs = list(Action.objects.filter(system_id__in=list(system_map.keys())))
-
-        # 将 Action 对象按 system_id 和 action_id 映射
-        for action_obj in action_objs:
-            action_obj_map.setdefault(action_obj.system_id, {})[action_obj.action_id] = action_obj
-
-        # 构建 action_data_map
         action_data_map = {
             system_id: {action["id"]: action for action in info["actions"] if action.get("id")}
             for system_id, info in system_map.items()
         }
-
-        for system_id, action_map in action_obj_map.items():
-            for action_id, action_obj in action_map.items():
-                action_obj.set_resource_type_ids(
-                    action_data_map.get(system_id, {}).get(action_id, {}).get("resource_type_ids", [])
-                )
+        action_relations = []
+        for system_id, action_id in Action.objects.filter(system_id__in=list(system_map)).values_list(
+            "system_id", "action_id"
+        ):
+            action_data = action_data_map[system_id].get(action_id, {})
+            action_relations.append(
+                {
+                    "system_id": system_id,
+                    "action_id": action_id,
+                    "resource_type_ids": [
+                        resource_type_id
+                        for resource_type_id in action_data.get("resource_type_ids", [])
+                        if resource_type_id in resource_type_ids[system_id]
+                    ],
+                }
+            )
+        Action.bulk_set_resource_types(action_relations)
 
 
 def sync_iam_v3_system_roles(iam_systems):
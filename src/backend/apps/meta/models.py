@@ -27,6 +27,8 @@ from django.db import IntegrityError, models, transaction
 from django.db.models import IntegerField, OuterRef, Q, QuerySet, Subquery, Value
 from django.db.models.aggregates import Count
 from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy
 from django.utils.translation import gettext_lazy as _
@@ -35,7 +37,15 @@ from treebeard.ns_tree import NS_Node
 
 from apps.exceptions import MetaConfigNotExistException
 from apps.meta.constants import (
+    DATA_MAP_INDEX_CACHE_NAMESPACE,
+    DATA_MAP_INDEX_CACHE_SIZE,
+    DATA_MAP_INDEX_LOCAL_CACHE_TTL,
+    DATA_MAP_INDEX_REMOTE_CACHE_TTL,
     GLOBAL_CONFIG_LEVEL_INSTANCE,
+    GLOBAL_META_CONFIG_CACHE_NAMESPACE,
+    GLOBAL_META_CONFIG_CACHE_SIZE,
+    GLOBAL_META_CONFIG_LOCAL_CACHE_TTL,
+    GLOBAL_META_CONFIG_REMOTE_CACHE_TTL,
     IAM_MANAGER_ROLE,
     SYSTEM_AUTH_TOKEN_LENGTH,
     SYSTEM_INSTANCE_SEPARATOR,
@@ -53,12 +63,14 @@ from core.models import (
     SoftDeleteModel,
     SoftDeleteModelManager,
 )
+from core.utils.cache import TwoLevelCache
 from core.utils.data import generate_random_string
 
 
 class GlobalMetaConfig(OperateRecordModel):
     """
     GlobalMetaConfig 系统全局配置
+    读取时优先使用两级缓存，配置变更后通过版本号广播失效
     """
 
     config_level = models.CharField(gettext_lazy("配置级别"), max_length=24, choices=ConfigLevelChoices.choices)
@@ -66,6 +78,14 @@ class GlobalMetaConfig(OperateRecordModel):
     config_key = models.CharField(gettext_lazy("配置Key"), max_length=255)
     config_value = models.JSONField(gettext_lazy("配置Value"), null=True)
 
+    config_cache = TwoLevelCache(
+        namespace=GLOBAL_META_CONFIG_CACHE_NAMESPACE,
+        max_size=GLOBAL_META_CONFIG_CACHE_SIZE,
+        local_ttl=GLOBAL_META_CONFIG_LOCAL_CACHE_TTL,
+        remote_ttl=GLOBAL_META_CONFIG_REMOTE_CACHE_TTL,
+        bypass_in_atomic=True,
+    )
+
     class Meta:
         verbose_name = gettext_lazy("系统全局配置")
         verbose_name_plural = verbose_name
@@ -81,18 +101,37 @@ class GlobalMetaConfig(OperateRecordModel):
         *,
         default=Unset,
     ):
-        try:
-            return cls.objects.get(
-                config_key=config_key, instance_key=instance_key, config_level=config_level
-            ).config_value
-        except cls.DoesNotExist:
-            if default != Unset:
-                return default
-            msg = "MetaConfig Not Exist: config_level => {}; config_key => {}; instance_key => {}".format(
-                config_level, config_key, instance_key
-            )
-            logger.error(msg)
-            raise MetaConfigNotExistException(message=msg)
+        configs = cls.get_many([config_key], config_level=config_level, instance_key=instance_key)
+        if config_key in configs:
+            return configs[config_key]
+        if default != Unset:
+            return default
+        msg = "MetaConfig Not Exist: config_level => {}; config_key => {}; instance_key => {}".format(
+            config_level, config_key, instance_key
+        )
+        logger.error(msg)
+        raise MetaConfigNotExistException(message=msg)
+
+    @classmethod
+    def get_many(
+        cls,
+        config_keys: List[str],
+        config_level: str = ConfigLevelChoices.GLOBAL.value,
+        instance_key: str = GLOBAL_CONFIG_LEVEL_INSTANCE,
+    ) -> Dict[str, any]:
+        """
+        批量获取配置，返回存在的配置
+        """
+
+        def load_configs(keys: List[tuple]) -> dict:
+            configs = cls.objects.filter(
+                config_level=config_level, instance_key=instance_key, config_key__in=[key[2] for key in keys]
+            ).values_list("config_key", "config_value")
+            return {(config_level, instance_key, key): value for key, value in configs}
+
+        keys = [(config_level, instance_key, config_key) for config_key in config_keys]
+        configs = cls.config_cache.get_many(keys, load_configs)
+        return {key[2]: value for key, value in configs.items()}
 
     @classmethod
     def set(
@@ -109,6 +148,18 @@ class GlobalMetaConfig(OperateRecordModel):
         config.save()
         return config
 
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """
+        缓存命中统计
+        """
+        return cls.config_cache.get_stats()
+
+
+@receiver([post_save, post_delete], sender=GlobalMetaConfig)
+def invalidate_global_meta_config_cache(**kwargs):
+    transaction.on_commit(GlobalMetaConfig.config_cache.invalidate)
+
 
 class Namespace(SoftDeleteModel):
     """
@@ -723,6 +774,20 @@ class Action(OperateRecordModel):
         )
 
 
+@receiver([post_save, post_delete], sender=System)
+@receiver([post_save, post_delete], sender=SystemRole)
+@receiver([post_save, post_delete], sender=ResourceType)
+@receiver([post_save, post_delete], sender=Action)
+def refresh_system_list_snapshot(**kwargs):
+    """
+    元数据变更后延迟刷新快照，同步时的批量变更只会触发一次刷新
+    """
+
+    from apps.meta.handlers.system_snapshot import SystemListSnapshot
+
+    SystemListSnapshot.schedule_refresh()
+
+
 class ResourceTypeActionRelation(OperateRecordModel):
     system_id = models.CharField(gettext_lazy("系统ID"), max_length=64, db_index=True)
     resource_type_id = models.CharField(gettext_lazy("资源类型ID"), max_length=64, db_index=True)
@@ -902,6 +967,68 @@ class DataMap(OperateRecordModel):
         return data if many else data[0]
 
 
+class DataMapIndex:
+    """
+    数据字典索引
+    按 data_field 整体加载别名映射，通过两级缓存在进程间共享，数据字典变更后更新版本号失效
+    """
+
+    index_cache = TwoLevelCache(
+        namespace=DATA_MAP_INDEX_CACHE_NAMESPACE,
+        max_size=DATA_MAP_INDEX_CACHE_SIZE,
+        local_ttl=DATA_MAP_INDEX_LOCAL_CACHE_TTL,
+        remote_ttl=DATA_MAP_INDEX_REMOTE_CACHE_TTL,
+        bypass_in_atomic=True,
+    )
+
+    def __init__(self):
+        self.index: Dict[str, Dict[str, str]] = {}
+
+    @classmethod
+    def load_from_db(cls, data_fields: List[str]) -> Dict[str, Dict[str, str]]:
+        index = {data_field: {} for data_field in data_fields}
+        for data_field, data_key, data_alias in DataMap.objects.filter(data_field__in=data_fields).values_list(
+            "data_field", "data_key", "data_alias"
+        ):
+            index[data_field][data_key] = data_alias
+        return index
+
+    def load(self, data_fields: List[str]) -> None:
+        """
+        加载数据字段的别名映射，已加载的字段不再重复加载
+        """
+        missing = [data_field for data_field in data_fields if data_field not in self.index]
+        if not missing:
+            return
+        self.index.update(self.index_cache.get_many(missing, self.load_from_db))
+
+    def translate_many(
+        self, rows: List[dict], fields: List[str], build_data_field: callable = lambda x: x
+    ) -> List[dict]:
+        """
+        批量转换数据 (仅支持第一层)，行中不存在的字段不做处理
+        """
+        data_fields = {field: build_data_field(field) for field in fields}
+        self.load(list(data_fields.values()))
+        for row in rows:
+            for field, data_field in data_fields.items():
+                if field not in row:
+                    continue
+                # 统一转换为字符串处理，与 DataMap.get_alias 保持一致
+                data_key = str(row[field])
+                row[field] = self.index.get(data_field, {}).get(data_key, data_key)
+        return rows
+
+    @classmethod
+    def invalidate(cls) -> None:
+        cls.index_cache.invalidate()
+
+
+@receiver([post_save, post_delete], sender=DataMap)
+def invalidate_data_map_index(**kwargs):
+    transaction.on_commit(DataMapIndex.invalidate)
+
+
 class Tag(OperateRecordModel):
     """
     Tags of Strategy, Risk ...
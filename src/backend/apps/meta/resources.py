@@ -19,7 +19,6 @@ import abc
 from abc import ABC
 from collections import defaultdict
 from enum import EnumMeta
-from functools import cmp_to_key
 from itertools import chain
 from typing import Set
 
@@ -33,7 +32,7 @@ from blueapps.utils.logger import logger
 from django.conf import settings
 from django.core.cache import cache as default_cache
 from django.db import transaction
-from django.db.models import Exists, OuterRef, Q, QuerySet
+from django.db.models import Exists, OuterRef, QuerySet
 from django.db.models.enums import ChoicesMeta
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext, gettext_lazy
@@ -48,7 +47,6 @@ from apps.meta.constants import (
     FETCH_INSTANCE_SCHEMA_CACHE_TIMEOUT,
     FETCH_INSTANCE_SCHEMA_METHOD,
     GET_APP_INFO_CACHE_TIMEOUT,
-    IAM_MANAGER_ROLE,
     RETRIEVE_USER_TIMEOUT,
     SpaceType,
     SystemAuditStatusEnum,
@@ -60,10 +58,12 @@ from apps.meta.exceptions import (
     SystemHasExist,
 )
 from apps.meta.handlers.system_diagnosis import SystemDiagnosisPushHandler
+from apps.meta.handlers.system_snapshot import SystemListSnapshot
 from apps.meta.models import (
     Action,
     CustomField,
     DataMap,
+    DataMapIndex,
     EnumMappingCollectionRelation,
     Field,
     GeneralConfig,
@@ -197,31 +197,6 @@ class SystemListResource(SystemAbstractResource, CacheResource):
     audit_action = ActionEnum.LIST_SYSTEM
     serializer_class = SystemListSerializer
 
-    def sort(self, systems: list, validated_request_data: dict):
-        sort_keys = validated_request_data.get("sort", [])
-        if not sort_keys:
-            return systems
-
-        def _sort(system0: dict, system1: dict):
-            result = 0
-            for key in sort_keys:
-                reverse = key.startswith("-")
-                key = key[1:] if reverse else key
-                if system0[key] < system1[key]:
-                    result = -1
-                elif system0[key] == system1[key]:
-                    result = 0
-                elif system0[key] > system1[key]:
-                    result = 1
-                if reverse:
-                    result = -result
-                if result != 0:
-                    break
-            return result
-
-        systems.sort(key=cmp_to_key(_sort))
-        return systems
-
     def filter(self, systems: list, filter_map: dict):
         _systems = []
         for system in systems:
@@ -234,48 +209,48 @@ class SystemListResource(SystemAbstractResource, CacheResource):
                 _systems.append(system)
         return _systems
 
+    def filter_keyword(self, systems: list, keyword: str) -> list:
+        keyword = keyword.lower()
+        return [
+            system
+            for system in systems
+            if any(keyword in str(system.get(field) or "").lower() for field in ["name", "name_en", "system_id"])
+        ]
+
     def perform_request(self, validated_request_data: dict) -> any:
-        # 添加聚合注释
-        queryset = System.objects.with_action_resource_type_count()
+        # 系统信息、管理员、系统状态均来自预先计算的快照
+        snapshot = SystemListSnapshot(namespace=validated_request_data["namespace"]).get()
+        systems = snapshot["systems"]
         if validated_request_data.get("keyword"):
-            keyword = validated_request_data["keyword"]
-            queryset = queryset.filter(
-                Q(Q(name__icontains=keyword) | Q(name_en__icontains=keyword) | Q(system_id__icontains=keyword))
-            )
+            systems = self.filter_keyword(systems, validated_request_data["keyword"])
         if validated_request_data.get("source_type"):
-            queryset = queryset.filter(source_type__in=validated_request_data["source_type"])
+            systems = self.filter(systems, {"source_type": validated_request_data["source_type"]})
         if validated_request_data.get("audit_status"):
-            queryset = queryset.filter(audit_status__in=validated_request_data["audit_status"])
-        systems = self.serializer_class(queryset, many=self.many_response_data).data
-        all_managers = resource.meta.system_role_list(role=IAM_MANAGER_ROLE)
-        system_manager_map = defaultdict(list)
-        for manager in all_managers:
-            system_manager_map[manager["system_id"]].append(manager["username"])
-        for system in systems:
-            system["managers"] = system["managers"] or system_manager_map[system["system_id"]]
+            systems = self.filter(systems, {"audit_status": validated_request_data["audit_status"]})
+        if validated_request_data.get("status"):
+            systems = self.filter(systems, {"status": validated_request_data["status"]})
+        if validated_request_data.get("system_status"):
+            systems = self.filter(systems, {"system_status": validated_request_data["system_status"]})
+        if not systems:
+            return systems
 
-        system_managers = {system["system_id"]: system["managers"] for system in systems}
+        # 叠加当前用户权限，一次批量鉴权
         username = get_request_username()
         actions = [ActionEnum.VIEW_SYSTEM, ActionEnum.EDIT_SYSTEM]
         systems = wrapper_permission_field(
             systems,
             actions,
             id_field=lambda x: x["system_id"],
-            always_allowed=lambda sys, action_id: username in system_managers.get(sys["system_id"]),
+            always_allowed=lambda sys, action_id: username in sys["managers"],
         )
-        systems.sort(key=PermissionSorter.sort_key)
-        if not systems:
-            return systems
-
-        # 绑定系统状态
-        systems = wrapper_system_status(namespace=validated_request_data["namespace"], systems=systems)
 
-        # 数据过滤
-        if validated_request_data.get("status"):
-            systems = self.filter(systems, {"status": validated_request_data["status"]})
-        if validated_request_data.get("system_status"):
-            systems = self.filter(systems, {"system_status": validated_request_data["system_status"]})
-        return self.sort(systems, validated_request_data)
+        # 按指定字段排序，相同时有权限的系统在前
+        systems.sort(
+            key=SystemListSnapshot.build_sort_key(
+                snapshot, validated_request_data.get("sort", []), extra_key=PermissionSorter.sort_key
+            )
+        )
+        return systems
 
 
 class SystemListAllResource(SystemAbstractResource, CacheResource):
@@ -1018,6 +993,8 @@ class UploadDataMapFile(Meta, Resource):
         with transaction.atomic():
             DataMap.objects.filter(data_field__in=keys).delete()
             DataMap.objects.bulk_create(data_maps)
+            # bulk_create 不会触发 post_save，需要主动使数据字典索引失效
+            transaction.on_commit(DataMapIndex.invalidate)
         return DataMap.objects.filter(data_field__in=keys)
 
 
@@ -33,6 +33,7 @@ from apps.meta.constants import (
     SystemSourceTypeEnum,
 )
 from apps.meta.handlers.system_diagnosis import SystemDiagnosisPushHandler
+from apps.meta.handlers.system_snapshot import SystemListSnapshot
 from apps.meta.handlers.system_sync import (
     IamSystemSyncer,
     IAMV3SystemSyncer,
@@ -128,6 +129,7 @@ def sync_system_paas_info():
             batch_size=PAAS_APP_BATCH_SIZE,
         )
 
+    SystemListSnapshot.schedule_refresh()
     logger.info("[sync_system_paas_info] finished")
 
 
@@ -155,6 +157,7 @@ def sync_iam_systems():
         syncer().sync_systems()
         syncer().sync_system_infos()
         syncer().sync_resources_actions()
+    SystemListSnapshot.schedule_refresh()
 
 
 @periodic_task(run_every=crontab(minute="*/30"), soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
@@ -189,3 +192,13 @@ def update_system_diagnosis_push():
             handler.change_push_status(system.enable_system_diagnosis_push)
         except Exception as e:
             logger_celery.error(f"[update_system_diagnosis_push] system {system.system_id} push error: {e}")
+
+
+@celery_app.task(soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
+@lock(lock_name="celery:refresh_system_list_snapshot")
+def refresh_system_list_snapshot():
+    """
+    刷新系统列表快照
+    """
+
+    SystemListSnapshot.refresh_all()
@@ -18,7 +18,7 @@ to the current version of the project delivered to anyone in the future.
 
 from django.contrib import admin
 
-from apps.notice.models import NoticeGroup, NoticeLogV2
+from apps.notice.models import NoticeGroup, NoticeLogV2, NoticePendingAgg
 
 
 @admin.register(NoticeGroup)
@@ -45,3 +45,10 @@ class NoticeLogV2Admin(admin.ModelAdmin):
     list_filter = ["relate_type", "schedule_result"]
     search_fields = ["title", "agg_key", "relate_id"]
     ordering = ["-id"]
+
+
+@admin.register(NoticePendingAgg)
+class NoticePendingAggAdmin(admin.ModelAdmin):
+    list_display = ["id", "relate_type", "agg_key", "create_at"]
+    list_filter = ["relate_type"]
+    search_fields = ["agg_key"]
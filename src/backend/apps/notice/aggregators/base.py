@@ -54,8 +54,9 @@ class Aggregator:
         """
 
         # 使用默认配置
-        duration = GlobalMetaConfig.get(NOTICE_AGG_DURATION_KEY, default=DEFAULT_NOTICE_AGG_DURATION)
-        max_send_times = GlobalMetaConfig.get(NOTICE_AGG_MAX_NOTICE_KEY, default=DEFAULT_NOTICE_AGG_MAX_NOTICE)
+        configs = GlobalMetaConfig.get_many([NOTICE_AGG_DURATION_KEY, NOTICE_AGG_MAX_NOTICE_KEY])
+        duration = configs.get(NOTICE_AGG_DURATION_KEY, DEFAULT_NOTICE_AGG_DURATION)
+        max_send_times = configs.get(NOTICE_AGG_MAX_NOTICE_KEY, DEFAULT_NOTICE_AGG_MAX_NOTICE)
 
         # 获取上次调度时间
         last_schedule_time = float(cache.get(key=self.cache_key, default=self.schedule_time - duration))
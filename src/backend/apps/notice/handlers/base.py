@@ -18,7 +18,7 @@ to the current version of the project delivered to anyone in the future.
 
 import json
 import traceback
-from typing import List, Optional, Type
+from typing import Dict, List, Optional, Tuple, Type
 
 from blueapps.utils.logger import logger
 from django.utils import timezone
@@ -31,6 +31,39 @@ from apps.notice.builders.base import Builder
 from apps.notice.models import NoticeLogV2
 from apps.notice.senders import SENDERS
 from apps.notice.senders.base import Sender
+from apps.notice.senders.executor import SenderExecutor, SendTask
+
+
+class NoticeSendJob:
+    """
+    单条通知的发送任务集合
+    """
+
+    def __init__(self, notice_log: NoticeLogV2):
+        self.notice_log = notice_log
+        self.title = ""
+        self.content = ""
+        # msg_type => 构造消息失败的调试信息
+        self.build_errors: Dict[str, dict] = {}
+        self.tasks: List[SendTask] = []
+
+    def collect(self) -> Tuple[list, list]:
+        """
+        按通知渠道汇总发送结果
+        :return: (失败的渠道, 调试信息)
+        """
+
+        errors, debug_info = [], []
+        for msg_type in self.notice_log.msg_type:
+            if msg_type in self.build_errors:
+                errors.append(msg_type)
+                debug_info.append(self.build_errors[msg_type])
+                continue
+            tasks = [task for task in self.tasks if task.msg_type == msg_type]
+            if any(task.error is not None for task in tasks):
+                errors.append(msg_type)
+            debug_info.extend(task.debug_info for task in tasks)
+        return errors, debug_info
 
 
 class NoticeHandler:
@@ -38,12 +71,15 @@ class NoticeHandler:
     消息通知基类
     """
 
+    update_fields = ["title", "content", "schedule_at", "schedule_result", "debug_info"]
+
     def __init__(
         self,
         schedule_time: float,
         relate_type: str,
         agg_key: str,
         notice_logs: List[NoticeLogV2],
+        executor: SenderExecutor = None,
     ):
         """
         需要注意：notice_logs 应当为按照 relate_type 和 agg_key 聚合后的一组消息内容
@@ -53,6 +89,10 @@ class NoticeHandler:
         self.relate_type = relate_type
         self.agg_key = agg_key
         self.notice_logs = notice_logs
+        self.executor = executor or SenderExecutor()
+        # 待发送的通知与已处理待保存的通知
+        self.jobs: List[NoticeSendJob] = []
+        self.finished_logs: List[NoticeLogV2] = []
 
     def send(self) -> None:
         """
@@ -85,12 +125,13 @@ class NoticeHandler:
 
         # 聚合的通知记录
         agg_notice_log = None
+        notice_logs = list(self.notice_logs)
 
         # 逐个处理
-        for notice_log in self.notice_logs:
+        for notice_log in notice_logs:
             # 已有聚合通知记录不再发送
             if agg_notice_log is not None:
-                self.done(
+                self.finish(
                     notice_log=notice_log,
                     debug_info=json.dumps({"AggNoticeLogID": agg_notice_log.id}, ensure_ascii=False),
                 )
@@ -102,67 +143,109 @@ class NoticeHandler:
                 continue
             # 达到最大聚合次数时，再发送一次，并更新聚合记录
             agg_notice_log = notice_log
-            self._send(notice_log=notice_log, need_agg=True, agg_count=len(self.notice_logs) - max_send_times)
+            self._send(notice_log=notice_log, need_agg=True, agg_count=len(notice_logs) - max_send_times)
+
+        # 并发发送并保存结果
+        self.dispatch()
 
         # 更新调度时间
         aggregator.update_agg_time()
 
     def _send(self, notice_log: NoticeLogV2, need_agg: bool, agg_count: int = None) -> None:
         """
-        发送消息
+        构造消息并生成发送任务
         """
 
         # 没有接收人或没有通知方式直接完成
         if not notice_log.receivers or not notice_log.msg_type:
-            self.done(notice_log=notice_log)
+            self.finish(notice_log=notice_log)
+            return
 
         # 获取构造器
         builder_cls: Optional[Type[Builder]] = BUILDERS.get(self.relate_type.lower(), None)
         if not builder_cls:
-            self.fail(notice_log=notice_log, debug_info=gettext("消息构造器不存在"))
+            self.apply_fail(notice_log=notice_log, debug_info=gettext("消息构造器不存在"))
+            self.finished_logs.append(notice_log)
             return
 
         # 实例化构造器
         builder: Builder = builder_cls(notice_log=notice_log, need_agg=need_agg, agg_count=agg_count)
 
-        # 逐个消息类型处理
-        errors = []
-        debug_info = []
-        title, content, button = "", "", None
+        # 逐个消息类型构造发送任务
+        job = NoticeSendJob(notice_log=notice_log)
         for msg_type in notice_log.msg_type:
             try:
                 # 获取发送器
                 sender: Type[Sender] = SENDERS[msg_type]
                 # 构造消息内容
-                title, content, button, configs = builder.build_msg(msg_type=msg_type)
-                # 发送消息
-                debug_info.append(
-                    sender(
-                        receivers=notice_log.receivers, title=title, content=content, button=button, **configs
-                    ).send()
+                job.title, job.content, button, configs = builder.build_msg(msg_type=msg_type)
+                job.tasks.extend(
+                    self.executor.build_tasks(
+                        msg_type=msg_type,
+                        sender_cls=sender,
+                        receivers=notice_log.receivers,
+                        title=job.title,
+                        content=job.content,
+                        button=button,
+                        configs=configs,
+                    )
                 )
             except Exception as err:  # NOCC:broad-except(需要处理所有错误)
                 # 记录错误信息
-                errors.append(err)
-                debug_info.append({"Error": str(err), "Traceback": str(traceback.format_exc())})
+                job.build_errors[msg_type] = {"Error": str(err), "Traceback": str(traceback.format_exc())}
+        self.jobs.append(job)
+
+    def dispatch(self) -> None:
+        """
+        并发执行所有发送任务
+        无需发送的通知先批量保存，每条通知的全部渠道发送完成后立即保存，避免进程中断后重复发送已完成的通知
+        """
+
+        if self.finished_logs:
+            NoticeLogV2.objects.bulk_update(self.finished_logs, fields=self.update_fields)
+        self.finished_logs = []
+
+        jobs, self.jobs = self.jobs, []
+        task_jobs = {id(task): job for job in jobs for task in job.tasks}
+        remaining = {id(job): len(job.tasks) for job in jobs}
 
-        # 存储记录
+        def on_complete(task: SendTask) -> None:
+            job = task_jobs[id(task)]
+            remaining[id(job)] -= 1
+            if not remaining[id(job)]:
+                self.complete(job)
+
+        for job in jobs:
+            if not job.tasks:
+                self.complete(job)
+        self.executor.execute([task for job in jobs for task in job.tasks], on_complete=on_complete)
+
+    def complete(self, job: NoticeSendJob) -> None:
+        """
+        汇总发送结果并保存通知记录
+        """
+
+        errors, debug_info = job.collect()
         self.done(
-            notice_log=notice_log,
+            notice_log=job.notice_log,
             errors=errors,
             debug_info=json.dumps(debug_info, ensure_ascii=False),
-            title=title,
-            content=content,
+            title=job.title,
+            content=job.content,
         )
 
-    @classmethod
-    def done(
-        cls, notice_log: NoticeLogV2, errors: list = None, debug_info: str = "", title: str = "", content: str = ""
-    ) -> None:
+    def finish(self, notice_log: NoticeLogV2, **kwargs) -> None:
         """
-        将消息标记为完成
+        将无需发送的消息标记为完成，在 dispatch 时统一保存
         """
 
+        self.apply_done(notice_log=notice_log, **kwargs)
+        self.finished_logs.append(notice_log)
+
+    @classmethod
+    def apply_done(
+        cls, notice_log: NoticeLogV2, errors: list = None, debug_info: str = "", title: str = "", content: str = ""
+    ) -> None:
         errors = errors or []
 
         notice_log.title = title if title else notice_log.title
@@ -172,7 +255,23 @@ class NoticeHandler:
             any([len(notice_log.msg_type) <= 0, len(notice_log.msg_type) > len(errors)])  # 没有通知渠道  # 错误数小于通知渠道数
         )
         notice_log.debug_info = debug_info
-        notice_log.save(update_fields=["title", "content", "schedule_at", "schedule_result", "debug_info"])
+
+    @classmethod
+    def apply_fail(cls, notice_log: NoticeLogV2, debug_info: str = "") -> None:
+        notice_log.schedule_at = timezone.now()
+        notice_log.schedule_result = False
+        notice_log.debug_info = debug_info
+
+    @classmethod
+    def done(
+        cls, notice_log: NoticeLogV2, errors: list = None, debug_info: str = "", title: str = "", content: str = ""
+    ) -> None:
+        """
+        将消息标记为完成
+        """
+
+        cls.apply_done(notice_log=notice_log, errors=errors, debug_info=debug_info, title=title, content=content)
+        notice_log.save(update_fields=cls.update_fields)
 
     @classmethod
     def fail(cls, notice_log: NoticeLogV2, debug_info: str = "") -> None:
@@ -180,7 +279,5 @@ class NoticeHandler:
         将消息标记为失败
         """
 
-        notice_log.schedule_at = timezone.now()
-        notice_log.schedule_result = False
-        notice_log.debug_info = debug_info
+        cls.apply_fail(notice_log=notice_log, debug_info=debug_info)
         notice_log.save(update_fields=["schedule_at", "schedule_result", "debug_info"])
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.notice.constants import NOTICE_LOG_EXPIRED_DAYS
+from apps.notice.models import NoticeLogV2
+
+
+class Command(BaseCommand):
+    """清理过期的通知记录，未发送的通知不会被清理"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=NOTICE_LOG_EXPIRED_DAYS, help="保留天数")
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批删除条数")
+        parser.add_argument("--dry-run", action="store_true", help="仅统计不删除")
+
+    def handle(self, *args, **options):
+        expired_at = timezone.now() - datetime.timedelta(days=options["days"])
+        queryset = NoticeLogV2.objects.filter(create_at__lt=expired_at, schedule_at__isnull=False)
+        if options["dry_run"]:
+            self.stdout.write(f"[CleanNoticeLog] ExpiredAt: {expired_at}; Count: {queryset.count()}")
+            return
+
+        # 按主键分批删除，避免长事务锁表
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by("id").values_list("id", flat=True)[: options["batch_size"]])
+            if not ids:
+                break
+            deleted += NoticeLogV2.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(f"[CleanNoticeLog] ExpiredAt: {expired_at}; Deleted: {deleted}")
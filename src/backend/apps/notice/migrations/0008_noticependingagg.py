@@ -0,0 +1,54 @@
+# Generated by Django 4.2.19 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+def init_pending_agg(apps, schema_editor):
+    """
+    登记存量未发送通知的聚合
+    """
+
+    NoticeLogV2 = apps.get_model("notice", "NoticeLogV2")
+    NoticePendingAgg = apps.get_model("notice", "NoticePendingAgg")
+    keys = {
+        (relate_type, agg_key or "")
+        for relate_type, agg_key in NoticeLogV2.objects.filter(schedule_at__isnull=True)
+        .values_list("relate_type", "agg_key")
+        .distinct()
+    }
+    NoticePendingAgg.objects.bulk_create(
+        [NoticePendingAgg(relate_type=relate_type, agg_key=agg_key) for relate_type, agg_key in keys],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('notice', '0007_alter_noticelogv2_relate_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoticePendingAgg',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                (
+                    'relate_type',
+                    models.CharField(
+                        choices=[('risk', '风险'), ('error', '异常'), ('log_export', '日志导出')],
+                        max_length=16,
+                        verbose_name='关联类型',
+                    ),
+                ),
+                ('agg_key', models.CharField(blank=True, default='', max_length=64, verbose_name='聚合标识')),
+                ('create_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '待发送通知聚合',
+                'verbose_name_plural': '待发送通知聚合',
+                'ordering': ['id'],
+                'unique_together': {('relate_type', 'agg_key')},
+            },
+        ),
+        migrations.RunPython(init_pending_agg, migrations.RunPython.noop),
+    ]
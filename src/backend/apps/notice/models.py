@@ -19,7 +19,7 @@ from typing import List, Optional, Union
 
 from bk_audit.log.models import AuditInstance
 from bk_resource.utils.common_utils import get_md5
-from django.db import models
+from django.db import models, transaction
 from django.db.models import QuerySet
 from django.utils.translation import gettext_lazy
 
@@ -198,3 +198,59 @@ class NoticeLogV2(models.Model):
         index_together = [
             ["relate_type", "agg_key", "schedule_at", "create_at"],
         ]
+
+
+class NoticePendingAgg(models.Model):
+    """
+    待发送的通知聚合
+    写入通知记录时登记，发送任务只扫描该表，聚合内的通知全部发送后移除
+    """
+
+    id = models.BigAutoField(gettext_lazy("ID"), primary_key=True)
+    relate_type = models.CharField(gettext_lazy("关联类型"), choices=RelateType.choices, max_length=16)
+    # 空聚合标识存储为空字符串，保证唯一约束生效
+    agg_key = models.CharField(gettext_lazy("聚合标识"), max_length=64, default="", blank=True)
+    create_at = models.DateTimeField(gettext_lazy("创建时间"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = gettext_lazy("待发送通知聚合")
+        verbose_name_plural = verbose_name
+        ordering = ["id"]
+        unique_together = [["relate_type", "agg_key"]]
+
+    @classmethod
+    def enqueue(cls, relate_type: str, agg_key: Optional[str]) -> None:
+        """
+        登记待发送的聚合，已存在时忽略
+        """
+
+        cls.objects.bulk_create([cls(relate_type=relate_type, agg_key=agg_key or "")], ignore_conflicts=True)
+
+    @property
+    def notice_agg_key(self) -> Optional[str]:
+        return self.agg_key or None
+
+    def pending_logs(self) -> QuerySet["NoticeLogV2"]:
+        """
+        聚合内未发送的通知记录
+        """
+
+        queryset = NoticeLogV2.objects.filter(relate_type=self.relate_type, schedule_at__isnull=True)
+        if self.agg_key:
+            return queryset.filter(agg_key=self.agg_key)
+        return queryset.filter(models.Q(agg_key__isnull=True) | models.Q(agg_key=""))
+
+    @classmethod
+    def drain(cls, handle) -> None:
+        """
+        逐个处理待发送的聚合，处理后聚合内无待发送通知时移除
+        移除前加锁，并发登记的通知会等待移除完成后重新登记；被其他进程锁定的聚合直接跳过
+        :param handle: 处理函数，参数为 (relate_type, agg_key, notice_logs)
+        """
+
+        for pending in cls.objects.all():
+            handle(pending.relate_type, pending.notice_agg_key, pending.pending_logs().order_by("create_at"))
+            with transaction.atomic():
+                locked = cls.objects.select_for_update(skip_locked=True).filter(id=pending.id).first()
+                if locked is not None and not locked.pending_logs().exists():
+                    locked.delete()
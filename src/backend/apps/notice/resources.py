@@ -26,7 +26,7 @@ from django.utils.translation import gettext_lazy
 
 from apps.audit.resources import AuditMixinResource
 from apps.notice.constants import MemberVariable, MsgType
-from apps.notice.models import NoticeGroup, NoticeLogV2
+from apps.notice.models import NoticeGroup, NoticeLogV2, NoticePendingAgg
 from apps.notice.serializers import (
     CreateNoticeGroupRequestSerializer,
     CreateNoticeGroupResponseSerializer,
@@ -172,7 +172,8 @@ class SendNotice(NoticeMeta):
     RequestSerializer = SendNoticeSerializer
 
     def perform_request(self, validated_request_data):
-        NoticeLogV2.objects.create(**validated_request_data)
+        notice_log = NoticeLogV2.objects.create(**validated_request_data)
+        NoticePendingAgg.enqueue(relate_type=notice_log.relate_type, agg_key=notice_log.agg_key)
 
 
 class GetNoticeCommon(NoticeMeta):
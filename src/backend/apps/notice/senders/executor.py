@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Type
+
+from django.conf import settings
+from django.db import connections
+
+from apps.notice.models import NoticeButton, NoticeContent
+from apps.notice.senders.base import Sender
+
+
+class RateLimiter:
+    """
+    按固定间隔限制调用频率，进程内共享
+    """
+
+    _limiters: Dict[str, "RateLimiter"] = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str, rate: float) -> Optional["RateLimiter"]:
+        """
+        获取指定渠道的限流器，rate <= 0 时不限流
+        """
+
+        if not rate or rate <= 0:
+            return None
+        key = f"{name}:{rate}"
+        with cls._limiters_lock:
+            if key not in cls._limiters:
+                cls._limiters[key] = cls(rate)
+            return cls._limiters[key]
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.next_at - now, 0)
+            self.next_at = max(self.next_at, now) + self.interval
+        if wait:
+            time.sleep(wait)
+
+
+class SendTask:
+    """
+    单次发送任务，对应一个通知渠道的一组接收人
+    """
+
+    def __init__(self, msg_type: str, sender: Sender):
+        self.msg_type = msg_type
+        self.sender = sender
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.traceback = ""
+
+    @property
+    def debug_info(self):
+        if self.error is None:
+            return self.result
+        return {"Error": str(self.error), "Traceback": self.traceback}
+
+
+class SenderExecutor:
+    """
+    通知发送执行器
+    按接收人拆分发送任务，通过有界线程池并发发送，并按渠道限流
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        receiver_chunk_size: int = None,
+        rate_limits: Dict[str, float] = None,
+    ):
+        self.max_workers = settings.NOTICE_SENDER_MAX_WORKERS if max_workers is None else max_workers
+        self.receiver_chunk_size = (
+            settings.NOTICE_SENDER_RECEIVER_CHUNK_SIZE if receiver_chunk_size is None else receiver_chunk_size
+        )
+        self.rate_limits = settings.NOTICE_SENDER_RATE_LIMITS if rate_limits is None else rate_limits
+
+    def build_tasks(
+        self,
+        msg_type: str,
+        sender_cls: Type[Sender],
+        receivers: List[str],
+        title: str,
+        content: NoticeContent,
+        button: NoticeButton,
+        configs: dict,
+    ) -> List[SendTask]:
+        chunk_size = self.receiver_chunk_size if self.receiver_chunk_size > 0 else max(len(receivers), 1)
+        return [
+            SendTask(
+                msg_type=msg_type,
+                sender=sender_cls(
+                    receivers=receivers[index : index + chunk_size],
+                    title=title,
+                    content=content,
+                    button=button,
+                    **configs,
+                ),
+            )
+            for index in range(0, len(receivers), chunk_size)
+        ]
+
+    def execute(self, tasks: List[SendTask], on_complete: Callable[[SendTask], None] = None) -> List[SendTask]:
+        """
+        执行发送任务，异常记录在任务中不会抛出
+        :param on_complete: 单个任务完成后在当前线程中回调，用于及时保存发送结果
+        """
+
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                self.run(task)
+                if on_complete:
+                    on_complete(task)
+            return tasks
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(tasks)), thread_name_prefix="notice_sender"
+        ) as executor:
+            futures = {executor.submit(self.run_in_thread, task): task for task in tasks}
+            for future in as_completed(futures):
+                future.result()
+                if on_complete:
+                    on_complete(futures[future])
+        return tasks
+
+    def run(self, task: SendTask) -> None:
+        limiter = RateLimiter.get(task.msg_type, self.rate_limits.get(task.msg_type))
+        if limiter:
+            limiter.acquire()
+        try:
+            task.result = task.sender.send()
+        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+            task.error = err
+            task.traceback = traceback.format_exc()
+
+    def run_in_thread(self, task: SendTask) -> None:
+        # 工作线程使用独立的 db 连接，发送完成后关闭，避免连接泄漏
+        try:
+            self.run(task)
+        finally:
+            connections.close_all()
@@ -21,7 +21,7 @@ from blueapps.contrib.celery_tools.periodic import periodic_task
 from celery.schedules import crontab
 
 from apps.notice.handlers import NoticeHandler
-from apps.notice.models import NoticeLogV2
+from apps.notice.models import NoticePendingAgg
 from core.lock import lock
 
 
@@ -35,20 +35,12 @@ def send_notice_from_db():
     # 初始化调度时间
     schedule_time = time.time()
 
-    # 获取聚合键
-    schedule_configs = (
-        NoticeLogV2.objects.values("relate_type", "agg_key").order_by("relate_type", "agg_key").distinct()
-    )
-
-    # 逐个执行
-    for schedule_config in schedule_configs:
-        NoticeHandler(
+    # 逐个聚合执行
+    NoticePendingAgg.drain(
+        lambda relate_type, agg_key, notice_logs: NoticeHandler(
             schedule_time=schedule_time,
-            relate_type=schedule_config["relate_type"],
-            agg_key=schedule_config["agg_key"],
-            notice_logs=NoticeLogV2.objects.filter(
-                relate_type=schedule_config["relate_type"],
-                agg_key=schedule_config["agg_key"],
-                schedule_at__isnull=True,
-            ).order_by("create_at"),
+            relate_type=relate_type,
+            agg_key=agg_key,
+            notice_logs=notice_logs,
         ).send()
+    )
@@ -16,6 +16,7 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 
+import os
 from enum import Enum
 
 from django.conf import settings
@@ -23,6 +24,12 @@ from django.conf import settings
 PERMISSION_CACHE_EXPIRE = 5 * 60
 FETCH_INSTANCE_TOKEN_KEY = "FETCH_INSTANCE_TOKEN"
 
+# IAM 策略与鉴权结果缓存
+IAM_POLICY_CACHE_NAMESPACE = "iam_policy"
+IAM_POLICY_CACHE_SIZE = int(os.getenv("BKAPP_IAM_POLICY_CACHE_SIZE", 4096))
+IAM_POLICY_LOCAL_CACHE_TTL = int(os.getenv("BKAPP_IAM_POLICY_LOCAL_CACHE_TTL", 10))  # s
+IAM_POLICY_REMOTE_CACHE_TTL = int(os.getenv("BKAPP_IAM_POLICY_REMOTE_CACHE_TTL", 60))  # s
+
 
 class IAMSystems(Enum):
     BK_AUDIT = settings.BK_IAM_SYSTEM_ID
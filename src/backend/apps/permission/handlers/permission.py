@@ -16,12 +16,16 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 import base64
+import json
 import os
-from typing import Dict, List, Union
+import threading
+import time
+from typing import Any, Callable, Dict, List, Union
 
 from blueapps.utils.logger import logger
 from blueapps.utils.request_provider import get_local_request
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import gettext
 from iam import IAM, MultiActionRequest, Request, Resource, Subject
 from iam.apply.models import (
@@ -40,11 +44,18 @@ from rest_framework.permissions import BasePermission
 
 from api.domains import BK_IAM_API_URL
 from apps.meta.models import GlobalMetaConfig
-from apps.permission.constants import FETCH_INSTANCE_TOKEN_KEY
+from apps.permission.constants import (
+    FETCH_INSTANCE_TOKEN_KEY,
+    IAM_POLICY_CACHE_NAMESPACE,
+    IAM_POLICY_CACHE_SIZE,
+    IAM_POLICY_LOCAL_CACHE_TTL,
+    IAM_POLICY_REMOTE_CACHE_TTL,
+)
 from apps.permission.exceptions import ActionNotExistError, GetSystemInfoError
 from apps.permission.handlers.actions import ActionMeta, _all_actions, get_action_by_id
 from apps.permission.handlers.resource_types import _all_resources, get_resource_by_id
 from core.exceptions import PermissionException
+from core.utils.cache import LRUCache, TwoLevelCache
 
 
 class Permission(object):
@@ -52,6 +63,20 @@ class Permission(object):
     权限中心鉴权封装
     """
 
+    # 进程内共享的 IAM 客户端
+    _iam_client = None
+    _iam_client_lock = threading.Lock()
+
+    # 用户策略及鉴权结果缓存，授权变更时调用 flush_cache 刷新
+    policy_cache = TwoLevelCache(
+        namespace=IAM_POLICY_CACHE_NAMESPACE,
+        max_size=IAM_POLICY_CACHE_SIZE,
+        local_ttl=IAM_POLICY_LOCAL_CACHE_TTL,
+        remote_ttl=IAM_POLICY_REMOTE_CACHE_TTL,
+    )
+    # 用户及用户动作的缓存版本号，作为缓存 key 的一部分，授权变更时只更新相关的版本号
+    policy_versions = LRUCache(max_size=IAM_POLICY_CACHE_SIZE, ttl=IAM_POLICY_LOCAL_CACHE_TTL)
+
     def __init__(self, username: str = "", request=None):
         if username:
             self.username = username
@@ -69,7 +94,83 @@ class Permission(object):
 
     @classmethod
     def get_iam_client(cls):
-        return IAM(settings.APP_CODE, settings.SECRET_KEY, bk_apigateway_url=BK_IAM_API_URL)
+        """
+        获取 IAM 客户端，同一进程内只初始化一次
+        """
+        if cls._iam_client is None:
+            with cls._iam_client_lock:
+                if cls._iam_client is None:
+                    cls._iam_client = IAM(settings.APP_CODE, settings.SECRET_KEY, bk_apigateway_url=BK_IAM_API_URL)
+        return cls._iam_client
+
+    @classmethod
+    def build_version_key(cls, username: str, action_id: str = None) -> str:
+        key = f"{IAM_POLICY_CACHE_NAMESPACE}:user_version:{username}"
+        return f"{key}:{action_id}" if action_id else key
+
+    @classmethod
+    def get_versions(cls, version_keys: List[str]) -> tuple:
+        """
+        获取缓存版本号，本地缓存未命中时批量读取
+        """
+        versions = {key: cls.policy_versions.get(key) for key in version_keys}
+        missing = [key for key, version in versions.items() if version is None]
+        if missing:
+            remote_versions = cache.get_many(missing)
+            for key in missing:
+                versions[key] = remote_versions.get(key, 0)
+                cls.policy_versions.set(key, versions[key])
+        return tuple(versions[key] for key in version_keys)
+
+    @classmethod
+    def flush_cache(cls, username: str = None, action_ids: List[str] = None) -> None:
+        """
+        刷新所有进程的策略及鉴权结果缓存
+        指定用户时只刷新该用户的缓存，同时指定动作时只刷新该用户相关动作的缓存
+        """
+        if not username:
+            cls.policy_cache.invalidate()
+            return
+        version_keys = [cls.build_version_key(username, action_id) for action_id in action_ids or [None]]
+        # 版本号取当前时间，过期后重新写入也不会与旧版本号重复
+        version = time.time_ns()
+        cache.set_many({key: version for key in version_keys}, timeout=cls.policy_cache.remote_ttl)
+        for key in version_keys:
+            cls.policy_versions.delete(key)
+
+    @classmethod
+    def build_resources_key(cls, resources: List[Union[Resource, List[Resource]]]) -> str:
+        """
+        将资源（或资源列表的列表）序列化为缓存 key
+        """
+
+        def to_data(item):
+            return [to_data(i) for i in item] if isinstance(item, (list, tuple)) else item.to_dict()
+
+        return json.dumps(to_data(resources), sort_keys=True, default=str)
+
+    def get_cached(self, key: tuple, loader: Callable[[], Any], action_ids: List[str]) -> Any:
+        """
+        获取当前用户的缓存数据，loader 抛出的异常不会被缓存
+        :param action_ids: 缓存数据关联的动作，用户或动作的版本号变更后缓存失效
+        """
+        versions = self.get_versions(
+            [self.build_version_key(self.username)]
+            + [self.build_version_key(self.username, action_id) for action_id in action_ids]
+        )
+        return self.policy_cache.get((self.username, versions, *key), loader)
+
+    def get_policy_filter(self, action: Union[ActionMeta, str], name: str, convert: Callable[[dict], Any]) -> Any:
+        """
+        获取转换后的策略筛选条件，转换结果按 name 区分缓存；无策略时返回 None
+        """
+        action = get_action_by_id(action)
+
+        def load_filter():
+            policies = self.get_policies_for_action(action)
+            return convert(policies) if policies else None
+
+        return self.get_cached(("policy_filter", name, action.id), load_filter, [action.id])
 
     def make_request(self, action: Union[ActionMeta, str], resources: List[Resource] = None) -> Request:
         """
@@ -106,7 +207,6 @@ class Permission(object):
     def _make_application(
         self, action_ids: List[str], resources: List[Resource] = None, system_id: str = settings.BK_IAM_SYSTEM_ID
     ) -> Application:
-
         resources = resources or []
         actions = []
 
@@ -250,7 +350,7 @@ class Permission(object):
             self.iam_client._validate_request(request)
 
             # 2. _client.policy_query
-            policies = self.iam_client._do_policy_query(request)
+            policies = self.get_policies_for_action(action)
 
             logger.debug("the return policies: %s", policies)
             result = bool(policies)
@@ -274,13 +374,17 @@ class Permission(object):
         :param raise_exception: 鉴权失败时是否需要抛出异常
         """
         action = get_action_by_id(action)
-        if not action.related_resource_types:
+        if not action.related_resource_types or not resources:
             resources = []
 
         request = self.make_request(action, resources)
 
         try:
-            result = self.iam_client.is_allowed(request)
+            result = self.get_cached(
+                ("is_allowed", action.id, self.build_resources_key(resources)),
+                lambda: self.iam_client.is_allowed(request),
+                [action.id],
+            )
         except AuthAPIError as e:
             logger.exception(
                 "[IAM AuthAPI Error] Action => %s; Resources => %s; Err => %s",
@@ -305,7 +409,11 @@ class Permission(object):
         查询某批资源某批操作是否有权限
         """
         request = self.make_multi_action_request(actions)
-        result = self.iam_client.batch_resource_multi_actions_allowed(request, resources)
+        action_ids = [action.id for action in request.actions]
+        key = ("batch_is_allowed", tuple(action_ids), self.build_resources_key(resources))
+        result = self.get_cached(
+            key, lambda: self.iam_client.batch_resource_multi_actions_allowed(request, resources), action_ids
+        )
         return result
 
     @classmethod
@@ -379,6 +487,7 @@ class Permission(object):
             grant_result = self.iam_client.grant_resource_creator_action_attributes(
                 application, self.bk_token, self.username
             )
+            self.flush_cache(application["creator"])
             logger.info(f"[grant_creator_action] Success! resource: {resource.to_dict()}, result: {grant_result}")
         except Exception as e:  # pylint: disable=broad-except
             logger.exception(f"[grant_creator_action] Failed! resource: {resource.to_dict()}, result: {e}")
@@ -409,6 +518,7 @@ class Permission(object):
 
         try:
             grant_result = self.iam_client.grant_resource_creator_actions(application, self.bk_token, self.username)
+            self.flush_cache(application["creator"])
             logger.info(f"[grant_creator_action] Success! resource: {resource.to_dict()}, result: {grant_result}")
         except Exception as e:  # pylint: disable=broad-except
             logger.exception(f"[grant_creator_action] Failed! resource: {resource.to_dict()}, result: {e}")
@@ -423,10 +533,11 @@ class Permission(object):
         主动授权
         """
 
+        action = get_action_by_id(action)
         request = ApiAuthRequest(
             system=settings.BK_IAM_SYSTEM_ID,
             subject=Subject("user", self.username),
-            action=get_action_by_id(action),
+            action=action,
             resources=resources,
             environment=None,
             operate="grant",
@@ -435,15 +546,16 @@ class Permission(object):
         self.iam_client.grant_or_revoke_path_permission(
             request=request, bk_token=self.bk_token, bk_username=self.username
         )
+        self.flush_cache(self.username, [action.id])
 
     def get_policies_for_action(self, action: Union[ActionMeta, str]) -> dict:
         """
-        获取用户对某个动作的策略
+        获取用户对某个动作的策略，优先读取缓存
         """
 
         action = get_action_by_id(action)
         request = self.make_request(action=action, resources=[])
-        return self.iam_client._do_policy_query(request)
+        return self.get_cached(("policy", action.id), lambda: self.iam_client._do_policy_query(request), [action.id])
 
 
 class FetchInstancePermission(BasePermission):
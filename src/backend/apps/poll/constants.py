@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import os
+
+from django.utils.translation import gettext_lazy
+
+from core.choices import TextChoices
+
+
+class PollStatusChoices(TextChoices):
+    PENDING = "pending", gettext_lazy("轮询中")
+    SUCCESS = "success", gettext_lazy("成功")
+    FAILED = "failed", gettext_lazy("失败")
+    EXPIRED = "expired", gettext_lazy("已超时")
+
+
+# 单次调度最多处理的轮询任务数
+POLL_BATCH_SIZE = int(os.getenv("BKAPP_POLL_BATCH_SIZE", 500))
+# 已投递的调度超过该时间（秒）未执行时视为丢失，允许重新投递
+POLL_TICK_GRACE_SECONDS = int(os.getenv("BKAPP_POLL_TICK_GRACE_SECONDS", 60))
+# 最近一次已投递调度的执行时间
+POLL_NEXT_TICK_CACHE_KEY = "poll:next_tick"
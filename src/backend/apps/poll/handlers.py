@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Type
+
+from blueapps.utils.logger import logger_celery
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.poll.constants import (
+    POLL_BATCH_SIZE,
+    POLL_NEXT_TICK_CACHE_KEY,
+    POLL_TICK_GRACE_SECONDS,
+    PollStatusChoices,
+)
+from apps.poll.models import PollTask
+
+
+@dataclass
+class PollResult:
+    """
+    单个轮询任务的结果，状态为 PENDING 时按退避间隔继续轮询
+    """
+
+    status: str
+    message: str = ""
+
+
+class PollHandler:
+    """
+    轮询处理器
+    同一调度周期内到期的任务会一次性交给 poll 批量处理
+    """
+
+    # 注册后首次轮询的延迟（秒）
+    initial_delay: int = 5
+    # 初始轮询间隔（秒），每次轮询后按 backoff_factor 递增
+    initial_interval: int = 5
+    backoff_factor: float = 2
+    max_interval: int = 300
+    # 自注册起的最长轮询时间（秒）
+    max_age: int = 3600
+    # 最大轮询次数，为空时仅受 max_age 限制
+    max_attempts: Optional[int] = None
+
+    @classmethod
+    def get_path(cls) -> str:
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    @classmethod
+    def next_interval(cls, backoff: int) -> int:
+        return min(int(backoff * cls.backoff_factor), cls.max_interval)
+
+    def poll(self, tasks: List[PollTask]) -> Dict[int, PollResult]:
+        """
+        批量轮询，返回 任务ID => 轮询结果，未返回结果的任务继续轮询
+        """
+
+        raise NotImplementedError()
+
+    def on_expired(self, tasks: List[PollTask]) -> None:
+        """
+        轮询超时或次数耗尽
+        """
+
+
+class PollScheduler:
+    """
+    轮询调度
+    轮询状态保存在 PollTask 中，由 run_poll_tasks 按最近的 next_poll_at 通过 countdown 重新投递，不占用 Worker 等待
+    """
+
+    def __init__(self, batch_size: int = POLL_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    @classmethod
+    def register(cls, handler_class: Type[PollHandler], poll_key: str, params: dict = None) -> PollTask:
+        """
+        注册轮询任务，已存在时重置轮询状态
+        """
+
+        now = timezone.now()
+        task, _ = PollTask.objects.update_or_create(
+            handler=handler_class.get_path(),
+            poll_key=str(poll_key),
+            defaults={
+                "params": params or {},
+                "status": PollStatusChoices.PENDING.value,
+                "attempt": 0,
+                "backoff": handler_class.initial_interval,
+                "next_poll_at": now + datetime.timedelta(seconds=handler_class.initial_delay),
+                "registered_at": now,
+                "expired_at": now + datetime.timedelta(seconds=handler_class.max_age),
+                "message": "",
+            },
+        )
+        next_poll_at = task.next_poll_at
+        transaction.on_commit(lambda: cls.schedule(next_poll_at))
+        return task
+
+    @classmethod
+    def schedule(cls, next_poll_at: datetime.datetime) -> bool:
+        """
+        投递调度任务，已有更早的调度未到执行时间时不重复投递
+        已过执行时间的调度可能因锁被占用而跳过，不再视为待执行
+        """
+
+        from apps.poll.tasks import run_poll_tasks
+
+        now = timezone.now().timestamp()
+        target = max(next_poll_at.timestamp(), now)
+        scheduled = cache.get(POLL_NEXT_TICK_CACHE_KEY)
+        if scheduled and now <= scheduled <= target:
+            return False
+        countdown = target - now
+        cache.set(POLL_NEXT_TICK_CACHE_KEY, target, timeout=int(countdown) + POLL_TICK_GRACE_SECONDS)
+        run_poll_tasks.apply_async(countdown=countdown)
+        return True
+
+    def tick(self) -> Dict[str, int]:
+        """
+        执行一次调度：批量处理到期任务，并投递下一次调度
+        """
+
+        now = timezone.now()
+        scheduled = cache.get(POLL_NEXT_TICK_CACHE_KEY)
+        if scheduled and scheduled <= now.timestamp():
+            cache.delete(POLL_NEXT_TICK_CACHE_KEY)
+
+        tasks = list(
+            PollTask.objects.filter(status=PollStatusChoices.PENDING.value, next_poll_at__lte=now).order_by(
+                "next_poll_at"
+            )[: self.batch_size]
+        )
+        handler_tasks = defaultdict(list)
+        for task in tasks:
+            handler_tasks[task.handler].append(task)
+        for handler_path, _tasks in handler_tasks.items():
+            self.run_handler(handler_path, _tasks, now)
+        updated = self.save_tasks(tasks)
+
+        next_poll_at = (
+            PollTask.objects.filter(status=PollStatusChoices.PENDING.value)
+            .order_by("next_poll_at")
+            .values_list("next_poll_at", flat=True)
+            .first()
+        )
+        if next_poll_at:
+            self.schedule(next_poll_at)
+
+        stats = defaultdict(int)
+        for task in tasks:
+            stats[task.status] += 1
+        logger_celery.info("[PollScheduler] Polled %d; Updated %d; Stats %s", len(tasks), updated, dict(stats))
+        return dict(stats)
+
+    def run_handler(self, handler_path: str, tasks: List[PollTask], now: datetime.datetime) -> None:
+        try:
+            handler: PollHandler = import_string(handler_path)()
+        except ImportError as err:
+            logger_celery.error("[PollScheduler] Handler Not Found => %s; %s", handler_path, err)
+            for task in tasks:
+                task.status = PollStatusChoices.FAILED.value
+                task.message = str(err)
+            return
+
+        expired_tasks = [task for task in tasks if task.expired_at <= now]
+        polling_tasks = [task for task in tasks if task.expired_at > now]
+        results = {}
+        if polling_tasks:
+            try:
+                results = handler.poll(polling_tasks)
+            except Exception as err:  # NOCC:broad-except(处理器异常时按退避间隔继续轮询)
+                logger_celery.exception("[PollScheduler] Poll Failed => %s; %s", handler_path, err)
+
+        for task in polling_tasks:
+            task.attempt += 1
+            result = results.get(task.id)
+            if result and result.status != PollStatusChoices.PENDING.value:
+                task.status = result.status
+                task.message = result.message
+                continue
+            if handler.max_attempts and task.attempt >= handler.max_attempts:
+                expired_tasks.append(task)
+                continue
+            task.next_poll_at = now + datetime.timedelta(seconds=task.backoff)
+            task.backoff = handler.next_interval(task.backoff)
+
+        if not expired_tasks:
+            return
+        for task in expired_tasks:
+            task.status = PollStatusChoices.EXPIRED.value
+        try:
+            handler.on_expired(expired_tasks)
+        except Exception as err:  # NOCC:broad-except(需要保证轮询状态被保存)
+            logger_celery.exception("[PollScheduler] Expire Failed => %s; %s", handler_path, err)
+
+    @classmethod
+    def save_tasks(cls, tasks: List[PollTask]) -> int:
+        """
+        保存轮询状态，轮询期间被重新注册的任务以注册结果为准
+        """
+
+        if not tasks:
+            return 0
+        registered = dict(
+            PollTask.objects.filter(id__in=[task.id for task in tasks]).values_list("id", "registered_at")
+        )
+        tasks = [task for task in tasks if registered.get(task.id) == task.registered_at]
+        PollTask.objects.bulk_update(tasks, fields=["status", "attempt", "backoff", "next_poll_at", "message"])
+        return len(tasks)
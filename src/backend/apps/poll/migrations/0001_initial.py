@@ -0,0 +1,44 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='PollTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('handler', models.CharField(max_length=255, verbose_name='处理器')),
+                ('poll_key', models.CharField(max_length=255, verbose_name='轮询标识')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='轮询参数')),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[('pending', '轮询中'), ('success', '成功'), ('failed', '失败'), ('expired', '已超时')],
+                        default='pending',
+                        max_length=32,
+                        verbose_name='状态',
+                    ),
+                ),
+                ('attempt', models.IntegerField(default=0, verbose_name='已轮询次数')),
+                ('backoff', models.IntegerField(default=0, verbose_name='轮询间隔(秒)')),
+                ('next_poll_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次轮询时间')),
+                ('registered_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='注册时间')),
+                ('expired_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='过期时间')),
+                ('message', models.TextField(blank=True, default='', verbose_name='结果信息')),
+            ],
+            options={
+                'verbose_name': '轮询任务',
+                'verbose_name_plural': '轮询任务',
+                'ordering': ['-id'],
+                'unique_together': {('handler', 'poll_key')},
+                'index_together': {('status', 'next_poll_at')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from apps.poll.constants import PollStatusChoices
+
+
+class PollTask(models.Model):
+    """
+    轮询任务
+    同一处理器下按 poll_key 唯一，重复注册时重置轮询状态
+    """
+
+    handler = models.CharField(gettext_lazy("处理器"), max_length=255)
+    poll_key = models.CharField(gettext_lazy("轮询标识"), max_length=255)
+    params = models.JSONField(gettext_lazy("轮询参数"), default=dict, blank=True)
+    status = models.CharField(
+        gettext_lazy("状态"),
+        max_length=32,
+        choices=PollStatusChoices.choices,
+        default=PollStatusChoices.PENDING.value,
+    )
+    attempt = models.IntegerField(gettext_lazy("已轮询次数"), default=0)
+    backoff = models.IntegerField(gettext_lazy("轮询间隔(秒)"), default=0)
+    next_poll_at = models.DateTimeField(gettext_lazy("下次轮询时间"), default=timezone.now)
+    registered_at = models.DateTimeField(gettext_lazy("注册时间"), default=timezone.now)
+    expired_at = models.DateTimeField(gettext_lazy("过期时间"), default=timezone.now)
+    message = models.TextField(gettext_lazy("结果信息"), default="", blank=True)
+
+    class Meta:
+        verbose_name = gettext_lazy("轮询任务")
+        verbose_name_plural = verbose_name
+        ordering = ["-id"]
+        unique_together = [["handler", "poll_key"]]
+        index_together = [["status", "next_poll_at"]]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from blueapps.contrib.celery_tools.periodic import periodic_task
+from celery.schedules import crontab
+from django.conf import settings
+
+from apps.poll.handlers import PollScheduler
+from core.lock import lock
+
+
+@periodic_task(run_every=crontab(minute="*/5"), soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
+@lock(lock_name="celery:run_poll_tasks")
+def run_poll_tasks():
+    """
+    批量执行到期的轮询任务
+    正常情况下由 PollScheduler 按 countdown 投递，周期调度用于兜底丢失的投递
+    """
+
+    PollScheduler().tick()
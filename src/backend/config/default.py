@@ -44,6 +44,7 @@ INSTALLED_APPS += (
     "apps.sops",
     "apps.itsm",
     "apps.user_manage",
+    "apps.poll",
     "bk_resource",
     "rest_framework",
     "drf_yasg",
@@ -197,6 +198,18 @@ APPEND_SLASH = False
 
 FETCH_INSTANCE_USERNAME = os.getenv("BKAPP_FETCH_INSTANCE_USERNAME", "bk_iam")
 
+# 反向拉取实例总数缓存时间(秒)
+FETCH_INSTANCE_COUNT_CACHE_TIMEOUT = int(os.getenv("BKAPP_FETCH_INSTANCE_COUNT_CACHE_TIMEOUT", 60))
+
+# 反向拉取分页游标缓存时间(秒)，游标失效时回退到 OFFSET 分页
+FETCH_INSTANCE_CURSOR_CACHE_TIMEOUT = int(os.getenv("BKAPP_FETCH_INSTANCE_CURSOR_CACHE_TIMEOUT", 600))
+
+# 反向拉取请求日志采样率(0~1)，异常请求总是记录
+FETCH_INSTANCE_LOG_SAMPLE_RATE = float(os.getenv("BKAPP_FETCH_INSTANCE_LOG_SAMPLE_RATE", 0.01))
+
+# 反向拉取请求日志最大长度，超出部分截断
+FETCH_INSTANCE_LOG_MAX_LENGTH = int(os.getenv("BKAPP_FETCH_INSTANCE_LOG_MAX_LENGTH", 1024))
+
 REDIS_HOST = get_env_or_raise("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
@@ -285,6 +298,12 @@ SNAPSHOT_USERINFO_RESOURCE_TOKEN = os.getenv("BKAPP_FETCH_USER_INFO_TOKEN", "")
 
 # Notice
 NOTICE_AGG_MINUTES = int(os.getenv("BKAPP_NOTICE_AGG_MINUTES", 30))
+# 通知发送并发数
+NOTICE_SENDER_MAX_WORKERS = int(os.getenv("BKAPP_NOTICE_SENDER_MAX_WORKERS", 8))
+# 单次发送的最大接收人数，超出时拆分为多次发送，0 表示不拆分
+NOTICE_SENDER_RECEIVER_CHUNK_SIZE = int(os.getenv("BKAPP_NOTICE_SENDER_RECEIVER_CHUNK_SIZE", 100))
+# 各通知渠道每秒最大发送次数，如 {"voice": 2}，未配置的渠道不限制
+NOTICE_SENDER_RATE_LIMITS = json.loads(os.getenv("BKAPP_NOTICE_SENDER_RATE_LIMITS", "{}"))
 
 # Asset
 ASSET_RT_STORAGE_CLUSTER = os.getenv("BKAPP_ASSET_RT_STORAGE_CLUSTER", "")
@@ -315,6 +334,10 @@ ENABLE_MULTI_PROCESS_RISK = strtobool(os.getenv("BKAPP_ENABLE_MULTI_PROCESS_RISK
 
 # cache lock
 DEFAULT_CACHE_LOCK_TIMEOUT = int(os.getenv("BKAPP_DEFAULT_CACHE_LOCK_TIMEOUT", 60 * 60))
+# 开启心跳的锁超时时间（秒），持有者存活期间每 1/3 超时时间续期一次
+CACHE_LOCK_HEARTBEAT_TIMEOUT = int(os.getenv("BKAPP_CACHE_LOCK_HEARTBEAT_TIMEOUT", 60))
+# 锁 fencing token 计数器的最短过期时间（秒），获取与续期锁时刷新，不小于锁超时时间的 10 倍
+CACHE_LOCK_FENCING_TIMEOUT = int(os.getenv("BKAPP_CACHE_LOCK_FENCING_TIMEOUT", 7 * 24 * 60 * 60))
 
 # Throttler
 throttler_config = ThrottlerConfig(
@@ -351,6 +374,15 @@ BK_AUDIT_SETTINGS = {
 # 全局配置
 BK_SHARED_RES_URL = os.getenv("BKAPP_BK_SHARED_RES_URL", os.getenv("BKPAAS_SHARED_RES_URL", ""))
 
+# 工具查询结果缓存最长时间(秒)
+TOOL_RESULT_CACHE_MAX_TTL = int(os.getenv("BKAPP_TOOL_RESULT_CACHE_MAX_TTL", 60 * 60))
+
+# 工具查询结果缓存单条最大大小(字节)，超出时不缓存
+TOOL_RESULT_CACHE_MAX_BYTES = int(os.getenv("BKAPP_TOOL_RESULT_CACHE_MAX_BYTES", 1024 * 1024))
+
+# 工具查询结果缓存等待其他请求查询完成的最长时间(秒)
+TOOL_RESULT_CACHE_WAIT_TIMEOUT = int(os.getenv("BKAPP_TOOL_RESULT_CACHE_WAIT_TIMEOUT", 30))
+
 # CORS 允许的 header
 CORS_ALLOW_HEADERS = [
     "x-requested-with",
@@ -378,6 +410,16 @@ EVENT_KAFKA_TIMEOUT_MS = int(os.getenv("BKAPP_EVENT_KAFKA_TIMEOUT_MS", 1000))
 EVENT_KAFKA_MAX_RECORDS = int(os.getenv("BKAPP_EVENT_KAFKA_MAX_RECORDS", 10))
 # 事件 kafka 拉取间隔时间
 EVENT_KAFKA_SLEEP_TIME = float(os.getenv("BKAPP_EVENT_KAFKA_SLEEP_TIME", 0.5))
+# 事件 kafka 是否按批次生成风险
+EVENT_KAFKA_BATCH_MODE = strtobool(os.getenv("BKAPP_EVENT_KAFKA_BATCH_MODE", "False"))
+# 事件 kafka 批量模式下并发处理的分区数
+EVENT_KAFKA_WORKERS = int(os.getenv("BKAPP_EVENT_KAFKA_WORKERS", 4))
+# 事件 kafka 批量模式下可用策略刷新间隔(秒)
+EVENT_KAFKA_STRATEGY_REFRESH_INTERVAL = int(os.getenv("BKAPP_EVENT_KAFKA_STRATEGY_REFRESH_INTERVAL", 30))
+# 事件 kafka 批量模式下批次失败后单条消息的最大尝试次数
+EVENT_KAFKA_RECORD_MAX_RETRIES = int(os.getenv("BKAPP_EVENT_KAFKA_RECORD_MAX_RETRIES", 3))
+# 事件 kafka 批量模式下单条消息连续回退重新消费的最大次数，超过后记录死信日志并跳过
+EVENT_KAFKA_RECORD_MAX_SEEKS = int(os.getenv("BKAPP_EVENT_KAFKA_RECORD_MAX_SEEKS", 3))
 
 # 系统访问地址(用作 swagger 访问返回)
 BK_BACKEND_URL = os.getenv("BKAPP_BACKEND_URL", BK_IAM_RESOURCE_API_HOST)
@@ -391,6 +433,27 @@ PROCESS_ONE_RISK_PERIODIC_TASK_MINUTE = os.getenv("BKAPP_PROCESS_ONE_RISK_PERIOD
 # 同步处理套餐结果定时任务调度周期(分)
 SYNC_AUTO_RESULT_PERIODIC_TASK_MINUTE = os.getenv("BKAPP_SYNC_AUTO_RESULT_PERIODIC_TASK_MINUTE", "*/10")
 
+# 同步采集项最近日志时间的并发数，每个数据平台使用独立的线程池
+TAIL_LOG_SYNC_WORKERS = int(os.getenv("BKAPP_TAIL_LOG_SYNC_WORKERS", 8))
+
+# 同步采集项最近日志时间的超时时间(秒)，超时的采集项本轮不更新
+TAIL_LOG_SYNC_TIMEOUT = int(os.getenv("BKAPP_TAIL_LOG_SYNC_TIMEOUT", 240))
+
+# 按数据平台配置的同步超时时间(秒)，如 {"bk_log": 120}，未配置的平台使用 TAIL_LOG_SYNC_TIMEOUT
+TAIL_LOG_SYNC_PLATFORM_TIMEOUTS = json.loads(os.getenv("BKAPP_TAIL_LOG_SYNC_PLATFORM_TIMEOUTS", "{}"))
+
+# 获取采集项最近日志的单次请求超时时间(秒)，用于限制同步超时后工作线程的最长等待时间
+TAIL_LOG_REQUEST_TIMEOUT = int(os.getenv("BKAPP_TAIL_LOG_REQUEST_TIMEOUT", 30))
+
+# 同步处理节点状态时每个子任务处理的节点数
+SYNC_AUTO_RESULT_SHARD_SIZE = int(os.getenv("BKAPP_SYNC_AUTO_RESULT_SHARD_SIZE", 500))
+
+# 同步处理节点状态时单次查询 ITSM 审批结果的单据数
+SYNC_AUTO_RESULT_ITSM_BATCH_SIZE = int(os.getenv("BKAPP_SYNC_AUTO_RESULT_ITSM_BATCH_SIZE", 50))
+
+# 同步处理节点状态时并发查询标准运维任务状态的线程数
+SYNC_AUTO_RESULT_SOPS_WORKERS = int(os.getenv("BKAPP_SYNC_AUTO_RESULT_SOPS_WORKERS", 4))
+
 # 图表结果缓存时间(秒)
 VISION_CACHE_TIMEOUT = int(os.getenv("BKAPP_VISION_CACHE_TIMEOUT", "86400"))
 
@@ -409,6 +472,18 @@ LOG_EXPORT_TASK_MAX_PERIODIC_TIME = int(os.getenv("BKAPP_LOG_EXPORT_TASK_MAX_PER
 # 日志导出任务分页大小
 LOG_EXPORT_TASK_PAGE_SIZE = int(os.getenv("BKAPP_LOG_EXPORT_TASK_PAGE_SIZE", 100))
 
+# 日志导出并发拉取的线程数
+LOG_EXPORT_FETCH_WORKERS = int(os.getenv("BKAPP_LOG_EXPORT_FETCH_WORKERS", 4))
+
+# 日志导出按时间切分的窗口数
+LOG_EXPORT_FETCH_SLICES = int(os.getenv("BKAPP_LOG_EXPORT_FETCH_SLICES", 16))
+
+# 日志导出每个时间窗口缓冲的最大页数
+LOG_EXPORT_FETCH_QUEUE_SIZE = int(os.getenv("BKAPP_LOG_EXPORT_FETCH_QUEUE_SIZE", 2))
+
+# 日志导出分片条数，每个分片上传后保存断点；仅对可直接拼接的格式(csv、csv.gz)生效
+LOG_EXPORT_PART_ROWS = int(os.getenv("BKAPP_LOG_EXPORT_PART_ROWS", 50000))
+
 # 初始化系统管理员
 SYSTEM_ADMIN = [p for p in os.getenv("BKAPP_SYSTEM_ADMIN", "admin").split(",") if p]
 
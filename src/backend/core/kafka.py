@@ -18,22 +18,48 @@ to the current version of the project delivered to anyone in the future.
 
 import abc
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from blueapps.utils.logger import logger
+from django.db import connections
 from kafka import KafkaConsumer
+from kafka.structs import OffsetAndMetadata
 
 from core.connection import ping_db
 
 
 class KafkaRecordConsumer:
-    """kafka 消息消费者基类"""
+    """
+    kafka 消息消费者基类
+    batch_mode 为 True 时按分区整批交给 process_batch 处理，workers 控制并发处理的分区数；
+    批次处理失败时逐条调用 process_record 重试，单条消息最多尝试 record_max_retries 次；
+    仍失败时只提交该消息之前的 offset，并将分区回退到该消息，下次拉取时重新处理，保证 offset 只在写入成功后提交；
+    同一条消息连续回退 record_max_seeks 次后仍失败时记录死信日志并跳过，避免单条异常消息阻塞整个分区
+    """
 
-    def __init__(self, consumer: KafkaConsumer, timeout_ms: int, max_records: int, sleep_time: float, sleep_wait=True):
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        timeout_ms: int,
+        max_records: int,
+        sleep_time: float,
+        sleep_wait=True,
+        batch_mode=False,
+        workers: int = 1,
+        record_max_retries: int = 3,
+        record_max_seeks: int = 3,
+    ):
         self.consumer = consumer
         self.timeout_ms = timeout_ms
         self.max_records = max_records
         self.sleep_time = sleep_time
         self.sleep_wait = sleep_wait
+        self.batch_mode = batch_mode
+        self.workers = max(workers, 1)
+        self.record_max_retries = max(record_max_retries, 1)
+        self.record_max_seeks = max(record_max_seeks, 1)
+        # 各分区当前失败的 offset 及连续失败次数
+        self.failed_offsets = {}
 
     def process(self):
         while True:
@@ -46,6 +72,10 @@ class KafkaRecordConsumer:
                 continue
             # 重连 db，防止消费者长时间没有消费数据的情况下， db 连接因为空闲被释放
             ping_db()
+            if self.batch_mode:
+                # 批量模式下由 process_batches 按分区提交已写入的 offset
+                self.process_batches(data)
+                continue
             for records in data.values():
                 self.process_records(records)
             self.consumer.commit()
@@ -60,3 +90,106 @@ class KafkaRecordConsumer:
     @abc.abstractmethod
     def process_record(self, record):
         raise NotImplementedError()
+
+    def process_batches(self, data: dict):
+        """
+        并发处理各分区的消息批次，处理完成后按分区提交 offset
+        """
+        if self.workers == 1 or len(data) == 1:
+            failed_records = {partition: self.process_partition_batch(records) for partition, records in data.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(data))) as executor:
+                futures = {
+                    partition: executor.submit(self.process_partition_batch_in_thread, records)
+                    for partition, records in data.items()
+                }
+                failed_records = {partition: future.result() for partition, future in futures.items()}
+        self.commit_batches(data, failed_records)
+
+    def commit_batches(self, data: dict, failed_records: dict) -> None:
+        """
+        提交各分区已写入的 offset，存在失败消息的分区回退到该消息重新消费，连续失败超过限制时跳过该消息
+        """
+        offsets = {}
+        for partition, records in data.items():
+            failed_record = failed_records.get(partition)
+            if failed_record is None:
+                self.failed_offsets.pop(partition, None)
+                offsets[partition] = OffsetAndMetadata(records[-1].offset + 1, "")
+                continue
+            failed_offset, failed_count = self.failed_offsets.get(partition, (None, 0))
+            failed_count = failed_count + 1 if failed_offset == failed_record.offset else 1
+            if failed_count >= self.record_max_seeks:
+                # 死信日志，之后的消息回退后重新消费
+                logger.error(
+                    f"[{self.__class__.__name__}] record failed {failed_count} times, skip as dead letter; "
+                    f"partition={partition}; offset={failed_record.offset}; record={failed_record}"
+                )
+                self.failed_offsets.pop(partition, None)
+                offsets[partition] = OffsetAndMetadata(failed_record.offset + 1, "")
+                self.consumer.seek(partition, failed_record.offset + 1)
+                continue
+            self.failed_offsets[partition] = (failed_record.offset, failed_count)
+            if failed_record is not records[0]:
+                offsets[partition] = OffsetAndMetadata(failed_record.offset, "")
+            logger.error(
+                f"[{self.__class__.__name__}] record still failed after retries, seek back; "
+                f"partition={partition}; offset={failed_record.offset}; failed_count={failed_count}"
+            )
+            self.consumer.seek(partition, failed_record.offset)
+        if offsets:
+            self.consumer.commit(offsets=offsets)
+
+    def process_partition_batch(self, records: list):
+        """
+        处理同一分区的消息批次，返回重试后仍失败的第一条消息，全部成功时返回 None
+        """
+        try:
+            self.process_batch(records)
+            return None
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception(
+                f"[{self.__class__.__name__}] process_batch error, fallback to process records one by one: {e}; "
+                f"records={len(records)}"
+            )
+        for record in records:
+            # 之后的消息不再处理，回退后按顺序重新消费
+            if not self.process_record_with_retry(record):
+                return record
+        return None
+
+    def process_partition_batch_in_thread(self, records: list):
+        # 工作线程使用独立的 db 连接，处理完成后关闭，避免连接泄漏
+        try:
+            return self.process_partition_batch(records)
+        finally:
+            connections.close_all()
+
+    def process_record_with_retry(self, record) -> bool:
+        """
+        逐条处理消息，超过最大重试次数后返回 False
+        """
+        for attempt in range(1, self.record_max_retries + 1):
+            try:
+                self.process_record(record)
+                return True
+            except Exception as e:  # pylint: disable=broad-except
+                if attempt >= self.record_max_retries:
+                    logger.exception(
+                        f"[{self.__class__.__name__}] process_record failed after {attempt} attempts: {e}; "
+                        f"record={record}"
+                    )
+                    return False
+                logger.warning(
+                    f"[{self.__class__.__name__}] process_record error, retry after {self.sleep_time}s: {e}; "
+                    f"attempt={attempt}"
+                )
+                time.sleep(self.sleep_time)
+        return False
+
+    def process_batch(self, records: list):
+        """
+        批量处理同一分区的消息，抛出异常时逐条重试
+        逐条重试时 process_record 需要在写入失败时抛出异常
+        """
+        raise NotImplementedError()
@@ -1,22 +1,164 @@
 # -*- coding: utf-8 -*-
 
+import threading
+import time
+from collections import defaultdict
 from functools import wraps
+from typing import Dict, Optional
 
 from blueapps.utils.logger import logger
 from django.conf import settings
 from django.core.cache import cache
 from redis.exceptions import ResponseError
 
+# 获取锁时等待的轮询间隔（秒）
+CACHE_LOCK_WAIT_INTERVAL = 0.1
+
+# 锁不存在时递增 fencing token 并写入锁，保证 token 随获取顺序单调递增，同时刷新计数器的过期时间
+ACQUIRE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('incr', KEYS[2])
+redis.call('pexpire', KEYS[2], ARGV[2])
+redis.call('set', KEYS[1], token, 'PX', ARGV[1])
+return token
+"""
+
+# 仅持有者可以续期，续期时同时刷新计数器的过期时间
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('pexpire', KEYS[2], ARGV[3])
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仅持有者可以释放
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LockMetrics:
+    """
+    进程内锁指标，按指标名统计获取、竞争、丢锁次数与等待、持有耗时
+    指标名需要是有限集合，超过 max_names 后新的指标名统一计入 overflow_name，避免常驻进程内存持续增长
+    """
+
+    max_names = 256
+    overflow_name = "__overflow__"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(self._init_stats)
+
+    def _get(self, name: str) -> dict:
+        if name not in self._stats and len(self._stats) >= self.max_names:
+            name = self.overflow_name
+        return self._stats[name]
+
+    @classmethod
+    def _init_stats(cls) -> dict:
+        return {
+            "acquired": 0,
+            "contended": 0,
+            "lost": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "held_seconds": 0.0,
+        }
+
+    def record_acquire(self, name: str, acquired: bool, wait_seconds: float) -> None:
+        with self._lock:
+            stats = self._get(name)
+            stats["acquired" if acquired else "contended"] += 1
+            stats["wait_seconds"] += wait_seconds
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait_seconds)
+
+    def record_release(self, name: str, held_seconds: float) -> None:
+        with self._lock:
+            self._get(name)["held_seconds"] += held_seconds
+
+    def record_lost(self, name: str) -> None:
+        with self._lock:
+            self._get(name)["lost"] += 1
+
+    def get_stats(self, name: str = None) -> Dict[str, dict]:
+        with self._lock:
+            if name is not None:
+                return dict(self._stats.get(name) or self._init_stats())
+            return {_name: dict(stats) for _name, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class LockHeartbeat(threading.Thread):
+    """
+    锁心跳，持有者存活期间定时续期，续期失败说明锁已丢失
+    """
+
+    def __init__(self, lock: "CacheLock", interval: float):
+        super().__init__(name=f"CacheLockHeartbeat-{lock.lock_name}", daemon=True)
+        self.lock = lock
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                extended = self.lock.extend()
+            except Exception as err:  # NOCC:broad-except(续期异常时等待下次心跳)
+                logger.warning("[CacheLockHeartbeatError] LockName: %s; Error: %s", self.lock.lock_name, err)
+                continue
+            if not extended:
+                self.lock.mark_lost()
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout=self.interval)
+
 
 class CacheLock:
     """
     基于缓存的并发锁
+    获取锁时生成单调递增的 fencing token 作为锁的值，续期与释放都校验 token，避免误删其他持有者的锁
+    token 计数器在获取与续期时刷新过期时间，锁长期不使用后计数器随之过期，不会无限堆积
+    开启心跳时由后台线程续期，超时时间只需覆盖一次心跳间隔，持有者异常退出后锁可以尽快过期
+    锁名包含动态参数时需要指定固定的 metric_name，未指定时计入 default_metric_name
     """
 
-    def __init__(self, lock_name: str, timeout=settings.DEFAULT_CACHE_LOCK_TIMEOUT) -> None:
+    metrics = LockMetrics()
+    default_metric_name = "cache_lock"
+
+    def __init__(
+        self,
+        lock_name: str,
+        timeout=settings.DEFAULT_CACHE_LOCK_TIMEOUT,
+        *,
+        wait_timeout: float = 0,
+        heartbeat: bool = False,
+        metric_name: str = None,
+    ) -> None:
         self.lock_name = lock_name
         self.lock_timeout = timeout
+        self.wait_timeout = wait_timeout
+        self.metric_name = metric_name or self.default_metric_name
+        self.token: Optional[int] = None
+        self.lost = False
+        self._acquired_at = None
+        self._heartbeat = None
         self._locked = not self._init()
+        if heartbeat and not self._locked:
+            self._heartbeat = LockHeartbeat(self, interval=self.lock_timeout / 3)
+            self._heartbeat.start()
 
     @property
     def locked(self) -> bool:
@@ -27,41 +169,170 @@ class CacheLock:
 
         return self._locked
 
+    @classmethod
+    def build_fencing_key(cls, lock_name: str) -> str:
+        return f"{lock_name}:fencing"
+
+    @property
+    def fencing_timeout(self) -> float:
+        """
+        token 计数器过期时间，远大于锁超时时间，保证计数器过期前锁已经过期
+        """
+
+        return max(settings.CACHE_LOCK_FENCING_TIMEOUT, self.lock_timeout * 10)
+
+    @classmethod
+    def get_redis_client(cls):
+        """
+        获取原生 Redis 客户端，缓存后端不是 Redis 时返回 None
+        """
+
+        client = getattr(cache, "client", None)
+        if client is None or not hasattr(client, "get_client"):
+            return None
+        return client.get_client(write=True)
+
     def _init(self) -> bool:
         """
         初始化锁
         """
 
-        try:
-            return cache.add(self.lock_name, True, timeout=self.lock_timeout)
-        except ResponseError as err:
-            logger.warning("[RedisResponseError] Key: %s; Error: %s", self.lock_name, err)
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        while True:
+            try:
+                self.token = self._acquire()
+            except ResponseError as err:
+                logger.warning("[RedisResponseError] Key: %s; Error: %s", self.lock_name, err)
+                self.token = None
+            now = time.monotonic()
+            if self.token or now >= deadline:
+                break
+            time.sleep(min(CACHE_LOCK_WAIT_INTERVAL, deadline - now))
+
+        acquired = bool(self.token)
+        wait_seconds = time.monotonic() - start
+        self.metrics.record_acquire(self.metric_name, acquired, wait_seconds)
+        if acquired:
+            self._acquired_at = time.monotonic()
+        else:
+            logger.info("[CacheLockContended] LockName: %s; Wait: %.3fs", self.lock_name, wait_seconds)
+        return acquired
+
+    def _acquire(self) -> Optional[int]:
+        redis_client = self.get_redis_client()
+        if redis_client is not None:
+            token = redis_client.eval(
+                ACQUIRE_SCRIPT,
+                2,
+                cache.make_key(self.lock_name),
+                cache.make_key(self.build_fencing_key(self.lock_name)),
+                int(self.lock_timeout * 1000),
+                int(self.fencing_timeout * 1000),
+            )
+            return int(token) or None
+        fencing_key = self.build_fencing_key(self.lock_name)
+        cache.add(fencing_key, 0, timeout=self.fencing_timeout)
+        token = cache.incr(fencing_key)
+        cache.touch(fencing_key, self.fencing_timeout)
+        if cache.add(self.lock_name, token, timeout=self.lock_timeout):
+            return token
+        return None
+
+    @classmethod
+    def is_owner(cls, lock_name: str, token: int) -> bool:
+        """
+        检查 token 是否仍持有锁，用于在写入前拦截已丢锁的持有者
+        """
+
+        return bool(token) and cache.get(lock_name) == token
+
+    def extend(self) -> bool:
+        """
+        续期，锁已不属于当前持有者时返回 False
+        """
+
+        if not self.token:
+            return False
+        redis_client = self.get_redis_client()
+        if redis_client is not None:
+            return bool(
+                redis_client.eval(
+                    EXTEND_SCRIPT,
+                    2,
+                    cache.make_key(self.lock_name),
+                    cache.make_key(self.build_fencing_key(self.lock_name)),
+                    self.token,
+                    int(self.lock_timeout * 1000),
+                    int(self.fencing_timeout * 1000),
+                )
+            )
+        if not self.is_owner(self.lock_name, self.token):
             return False
+        cache.touch(self.build_fencing_key(self.lock_name), self.fencing_timeout)
+        return cache.touch(self.lock_name, self.lock_timeout)
+
+    def mark_lost(self) -> None:
+        self.lost = True
+        self.metrics.record_lost(self.metric_name)
+        logger.error("[CacheLockLost] LockName: %s; Token: %s", self.lock_name, self.token)
 
     def release(self) -> bool:
         """
         释放锁
         """
 
-        return cache.delete(self.lock_name)
+        if self._heartbeat is not None:
+            self._heartbeat.stop()
+            self._heartbeat = None
+        if not self.token:
+            return False
+        token, self.token = self.token, None
+        self.metrics.record_release(self.metric_name, time.monotonic() - self._acquired_at)
+        redis_client = self.get_redis_client()
+        if redis_client is not None:
+            return bool(redis_client.eval(RELEASE_SCRIPT, 1, cache.make_key(self.lock_name), token))
+        if self.is_owner(self.lock_name, token):
+            return cache.delete(self.lock_name)
+        return False
 
 
-def lock(lock_name: str = "", *, load_lock_name: callable = None, timeout: int = settings.DEFAULT_CACHE_LOCK_TIMEOUT):
+def lock(
+    lock_name: str = "",
+    *,
+    load_lock_name: callable = None,
+    timeout: int = settings.DEFAULT_CACHE_LOCK_TIMEOUT,
+    wait_timeout: float = 0,
+    heartbeat: bool = False,
+    token_kwarg: str = None,
+):
     """
     并发锁装饰器
+    heartbeat: 后台续期，timeout 可以设置为较短的心跳超时
+    token_kwarg: 指定时将 fencing token 以该参数名传给被装饰函数
     """
 
     def decorator(func):
+        metric_name = lock_name or f"{func.__module__}.{func.__qualname__}"
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 初始化
             _lock_name = load_lock_name(*args, **kwargs) if callable(load_lock_name) else lock_name
             logger.info("[CacheLockDecorator] LockName: %s args: %s kwargs: %s", _lock_name, args, kwargs)
-            _lock = CacheLock(lock_name=_lock_name, timeout=timeout)
+            _lock = CacheLock(
+                lock_name=_lock_name,
+                timeout=timeout,
+                wait_timeout=wait_timeout,
+                heartbeat=heartbeat,
+                metric_name=metric_name,
+            )
             # 检查
             if _lock.locked:
                 logger.warning("[CacheLockCheckFailed] MultiProcessRunning %s", _lock_name)
                 return
+            if token_kwarg:
+                kwargs[token_kwarg] = _lock.token
             # 运行
             try:
                 return func(*args, **kwargs)
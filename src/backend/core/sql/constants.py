@@ -15,6 +15,7 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
+import os
 from functools import cached_property
 
 from django.utils.translation import gettext_lazy
@@ -131,3 +132,7 @@ class Operator(TextChoices):
     MATCH_ALL = "match_all", gettext_lazy("match all")
     MATCH_ANY = "match_any", gettext_lazy("match any")
     BETWEEN = "between", gettext_lazy("between")
+
+
+# SQL 解析结果缓存条数
+SQL_PARSE_CACHE_SIZE = int(os.getenv("BKAPP_SQL_PARSE_CACHE_SIZE", 1024))
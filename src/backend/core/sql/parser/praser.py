@@ -1,66 +1,43 @@
+import copy
+from functools import cached_property
 from itertools import chain
-from typing import List, Optional, Set
+from typing import List, Optional, Set, Tuple
 
 import sqlglot
 from sqlglot import exp
 
+from core.sql.constants import SQL_PARSE_CACHE_SIZE
 from core.sql.exceptions import SQLParseError
 from core.sql.model import Table
 from core.sql.parser.common import _create_sqlglot_literal
 from core.sql.parser.functions import function_visitors, get_skip_null_var_names
 from core.sql.parser.model import ParsedSQLInfo, SelectField, SqlVariable
+from core.utils.cache import LRUCache
 
 
-class SqlQueryAnalysis:
+class ParsedSQL:
     """
-    封装了SQL查询的解析结果和相关操作。
-    解析SQL，并将结果（引用的表、SQL变量、结果字段）存储为实例属性。
-    提供了用实际值替换参数以生成完整SQL的方法。
+    SQL 解析结果，按 (SQL, 方言) 缓存，不可修改
+    使用方需要 copy 语法树后再做变换
     """
 
-    original_sql: str
-    dialect: Optional[str]
-
-    referenced_tables: List[Table]
-    sql_variables: List[SqlVariable]
-    result_fields: List[SelectField]
-
-    _parsed_expression: Optional[exp.Expression]  # Store the parsed AST
+    def __init__(self, expression: exp.Expression):
+        self.expression = expression
+        self.skip_null_var_names = frozenset(get_skip_null_var_names(expression))
 
-    def __init__(self, sql: str, dialect: Optional[str] = 'hive'):
+    @cached_property
+    def metadata(self) -> Tuple[List[Table], List[SqlVariable], List[SelectField]]:
         """
-        初始化SQL查询分析器。此时不进行解析。
+        提取引用的表、SQL 变量、结果字段
         """
-        self.original_sql = sql
-        self.dialect = dialect
-        self.referenced_tables = []
-        self.sql_variables = []
-        self.result_fields = []
-        self._parsed_expression = None  # Initialize as None
 
-    def parse_sql(self):
-        """
-        使用sqlglot解析SQL并填充实例属性。
-        如果已经解析过，则不会重复解析。
-        """
-        if self._parsed_expression is not None:  # 已解析
-            return
-
-        self.referenced_tables = []
-        self.sql_variables = []
-        self.result_fields = []
-
-        if not self.original_sql or not self.original_sql.strip():
-            return
-
-        try:
-            self._parsed_expression = sqlglot.parse_one(self.original_sql, read=self.dialect)
-        except sqlglot.errors.ParseError as e:
-            raise SQLParseError(f"SQL解析失败: {e}") from e
+        referenced_tables = []
+        sql_variables = []
+        result_fields = []
 
         # 1. 提取引用的表 (Extract referenced tables)
-        cte_names = {cte.alias_or_name for cte in self._parsed_expression.find_all(exp.CTE)}
-        for table_exp in self._parsed_expression.find_all(exp.Table):
+        cte_names = {cte.alias_or_name for cte in self.expression.find_all(exp.CTE)}
+        for table_exp in self.expression.find_all(exp.Table):
             if table_exp.db:
                 table_name = table_exp.db
                 storage = table_exp.name
@@ -69,26 +46,26 @@ class SqlQueryAnalysis:
                 storage = None
             if table_name in cte_names:
                 continue
-            self.referenced_tables.append(Table(table_name=table_name, storage=storage))
-
-        # 出现在 SKIP_NULL_CLAUSE 中的变量默认视为非必填
-        skip_null_var_names = get_skip_null_var_names(self._parsed_expression)
+            referenced_tables.append(Table(table_name=table_name, storage=storage))
 
         # 2. 提取SQL命名变量 (Extract SQL named variables)
+        # 出现在 SKIP_NULL_CLAUSE 中的变量默认视为非必填
         extracted_var_raw_names: Set[str] = set()
-        for var_node in chain(self._parsed_expression.find_all(exp.Var, exp.Placeholder, bfs=False)):
+        for var_node in chain(self.expression.find_all(exp.Var, exp.Placeholder, bfs=False)):
             raw_name = var_node.name
             if raw_name == "?":
                 raise SQLParseError(message="不支持匿名变量")
             elif raw_name not in extracted_var_raw_names:
-                self.sql_variables.append(
-                    SqlVariable(raw_name=raw_name, display_name=raw_name, required=raw_name not in skip_null_var_names)
+                sql_variables.append(
+                    SqlVariable(
+                        raw_name=raw_name, display_name=raw_name, required=raw_name not in self.skip_null_var_names
+                    )
                 )
                 extracted_var_raw_names.add(raw_name)
 
         # 3. 提取查询结果字段 (Extract query result fields - SelectField)
         # 主要针对顶层的 SELECT 语句 (Mainly for top-level SELECT statements)
-        current_expr = self._parsed_expression
+        current_expr = self.expression
         if isinstance(current_expr, exp.Union):
             raise SQLParseError(message="暂不支持Union查询。")
         if isinstance(current_expr, exp.Query) and current_expr.this:
@@ -106,13 +83,81 @@ class SqlQueryAnalysis:
                 if raw_name == "*":
                     raise SQLParseError(message="不支持查询结果字段为 *")
 
-                self.result_fields.append(
+                result_fields.append(
                     SelectField(
                         display_name=raw_name,
                         raw_name=raw_name,
                     )
                 )
 
+        return referenced_tables, sql_variables, result_fields
+
+
+class SqlQueryAnalysis:
+    """
+    封装了SQL查询的解析结果和相关操作。
+    解析SQL，并将结果（引用的表、SQL变量、结果字段）存储为实例属性。
+    提供了用实际值替换参数以生成完整SQL的方法。
+    """
+
+    original_sql: str
+    dialect: Optional[str]
+
+    referenced_tables: List[Table]
+    sql_variables: List[SqlVariable]
+    result_fields: List[SelectField]
+
+    _parsed_expression: Optional[exp.Expression]  # Store the parsed AST
+
+    def __init__(self, sql: str, dialect: Optional[str] = 'hive'):
+        """
+        初始化SQL查询分析器。此时不进行解析。
+        """
+        self.original_sql = sql
+        self.dialect = dialect
+        self.referenced_tables = []
+        self.sql_variables = []
+        self.result_fields = []
+        self._parsed_expression = None  # Initialize as None
+
+    # 解析结果缓存，同一 SQL 模板只解析一次
+    parsed_cache = LRUCache(max_size=SQL_PARSE_CACHE_SIZE)
+
+    @classmethod
+    def get_parsed(cls, sql: str, dialect: Optional[str], error_message: str) -> ParsedSQL:
+        """
+        获取 SQL 解析结果，优先使用缓存
+        """
+        cache_key = (sql, dialect)
+        parsed = cls.parsed_cache.get(cache_key)
+        if parsed is None:
+            try:
+                parsed = ParsedSQL(sqlglot.parse_one(sql, read=dialect))
+            except sqlglot.errors.ParseError as e:
+                raise SQLParseError(error_message.format(sql=sql, err=e)) from e
+            cls.parsed_cache.set(cache_key, parsed)
+        return parsed
+
+    def parse_sql(self):
+        """
+        使用sqlglot解析SQL并填充实例属性。
+        如果已经解析过，则不会重复解析。
+        """
+        if self._parsed_expression is not None:  # 已解析
+            return
+
+        self.referenced_tables = []
+        self.sql_variables = []
+        self.result_fields = []
+
+        if not self.original_sql or not self.original_sql.strip():
+            return
+
+        parsed = self.get_parsed(self.original_sql, self.dialect, "SQL解析失败: {err}")
+        self._parsed_expression = parsed.expression.copy()
+        # 缓存的元数据可能被多个实例共享，返回副本
+        self.referenced_tables, self.sql_variables, self.result_fields = copy.deepcopy(parsed.metadata)
+
     def _parameter_replacer_visitor(
         self, node: exp.Expression, named_params_dict: dict, dialect_str: Optional[str], skip_null_var_names: Set[str]
     ) -> exp.Expression:
@@ -158,29 +203,26 @@ class SqlQueryAnalysis:
         target_sql = sql_template if sql_template is not None else self.original_sql
         target_dialect = template_dialect if template_dialect is not None else self.dialect
 
-        try:
-            parsed_tree = sqlglot.parse_one(target_sql, read=target_dialect)
-        except sqlglot.errors.ParseError as e:
-            raise SQLParseError(f"SQL 模板解析失败 (SQL template parsing failed): {target_sql} - {e}") from e
-
-        skip_null_var_names = get_skip_null_var_names(parsed_tree)
+        parsed = self.get_parsed(target_sql, target_dialect, "SQL 模板解析失败 (SQL template parsing failed): {sql} - {err}")
 
-        transformed_tree = parsed_tree.transform(
-            self._parameter_replacer_visitor, params, target_dialect, skip_null_var_names, copy=True
+        # 先替换全部参数，再由外向内展开自定义函数，两次遍历都在同一份副本上原地进行
+        transformed_tree = parsed.expression.copy().transform(
+            self._parameter_replacer_visitor, params, target_dialect, parsed.skip_null_var_names, copy=False
         )
-        transformed_tree = transformed_tree.transform(self._custom_function_visitor, params, target_dialect, copy=True)
+        transformed_tree = transformed_tree.transform(self._custom_function_visitor, params, target_dialect, copy=False)
 
         count_sql = None
         if with_count:
+            # 语法树已是副本，直接作为子查询，无需再次复制
             count_expr = exp.select(exp.func("COUNT", exp.Star()).as_("count")).from_(
-                transformed_tree.copy().subquery("_sub")
+                transformed_tree.subquery("_sub", copy=False), copy=False
             )
             count_sql = count_expr.sql(dialect=target_dialect)
 
         if limit is not None:
-            transformed_tree = transformed_tree.limit(limit)
+            transformed_tree = transformed_tree.limit(limit, copy=False)
         if offset:
-            transformed_tree = transformed_tree.offset(offset)
+            transformed_tree = transformed_tree.offset(offset, copy=False)
 
         data_sql = transformed_tree.sql(dialect=target_dialect)
 
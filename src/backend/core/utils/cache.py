@@ -19,11 +19,16 @@ to the current version of the project delivered to anyone in the future.
 import abc
 import functools
 import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
 
 from blueapps.utils.base import md5_sum
 from blueapps.utils.logger import logger
 from django.core.cache import cache
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
 
 from core.constants import TimeEnum
 
@@ -90,3 +95,150 @@ class CacheMixin(abc.ABC):
     def set_cache(self, key_params: dict, data: any, ex: int = None, *args, **kwargs) -> None:
         cache_key = self.generate_cache_key(**key_params)
         return self.cache.set(cache_key, data, ex, *args, **kwargs)
+
+
+class LRUCache:
+    """
+    进程内 LRU 缓存，线程安全，可选 TTL(秒)
+    """
+
+    def __init__(self, max_size: int, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (item[1] is not None and item[1] <= time.monotonic()):
+                if item is not None:
+                    self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl: float = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expire_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expire_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoLevelCache:
+    """
+    两级缓存：进程内 LRU(带 TTL) + django cache
+    写入方调用 invalidate 更新版本号广播失效，其他进程的本地缓存最长在 local_ttl 后失效
+    不存在的 key 同样会被缓存，避免反复穿透到数据源；get_many 指定 cache_missing=False 时不缓存不存在的 key
+    bypass_in_atomic 为 True 时，事务中直接读取数据源，避免缓存未提交的数据
+    """
+
+    def __init__(
+        self, namespace: str, max_size: int, local_ttl: float, remote_ttl: int, bypass_in_atomic: bool = False
+    ):
+        self.namespace = namespace
+        self.bypass_in_atomic = bypass_in_atomic
+        self.version_key = f"{namespace}:version"
+        self.local = LRUCache(max_size=max_size, ttl=local_ttl)
+        self.remote_ttl = remote_ttl
+        self.local_version = None
+        self.stats = {"local_hits": 0, "remote_hits": 0, "misses": 0}
+
+    def build_remote_key(self, version: int, key) -> str:
+        return f"{self.namespace}:{version}:{md5_sum(json.dumps(key, cls=DjangoJSONEncoder))}"
+
+    def get(self, key, loader: Callable[[], Any], default=None):
+        """
+        :param loader: 缓存未命中时加载数据，数据不存在时应抛出 KeyError
+        """
+
+        def load_many(keys: list) -> dict:
+            try:
+                return {key: loader()}
+            except KeyError:
+                return {}
+
+        return self.get_many([key], load_many).get(key, default)
+
+    def get_many(self, keys: list, loader: Callable[[list], dict], cache_missing: bool = True) -> dict:
+        """
+        批量获取缓存，返回存在的 key 对应的值
+        :param loader: 批量加载未命中的 key，返回值中不包含的 key 视为不存在
+        :param cache_missing: 是否缓存不存在的 key，为 False 时下次获取会重新加载
+        """
+        if self.bypass_in_atomic and connection.in_atomic_block:
+            return loader(keys)
+        result, missing = {}, []
+        for key in keys:
+            item = self.local.get(key)
+            if item is None:
+                missing.append(key)
+                continue
+            self.stats["local_hits"] += 1
+            if item[0]:
+                result[key] = item[1]
+        if not missing:
+            return result
+
+        # 本地未命中时检查版本号，版本变更说明其他进程已经更新数据，清空本地缓存
+        version = cache.get(self.version_key, 0)
+        if version != self.local_version:
+            self.local.clear()
+            self.local_version = version
+        remote_keys = {self.build_remote_key(version, key): key for key in missing}
+        remote_items = cache.get_many(list(remote_keys.keys()))
+        for remote_key, item in remote_items.items():
+            key = remote_keys[remote_key]
+            self.stats["remote_hits"] += 1
+            self.local.set(key, item)
+            if item[0]:
+                result[key] = item[1]
+
+        # 从数据源加载剩余的 key
+        missing = [key for remote_key, key in remote_keys.items() if remote_key not in remote_items]
+        if not missing:
+            return result
+        self.stats["misses"] += len(missing)
+        loaded = loader(missing)
+        to_cache = {}
+        for key in missing:
+            if key not in loaded and not cache_missing:
+                continue
+            item = (True, loaded[key]) if key in loaded else (False, None)
+            self.local.set(key, item)
+            to_cache[self.build_remote_key(version, key)] = item
+            if item[0]:
+                result[key] = item[1]
+        cache.set_many(to_cache, self.remote_ttl)
+        return result
+
+    def invalidate(self) -> None:
+        """
+        更新版本号，使所有进程的缓存失效
+        """
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, timeout=None)
+        self.local.clear()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "local_size": len(self.local)}
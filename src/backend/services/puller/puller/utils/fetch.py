@@ -20,6 +20,8 @@ import abc
 import datetime
 from typing import List
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import QuerySet
 from rest_framework import serializers
 
@@ -63,9 +65,18 @@ class FetchInstanceMixin:
 
 
 class BaseFetchHandler(FetchInstanceMixin, abc.ABC):
+    """
+    按主键倒序游标分页拉取实例
+    调用方按 offset 顺序翻页，上一页的最后一个主键会缓存为下一页的游标，未命中游标时回退到 OFFSET 分页
+    游标按时间范围与 offset 在调用方之间共享，使用前校验游标对应的记录仍在结果中，已删除或移出时间范围时回退到 OFFSET 分页
+    """
+
+    pk_field = "id"
+
     def __init__(self, start_time: int = None, end_time: int = None, page: dict = None):
         self.start_time = datetime.datetime.fromtimestamp(start_time / 1000) if start_time else None
         self.end_time = datetime.datetime.fromtimestamp(end_time / 1000) if end_time else None
+        self.cache_prefix = f"puller:fetch_instance:{self.__class__.__name__}:{start_time}:{end_time}"
         page = page or dict()
         self.offset = page.get("offset")
         self.limit = page.get("limit")
@@ -77,19 +88,73 @@ class BaseFetchHandler(FetchInstanceMixin, abc.ABC):
             queryset = self.get_queryset().filter(updated_at__gte=self.start_time)
         else:
             queryset = self.get_queryset()
-        count = queryset.count()
+        count = self.get_count(queryset)
         page = self.pagination(queryset)
         data = self.serialize(page)
+        self.save_cursor(data)
         return {"count": count, "results": self.parse_data(data)}
 
+    def get_count(self, queryset: QuerySet) -> int:
+        """
+        获取总数，同一时间范围的翻页请求共享缓存
+        """
+
+        cache_key = f"{self.cache_prefix}:count"
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, settings.FETCH_INSTANCE_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def build_cursor_key(self, offset: int) -> str:
+        return f"{self.cache_prefix}:cursor:{offset}"
+
     def pagination(self, queryset: QuerySet) -> QuerySet:
-        if self.offset is not None and self.limit is not None:
-            return queryset[self.offset : self.offset + self.limit]
-        return queryset
+        queryset = queryset.order_by(f"-{self.pk_field}")
+        if self.offset is None or self.limit is None:
+            return queryset
+        cursor = cache.get(self.build_cursor_key(self.offset)) if self.offset else None
+        if cursor is not None and self.verify_cursor(queryset, cursor):
+            return queryset.filter(**{f"{self.pk_field}__lt": cursor})[: self.limit]
+        return queryset[self.offset : self.offset + self.limit]
+
+    def verify_cursor(self, queryset: QuerySet, cursor) -> bool:
+        """
+        只校验游标对应的边界记录，按主键查询，不随 offset 增长
+        """
+
+        return queryset.filter(**{self.pk_field: cursor}).exists()
+
+    def save_cursor(self, data: List[dict]) -> None:
+        """
+        缓存下一页的游标
+        """
+
+        if self.offset is None or not self.limit or len(data) < self.limit:
+            return
+        cache.set(
+            self.build_cursor_key(self.offset + self.limit),
+            data[-1][self.pk_field],
+            settings.FETCH_INSTANCE_CURSOR_CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    def get_value_fields(cls) -> List[str]:
+        """
+        序列化字段，与序列化器保持一致
+        """
+
+        if "_value_fields" not in cls.__dict__:
+            cls._value_fields = list(cls.serializer().fields.keys())
+        return cls._value_fields
 
     def serialize(self, queryset: QuerySet) -> list:
-        serializer = self.serializer(queryset, many=True)
-        return serializer.data
+        data = list(queryset.values(*self.get_value_fields()))
+        for item in data:
+            for field in (self.created_at_field, self.updated_at_field):
+                if isinstance(item.get(field), datetime.datetime):
+                    item[field] = int(item[field].timestamp() * 1000)
+        return data
 
     def parse_data(self, data: List[dict]) -> list:
         return [
@@ -17,9 +17,11 @@ to the current version of the project delivered to anyone in the future.
 """
 
 import json
+import random
 
 from bk_resource.settings import bk_resource_settings
 from blueapps.utils.logger import logger
+from django.conf import settings
 from django.utils.translation import gettext
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.response import Response
@@ -60,19 +62,40 @@ class ResourcesView(APIView):
         try:
             handler = getattr(self, method)
             data = handler(request, *args, **kwargs)
-            logger.info(
-                f"[{self.__class__.__module__}.{self.__class__.__name__}] "
-                f"RequestData => {json.dumps(request.data)}; "
-                f"ResponseData => {json.dumps(data)}"
-            )
+            # 响应数据较大，按采样率记录
+            if random.random() < settings.FETCH_INSTANCE_LOG_SAMPLE_RATE:
+                logger.info(
+                    f"[{self.__class__.__module__}.{self.__class__.__name__}] "
+                    f"RequestData => {self.build_log_content(request.data)}; "
+                    f"ResponseData => {self.build_log_content(data)}"
+                )
             return Response(data)
         except AttributeError:
             logger.info(
                 f"[{self.__class__.__module__}.{self.__class__.__name__}] "
-                f"RequestData => {json.dumps(request.data)}; "
+                f"RequestData => {self.build_log_content(request.data)}; "
                 f"ResponseData => {NotImplementedError.__name__}"
             )
             raise NotImplementedError(f"{gettext('未实现方法')} => {method}")
+        except Exception as err:  # NOCC:broad-except(需要记录所有失败请求)
+            logger.exception(
+                f"[{self.__class__.__module__}.{self.__class__.__name__}] "
+                f"RequestData => {self.build_log_content(request.data)}; "
+                f"Error => {err}"
+            )
+            raise
+
+    @classmethod
+    def build_log_content(cls, data) -> str:
+        """
+        日志内容超出最大长度时截断
+        """
+
+        content = json.dumps(data)
+        max_length = settings.FETCH_INSTANCE_LOG_MAX_LENGTH
+        if len(content) <= max_length:
+            return content
+        return f"{content[:max_length]}...(truncated, length={len(content)})"
 
     def fetch_instance_list(self, request, *args, **kwargs):
         type_name = request.data.get("type")
@@ -20,7 +20,11 @@ from django.utils.translation import gettext_lazy
 
 from core.choices import TextChoices
 
+# 检查 Flow 状态的初始间隔（秒），之后指数退避
 CHECK_FLOW_STATUS_SLEEP_SECONDS = 5
+CHECK_FLOW_STATUS_MAX_INTERVAL = 60
+# 超过该时间（秒）Flow 仍未部署完成视为失败
+CHECK_FLOW_STATUS_MAX_AGE = 60 * 60
 
 BKBASE_ATTR_GROUP_FIELD_NAME = "attr_group"
 BKBASE_GROUP_BY_FIELD_CONTAINER_TYPE = "group"
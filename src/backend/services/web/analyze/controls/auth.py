@@ -23,6 +23,7 @@ from bk_resource.exceptions import APIRequestError
 from blueapps.utils.logger import logger
 from django.conf import settings
 
+from services.web.common.bkbase_auth import flush_user_auth_cache
 from services.web.databus.models import CollectorPlugin, Snapshot
 
 
@@ -56,6 +57,8 @@ class BaseAuthHandler:
                 "[%sSuccess] RT => %s; Result => %s", self.__class__.__name__, self.build_result_table_id(), resp
             )
             result = True
+            # 授权后刷新结果表鉴权缓存
+            flush_user_auth_cache()
         except APIRequestError as err:
             logger.exception(
                 "[%sFailed] RT => %s; Result => %s",
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from typing import Dict, List
+
+from bk_resource import api
+from bk_resource.exceptions import APIRequestError
+from blueapps.utils.logger import logger_celery
+from django.utils.translation import gettext
+
+from apps.notice.handlers import ErrorMsgHandler
+from apps.poll.constants import PollStatusChoices
+from apps.poll.handlers import PollHandler, PollResult
+from apps.poll.models import PollTask
+from services.web.analyze.constants import (
+    BKBASE_ERROR_LOG_LEVEL,
+    CHECK_FLOW_STATUS_MAX_AGE,
+    CHECK_FLOW_STATUS_MAX_INTERVAL,
+    CHECK_FLOW_STATUS_SLEEP_SECONDS,
+    FlowStatusChoices,
+)
+from services.web.strategy_v2.models import Strategy
+
+
+class FlowStatusPollHandler(PollHandler):
+    """
+    检查 BKBase Flow 部署状态
+    同一调度周期内到期的策略并发请求 BKBase，并批量更新策略状态
+    """
+
+    initial_delay = CHECK_FLOW_STATUS_SLEEP_SECONDS
+    initial_interval = CHECK_FLOW_STATUS_SLEEP_SECONDS
+    max_interval = CHECK_FLOW_STATUS_MAX_INTERVAL
+    max_age = CHECK_FLOW_STATUS_MAX_AGE
+
+    def poll(self, tasks: List[PollTask]) -> Dict[int, PollResult]:
+        strategies = self.load_strategies(tasks)
+        results = {}
+        checking = []
+        for task in tasks:
+            strategy = strategies.get(task.params["strategy_id"])
+            if strategy is None:
+                logger_celery.error("[CheckFlowStatusFailed] Strategy Not Found => %s", task.params["strategy_id"])
+                results[task.id] = PollResult(status=PollStatusChoices.FAILED.value, message="strategy not found")
+                continue
+            checking.append((task, strategy))
+        if not checking:
+            return results
+
+        # check flow status
+        try:
+            deploy_data_list = api.bk_base.get_flow_deploy_data.bulk_request(
+                [{"flow_id": (strategy.backend_data or {}).get("flow_id")} for _, strategy in checking],
+                ignore_exceptions=True,
+            )
+        except APIRequestError as err:
+            logger_celery.warning("[CheckFlowStatusFailed] %s", err)
+            deploy_data_list = [None] * len(checking)
+
+        failed_strategies = []
+        for (task, strategy), deploy_data in zip(checking, deploy_data_list):
+            status = deploy_data.get("status") if isinstance(deploy_data, dict) else None
+            if status == FlowStatusChoices.SUCCESS.value:
+                strategy.status = task.params["success_status"]
+                results[task.id] = PollResult(status=PollStatusChoices.SUCCESS.value)
+            elif status == FlowStatusChoices.FAILURE.value:
+                strategy.status = task.params["failed_status"]
+                strategy.status_msg = ";".join(
+                    [
+                        str(log.get("message", ""))
+                        for log in deploy_data.get("logs", [])
+                        if log.get("level") == BKBASE_ERROR_LOG_LEVEL
+                    ]
+                )
+                failed_strategies.append(strategy)
+                results[task.id] = PollResult(status=PollStatusChoices.FAILED.value, message=strategy.status_msg)
+            else:
+                strategy.status = task.params["other_status"]
+
+        # update status
+        Strategy.objects.bulk_update(
+            [strategy for _, strategy in checking], fields=["status", "status_msg"], update_record=False
+        )
+        self.notify_failed(failed_strategies)
+        return results
+
+    def on_expired(self, tasks: List[PollTask]) -> None:
+        strategies = self.load_strategies(tasks)
+        expired_strategies = []
+        for task in tasks:
+            strategy = strategies.get(task.params["strategy_id"])
+            if strategy is None:
+                continue
+            strategy.status = task.params["failed_status"]
+            strategy.status_msg = gettext("Check Flow Status Timeout")
+            expired_strategies.append(strategy)
+        Strategy.objects.bulk_update(expired_strategies, fields=["status", "status_msg"], update_record=False)
+        self.notify_failed(expired_strategies)
+
+    @classmethod
+    def load_strategies(cls, tasks: List[PollTask]) -> Dict[int, Strategy]:
+        strategy_ids = [task.params["strategy_id"] for task in tasks]
+        return {strategy.strategy_id: strategy for strategy in Strategy.objects.filter(strategy_id__in=strategy_ids)}
+
+    @classmethod
+    def notify_failed(cls, strategies: List[Strategy]) -> None:
+        for strategy in strategies:
+            ErrorMsgHandler(
+                title=gettext("Flow Status Abnormal"), content=gettext("Strategy ID:\t%s") % strategy.strategy_id
+            ).send()
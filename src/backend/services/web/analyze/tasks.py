@@ -16,7 +16,6 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 
-import time
 from functools import reduce
 from operator import or_
 from typing import List
@@ -29,18 +28,14 @@ from blueapps.utils.logger import logger_celery
 from celery.schedules import crontab
 from django.conf import settings
 from django.db.models import Q
-from django.utils.translation import gettext
 
 from apps.notice.constants import MsgType
-from apps.notice.handlers import ErrorMsgHandler
 from apps.notice.models import NoticeGroup
 from apps.notice.parser import IgnoreMemberVariableParser
+from apps.poll.handlers import PollScheduler
 from core.lock import lock
 from services.web.analyze.constants import (
-    BKBASE_ERROR_LOG_LEVEL,
-    CHECK_FLOW_STATUS_SLEEP_SECONDS,
     BaseControlTypeChoices,
-    FlowStatusChoices,
     ObjectType,
 )
 from services.web.analyze.controls.auth import (
@@ -49,6 +44,7 @@ from services.web.analyze.controls.auth import (
 )
 from services.web.analyze.controls.monitor import LostSceneDetectedEvent
 from services.web.analyze.models import ControlVersion
+from services.web.analyze.poll import FlowStatusPollHandler
 from services.web.databus.models import CollectorPlugin, Snapshot
 from services.web.strategy_v2.models import Strategy
 
@@ -76,49 +72,19 @@ def call_controller(
 def check_flow_status(strategy_id: int, success_status: str, failed_status: str, other_status: str):
     """
     check flow status
+    注册轮询任务，由 PollScheduler 统一批量检查，避免在 Worker 中等待
     """
 
-    # load strategy
-    strategy: Strategy = Strategy.objects.filter(strategy_id=strategy_id).first()
-    if strategy is None:
-        logger_celery.error("[CheckFlowStatusFailed] Strategy Not Found => %s", strategy_id)
-        return
-
-    # check flow status
-    flow_id = strategy.backend_data["flow_id"]
-    try:
-        deploy_data = api.bk_base.get_flow_deploy_data(flow_id=flow_id)
-        status = deploy_data["status"]
-        if status == FlowStatusChoices.SUCCESS.value:
-            strategy.status = success_status
-        elif status == FlowStatusChoices.FAILURE.value:
-            strategy.status = failed_status
-            strategy.status_msg = ";".join(
-                [
-                    str(log.get("message", ""))
-                    for log in deploy_data.get("logs", [])
-                    if log.get("level") == BKBASE_ERROR_LOG_LEVEL
-                ]
-            )
-            strategy.save(update_record=False, update_fields=["status_msg"])
-        else:
-            strategy.status = other_status
-    except (APIRequestError, TypeError, KeyError):
-        strategy.status = other_status
-
-    # update status
-    strategy.save(update_record=False, update_fields=["status"])
-
-    # check re-run
-    if strategy.status == other_status:
-        time.sleep(CHECK_FLOW_STATUS_SLEEP_SECONDS)
-        check_flow_status.delay(
-            strategy_id, success_status=success_status, failed_status=failed_status, other_status=other_status
-        )
-
-    # check failed
-    if strategy.status == failed_status:
-        ErrorMsgHandler(title=gettext("Flow Status Abnormal"), content=gettext("Strategy ID:\t%s") % strategy_id).send()
+    PollScheduler.register(
+        FlowStatusPollHandler,
+        poll_key=strategy_id,
+        params={
+            "strategy_id": strategy_id,
+            "success_status": success_status,
+            "failed_status": failed_status,
+            "other_status": other_status,
+        },
+    )
 
 
 @periodic_task(run_every=crontab(minute="*/10"), soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
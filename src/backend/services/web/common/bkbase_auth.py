@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+BKBase 用户结果表鉴权
+
+鉴权结果按 (user_id, object_id, action_id) 缓存，批量校验时仅向 BKBase 查询未命中的部分；
+通过本应用向 BKBase 授权后调用 flush_user_auth_cache 刷新。
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from bk_resource import api
+
+from core.utils.cache import TwoLevelCache
+from services.web.common.constants import (
+    BKBASE_USER_AUTH_CACHE_NAMESPACE,
+    BKBASE_USER_AUTH_CACHE_SIZE,
+    BKBASE_USER_AUTH_LOCAL_CACHE_TTL,
+    BKBASE_USER_AUTH_REMOTE_CACHE_TTL,
+)
+
+user_auth_cache = TwoLevelCache(
+    namespace=BKBASE_USER_AUTH_CACHE_NAMESPACE,
+    max_size=BKBASE_USER_AUTH_CACHE_SIZE,
+    local_ttl=BKBASE_USER_AUTH_LOCAL_CACHE_TTL,
+    remote_ttl=BKBASE_USER_AUTH_REMOTE_CACHE_TTL,
+)
+
+
+def build_user_auth_key(permission: dict) -> Tuple[str, str, str]:
+    return permission["user_id"], permission["object_id"], permission["action_id"]
+
+
+def load_user_auth(keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], dict]:
+    """
+    向 BKBase 批量查询鉴权结果
+    按返回结果中的 user_id/object_id(及 action_id) 匹配请求，不依赖返回顺序；
+    未回显或回显的 id 与请求不一致的结果按请求顺序匹配；未返回的权限不包含在结果中
+    """
+
+    permissions = [
+        {"user_id": user_id, "object_id": object_id, "action_id": action_id} for user_id, object_id, action_id in keys
+    ]
+    resp = api.bk_base.user_auth_batch_check({"permissions": permissions})
+    keys_by_object = defaultdict(list)
+    for key in keys:
+        keys_by_object[key[:2]].append(key)
+    decisions = {}
+    unmatched = []
+    for index, item in enumerate(resp or []):
+        if not isinstance(item, dict) or "result" not in item:
+            continue
+        matched_keys = [
+            key
+            for key in keys_by_object.get((item.get("user_id"), item.get("object_id")), [])
+            if item.get("action_id") in (None, key[2])
+        ]
+        if not matched_keys:
+            unmatched.append((index, item))
+        for key in matched_keys:
+            decisions[key] = item
+    for index, item in unmatched:
+        if index < len(keys):
+            decisions.setdefault(keys[index], item)
+    return decisions
+
+
+def batch_check_user_auth(permissions: List[dict]) -> List[dict]:
+    """
+    批量校验用户结果表权限，返回结构与 user_auth_batch_check 一致
+    接口未返回的权限不缓存，本次视为无权限，下次校验时重新查询
+    """
+
+    keys = [build_user_auth_key(permission) for permission in permissions]
+    decisions = user_auth_cache.get_many(list(dict.fromkeys(keys)), load_user_auth, cache_missing=False)
+    return [decisions.get(key) or {"user_id": key[0], "object_id": key[1], "result": False} for key in keys]
+
+
+def flush_user_auth_cache() -> None:
+    """
+    刷新所有进程的鉴权结果缓存
+    """
+
+    user_auth_cache.invalidate()
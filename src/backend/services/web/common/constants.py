@@ -1,7 +1,16 @@
 from __future__ import annotations
 
+import os
+
 from django.db import models
 
 
 class CallerResourceType(models.TextChoices):
     RISK = "risk"
+
+
+# BKBase 用户结果表鉴权结果缓存
+BKBASE_USER_AUTH_CACHE_NAMESPACE = "bkbase_user_auth"
+BKBASE_USER_AUTH_CACHE_SIZE = int(os.getenv("BKAPP_BKBASE_USER_AUTH_CACHE_SIZE", 4096))
+BKBASE_USER_AUTH_LOCAL_CACHE_TTL = int(os.getenv("BKAPP_BKBASE_USER_AUTH_LOCAL_CACHE_TTL", 10))  # s
+BKBASE_USER_AUTH_REMOTE_CACHE_TTL = int(os.getenv("BKAPP_BKBASE_USER_AUTH_REMOTE_CACHE_TTL", 60))  # s
@@ -18,10 +18,16 @@ to the current version of the project delivered to anyone in the future.
 
 import datetime
 import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List
 
 from bk_resource import api
 from bk_resource.exceptions import APIRequestError
 from blueapps.utils.logger import logger
+from django.conf import settings
+from django.db import connections
 from django.utils import timezone
 from django.utils.timezone import get_default_timezone
 from rest_framework.settings import api_settings
@@ -59,6 +65,14 @@ class TailLogHandler:
         raise NotImplementedError
 
     def sync(self):
+        self.fetch()
+        self.collector.save(update_fields=["tail_log_time"])
+
+    def fetch(self) -> None:
+        """
+        获取最近日志时间并写入采集项，不保存
+        """
+
         try:
             self.load_tail_log()
         except APIRequestError as err:
@@ -76,7 +90,13 @@ class TailLogHandler:
                     err,
                 )
         self.collector.tail_log_time = self.tail_log_time
-        self.collector.save(update_fields=["tail_log_time"])
+
+    def fetch_in_thread(self) -> None:
+        # 工作线程使用独立的 db 连接，获取完成后关闭，避免连接泄漏
+        try:
+            self.fetch()
+        finally:
+            connections.close_all()
 
 
 class BkLogTailLogHandler(TailLogHandler):
@@ -106,3 +126,70 @@ class BkBaseTailLogHandler(TailLogHandler):
         self.tail_log_time = datetime.datetime.fromtimestamp(start_time / 1000).astimezone(
             timezone.get_default_timezone()
         )
+
+
+class TailLogSyncer:
+    """
+    并发同步采集项最近日志时间
+    每个数据平台使用独立的线程池与超时时间，单个平台响应慢不影响其他平台，结果统一批量保存
+    超时后取消未开始的任务，并等待执行中的请求结束，单次请求耗时由 TAIL_LOG_REQUEST_TIMEOUT 限制
+    """
+
+    def __init__(self, workers: int = None, timeout: float = None, platform_timeouts: Dict[str, float] = None):
+        self.workers = workers or settings.TAIL_LOG_SYNC_WORKERS
+        self.timeout = timeout or settings.TAIL_LOG_SYNC_TIMEOUT
+        self.platform_timeouts = (
+            settings.TAIL_LOG_SYNC_PLATFORM_TIMEOUTS if platform_timeouts is None else platform_timeouts
+        )
+
+    def get_timeout(self, source_platform: str) -> float:
+        return self.platform_timeouts.get(source_platform, self.timeout)
+
+    def sync(self, collectors: Iterable[CollectorConfig]) -> int:
+        """
+        同步最近日志时间，返回更新的采集项数
+        """
+
+        # 按数据平台分组
+        platform_handlers: Dict[str, List[TailLogHandler]] = defaultdict(list)
+        for collector in collectors:
+            try:
+                platform_handlers[collector.source_platform].append(TailLogHandler.get_instance(collector))
+            except NotImplementedError as err:
+                logger.warning(str(err))
+        if not platform_handlers:
+            return 0
+
+        # 各平台并发获取
+        start = time.monotonic()
+        executors, futures = {}, {}
+        for source_platform, handlers in platform_handlers.items():
+            executors[source_platform] = ThreadPoolExecutor(
+                max_workers=min(self.workers, len(handlers)), thread_name_prefix=f"tail_log_{source_platform}"
+            )
+            futures[source_platform] = {
+                executors[source_platform].submit(handler.fetch_in_thread): handler for handler in handlers
+            }
+
+        # 按平台超时时间等待，超时的采集项本轮不更新
+        finished: List[TailLogHandler] = []
+        for source_platform, platform_futures in futures.items():
+            timeout = max(self.get_timeout(source_platform) - (time.monotonic() - start), 0)
+            done, not_done = wait(platform_futures, timeout=timeout)
+            finished.extend(platform_futures[future] for future in done)
+            if not_done:
+                logger.warning(
+                    "[SyncTailLogTimeout] SourcePlatform => %s; Timeout => %s; Collectors => %s",
+                    source_platform,
+                    self.get_timeout(source_platform),
+                    [platform_futures[future].collector.collector_config_id for future in not_done],
+                )
+            executors[source_platform].shutdown(wait=False, cancel_futures=True)
+
+        # 等待执行中的请求结束，避免遗留工作线程
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+
+        collectors = [handler.collector for handler in finished]
+        CollectorConfig.objects.bulk_update(collectors, fields=["tail_log_time"])
+        return len(collectors)
@@ -102,6 +102,8 @@ USER_INFO_DATA_NAME_FORMAT = "bkaudit_user_info_data_{}"
 API_PUSH_COLLECTOR_NAME_FORMAT = "{system_id}_{id}_{date}"
 API_PUSH_ETL_RETRY_TIMES = 3
 API_PUSH_ETL_RETRY_WAIT_TIME = 3
+# 创建 API PUSH 清洗链路的最长重试时间（秒）
+API_PUSH_ETL_MAX_AGE = 10 * 60
 
 COLLECTOR_CHECK_TIME_PERIOD = 5  # 次
 COLLECTOR_CHECK_TIME_RANGE = 60  # 秒
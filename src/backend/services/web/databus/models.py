@@ -19,6 +19,8 @@ to the current version of the project delivered to anyone in the future.
 from blueapps.utils.request_provider import get_local_request_id, get_request_username
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy
 
 from apps.meta.constants import ConfigLevelChoices
@@ -286,3 +288,15 @@ class SnapshotCheckStatistic(models.Model):
 
     class Meta:
         unique_together = [["system_id", "resource_type_id", "join_data_type"]]
+
+
+@receiver([post_save, post_delete], sender=CollectorConfig)
+@receiver([post_save, post_delete], sender=Snapshot)
+def refresh_system_list_snapshot(**kwargs):
+    """
+    采集项与快照变化会影响系统状态
+    """
+
+    from apps.meta.handlers.system_snapshot import SystemListSnapshot
+
+    SystemListSnapshot.schedule_refresh()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from typing import Dict, List
+
+from bk_resource import resource
+from bk_resource.exceptions import APIRequestError
+from blueapps.utils.logger import logger_celery
+
+from apps.poll.constants import PollStatusChoices
+from apps.poll.handlers import PollHandler, PollResult
+from apps.poll.models import PollTask
+from services.web.databus.constants import (
+    API_PUSH_ETL_MAX_AGE,
+    API_PUSH_ETL_RETRY_TIMES,
+    API_PUSH_ETL_RETRY_WAIT_TIME,
+    EtlConfigEnum,
+)
+from services.web.databus.models import CollectorConfig, CollectorPlugin
+
+
+class ApiPushEtlPollHandler(PollHandler):
+    """
+    创建 API PUSH 对应的数据清洗入库链路
+    采集项创建后 BkBase 未及时同步时接口报错，按退避间隔重试
+    """
+
+    initial_delay = API_PUSH_ETL_RETRY_WAIT_TIME
+    initial_interval = API_PUSH_ETL_RETRY_WAIT_TIME
+    max_age = API_PUSH_ETL_MAX_AGE
+    max_attempts = API_PUSH_ETL_RETRY_TIMES
+
+    def poll(self, tasks: List[PollTask]) -> Dict[int, PollResult]:
+        results = {}
+        for task in tasks:
+            collector_config_id = task.params["collector_config_id"]
+            try:
+                resource.databus.collector.collector_etl(**self.build_etl_params(collector_config_id))
+                logger_celery.info(
+                    "[CreateApiPushEtlSuccess] Attempt => %s; Collector => %s", task.attempt + 1, collector_config_id
+                )
+                results[task.id] = PollResult(status=PollStatusChoices.SUCCESS.value)
+            except APIRequestError as err:
+                logger_celery.warning(
+                    "[CreateApiPushEtlError] Attempt => %s; Collector => %s; Error => %s",
+                    task.attempt + 1,
+                    collector_config_id,
+                    err,
+                )
+            except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+                logger_celery.exception(
+                    "[CreateApiPushEtlError] Collector => %s; Error => %s", collector_config_id, err
+                )
+                results[task.id] = PollResult(status=PollStatusChoices.FAILED.value, message=str(err))
+        return results
+
+    def on_expired(self, tasks: List[PollTask]) -> None:
+        for task in tasks:
+            logger_celery.error(
+                "[CreateApiPushEtlFailed] Retry Exhausted; Collector => %s", task.params["collector_config_id"]
+            )
+
+    @classmethod
+    def build_etl_params(cls, collector_config_id: int) -> dict:
+        collector = CollectorConfig.objects.get(collector_config_id=collector_config_id)
+        namespace = CollectorPlugin.objects.get(collector_plugin_id=collector.collector_plugin_id).namespace
+        fields = [
+            {
+                **_field,
+                "option": {
+                    "key": f"attributes/{_field['field_name']}",
+                    "path": f"attributes/{_field['field_name']}",
+                    "val": None,
+                },
+            }
+            for _field in resource.meta.get_standard_fields()
+        ]
+        return {
+            "namespace": namespace,
+            "collector_config_id": collector.collector_config_id,
+            "etl_config": EtlConfigEnum.BK_LOG_JSON.value,
+            "etl_params": {"retain_original_text": True},
+            "fields": fields,
+            "ignore_check": True,
+        }
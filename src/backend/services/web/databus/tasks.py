@@ -18,13 +18,10 @@ to the current version of the project delivered to anyone in the future.
 
 import datetime
 import os
-import time
-import traceback
 
 import requests
 from billiard.exceptions import SoftTimeLimitExceeded
 from bk_resource import api, resource
-from bk_resource.exceptions import APIRequestError
 from blueapps.contrib.celery_tools.periodic import periodic_task
 from blueapps.core.celery import celery_app
 from blueapps.utils.logger import logger
@@ -35,12 +32,14 @@ from django.utils.translation import gettext
 
 from api.bk_base.constants import StorageType
 from apps.meta.constants import ConfigLevelChoices
+from apps.meta.handlers.system_snapshot import SystemListSnapshot
 from apps.meta.models import GlobalMetaConfig, ResourceType, System
 from apps.notice.handlers import ErrorMsgHandler
+from apps.poll.handlers import PollScheduler
 from core.lock import lock
 from services.web.databus.collector.check.handlers import ReportCheckHandler
 from services.web.databus.collector.etl.base import EtlClean
-from services.web.databus.collector.handlers import TailLogHandler
+from services.web.databus.collector.handlers import TailLogSyncer
 from services.web.databus.collector.snapshot.join.base import (
     AssetHandler,
     BasicJoinHandler,
@@ -48,11 +47,8 @@ from services.web.databus.collector.snapshot.join.base import (
 from services.web.databus.collector.snapshot.join.http_pull import HttpPullHandler
 from services.web.databus.collector_plugin.handlers import PluginEtlHandler
 from services.web.databus.constants import (
-    API_PUSH_ETL_RETRY_TIMES,
-    API_PUSH_ETL_RETRY_WAIT_TIME,
     COLLECTOR_PLUGIN_ID,
     PULL_HANDLER_PRE_CHECK_TIMEOUT,
-    EtlConfigEnum,
     PluginSceneChoices,
     SnapshotRunningStatus,
 )
@@ -62,6 +58,7 @@ from services.web.databus.models import (
     Snapshot,
     SnapshotCheckStatistic,
 )
+from services.web.databus.poll import ApiPushEtlPollHandler
 
 
 @periodic_task(run_every=crontab(minute="*/1"), soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
@@ -111,9 +108,9 @@ def start_snapshot():
 @periodic_task(run_every=crontab(minute="*/10"), soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
 @lock(lock_name="celery:sync_tail_log_time")
 def sync_tail_log_time():
-    collectors = CollectorConfig.objects.all()
-    for collector in collectors:
-        TailLogHandler.get_instance(collector).sync()
+    TailLogSyncer().sync(CollectorConfig.objects.all())
+    # 最近日志时间决定系统的日志上报状态
+    SystemListSnapshot.schedule_refresh()
 
 
 @periodic_task(run_every=crontab(minute="*/1"), soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
@@ -200,53 +197,12 @@ def refresh_snapshot():
 def create_api_push_etl(collector_config_id: int):
     """
     创建 API PUSH 对应的数据清洗入库链路
+    Delay 任务不会及时到 BkBase，注册轮询任务按退避间隔重试，避免在 Worker 中等待
     """
 
-    logger.info("[create_api_push_etl] Start %s", datetime.datetime.now())
-
-    collector = CollectorConfig.objects.get(collector_config_id=collector_config_id)
-    namespace = CollectorPlugin.objects.get(collector_plugin_id=collector.collector_plugin_id).namespace
-
-    # 创建清洗策略
-    fields = [
-        {
-            **_field,
-            "option": {
-                "key": f"attributes/{_field['field_name']}",
-                "path": f"attributes/{_field['field_name']}",
-                "val": None,
-            },
-        }
-        for _field in resource.meta.get_standard_fields()
-    ]
-    etl_params = {
-        "namespace": namespace,
-        "collector_config_id": collector.collector_config_id,
-        "etl_config": EtlConfigEnum.BK_LOG_JSON.value,
-        "etl_params": {"retain_original_text": True},
-        "fields": fields,
-        "ignore_check": True,
-    }
-
-    # Delay 任务不会及时到 BkBase，需要增加 Retry
-    retry = 1
-    time.sleep(API_PUSH_ETL_RETRY_WAIT_TIME)
-    while retry <= API_PUSH_ETL_RETRY_TIMES:
-        retry += 1
-        try:
-            resource.databus.collector.collector_etl(**etl_params)
-            retry = API_PUSH_ETL_RETRY_TIMES + 1
-            logger.info("[CreateApiPushEtlSuccess] Retry => %s; Collector => %s", retry, collector.collector_config_id)
-        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
-            logger.exception(
-                "[CreateApiPushEtlError] Retry => %s; Error => %s; Detail %s;", retry, str(err), traceback.format_exc()
-            )
-            if isinstance(err, APIRequestError):
-                time.sleep(API_PUSH_ETL_RETRY_WAIT_TIME)
-            else:
-                break
-
-    logger.info("[create_api_push_etl] End %s", datetime.datetime.now())
+    PollScheduler.register(
+        ApiPushEtlPollHandler, poll_key=collector_config_id, params={"collector_config_id": collector_config_id}
+    )
 
 
 @lock(lock_name="celery:check_report_continues")
@@ -15,6 +15,7 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
+import os
 from functools import cached_property
 from typing import List, Optional
 
@@ -189,6 +190,8 @@ COLLECT_SEARCH_CONFIG = CollectorSearchConfig(
 DATE_FORMAT = "%Y%m%d"
 DATE_PARTITION_FIELD = "thedate"
 TIMESTAMP_PARTITION_FIELD = "dtEventTimeStamp"
+# 日志导出游标分页的唯一字段，每条日志的 event_id 唯一，与时间戳组合作为游标；拉取时校验 (时间戳, event_id) 不重复
+LOG_EXPORT_KEYSET_ID_FIELD = "event_id"
 
 # 日志导出字段Keys长度限制
 LOG_EXPORT_FIELD_KEYS_MAX_LENGTH = 512
@@ -274,6 +277,17 @@ class LogExportFieldScope(TextChoices):
         }.get(scope)
 
 
+class LogExportFormat(TextChoices):
+    """
+    日志导出文件格式
+    """
+
+    XLSX = "xlsx", gettext_lazy("Excel")
+    CSV = "csv", gettext_lazy("CSV")
+    CSV_GZIP = "csv_gzip", gettext_lazy("CSV(gzip 压缩)")
+    PARQUET = "parquet", gettext_lazy("Parquet")
+
+
 # 日志字段 key 拼接字符
 LOG_FIELD_KEY_JOIN_CHAR = "/"
 
@@ -282,6 +296,12 @@ LOG_EXPORT_ROOT_PATH = "log_export"
 # 文件上传路径
 LOG_EXPORT_FILE_NAME_FORMAT = LOG_EXPORT_ROOT_PATH + "/{namespace}/{file_name}"
 
+# ES 客户端连接池
+ES_CLIENT_POOL_MAXSIZE = int(os.getenv("BKAPP_ES_CLIENT_POOL_MAXSIZE", 10))
+ES_CLIENT_IDLE_TIMEOUT = int(os.getenv("BKAPP_ES_CLIENT_IDLE_TIMEOUT", 30 * 60))  # s
+ES_CLUSTER_CONFIG_CACHE_SIZE = 128
+ES_CLUSTER_CONFIG_CACHE_TTL = int(os.getenv("BKAPP_ES_CLUSTER_CONFIG_CACHE_TTL", 5 * 60))  # s
+
 
 @register_choices("query_field_category")
 class FieldCategoryEnum(TextChoices):
@@ -58,3 +58,12 @@ class LogExportMaxCountError(BlueException):
     def __init__(self, current_count: int, max_count: int, *args, **kwargs):
         self.MESSAGE = self.MESSAGE.format(current_count=current_count, max_count=max_count)
         super().__init__(*args, **kwargs)
+
+
+class LogExportKeysetKeyDuplicate(BlueException):
+    MODULE_CODE = "26"
+    MESSAGE = gettext_lazy("日志导出游标 (时间, event_id) 重复: {key}，继续分页会遗漏数据")
+
+    def __init__(self, key, *args, **kwargs):
+        self.MESSAGE = self.MESSAGE.format(key=key)
+        super().__init__(*args, **kwargs)
@@ -15,24 +15,94 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
+
+import datetime
 import math
-from typing import Generator, List
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Generator, List, Optional, Union
 
-from bk_resource import resource
+from bk_resource import api, resource
+from blueapps.utils.logger import logger_celery
 from django.conf import settings
+from django.db import connections
 
+from api.bk_base.constants import StorageType
+from core.constants import OrderTypeChoices
 from core.utils.retry import FuncRunner
+from core.utils.time import parse_datetime
+from services.web.query.constants import (
+    DATE_FORMAT,
+    DATE_PARTITION_FIELD,
+    LOG_EXPORT_KEYSET_ID_FIELD,
+    TIMESTAMP_PARTITION_FIELD,
+)
+from services.web.query.exceptions import LogExportKeysetKeyDuplicate
 from services.web.query.export.model import ExportConfig
+from services.web.query.utils.doris import DorisKeysetQuerySQLBuilder
+from services.web.query.utils.search_config import QueryConditionOperator
+
+
+@dataclass
+class FetchWindow:
+    """
+    时间窗口 [start_ms, end_ms)，最后一个窗口包含 end_ms
+    """
+
+    start_ms: int
+    end_ms: int
+    include_end: bool = False
+
+    def build_conditions(self) -> List[dict]:
+        start_date = datetime.datetime.fromtimestamp(self.start_ms / 1000).strftime(DATE_FORMAT)
+        end_date = datetime.datetime.fromtimestamp(self.end_ms / 1000).strftime(DATE_FORMAT)
+        end_operator = QueryConditionOperator.LTE.value if self.include_end else QueryConditionOperator.LT.value
+        return [
+            {
+                "field": {"raw_name": DATE_PARTITION_FIELD},
+                "operator": QueryConditionOperator.GTE.value,
+                "filters": [start_date],
+            },
+            {
+                "field": {"raw_name": DATE_PARTITION_FIELD},
+                "operator": QueryConditionOperator.LTE.value,
+                "filters": [end_date],
+            },
+            {
+                "field": {"raw_name": TIMESTAMP_PARTITION_FIELD},
+                "operator": QueryConditionOperator.GTE.value,
+                "filters": [self.start_ms],
+            },
+            {"field": {"raw_name": TIMESTAMP_PARTITION_FIELD}, "operator": end_operator, "filters": [self.end_ms]},
+        ]
 
 
 class DataFetcher:
     """
     数据获取模块
+    按时间切分窗口，窗口内游标分页，多个窗口并发拉取并通过有界队列按顺序输出，内存占用与总条数无关
     """
 
-    def __init__(self, config: ExportConfig, page_size: int = settings.LOG_EXPORT_TASK_PAGE_SIZE):
+    # 窗口拉取完成标记
+    WINDOW_DONE = object()
+
+    def __init__(
+        self,
+        config: ExportConfig,
+        page_size: int = settings.LOG_EXPORT_TASK_PAGE_SIZE,
+        workers: int = settings.LOG_EXPORT_FETCH_WORKERS,
+        slices: int = settings.LOG_EXPORT_FETCH_SLICES,
+        queue_size: int = settings.LOG_EXPORT_FETCH_QUEUE_SIZE,
+    ):
         self.config = config
         self.page_size = page_size
+        self.workers = max(workers, 1)
+        self.slices = max(slices, 1)
+        self.queue_size = max(queue_size, 1)
+        # 已输出数据的拉取位置，可用于断点续传
+        self.position: dict = {}
 
     @classmethod
     def _fetch_data(cls, query_params: dict, page: int, page_size: int):
@@ -67,9 +137,10 @@ class DataFetcher:
         resp = cls._fetch_data(query_params, page, page_size)
         return resp["results"]
 
-    def fetch_logs(self) -> Generator[List[dict], None, None]:
+    def fetch_logs(self, position: dict = None) -> Generator[List[dict], None, None]:
         """
-        检索日志
+        检索日志，总条数只查询一次
+        :param position: 断点位置，从该位置之后继续拉取
         """
 
         total = self.get_total(self.config.task.query_params)
@@ -77,5 +148,171 @@ class DataFetcher:
         if total != self.config.task.total:
             self.config.task.total = total
             self.config.task.save(update_fields=["total"])
-        for i in range(0, math.ceil(total / self.page_size)):
-            yield self.fetch_patch_logs(self.config.task.query_params, i + 1, self.page_size)
+        if not total:
+            return
+        search_params = self.validate_query_params(self.config.task.query_params)
+        order_type = self.get_keyset_order_type(search_params)
+        # 首个排序字段不是时间时无法使用游标分页，回退到 OFFSET 分页
+        position = position or {}
+        if order_type is None:
+            yield from self.fetch_logs_by_page(total, position)
+            return
+        yield from self.fetch_logs_by_keyset(search_params, order_type, position)
+
+    def fetch_logs_by_page(self, total: int, position: dict) -> Generator[List[dict], None, None]:
+        """
+        OFFSET 分页检索日志
+        """
+
+        page_size = position.get("page_size", self.page_size)
+        for i in range(position.get("page", 0), math.ceil(total / page_size)):
+            data = self.fetch_patch_logs(self.config.task.query_params, i + 1, page_size)
+            self.position = {"page": i + 1, "page_size": page_size}
+            yield data
+
+    @classmethod
+    def validate_query_params(cls, query_params: dict) -> dict:
+        from services.web.query.serializers import CollectorSearchAllReqSerializer
+
+        serializer = CollectorSearchAllReqSerializer(data={"page": 1, "page_size": 1, **query_params})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @classmethod
+    def get_keyset_order_type(cls, search_params: dict) -> Optional[str]:
+        sort_list = search_params["sort_list"]
+        if sort_list and sort_list[0]["order_field"] != TIMESTAMP_PARTITION_FIELD:
+            return None
+        return sort_list[0]["order_type"] if sort_list else OrderTypeChoices.DESC.value
+
+    def split_windows(self, search_params: dict, order_type: str, slices: int) -> List[FetchWindow]:
+        """
+        将检索时间范围切分为多个窗口，按输出顺序排列
+        """
+
+        start_ms = int(parse_datetime(search_params["start_time"]).timestamp() * 1000)
+        end_ms = int(parse_datetime(search_params["end_time"]).timestamp() * 1000)
+        slices = max(min(slices, end_ms - start_ms), 1)
+        step = math.ceil((end_ms - start_ms) / slices) or 1
+        windows = [
+            FetchWindow(start_ms=start, end_ms=min(start + step, end_ms), include_end=start + step >= end_ms)
+            for start in range(start_ms, end_ms, step)
+        ] or [FetchWindow(start_ms=start_ms, end_ms=end_ms, include_end=True)]
+        if order_type == OrderTypeChoices.DESC:
+            windows.reverse()
+        return windows
+
+    def fetch_logs_by_keyset(
+        self, search_params: dict, order_type: str, position: dict
+    ) -> Generator[List[dict], None, None]:
+        """
+        游标分页并发检索日志
+        每个窗口对应一个有界队列，消费方按窗口顺序读取，保证输出有序
+        断点位置记录为 (窗口序号, 窗口内游标)，切分的窗口数需与断点一致
+        """
+
+        from services.web.query.resources.doris import CollectorSearchAllResource
+
+        search_resource = CollectorSearchAllResource()
+        table = search_resource.get_collector_rt_id(search_params["namespace"])
+        system_map = search_resource.load_system_map(search_params["namespace"], search_params["bind_system_info"])
+        slices = position.get("slices", self.slices)
+        start_window = position.get("window", 0)
+        windows = self.split_windows(search_params, order_type, slices)[start_window:]
+        pages_list = [queue.Queue(maxsize=self.queue_size) for _ in windows]
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="log_export_fetch")
+        try:
+            for index, (window, pages) in enumerate(zip(windows, pages_list)):
+                cursor = position.get("cursor") if index == 0 else None
+                sql_builder = DorisKeysetQuerySQLBuilder(
+                    table=table,
+                    conditions=search_params["conditions"] + window.build_conditions(),
+                    page_size=self.page_size,
+                    time_field=TIMESTAMP_PARTITION_FIELD,
+                    id_field=LOG_EXPORT_KEYSET_ID_FIELD,
+                    order_type=order_type,
+                )
+                executor.submit(self.fetch_window, sql_builder, pages, stop, cursor)
+            for index, pages in enumerate(pages_list, start=start_window):
+                while True:
+                    item = pages.get()
+                    if item is self.WINDOW_DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    cursor = [item[-1][TIMESTAMP_PARTITION_FIELD], item[-1][LOG_EXPORT_KEYSET_ID_FIELD]]
+                    data = search_resource.format_results(item, system_map)
+                    self.position = {"slices": slices, "window": index, "cursor": cursor}
+                    yield data
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def fetch_window(
+        self,
+        sql_builder: DorisKeysetQuerySQLBuilder,
+        pages: queue.Queue,
+        stop: threading.Event,
+        cursor: Optional[list] = None,
+    ):
+        """
+        拉取单个时间窗口的数据，cursor 不为空时从游标之后开始
+        游标 (时间, event_id) 需唯一，键重复时分页边界上的记录会被遗漏，因此拉取时校验游标键严格单调
+        """
+
+        try:
+            while not stop.is_set():
+                sql = sql_builder.build_data_sql(tuple(cursor) if cursor else None)
+                resp = FuncRunner(
+                    func=api.bk_base.query_sync,
+                    kwargs={"sql": sql, "prefer_storage": StorageType.DORIS.value},
+                ).run()
+                rows = resp.get("list", [])
+                # 游标条件包含游标记录本身，去掉后剩余记录的键需严格单调，与游标重复说明键不唯一
+                if cursor and rows and self.get_key(sql_builder, rows[0]) == tuple(cursor):
+                    rows = rows[1:]
+                self.check_keys(sql_builder, rows, cursor)
+                if rows:
+                    self.put_page(pages, rows, stop)
+                if len(rows) < self.page_size:
+                    break
+                cursor = list(self.get_key(sql_builder, rows[-1]))
+        except Exception as err:  # pylint: disable=broad-except
+            logger_celery.exception(f"[{self.__class__.__name__}] fetch window failed; task {self.config.task.id}")
+            self.put_page(pages, err, stop)
+        finally:
+            self.put_page(pages, self.WINDOW_DONE, stop)
+            connections.close_all()
+
+    @classmethod
+    def get_key(cls, sql_builder: DorisKeysetQuerySQLBuilder, row: dict) -> tuple:
+        return row[sql_builder.time_field], row[sql_builder.id_field]
+
+    @classmethod
+    def check_keys(cls, sql_builder: DorisKeysetQuerySQLBuilder, rows: List[dict], cursor: Optional[list] = None):
+        """
+        校验分页记录的 (时间, 唯一ID) 按排序方向严格单调，出现重复时游标分页会漏数据，直接报错
+        """
+
+        keys = [cls.get_key(sql_builder, row) for row in rows]
+        if cursor:
+            keys.insert(0, tuple(cursor))
+        if sql_builder.order_type == OrderTypeChoices.DESC:
+            keys.reverse()
+        for prev, current in zip(keys, keys[1:]):
+            if not prev < current:
+                raise LogExportKeysetKeyDuplicate(key=current)
+
+    @classmethod
+    def put_page(cls, pages: queue.Queue, item: Union[List[dict], Exception, object], stop: threading.Event):
+        """
+        写入队列，队列已满时等待消费，消费方退出后放弃写入
+        """
+
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
@@ -17,7 +17,7 @@ to the current version of the project delivered to anyone in the future.
 """
 
 import json
-from typing import Any, List
+from typing import Any, Dict, List
 
 from bk_resource.base import Empty
 
@@ -63,3 +63,15 @@ class DataProcessor:
         """
 
         return [self.format_data(log) for log in batch_data]
+
+    def batch_format_columns(self, batch_data: List[dict]) -> Dict[str, List[str]]:
+        """
+        批量格式化数据，按列输出: 字段完整键名 => 该列的值
+        """
+
+        return {
+            field.full_key: [
+                self.format_value(extract_nested_value(log.get(field.raw_name), field.keys)) for log in batch_data
+            ]
+            for field in self.config.export_fields
+        }
@@ -15,22 +15,29 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
+import os
 import traceback
 from datetime import datetime
+from typing import List, Optional, Type
 
 from blueapps.utils.logger import logger_celery
-from django.core.files import File
+from django.conf import settings
 
+from services.web.query.constants import FileExportResult
 from services.web.query.export.data_fetcher import DataFetcher
 from services.web.query.export.data_processor import DataProcessor
 from services.web.query.export.file_exporter import FileExporter
 from services.web.query.export.file_uploader import FileUploader
-from services.web.query.export.model import ExportConfig
+from services.web.query.export.model import ExportCheckpoint, ExportConfig, ExportPart
 
 
 class CollectorLogExporter:
     """
     检索日志导出器
+    可直接拼接的格式按分片写入，分片作为同一个文件的分块上传，每个分片上传后保存断点，任务重试时跳过已完成的分片，
+    完成后在服务端拼接；
+    其他格式(如 xlsx、parquet)的表头和元数据需要在完整文件中一次写入，不分片，单次写入完整文件后上传，任务重试时重新导出
+    导出结果先保存到断点再删除分片，任务不再重试时删除断点关联的文件
     """
 
     def __init__(
@@ -38,66 +45,214 @@ class CollectorLogExporter:
         config: ExportConfig,
         data_fetcher: DataFetcher,
         data_processor: DataProcessor,
-        file_exporter: FileExporter,
+        file_exporter_class: Type[FileExporter],
         file_uploader: FileUploader,
+        part_rows: int = settings.LOG_EXPORT_PART_ROWS,
     ):
         self.config = config
         self.task = self.config.task
         self.data_fetcher = data_fetcher
         self.data_processor = data_processor
-        self.file_exporter = file_exporter
+        self.file_exporter_class = file_exporter_class
         self.file_uploader = file_uploader
-        self.current_records = 0
+        self.part_rows = part_rows
+        self.checkpoint = ExportCheckpoint.model_validate(self.task.checkpoint or {})
+        if not self.checkpoint.file_name:
+            self.checkpoint.file_name = self.file_exporter_class.build_file_name()
+        self.file_exporter: Optional[FileExporter] = None
+        self.part_records = 0
+        self.current_records = self.checkpoint.rows
+
+    @property
+    def file_name(self) -> str:
+        return self.checkpoint.file_name
+
+    @property
+    def use_multipart(self) -> bool:
+        return self.file_exporter_class.concatenable
+
+    def save_checkpoint(self):
+        self.task.update_checkpoint(self.checkpoint.model_dump())
 
     def _finally_export(self):
         """
         最终的收尾工作
         """
 
-        self.file_exporter.close()
+        if self.file_exporter is not None:
+            self.file_exporter.close()
+            self.file_exporter = None
+
+    def get_part_exporter(self) -> FileExporter:
+        if self.file_exporter is None:
+            self.file_exporter = self.file_exporter_class(
+                config=self.config, is_first_part=self.checkpoint.part_index == 0
+            )
+            self.file_exporter.file_name = self.file_name
+        return self.file_exporter
+
+    def finish_part(self):
+        """
+        上传当前分片并保存断点，上传失败时按分片重试
+        """
+
+        file_exporter = self.get_part_exporter()
+        try:
+            file_obj = file_exporter.save()
+            if self.use_multipart:
+                part = self.upload_block(file_obj)
+            else:
+                upload_result = self.file_uploader.upload(file_obj, file_exporter.file_name)
+                part = ExportPart(
+                    index=self.checkpoint.part_index,
+                    storage_name=upload_result.storage_name,
+                    url=upload_result.url,
+                    size=upload_result.size,
+                    rows=self.part_records,
+                )
+        finally:
+            self._finally_export()
+        self.checkpoint.parts.append(part)
+        self.checkpoint.part_index += 1
+        self.checkpoint.rows += self.part_records
+        self.checkpoint.bytes_written += part.size
+        self.checkpoint.position = self.data_fetcher.position
+        self.part_records = 0
+        self.save_checkpoint()
+        logger_celery.info(
+            f"[{self.__class__.__name__}] part upload done; task {self.task.id}; "
+            f"part: {self.checkpoint.part_index}; rows: {self.checkpoint.rows}; "
+            f"bytes_written: {self.checkpoint.bytes_written}"
+        )
+
+    def upload_block(self, file_obj) -> ExportPart:
+        """
+        将分片作为分块上传，首个分片上传前创建分块上传并保存到断点
+        """
+
+        if not self.checkpoint.upload_id:
+            self.checkpoint.storage_name, self.checkpoint.upload_id = self.file_uploader.create_multipart(
+                self.file_name
+            )
+            self.save_checkpoint()
+        self.file_uploader.upload_part(
+            self.checkpoint.storage_name, self.checkpoint.upload_id, self.checkpoint.part_index + 1, file_obj
+        )
+        file_obj.seek(0, os.SEEK_END)
+        return ExportPart(index=self.checkpoint.part_index, size=file_obj.tell(), rows=self.part_records)
 
-    def search_and_write_file(self) -> File:
+    def search_and_write_file(self):
         """
-        分页检索日志，处理并写入文件
+        分页检索日志，处理并写入分片文件
         1. 分页检索日志
         2. 格式化数据
         3. 导出日志
-        4. 上传文件
+        4. 分片写满后上传并保存断点
         """
 
+        if self.checkpoint.fetch_finished:
+            return
+        if self.checkpoint.parts:
+            logger_celery.info(
+                f"[{self.__class__.__name__}] resume from checkpoint; task {self.task.id}; "
+                f"parts: {len(self.checkpoint.parts)}; rows: {self.checkpoint.rows}"
+            )
+
         # 1. 分页检索日志
-        for log_data in self.data_fetcher.fetch_logs():
+        for log_data in self.data_fetcher.fetch_logs(position=self.checkpoint.position):
             logger_celery.info(
                 f"[{self.__class__.__name__}] fetch logs done; task {self.task.id}; data_count: {len(log_data)}"
             )
             # 2. 数据处理
-            formatted_logs = self.data_processor.batch_format_data(log_data)
-            logger_celery.info(
-                f"[{self.__class__.__name__}] format logs done; task {self.task.id}; "
-                f"formatted_logs_count: {len(formatted_logs)}"
-            )
+            columns = self.data_processor.batch_format_columns(log_data)
             # 3. 导出日志
-            self.file_exporter.write(formatted_logs)
-            logger_celery.info(
-                f"[{self.__class__.__name__}] write logs done; task {self.task.id}; "
-                f"written_logs_count: {len(formatted_logs)}"
-            )
+            self.get_part_exporter().write(columns)
             # 4. 更新记录日志条数
-            self.current_records += len(formatted_logs)
+            self.part_records += len(log_data)
+            self.current_records += len(log_data)
             self.task.update_current_records(current_records=self.current_records)
             logger_celery.info(
-                f"[{self.__class__.__name__}] record logs done; task {self.task.id}; "
+                f"[{self.__class__.__name__}] write logs done; task {self.task.id}; "
                 f"current_logs_count: {self.current_records}"
             )
-        return self.file_exporter.save()
+            # 5. 分片写满后上传，不可拼接的格式只写入一个文件
+            if self.use_multipart and self.part_records >= self.part_rows:
+                self.finish_part()
+
+        # 最后一个分片；没有数据时也生成一个仅包含表头的文件
+        if self.part_records or not self.checkpoint.parts:
+            self.finish_part()
+        self.checkpoint.fetch_finished = True
+        self.save_checkpoint()
+
+    def merge_parts(self) -> FileExportResult:
+        """
+        合并分片，合并结果保存到断点后再删除分片，重试时直接使用已保存的结果
+        1. 分块上传：在服务端按序拼接分块
+        2. 其他：只有一个完整文件，直接使用该文件
+        """
+
+        if self.checkpoint.result:
+            return self.checkpoint.result
+
+        parts = self.checkpoint.parts
+        if self.use_multipart:
+            upload_result = self.file_uploader.complete_multipart(
+                self.checkpoint.storage_name, self.checkpoint.upload_id, self.file_name
+            )
+        else:
+            part = parts[0]
+            upload_result = FileExportResult(
+                url=part.url,
+                size=part.size,
+                origin_name=self.file_name,
+                storage_name=part.storage_name,
+            )
+
+        # 先保存合并结果并移除分片，再删除分片文件，避免重试时引用已删除的分片
+        self.checkpoint.result = upload_result
+        self.checkpoint.parts = []
+        self.checkpoint.upload_id = ""
+        self.save_checkpoint()
+        self.delete_parts([part for part in parts if part.storage_name != upload_result.storage_name])
+        return upload_result
+
+    def delete_parts(self, parts: List[ExportPart]):
+        self.delete_files([part.storage_name for part in parts if part.storage_name])
+
+    def delete_files(self, storage_names: List[str]):
+        for storage_name in storage_names:
+            try:
+                self.file_uploader.delete(storage_name)
+            except Exception as e:  # NOCC:broad-except(清理失败不影响导出结果)
+                logger_celery.warning(
+                    f"[{self.__class__.__name__}] delete part failed; task {self.task.id}; "
+                    f"storage_name: {storage_name}; Err: {e}"
+                )
+
+    def clean_checkpoint(self):
+        """
+        删除断点关联的文件、取消未完成的分块上传并清空断点
+        """
+
+        self.delete_files(self.checkpoint.storage_names)
+        if self.checkpoint.upload_id:
+            try:
+                self.file_uploader.abort_multipart(self.checkpoint.storage_name, self.checkpoint.upload_id)
+            except Exception as e:  # NOCC:broad-except(清理失败不影响导出结果)
+                logger_celery.warning(
+                    f"[{self.__class__.__name__}] abort multipart failed; task {self.task.id}; Err: {e}"
+                )
+        self.checkpoint = ExportCheckpoint()
+        self.task.update_checkpoint({})
 
     def export(self):
         """
-        1. 检索日志并写入文件
+        1. 检索日志并写入分片文件
             2.1 分页检索日志
             2.2 数据处理
-            2.3 写入文件
-        2. 上传文件
+            2.3 写入文件，分片上传
+        2. 合并分片
         3. 更新任务状态
         4. 消息通知
         """
@@ -106,16 +261,12 @@ class CollectorLogExporter:
         logger_celery.info(f"[{self.__class__.__name__}] export start; task {self.task.id}")
         try:
             # 1. 检索日志并写入文件
-            file_obj = self.search_and_write_file()
+            self.search_and_write_file()
             logger_celery.info(f"[{self.__class__.__name__}] search and write done; task {self.task.id}")
-            # 2. 上传文件
-            file_name = self.file_exporter.file_name
-            logger_celery.info(
-                f"[{self.__class__.__name__}] upload file start; task {self.task.id}; file_name: {file_name}"
-            )
-            upload_result = self.file_uploader.upload(file_obj, file_name)
+            # 2. 合并分片
+            upload_result = self.merge_parts()
             logger_celery.info(
-                f"[{self.__class__.__name__}] upload file done; task {self.task.id}; file_name: {file_name}"
+                f"[{self.__class__.__name__}] upload file done; task {self.task.id}; file_name: {self.file_name}; "
                 f"upload_result: {upload_result}"
             )
             # 3. 更新任务状态
@@ -136,6 +287,9 @@ class CollectorLogExporter:
                 f"Detail => {traceback.format_exc()}"
             )
             self.task.update_task_failed(str(e))
+            # 任务不再重试时分片无法继续使用，直接清理
+            if not self.task.can_retry:
+                self.clean_checkpoint()
         finally:
             # 4. 清理资源
             self._finally_export()
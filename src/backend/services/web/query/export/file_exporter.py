@@ -16,31 +16,45 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 import abc
-import gc
+import csv
+import gzip
+import io
 import tempfile
 from datetime import datetime
 from functools import cached_property
-from typing import List
+from typing import Dict, List, Type
 
+import pyarrow
+import pyarrow.parquet
 import xlsxwriter
 from blueapps.utils.logger import logger_celery
 from django.core.files import File
 
 from core.utils.data import unique_id
-from services.web.query.constants import FieldCategoryEnum
+from services.web.query.constants import FieldCategoryEnum, LogExportFormat
 from services.web.query.export.model import ExportConfig
 
+# 列式数据批次: 字段完整键名 => 该列的值
+ColumnBatch = Dict[str, List[str]]
+
 
 class FileExporter(abc.ABC):
     """
     文件导出模块
+    各格式的写入器接收 DataProcessor 输出的列式数据批次
+    concatenable 为 True 的格式，分片文件按顺序直接拼接即为完整文件，只有第一个分片包含表头；
+    其他格式不分片，由一个写入器写入完整文件
     """
 
+    concatenable = False
+
     def __init__(
         self,
         config: ExportConfig,
+        is_first_part: bool = True,
     ):
         self.config = config
+        self.is_first_part = is_first_part
 
     @property
     @abc.abstractmethod
@@ -57,11 +71,31 @@ class FileExporter(abc.ABC):
         获取文件名: 审计检索日志-{YYYYMMDD-HH:MM:SS}-{唯一ID}.suffix
         """
 
+        return self.build_file_name()
+
+    @classmethod
+    def build_file_name(cls) -> str:
         date_str = datetime.now().strftime("%Y%m%d-%H%M%S")
-        return f"审计检索日志-{date_str}-{unique_id()}{self.suffix}"
+        return f"审计检索日志-{date_str}-{unique_id()}{cls.suffix}"
+
+    def get_columns(self, columns: ColumnBatch) -> List[List[str]]:
+        """
+        按导出字段顺序获取列，缺失的列使用空值填充
+        """
+
+        row_count = len(next(iter(columns.values()), []))
+        empty_column = [self.config.empty_value] * row_count
+        return [columns.get(field.full_key, empty_column) for field in self.config.export_fields]
+
+    def iter_rows(self, columns: ColumnBatch):
+        """
+        将列式数据按导出字段顺序转为行
+        """
+
+        return zip(*self.get_columns(columns))
 
     @abc.abstractmethod
-    def write(self, data: List[dict]):
+    def write(self, columns: ColumnBatch):
         """
         将数据写入文件
         """
@@ -92,8 +126,8 @@ class XLSXExporter(FileExporter):
     data_format = {'border': 0}
     suffix = ".xlsx"
 
-    def __init__(self, config: ExportConfig, max_row=65536):
-        super().__init__(config)
+    def __init__(self, config: ExportConfig, is_first_part: bool = True, max_row=65536):
+        super().__init__(config, is_first_part)
         self.tmp_file = tempfile.NamedTemporaryFile(delete=True, suffix=self.suffix)
         logger_celery.info(f"{self.__class__.__name__} init tmp file, file_name: {self.tmp_file.name}")
         self.workbook = xlsxwriter.Workbook(self.tmp_file.name, {'constant_memory': True})
@@ -177,15 +211,15 @@ class XLSXExporter(FileExporter):
         # 设置列宽
         self.worksheet.set_column(0, len(titles) - 1, 20)
 
-    def write(self, formatted_logs: List[dict]):
-        for log in formatted_logs:
-            row_data = [log.get(field.full_key, self.config.empty_value) for field in self.config.export_fields]
-            self._write_row(row_data, self.data_fmt)
-            # 如果超出最大行数，则新建一个工作表
-            if self.row >= self.max_row:
-                self._init_worksheet()
-        # 手动垃圾回收
-        gc.collect()
+    def _write_data_row(self, row_data):
+        self._write_row(row_data, self.data_fmt)
+        # 如果超出最大行数，则新建一个工作表
+        if self.row >= self.max_row:
+            self._init_worksheet()
+
+    def write(self, columns: ColumnBatch):
+        for row_data in self.iter_rows(columns):
+            self._write_data_row(row_data)
 
     def save(self) -> File:
         self.workbook.close()
@@ -193,3 +227,105 @@ class XLSXExporter(FileExporter):
 
     def close(self):
         self.tmp_file.close()
+
+
+class CSVExporter(FileExporter):
+    """
+    CSV 导出，逐批流式写入临时文件
+    使用 utf-8-sig 编码，便于 Excel 直接打开；BOM 和表头只写入第一个分片，分片可直接拼接
+    """
+
+    suffix = ".csv"
+    encoding = "utf-8-sig"
+    concatenable = True
+
+    def __init__(self, config: ExportConfig, is_first_part: bool = True):
+        super().__init__(config, is_first_part)
+        self.tmp_file = tempfile.NamedTemporaryFile(delete=True, suffix=self.suffix)
+        logger_celery.info(f"{self.__class__.__name__} init tmp file, file_name: {self.tmp_file.name}")
+        self.stream = self.open_stream()
+        self.writer = csv.writer(self.stream)
+        if self.is_first_part:
+            self.writer.writerow([f.display_name or f.full_key for f in self.config.export_fields])
+
+    @property
+    def stream_encoding(self) -> str:
+        return self.encoding if self.is_first_part else "utf-8"
+
+    def open_stream(self) -> io.TextIOBase:
+        return io.TextIOWrapper(self.tmp_file, encoding=self.stream_encoding, newline="", write_through=True)
+
+    def write(self, columns: ColumnBatch):
+        self.writer.writerows(self.iter_rows(columns))
+
+    def save(self) -> File:
+        self.stream.flush()
+        return File(self.tmp_file)
+
+    def close(self):
+        # 关闭文本流会同时关闭底层文件
+        self.stream.close()
+        self.tmp_file.close()
+
+
+class GzipCSVExporter(CSVExporter):
+    """
+    gzip 压缩的 CSV 导出，边写边压缩
+    每个分片是一个独立的 gzip member，多个 member 直接拼接仍是合法的 gzip 文件
+    """
+
+    suffix = ".csv.gz"
+
+    def open_stream(self) -> io.TextIOBase:
+        self.gzip_file = gzip.GzipFile(filename="", fileobj=self.tmp_file, mode="wb")
+        return io.TextIOWrapper(self.gzip_file, encoding=self.stream_encoding, newline="")
+
+    def save(self) -> File:
+        # 关闭 gzip 流写入文件尾，不会关闭临时文件
+        self.stream.close()
+        return File(self.tmp_file)
+
+
+class ParquetExporter(FileExporter):
+    """
+    Parquet 导出，每批数据写入一个 row group
+    """
+
+    suffix = ".parquet"
+
+    def __init__(self, config: ExportConfig, is_first_part: bool = True):
+        super().__init__(config, is_first_part)
+        self.tmp_file = tempfile.NamedTemporaryFile(delete=True, suffix=self.suffix)
+        logger_celery.info(f"{self.__class__.__name__} init tmp file, file_name: {self.tmp_file.name}")
+        # 以字段完整键名作为列名，保证列名唯一
+        self.schema = pyarrow.schema(
+            [pyarrow.field(field.full_key, pyarrow.string()) for field in self.config.export_fields]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(self.tmp_file.name, self.schema, compression="snappy")
+
+    def write(self, columns: ColumnBatch):
+        arrays = [pyarrow.array(column, type=pyarrow.string()) for column in self.get_columns(columns)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def save(self) -> File:
+        self.writer.close()
+        return File(self.tmp_file)
+
+    def close(self):
+        self.tmp_file.close()
+
+
+FILE_EXPORTERS: Dict[str, Type[FileExporter]] = {
+    LogExportFormat.XLSX.value: XLSXExporter,
+    LogExportFormat.CSV.value: CSVExporter,
+    LogExportFormat.CSV_GZIP.value: GzipCSVExporter,
+    LogExportFormat.PARQUET.value: ParquetExporter,
+}
+
+
+def get_file_exporter_class(export_format: str) -> Type[FileExporter]:
+    """
+    根据导出格式获取文件导出类
+    """
+
+    return FILE_EXPORTERS.get(export_format, XLSXExporter)
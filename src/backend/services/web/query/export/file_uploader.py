@@ -16,6 +16,7 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 import abc
+from typing import Tuple
 
 from blueapps.utils.logger import logger
 from django.core.files import File
@@ -23,7 +24,7 @@ from django.core.files import File
 from core.utils.retry import FuncRunner
 from services.web.query.constants import LOG_EXPORT_FILE_NAME_FORMAT, FileExportResult
 from services.web.query.export.model import ExportConfig
-from services.web.query.utils.storage import LogExportStorage
+from services.web.query.utils.storage import BKRepoBlockClient, LogExportStorage
 
 
 class FileUploader(abc.ABC):
@@ -35,11 +36,48 @@ class FileUploader(abc.ABC):
     def upload(self, file_obj: File, file_name: str) -> FileExportResult:
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def open(self, storage_name: str) -> File:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def delete(self, storage_name: str) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def create_multipart(self, file_name: str) -> Tuple[str, str]:
+        """
+        创建分块上传，返回 (storage_name, upload_id)
+        """
+
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def upload_part(self, storage_name: str, upload_id: str, sequence: int, file_obj: File) -> None:
+        """
+        上传分块，sequence 从 1 开始，重复上传同一序号会覆盖
+        """
+
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def complete_multipart(self, storage_name: str, upload_id: str, file_name: str) -> FileExportResult:
+        """
+        按序号拼接已上传的分块，生成完整文件
+        """
+
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def abort_multipart(self, storage_name: str, upload_id: str) -> None:
+        raise NotImplementedError()
+
 
 class BKRepoUploader(FileUploader):
     def __init__(self, config: ExportConfig):
         super().__init__(config=config)
         self.storage = LogExportStorage()
+        self.block_client = BKRepoBlockClient(self.storage)
 
     def upload(self, file_obj: File, file_name: str) -> FileExportResult:
         file_path = LOG_EXPORT_FILE_NAME_FORMAT.format(namespace=self.namespace, file_name=file_name)
@@ -53,3 +91,37 @@ class BKRepoUploader(FileUploader):
             origin_name=file_name,
             storage_name=storage_name,
         )
+
+    def open(self, storage_name: str) -> File:
+        return FuncRunner(func=self.storage.open, kwargs={"name": storage_name, "mode": "rb"}).run()
+
+    def delete(self, storage_name: str) -> None:
+        FuncRunner(func=self.storage.delete, kwargs={"name": storage_name}).run()
+
+    def create_multipart(self, file_name: str) -> Tuple[str, str]:
+        storage_name = LOG_EXPORT_FILE_NAME_FORMAT.format(namespace=self.namespace, file_name=file_name)
+        upload_id = FuncRunner(func=self.block_client.create, kwargs={"name": storage_name}).run()
+        logger.info(f"create multipart upload success; storage_name: {storage_name}; upload_id: {upload_id}")
+        return storage_name, upload_id
+
+    def upload_part(self, storage_name: str, upload_id: str, sequence: int, file_obj: File) -> None:
+        def upload():
+            # 重试时从头读取分块
+            file_obj.seek(0)
+            self.block_client.upload(name=storage_name, upload_id=upload_id, sequence=sequence, content=file_obj)
+
+        FuncRunner(func=upload).run()
+        logger.info(f"upload part success; storage_name: {storage_name}; sequence: {sequence}")
+
+    def complete_multipart(self, storage_name: str, upload_id: str, file_name: str) -> FileExportResult:
+        FuncRunner(func=self.block_client.complete, kwargs={"name": storage_name, "upload_id": upload_id}).run()
+        logger.info(f"complete multipart upload success; storage_name: {storage_name}")
+        return FileExportResult(
+            url=self.storage.url(storage_name),
+            size=self.storage.size(storage_name),
+            origin_name=file_name,
+            storage_name=storage_name,
+        )
+
+    def abort_multipart(self, storage_name: str, upload_id: str) -> None:
+        FuncRunner(func=self.block_client.abort, kwargs={"name": storage_name, "upload_id": upload_id}).run()
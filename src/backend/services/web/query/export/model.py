@@ -18,12 +18,16 @@ to the current version of the project delivered to anyone in the future.
 from collections import defaultdict
 from dataclasses import dataclass
 from functools import cached_property
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
 
 from services.web.query.constants import (
     FieldCategoryEnum,
+    FileExportResult,
     LogExportField,
     LogExportFieldScope,
+    LogExportFormat,
 )
 from services.web.query.models import LogExportTask
 
@@ -64,6 +68,14 @@ class ExportConfig:
 
         return category_fields
 
+    @cached_property
+    def export_format(self) -> str:
+        """
+        导出文件格式，历史任务未指定时使用 xlsx
+        """
+
+        return self.task.export_config.get("export_format", LogExportFormat.XLSX.value)
+
     @cached_property
     def export_fields(self) -> List[LogExportField]:
         """
@@ -75,3 +87,44 @@ class ExportConfig:
             ordered_fields.extend(self.category_fields.get(category, []))
 
         return ordered_fields
+
+
+class ExportPart(BaseModel):
+    """
+    已上传的分片，分块上传时分片没有独立的文件
+    """
+
+    index: int
+    storage_name: str = ""
+    url: str = ""
+    size: int  # 文件大小(单位:字节)
+    rows: int
+
+
+class ExportCheckpoint(BaseModel):
+    """
+    导出断点，每完成一个分片保存一次，任务重试时从断点继续
+    """
+
+    file_name: str = ""
+    part_index: int = 0  # 下一个分片序号
+    rows: int = 0  # 已上传分片的总条数
+    bytes_written: int = 0  # 已上传分片的总大小
+    position: dict = {}  # 数据拉取位置
+    parts: List[ExportPart] = []
+    fetch_finished: bool = False  # 数据是否已全部写入分片
+    # 分块上传，分片作为同一个文件的分块上传，完成后在服务端拼接
+    storage_name: str = ""
+    upload_id: str = ""
+    result: Optional[FileExportResult] = None  # 合并后的文件，保存后不再重复合并
+
+    @property
+    def storage_names(self) -> List[str]:
+        """
+        断点关联的所有文件
+        """
+
+        storage_names = [part.storage_name for part in self.parts if part.storage_name]
+        if self.result:
+            storage_names.append(self.result.storage_name)
+        return storage_names
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.web.query.resources.doris import CollectorSearchAllStatisticResource
+
+
+def extract_time_series_by_scan(raw: list, name_key: str) -> dict:
+    """
+    按名称和时间逐个扫描原始数据，作为对比基线，单元测试也以此作为期望结果
+    """
+
+    times = sorted({item["time_interval"] for item in raw})
+    names = list(dict.fromkeys(item[name_key] for item in raw))
+    series = []
+    for name in names:
+        data = []
+        for t in times:
+            data.append(
+                next((item["count"] for item in raw if item[name_key] == name and item["time_interval"] == t), 0)
+            )
+        series.append({"name": name, "data": data})
+    return {"series": series, "times": times}
+
+
+class Command(BaseCommand):
+    """对比统计时间序列逐个扫描与建立索引两种提取方式的耗时，使用合成数据，不访问数据库"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--names", type=int, default=5, help="系列数量")
+        parser.add_argument("--hours", type=int, default=24 * 14, help="时间段数量")
+        parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最小耗时")
+
+    def handle(self, *args, **options):
+        raw = [
+            {"event_type": f"type_{name}", "time_interval": hour, "count": name + hour}
+            for hour in range(options["hours"])
+            for name in range(options["names"])
+            # 部分时间段缺失数据
+            if (name + hour) % 7
+        ]
+        statistic_resource = CollectorSearchAllStatisticResource()
+
+        scan_cost = self.measure(lambda: extract_time_series_by_scan(raw, "event_type"), options["repeat"])
+        index_cost = self.measure(
+            lambda: statistic_resource.extract_time_series({"top_5_time_series": raw}), options["repeat"]
+        )
+        self.stdout.write(
+            f"[BenchmarkCollectorStatistic] rows={len(raw)}; scan={scan_cost * 1000:.2f}ms; "
+            f"index={index_cost * 1000:.2f}ms"
+        )
+
+    @classmethod
+    def measure(cls, func, repeat: int) -> float:
+        costs = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            func()
+            costs.append(time.perf_counter() - start)
+        return min(costs)
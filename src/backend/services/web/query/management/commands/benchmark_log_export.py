@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import os
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from services.web.query.constants import LogExportFormat
+from services.web.query.export.data_processor import DataProcessor
+from services.web.query.export.file_exporter import get_file_exporter_class
+from services.web.query.export.model import ExportConfig
+from services.web.query.models import LogExportTask
+
+
+class Command(BaseCommand):
+    """对比各导出格式的写入速度、峰值内存与文件大小，使用合成数据，不访问数据库"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000, help="写入总条数")
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批写入条数")
+        parser.add_argument(
+            "--formats", nargs="+", default=LogExportFormat.values, choices=LogExportFormat.values, help="导出格式"
+        )
+
+    def handle(self, *args, **options):
+        task = LogExportTask(
+            export_config={
+                "field_scope": "specified",
+                "fields": [
+                    {"raw_name": "event_id", "display_name": "ID", "keys": []},
+                    {"raw_name": "username", "display_name": "用户名", "keys": []},
+                    {"raw_name": "event_data", "display_name": "", "keys": ["user", "name"]},
+                ],
+            }
+        )
+        config = ExportConfig(task=task)
+        batch = [
+            {"event_id": f"e{i}", "event_data": {"user": {"name": f"user{i}"}}, "username": "admin"}
+            for i in range(options["batch_size"])
+        ]
+        columns = DataProcessor(config=config).batch_format_columns(batch)
+        batches = options["rows"] // options["batch_size"]
+        rows = batches * options["batch_size"]
+
+        for export_format in options["formats"]:
+            exporter_class = get_file_exporter_class(export_format)
+            tracemalloc.start()
+            start = time.perf_counter()
+            exporter = exporter_class(config=config)
+            try:
+                for _ in range(batches):
+                    exporter.write(columns)
+                file_obj = exporter.save()
+                cost = time.perf_counter() - start
+                file_obj.seek(0, os.SEEK_END)
+                size = file_obj.tell()
+            finally:
+                exporter.close()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # ru_maxrss 为进程级峰值，只增不减，靠后的格式会受前面格式影响
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(
+                f"[BenchmarkLogExport] {export_format}: rows={rows}; rows_per_sec={rows / cost:.0f}; "
+                f"peak_traced={peak / 1024:.0f}KB; max_rss={max_rss}KB; file_size={size / 1024:.0f}KB"
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query', '0004_logexporttask_alert_sented'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logexporttask',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict, verbose_name='断点信息'),
+        ),
+    ]
@@ -19,6 +19,7 @@ from datetime import datetime
 
 from bk_resource import resource
 from blueapps.utils.db import MultiStrSplitCharField
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy
 
@@ -61,12 +62,21 @@ class LogExportTask(SoftDeleteModel):
     total = models.IntegerField(gettext_lazy("总条数"), default=0)
     search_params_url = models.TextField(gettext_lazy("查询参数URL"), blank=True, null=True)
     alert_sented = models.BooleanField(gettext_lazy("是否已发送告警"), default=False)
+    checkpoint = models.JSONField(gettext_lazy("断点信息"), default=dict, blank=True)
 
     class Meta:
         verbose_name = gettext_lazy("日志导出任务")
         verbose_name_plural = verbose_name
         ordering = ["-created_at"]
 
+    @property
+    def can_retry(self) -> bool:
+        """
+        失败后是否还会被调度重试
+        """
+
+        return self.repeat_times <= settings.PROCESS_LOG_EXPORT_TASK_MAX_REPEAT_TIMES
+
     def update_current_records(self, current_records: int):
         """
         更新当前记录数
@@ -75,6 +85,14 @@ class LogExportTask(SoftDeleteModel):
         self.current_records = current_records
         self.save(update_fields=["current_records"])
 
+    def update_checkpoint(self, checkpoint: dict):
+        """
+        更新断点信息
+        """
+
+        self.checkpoint = checkpoint
+        self.save(update_fields=["checkpoint"])
+
     def update_task_success(self, current_records: int, result: dict):
         """
         更新任务状态为成功
@@ -85,7 +103,8 @@ class LogExportTask(SoftDeleteModel):
         self.task_end_time = datetime.now()
         self.current_records = current_records
         self.status = TaskEnum.SUCCESS.value
-        self.save(update_fields=["error_msg", "result", "task_end_time", "current_records", "status"])
+        self.checkpoint = {}
+        self.save(update_fields=["error_msg", "result", "task_end_time", "current_records", "status", "checkpoint"])
 
     def update_task_failed(self, error_msg: str):
         """
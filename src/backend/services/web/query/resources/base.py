@@ -20,7 +20,8 @@ import abc
 from typing import List
 
 from apps.audit.resources import AuditMixinResource
-from apps.meta.models import SensitiveObject
+from apps.meta.models import DataMapIndex, SensitiveObject
+from apps.meta.utils.fields import SNAPSHOT_USER_INFO
 from apps.meta.utils.tools import is_system_admin
 from apps.permission.handlers.actions import ActionEnum
 from apps.permission.handlers.permission import Permission
@@ -28,7 +29,10 @@ from apps.permission.handlers.resource_types import ResourceEnum
 from core.models import get_request_username
 from services.web.query.exceptions import LogExportTaskNoPermission
 from services.web.query.models import LogExportTask
-from services.web.query.utils.formatter import HitsFormatter
+from services.web.query.utils.formatter import (
+    HitsFormatter,
+    build_snapshot_user_info_data_field,
+)
 
 
 class QueryBaseResource(AuditMixinResource, abc.ABC):
@@ -39,13 +43,18 @@ class QueryBaseResource(AuditMixinResource, abc.ABC):
 
 
 class SearchDataParser:
-    def parse_data(self, data: List[dict]) -> list:
+    def parse_data(self, data: List[dict], username: str = None) -> list:
+        """
+        格式化检索结果并处理敏感信息
+        username: 用于判断敏感权限的用户，后台任务中没有请求上下文时需要显式传入
+        """
+
         # 获取敏感字段列表
         private_sensitive_objs = list(SensitiveObject._objects.filter(is_private=True))
         sensitive_objs = list(SensitiveObject.objects.all())
         # 获取用户信息，用于判断敏感权限
         if sensitive_objs:
-            username = get_request_username()
+            username = username or get_request_username()
             if username:
                 permissions = Permission(username).batch_is_allowed(
                     actions=[ActionEnum.ACCESS_AUDIT_SENSITIVE_INFO],
@@ -59,8 +68,24 @@ class SearchDataParser:
                     "_has_permission",
                     permissions.get(so.id, {}).get(ActionEnum.ACCESS_AUDIT_SENSITIVE_INFO.id, False),
                 )
+        # 批量转换快照用户信息，避免逐条查询数据字典
+        self.translate_snapshot_user_info(data)
         # parse
-        return [HitsFormatter(value, [*sensitive_objs, *private_sensitive_objs]).value for value in data]
+        return [
+            HitsFormatter(value, [*sensitive_objs, *private_sensitive_objs], translate_user_info=False).value
+            for value in data
+        ]
+
+    def translate_snapshot_user_info(self, data: List[dict]) -> None:
+        user_infos = []
+        for hit in data:
+            if SNAPSHOT_USER_INFO.field_name not in hit:
+                continue
+            hit[SNAPSHOT_USER_INFO.field_name] = HitsFormatter.loads_json(hit[SNAPSHOT_USER_INFO.field_name])
+            if isinstance(hit[SNAPSHOT_USER_INFO.field_name], dict):
+                user_infos.append(hit[SNAPSHOT_USER_INFO.field_name])
+        fields = list({field: None for user_info in user_infos for field in user_info})
+        DataMapIndex().translate_many(user_infos, fields, build_data_field=build_snapshot_user_info_data_field)
 
 
 class SearchExportTaskBaseResource(QueryBaseResource, abc.ABC):
@@ -17,7 +17,7 @@ to the current version of the project delivered to anyone in the future.
 """
 from abc import ABCMeta, abstractmethod
 from datetime import timedelta
-from typing import Dict, Type
+from typing import Dict, List, Optional, Type
 
 from bk_resource import api, resource
 from bkstorages.backends.bkrepo import BKRepoFile
@@ -82,25 +82,31 @@ class CollectorSearchBaseResource(QueryBaseResource, SearchDataParser, metaclass
     def doris_sql_builder_class(self) -> Type[BaseDorisSQLBuilder]:
         pass
 
-    def get_sql_builder(self, validated_request_data) -> BaseDorisSQLBuilder:
+    @classmethod
+    def get_collector_rt_id(cls, namespace: str) -> str:
         """
-        构建日志查询SQL
+        获取默认日志 RT
         """
 
-        page = validated_request_data["page"]
-        page_size = validated_request_data["page_size"]
-        namespace = validated_request_data["namespace"]
-        conditions = validated_request_data["conditions"]
-        # 获取默认日志 RT
         collector_plugin_id = GlobalMetaConfig.get(
             config_key=COLLECTOR_PLUGIN_ID,
             config_level=ConfigLevelChoices.NAMESPACE.value,
             instance_key=namespace,
         )
         plugin = CollectorPlugin.objects.get(collector_plugin_id=collector_plugin_id)
-        collector_rt_id = plugin.build_result_table_id(settings.DEFAULT_BK_BIZ_ID, plugin.collector_plugin_name_en)
+        return plugin.build_result_table_id(settings.DEFAULT_BK_BIZ_ID, plugin.collector_plugin_name_en)
+
+    def get_sql_builder(self, validated_request_data) -> BaseDorisSQLBuilder:
+        """
+        构建日志查询SQL
+        """
+
+        page = validated_request_data["page"]
+        page_size = validated_request_data["page_size"]
+        namespace = validated_request_data["namespace"]
+        conditions = validated_request_data["conditions"]
         sql_builder = self.doris_sql_builder_class(
-            table=collector_rt_id,
+            table=self.get_collector_rt_id(namespace),
             conditions=conditions,
             sort_list=validated_request_data["sort_list"],
             page=page,
@@ -143,13 +149,8 @@ class CollectorSearchAllResource(CollectorSearchBaseResource):
         # 请求BKBASE数据
         bulk_resp = api.bk_base.query_sync.bulk_request(bulk_req_params)
         data_resp, count_resp = bulk_resp
-        data = self.parse_data(data_resp.get("list", []))
-        # 补充系统信息
-        if bind_system_info:
-            systems = resource.meta.system_list(namespace=validated_request_data["namespace"])
-            system_map = {system["system_id"]: system for system in systems}
-            for value in data:
-                value["system_info"] = system_map.get(value.get("system_id"), dict())
+        system_map = self.load_system_map(validated_request_data["namespace"], bind_system_info)
+        data = self.format_results(data_resp.get("list", []), system_map)
         # 请求总数
         total = count_resp.get("list", [{}])[0].get("count", 0)
         # 响应
@@ -163,6 +164,28 @@ class CollectorSearchAllResource(CollectorSearchBaseResource):
         }
         return resp
 
+    @classmethod
+    def load_system_map(cls, namespace: str, bind_system_info: bool) -> Optional[Dict[str, dict]]:
+        """
+        获取系统信息映射 system_id => system，不需要补充系统信息时返回 None
+        """
+
+        if not bind_system_info:
+            return None
+        systems = resource.meta.system_list(namespace=namespace)
+        return {system["system_id"]: system for system in systems}
+
+    def format_results(self, data: List[dict], system_map: Optional[Dict[str, dict]] = None) -> list:
+        """
+        格式化检索结果并补充系统信息，日志导出与检索共用
+        """
+
+        results = self.parse_data(data)
+        if system_map is not None:
+            for value in results:
+                value["system_info"] = system_map.get(value.get("system_id"), dict())
+        return results
+
 
 class CollectorSearchAllStatisticResource(CollectorSearchBaseResource):
     name = gettext_lazy("日志统计查询(All)")
@@ -173,48 +196,33 @@ class CollectorSearchAllStatisticResource(CollectorSearchBaseResource):
         field.field_name: FieldType(BKDATA_ES_TYPE_MAP[field.field_type]) for field in STANDARD_FIELDS
     }
 
-    def build_sql(self, validated_request_data) -> Dict[str, str]:
+    def build_sql(self, validated_request_data) -> str:
         """
-        构建日志统计查询SQL
+        构建日志统计查询SQL，所有统计指标合并为一条查询
         """
         sql_builder = super().get_sql_builder(validated_request_data)
-        # 调用 build_data_statistic_sql 获取统计信息
         field_name = validated_request_data["field_name"]
         field_type = self.standard_fields_types[field_name]
-        stats_sql = sql_builder.build_statistic_sql(
-            field_name=validated_request_data["field_name"], field_type=field_type
-        )
+        stats_sql = sql_builder.build_single_statistic_sql(field_name=field_name, field_type=field_type)
         logger.info(f"[{self.__class__.__name__}] search stats_sql: {stats_sql}")
         return stats_sql
 
     def perform_request(self, validated_request_data):
         stats_sql = self.build_sql(validated_request_data)
+        field_name = validated_request_data["field_name"]
+        field_type = self.standard_fields_types[field_name]
 
-        # 创建请求参数，每个查询独立请求
-        bulk_req_params = [
-            {
-                "sql": query_sql,
-                "prefer_storage": StorageType.DORIS.value,
-            }
-            for query_sql in stats_sql.values()
-            if query_sql  # 从 stats_sql 字典中获取每个查询 SQL
-        ]
         # 请求 BKBASE 数据
-        bulk_resp = api.bk_base.query_sync.bulk_request(bulk_req_params)
-        results = {}
-        for per_resp, sql_name in zip(bulk_resp, (k for k, v in stats_sql.items() if v)):
-            per_ret = per_resp.get("list", [])
-            if per_ret:
-                results[sql_name] = per_ret
-            else:
-                results[sql_name] = None
-        results.update((k, v) for k, v in stats_sql.items() if not v)
+        resp = api.bk_base.query_sync(sql=stats_sql, prefer_storage=StorageType.DORIS.value)
+        results = self.doris_sql_builder_class.parse_single_statistic_result(
+            resp.get("list", []), field_name=field_name, field_type=field_type
+        )
         results['top_5_echarts_time_series'] = self.extract_time_series(results)
-        field_name = validated_request_data["field_name"]
-        field_type = self.standard_fields_types[field_name]
+        # 所有统计指标由同一条查询得出
+        statistic_keys = self.doris_sql_builder_class.get_statistic_keys(field_type)
         resp = {
             "results": results,
-            "sqls": stats_sql,  # 返回每个统计查询的 SQL
+            "sqls": {key: stats_sql if key in statistic_keys else None for key in results},
             "numeric": field_type not in (FieldType.STRING, FieldType.TEXT),
         }
         return resp
@@ -235,21 +243,19 @@ class CollectorSearchAllStatisticResource(CollectorSearchBaseResource):
             return []
         name_key = name_keys[0]
 
-        # 1. 去重并排序所有 time_interval
-        times = sorted({item["time_interval"] for item in raw})
-
-        # 2. 按首次出现顺序收集所有系列名称
-        names = list(dict.fromkeys(item[name_key] for item in raw))
-
-        # 3. 为每个系列填充 data，缺失时补 0
-        series = []
-        for name in names:
-            data = []
-            for t in times:
-                # 寻找匹配的记录，否则补 0
-                cnt = next((item["count"] for item in raw if item[name_key] == name and item["time_interval"] == t), 0)
-                data.append(cnt)
-            series.append({"name": name, "data": data})
+        # 1. 一次遍历建立 (名称, 时间) => 次数 的索引，同时收集时间和名称（按首次出现顺序）
+        counts = {}
+        times = set()
+        names = {}
+        for item in raw:
+            name, t = item[name_key], item["time_interval"]
+            counts.setdefault((name, t), item["count"])
+            times.add(t)
+            names.setdefault(name, None)
+        times = sorted(times)
+
+        # 2. 为每个系列填充 data，缺失时补 0
+        series = [{"name": name, "data": [counts.get((name, t), 0) for t in times]} for name in names]
 
         return {"series": series, "times": times}
 
@@ -60,6 +60,7 @@ from services.web.query.constants import (
     CollectorSortFieldChoices,
     FieldCategoryEnum,
     LogExportFieldScope,
+    LogExportFormat,
     ResultCodeChoices,
 )
 from services.web.query.models import LogExportTask
@@ -526,6 +527,9 @@ class LogExportConfigSerializer(serializers.Serializer):
         label=gettext_lazy("字段范围"), choices=LogExportFieldScope.choices, help_text=gettext_lazy("指定字段时，字段列表不能为空")
     )
     fields = serializers.ListField(label=gettext_lazy("字段列表"), child=LogExportField(), default=list)
+    export_format = serializers.ChoiceField(
+        label=gettext_lazy("导出格式"), choices=LogExportFormat.choices, default=LogExportFormat.XLSX.value
+    )
 
     def validate(self, attrs):
         attrs = super().validate(attrs)
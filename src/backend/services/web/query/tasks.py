@@ -31,11 +31,11 @@ from services.web.query.constants import TaskEnum
 from services.web.query.export.data_fetcher import DataFetcher
 from services.web.query.export.data_processor import DataProcessor
 from services.web.query.export.export import CollectorLogExporter
-from services.web.query.export.file_exporter import XLSXExporter
+from services.web.query.export.file_exporter import get_file_exporter_class
 from services.web.query.export.file_uploader import BKRepoUploader
-from services.web.query.export.model import ExportConfig
+from services.web.query.export.model import ExportCheckpoint, ExportConfig
 from services.web.query.models import ExportFieldLog, LogExportTask
-from services.web.query.utils.storage import LogExportStorage
+from services.web.query.utils.storage import BKRepoBlockClient, LogExportStorage
 
 
 @periodic_task(run_every=crontab(hour="*/1"))
@@ -111,7 +111,7 @@ def process_one_log_export_task(task_id: int):
             config=config,
             data_fetcher=DataFetcher(config=config),
             data_processor=DataProcessor(config=config),
-            file_exporter=XLSXExporter(config=config),
+            file_exporter_class=get_file_exporter_class(config.export_format),
             file_uploader=BKRepoUploader(config=config),
         ).export()
     except Exception as e:  # pylint: disable=broad-except
@@ -155,6 +155,35 @@ def process_expired_log_task(task_id: int = None):
             logger_celery.error(f"Failed to process expired task {task.id}: {e}")
 
 
+@periodic_task(
+    run_every=crontab(minute=settings.PROCESS_EXPIRED_LOG_TASK_HOUR),
+    queue="log_export",
+    time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT,
+)
+@lock(load_lock_name=lambda **kwargs: "celery:clean_failed_log_export_parts")
+def clean_failed_log_export_parts():
+    """
+    清理不会再被调度的失败任务遗留的分片文件
+    """
+
+    storage = LogExportStorage()
+    end_time = datetime.now() - timedelta(seconds=settings.LOG_EXPORT_TASK_MAX_PERIODIC_TIME)
+    tasks: QuerySet[LogExportTask] = LogExportTask.objects.filter(
+        status=TaskEnum.FAILURE.value, updated_at__lt=end_time
+    ).exclude(checkpoint={})
+    for task in tasks:
+        try:
+            checkpoint = ExportCheckpoint.model_validate(task.checkpoint)
+            for storage_name in checkpoint.storage_names:
+                storage.delete(storage_name)
+            if checkpoint.upload_id:
+                BKRepoBlockClient(storage).abort(name=checkpoint.storage_name, upload_id=checkpoint.upload_id)
+            task.update_checkpoint({})
+            logger_celery.info(f"Cleaned export parts of failed task {task.id}")
+        except Exception as e:  # pylint: disable=broad-except
+            logger_celery.error(f"Failed to clean export parts of task {task.id}: {e}")
+
+
 @periodic_task(
     run_every=crontab(hour=settings.PROCESS_STUCK_LOG_TASK_HOUR),  # 每小时执行一次
     queue="log_export",
@@ -15,12 +15,19 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
-from typing import List, Union
+from typing import List, Optional, Union
 
 from pypika.enums import Order
-from pypika.functions import Avg, Count, Max, Min
-from pypika.queries import QueryBuilder
-from pypika.terms import BasicCriterion, Criterion, EmptyCriterion, Function
+from pypika.functions import Avg, Count, Max, Min, Sum
+from pypika.queries import AliasedQuery, QueryBuilder
+from pypika.terms import (
+    BasicCriterion,
+    Case,
+    Criterion,
+    EmptyCriterion,
+    Function,
+    ValueWrapper,
+)
 
 from apps.meta.utils.fields import STANDARD_FIELDS
 from core.constants import OrderTypeChoices
@@ -136,6 +143,54 @@ class DorisQuerySQLBuilder(BaseDorisSQLBuilder):
         return str(self._build_where(self.query).select(Count("*").as_("count")).limit(1))
 
 
+class DorisKeysetQuerySQLBuilder(DorisQuerySQLBuilder):
+    """
+    游标分页查询，按 (时间字段, 唯一字段) 排序并从上一页的最后一条记录继续，避免深分页的 OFFSET 扫描
+    游标条件包含游标记录本身并多取一条，调用方据此校验游标键没有重复
+    """
+
+    def __init__(
+        self,
+        table: str,
+        conditions: List[dict],
+        page_size: int,
+        time_field: str,
+        id_field: str,
+        order_type: str = OrderTypeChoices.DESC,
+    ):
+        sort_list = [{"order_field": field, "order_type": order_type} for field in (time_field, id_field)]
+        super().__init__(table=table, conditions=conditions, sort_list=sort_list, page=1, page_size=page_size)
+        self.time_field = time_field
+        self.id_field = id_field
+        self.order_type = order_type
+
+    def _build_cursor_condition(self, cursor: tuple) -> Criterion:
+        """
+        (time, id) <= (cursor_time, cursor_id)，升序时取 >=
+        """
+
+        time_value, id_value = cursor
+        time_field = self.get_pypika_field(self.time_field)
+        id_field = self.get_pypika_field(self.id_field)
+        if self.order_type == OrderTypeChoices.DESC:
+            return (time_field < time_value) | ((time_field == time_value) & (id_field <= id_value))
+        return (time_field > time_value) | ((time_field == time_value) & (id_field >= id_value))
+
+    def build_data_sql(self, cursor: Optional[tuple] = None) -> str:
+        """
+        生成游标分页数据查询，cursor 为上一页最后一条记录的 (时间, 唯一ID)
+        带游标时结果以游标记录开头，多取一条以保证去掉游标记录后仍有 page_size 条
+        """
+
+        query = self._build_where(self.query.select("*"))
+        limit = self.page_size
+        if cursor:
+            query = query.where(self._build_cursor_condition(cursor))
+            limit += 1
+        query = self._build_order_by(query)
+        return str(query.limit(limit))
+
+
 class DorisStatisticSQLBuilder(BaseDorisSQLBuilder):
     def _build_base_table(self, table: str) -> BkBaseTable:
         """
@@ -143,75 +198,130 @@ class DorisStatisticSQLBuilder(BaseDorisSQLBuilder):
         """
         return super()._build_base_table(table).as_("event_table")
 
-    def build_statistic_sql(self, field_name: str, field_type: FieldType) -> dict[str, str]:
+    def build_single_statistic_sql(self, field_name: str, field_type: FieldType) -> str:
         """
-        生成统计数据查询，基于字段类型生成相应的统计数据
+        生成单条统计查询，所有统计指标在一次扫描中得出
+        数值字段: 条件聚合一次算出全部指标
+        文本字段: 先按 (字段值, 小时) 聚合为公共 CTE，总数、Top5、时间序列均基于该 CTE 计算
         """
-        query = self._build_where(self.query)
 
-        # 使用 get_pypika_fields 来获取字段对象
+        query = self._build_where(self.query)
         field = self.get_pypika_field(field_name)
 
-        # 1. 总行数
-        total_rows_query = query.select(Count('*').as_("total_rows"))
-
-        # 2. 出现行数（非空）
-        non_empty_rows_query = query.select(Count(field).as_("non_empty_rows"))
+        if field_type not in (FieldType.STRING, FieldType.TEXT):
+            return str(
+                query.select(
+                    Count('*').as_("total_rows"),
+                    Count(field).as_("non_empty_rows"),
+                    (Count(field) / Count('*')).as_("non_empty_ratio"),
+                    Max(field).as_("max_value"),
+                    Min(field).as_("min_value"),
+                    Avg(field).as_("avg_value"),
+                    PercentileApprox(field, 0.5).as_("median_value"),
+                )
+            )
 
-        # 3. 非空行数占比
-        non_empty_ratio_query = query.select((Count(field) / Count('*')).as_("non_empty_ratio"))
+        # 1. 公共 CTE：按字段值和小时聚合，字段为空的行也计入，用于统计总行数
+        time_interval = DateTrunc(FromUnixTime(self.get_pypika_field('dteventtimestamp') / 1000), "HOUR")
+        base_query = query.select(
+            field.as_(field_name), time_interval.as_("time_interval"), Count('*').as_("count")
+        ).groupby(field, time_interval)
+        base = AliasedQuery("field_counts")
+
+        # 2. 总行数、非空行数
+        stats_query = (
+            BKBaseQueryBuilder()
+            .from_(base)
+            .select(
+                Sum(base.count).as_("total_rows"),
+                Sum(Case().when(base.field(field_name).notnull(), base.count).else_(0)).as_("non_empty_rows"),
+            )
+        )
+        stats = AliasedQuery("total_stats")
+
+        # 3. Top 5 值
+        top_query = (
+            BKBaseQueryBuilder()
+            .from_(base)
+            .where(base.field(field_name).notnull())
+            .groupby(base.field(field_name))
+            .select(base.field(field_name), Sum(base.count).as_("count"))
+            .orderby(PypikaField("count"), order=Order.desc)
+            .limit(5)
+        )
+        top = AliasedQuery("top_values")
+
+        # 4. 汇总：每个 Top 值的每个小时一行，没有 Top 值时仍保留一行总数
+        return str(
+            BKBaseQueryBuilder()
+            .with_(base_query, base.name)
+            .with_(stats_query, stats.name)
+            .with_(top_query, top.name)
+            .from_(stats)
+            .left_join(top)
+            .on(ValueWrapper(1) == ValueWrapper(1))
+            .left_join(base)
+            .on(base.field(field_name) == top.field(field_name))
+            .select(
+                stats.total_rows,
+                stats.non_empty_rows,
+                top.field(field_name),
+                top.count.as_("top_count"),
+                base.time_interval,
+                base.count,
+            )
+            .orderby(PypikaField("top_count"), order=Order.desc)
+            .orderby(base.time_interval, order=Order.desc)
+        )
 
-        if field_type in (FieldType.STRING, FieldType.TEXT):  # 文本字段的统计
-            # 4. Top 5（出现次数）值
-            top_5_values_query = (
-                query.select(field, Count(field).as_("count"))
-                .groupby(field)
-                .orderby(PypikaField("count"), order=Order.desc)
-            ).limit(5)
+    COMMON_STATISTIC_KEYS = ["total_rows", "non_empty_rows", "non_empty_ratio"]
+    NUMERIC_STATISTIC_KEYS = ["max_value", "min_value", "avg_value", "median_value"]
+    TEXT_STATISTIC_KEYS = ["top_5_values", "top_5_time_series"]
 
-            time_interval = DateTrunc(FromUnixTime(self.get_pypika_field('dteventtimestamp') / 1000), "HOUR")
+    @classmethod
+    def get_statistic_keys(cls, field_type: FieldType) -> List[str]:
+        """
+        字段类型对应的统计指标
+        """
 
-            # 5. 时间序列统计（按分钟）
-            time_series_query = (
-                query.select(
-                    field,
-                    time_interval.as_("time_interval"),
-                    Count(field).as_("count"),
-                )
-                .join(top_5_values_query)
-                .on(field == getattr(top_5_values_query, field_name))  # 修改连接条件
-                .groupby(time_interval, field)
-                .orderby(time_interval, order=Order.desc)
-            )
+        if field_type in (FieldType.STRING, FieldType.TEXT):
+            return cls.COMMON_STATISTIC_KEYS + cls.TEXT_STATISTIC_KEYS
+        return cls.COMMON_STATISTIC_KEYS + cls.NUMERIC_STATISTIC_KEYS
 
-            # 返回每个查询
-            return {
-                "total_rows": str(total_rows_query),
-                "non_empty_rows": str(non_empty_rows_query),
-                "non_empty_ratio": str(non_empty_ratio_query),
-                "top_5_values": str(top_5_values_query),
-                "top_5_time_series": str(time_series_query),
-                "max_value": None,
-                "min_value": None,
-                "avg_value": None,
-                "median_value": None,
-            }
+    @classmethod
+    def parse_single_statistic_result(cls, rows: List[dict], field_name: str, field_type: FieldType) -> dict:
+        """
+        将单条统计查询的结果按统计指标拆分，每个指标为一组结果行，不适用的指标为 None
+        查询没有返回结果时所有指标均为 None，与按指标分别查询时一致
+        """
 
-        else:
-            max_value_query = query.select(Max(field).as_("max_value"))
-            min_value_query = query.select(Min(field).as_("min_value"))
-            avg_value_query = query.select(Avg(field).as_("avg_value"))
-            median_value_query = query.select(PercentileApprox(field, 0.5).as_("median_value"))
-
-            # 返回每个查询
-            return {
-                "total_rows": str(total_rows_query),
-                "non_empty_rows": str(non_empty_rows_query),
-                "non_empty_ratio": str(non_empty_ratio_query),
-                "max_value": str(max_value_query),
-                "min_value": str(min_value_query),
-                "avg_value": str(avg_value_query),
-                "median_value": str(median_value_query),
-                "top_5_values": None,
-                "top_5_time_series": None,
+        results = dict.fromkeys(cls.COMMON_STATISTIC_KEYS + cls.NUMERIC_STATISTIC_KEYS + cls.TEXT_STATISTIC_KEYS)
+        if not rows:
+            return results
+        first = rows[0]
+        total_rows = first.get("total_rows") or 0
+        non_empty_rows = first.get("non_empty_rows") or 0
+        results.update(
+            {
+                "total_rows": [{"total_rows": total_rows}],
+                "non_empty_rows": [{"non_empty_rows": non_empty_rows}],
+                "non_empty_ratio": [{"non_empty_ratio": non_empty_rows / total_rows if total_rows else None}],
             }
+        )
+
+        if field_type not in (FieldType.STRING, FieldType.TEXT):
+            results.update({key: [{key: first.get(key)}] for key in cls.NUMERIC_STATISTIC_KEYS})
+            return results
+
+        top_values = {}
+        time_series = []
+        for row in rows:
+            value = row.get(field_name)
+            if value is None:
+                continue
+            top_values.setdefault(value, row["top_count"])
+            time_series.append({field_name: value, "time_interval": row["time_interval"], "count": row["count"]})
+        time_series.sort(key=lambda item: item["time_interval"], reverse=True)
+        results["top_5_values"] = [{field_name: value, "count": count} for value, count in top_values.items()] or None
+        results["top_5_time_series"] = time_series or None
+        return results
@@ -16,30 +16,165 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 
-from typing import List
+import json
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List
 
 from bk_resource import api
+from blueapps.utils.base import md5_sum
+from blueapps.utils.logger import logger
 from django.conf import settings
 from elasticsearch import Elasticsearch
 
 from api.bk_monitor.constants import ClusterTypeChoices
+from core.utils.cache import LRUCache
 from services.web.databus.constants import (
     BKLOG_INDEX_SET_SCENARIO_ID,
     DEFAULT_CATEGORY_ID,
 )
 from services.web.databus.models import CollectorPlugin
+from services.web.query.constants import (
+    ES_CLIENT_IDLE_TIMEOUT,
+    ES_CLIENT_POOL_MAXSIZE,
+    ES_CLUSTER_CONFIG_CACHE_SIZE,
+    ES_CLUSTER_CONFIG_CACHE_TTL,
+)
 from services.web.query.exceptions import ClusterNotExist
 
 
+class ElasticClientEntry:
+    """
+    注册表中的客户端及其引用计数
+    """
+
+    def __init__(self, client: Elasticsearch, last_used: float):
+        self.client = client
+        self.last_used = last_used
+        self.refs = 0
+        self.retired = False
+
+
+class ElasticClientRegistry:
+    """
+    进程内 ES 客户端注册表
+    按集群配置哈希复用客户端（及其连接池），集群配置变化时重建，空闲超时的客户端会被关闭
+    客户端按引用计数管理，使用方通过 release 归还；被替换的客户端仍有使用方时延迟到全部归还后再关闭
+    """
+
+    def __init__(self, idle_timeout: float = ES_CLIENT_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        # config_hash => entry
+        self._clients: Dict[str, ElasticClientEntry] = {}
+        # cluster_id => config_hash
+        self._cluster_hashes: Dict[int, str] = {}
+        # id(client) => entry，包含已被替换但尚未归还的客户端
+        self._entries: Dict[int, ElasticClientEntry] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build_config_hash(cls, es_config: dict) -> str:
+        return md5_sum(json.dumps(es_config, sort_keys=True, default=str))
+
+    def get(self, cluster_id: int, es_config: dict, factory: Callable[..., Elasticsearch]) -> Elasticsearch:
+        """
+        获取客户端并增加引用计数，使用完成后需要调用 release 归还
+        """
+        config_hash = self.build_config_hash(es_config)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            # 集群配置变化，废弃旧配置的客户端
+            old_hash = self._cluster_hashes.get(cluster_id)
+            if old_hash and old_hash != config_hash:
+                self._cluster_hashes.pop(cluster_id)
+                if old_hash not in self._cluster_hashes.values():
+                    self._retire(self._clients.pop(old_hash, None))
+            entry = self._clients.get(config_hash)
+            if entry is None:
+                entry = self._clients[config_hash] = ElasticClientEntry(factory(**es_config), now)
+                self._entries[id(entry.client)] = entry
+            entry.last_used = now
+            entry.refs += 1
+            self._cluster_hashes[cluster_id] = config_hash
+            return entry.client
+
+    def release(self, client: Elasticsearch) -> None:
+        """
+        归还客户端，已废弃的客户端在最后一个使用方归还后关闭
+        """
+        with self._lock:
+            entry = self._entries.get(id(client))
+            if entry is None or entry.client is not client:
+                return
+            entry.refs = max(entry.refs - 1, 0)
+            entry.last_used = time.monotonic()
+            if entry.retired and not entry.refs:
+                self._entries.pop(id(client))
+                self._close(client)
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                self._close(entry.client)
+            self._clients.clear()
+            self._cluster_hashes.clear()
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _retire(self, entry: ElasticClientEntry) -> None:
+        if entry is None:
+            return
+        entry.retired = True
+        if not entry.refs:
+            self._entries.pop(id(entry.client), None)
+            self._close(entry.client)
+
+    def _evict_idle(self, now: float) -> None:
+        # 仍在使用中的客户端不会被回收
+        expired = [
+            key for key, entry in self._clients.items() if not entry.refs and now - entry.last_used > self.idle_timeout
+        ]
+        for config_hash in expired:
+            self._retire(self._clients.pop(config_hash))
+        if expired:
+            self._cluster_hashes = {
+                cluster_id: config_hash
+                for cluster_id, config_hash in self._cluster_hashes.items()
+                if config_hash in self._clients
+            }
+
+    @classmethod
+    def _close(cls, client: Elasticsearch) -> None:
+        if client is None:
+            return
+        try:
+            client.transport.close()
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning("[ElasticClientRegistry] Close Client Failed: %s", err)
+
+
 class ElasticHandler:
     """
     ES
     """
 
+    client_registry = ElasticClientRegistry()
+    # 集群配置包含鉴权信息，仅缓存在进程内
+    es_config_cache = LRUCache(max_size=ES_CLUSTER_CONFIG_CACHE_SIZE, ttl=ES_CLUSTER_CONFIG_CACHE_TTL)
+
     def __init__(self, cluster_id: int):
         self.cluster_id = cluster_id
-        es_config = self.get_es_config(cluster_id)
-        self.client = self.get_client(**es_config)
+        es_config = self.get_cached_es_config(cluster_id)
+        self.client = self.client_registry.get(cluster_id, es_config, self.get_client)
+        # 处理器被回收或主动关闭时归还客户端
+        self._release_client = weakref.finalize(self, self.client_registry.release, self.client)
+
+    def close(self) -> None:
+        self._release_client()
 
     @classmethod
     def get_client(
@@ -50,13 +185,31 @@ class ElasticHandler:
         port: int,
         sniffer_timeout: int = 600,
         verify_certs: bool = False,
+        maxsize: int = ES_CLIENT_POOL_MAXSIZE,
         **kwargs,
     ) -> Elasticsearch:
         http_auth = (username, password) if password else None
         return Elasticsearch(
-            hosts, http_auth=http_auth, port=port, sniffer_timeout=sniffer_timeout, verify_certs=verify_certs, **kwargs
+            hosts,
+            http_auth=http_auth,
+            port=port,
+            sniffer_timeout=sniffer_timeout,
+            verify_certs=verify_certs,
+            maxsize=maxsize,
+            **kwargs,
         )
 
+    @classmethod
+    def get_cached_es_config(cls, cluster_id: int) -> dict:
+        """
+        获取集群配置，缓存过期后重新获取，配置变化时注册表会重建客户端
+        """
+        es_config = cls.es_config_cache.get(cluster_id)
+        if es_config is None:
+            es_config = cls.get_es_config(cluster_id)
+            cls.es_config_cache.set(cluster_id, es_config)
+        return es_config
+
     @classmethod
     def get_es_config(cls, cluster_id: int) -> dict:
         result = api.bk_monitor.get_cluster_info(
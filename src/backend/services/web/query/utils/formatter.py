@@ -26,7 +26,7 @@ from apps.meta.constants import (
     SensitiveResourceTypeEnum,
     SensitiveUserData,
 )
-from apps.meta.models import DataMap, SensitiveObject
+from apps.meta.models import DataMapIndex, SensitiveObject
 from apps.meta.utils.fields import (
     EXTEND_DATA,
     INSTANCE_DATA,
@@ -61,12 +61,20 @@ JSON_FORMAT = [
 ]
 
 
+def build_snapshot_user_info_data_field(field: str) -> str:
+    return f"{SNAPSHOT_USER_INFO.field_name}__{field}"
+
+
 class HitsFormatter:
-    """格式化数据输出"""
+    """
+    格式化数据输出
+    translate_user_info 为 False 时，快照用户信息已由调用方通过 DataMapIndex 批量转换
+    """
 
-    def __init__(self, hit: dict, sensitive_objs: List[SensitiveObject]):
+    def __init__(self, hit: dict, sensitive_objs: List[SensitiveObject], translate_user_info: bool = True):
         self.hit = hit
         self.sensitive_objs = sensitive_objs
+        self.translate_user_info = translate_user_info
         self._format_hit()
         self._format_sensitive_data()
 
@@ -116,6 +124,10 @@ class HitsFormatter:
         return str(choices_to_items(UserIdentifyTypeChoices).get(str(value), value))
 
     def _loads_json(self, value: Union[str, dict]) -> Union[str, dict]:
+        return self.loads_json(value)
+
+    @classmethod
+    def loads_json(cls, value: Union[str, dict]) -> Union[str, dict]:
         if not value:
             return {}
         if not isinstance(value, str):
@@ -126,7 +138,11 @@ class HitsFormatter:
             return value
 
     def _format_snapshot_user_info(self, value: dict) -> dict:
-        data = DataMap.trans_data(value, list(value.keys()), build_data_fields=lambda x: f"snapshot_user_info__{x}")
+        data = value
+        if self.translate_user_info:
+            data = DataMapIndex().translate_many(
+                [value], list(value.keys()), build_data_field=build_snapshot_user_info_data_field
+            )[0]
         # 加密用户数据
         for key, val in data.items():
             data[key] = asymmetric_cipher.encrypt(val)
@@ -15,7 +15,14 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
+import posixpath
+from urllib.parse import urljoin
+
+import requests
 from bkstorages.backends.bkrepo import BKRepoStorage
+from bkstorages.exceptions import RequestError
+from bkstorages.utils import get_setting
+from requests.auth import HTTPBasicAuth
 
 
 class LogExportStorage:
@@ -25,3 +32,61 @@ class LogExportStorage:
         if cls._instance is None:
             cls._instance = BKRepoStorage()
         return cls._instance
+
+
+class BKRepoBlockClient:
+    """
+    制品库分块上传
+    分块按序号(从 1 开始)上传，完成后在服务端拼接为一个文件，单个分块可以重复上传
+    bkstorages 未提供分块上传，这里只读取存储的公开配置(root_path 及 client 的仓库、鉴权配置)，独立发起请求
+    """
+
+    def __init__(self, storage: BKRepoStorage):
+        self.storage = storage
+        self.repo = storage.client
+        self.timeout = float(get_setting("BKREPO_TIMEOUT_THRESHOLD") or 30)
+        self._session = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.auth = HTTPBasicAuth(username=self.repo.username, password=self.repo.password)
+        return self._session
+
+    def build_key(self, name: str) -> str:
+        """
+        与存储保存文件时的路径规则一致：root_path 下的相对路径
+        """
+
+        return posixpath.normpath(posixpath.join(self.storage.root_path or "", name.lstrip("/"))).lstrip("/")
+
+    def request(self, method: str, path: str, name: str, headers: dict, data=None) -> dict:
+        key = self.build_key(name)
+        url = urljoin(self.repo.endpoint_url, f"/{path}/{self.repo.project}/{self.repo.bucket}/{key}")
+        resp = self.session.request(method, url, headers=headers, data=data, timeout=self.timeout)
+        try:
+            result = resp.json()
+        except ValueError as e:
+            raise RequestError(str(e), code=str(resp.status_code), response=resp) from e
+        if result.get("code") != 0:
+            raise RequestError(result.get("message"), code=result.get("code"), response=resp)
+        return result.get("data") or {}
+
+    def create(self, name: str) -> str:
+        """
+        创建分块上传，返回 upload_id
+        """
+
+        data = self.request("POST", "generic/block", name, headers={"X-BKREPO-OVERWRITE": "true"})
+        return data["uploadId"]
+
+    def upload(self, name: str, upload_id: str, sequence: int, content) -> None:
+        headers = {"X-BKREPO-UPLOAD-ID": upload_id, "X-BKREPO-SEQUENCE": str(sequence)}
+        self.request("PUT", "generic", name, headers=headers, data=content)
+
+    def complete(self, name: str, upload_id: str) -> None:
+        self.request("PUT", "generic/block", name, headers={"X-BKREPO-UPLOAD-ID": upload_id})
+
+    def abort(self, name: str, upload_id: str) -> None:
+        self.request("DELETE", "generic/block", name, headers={"X-BKREPO-UPLOAD-ID": upload_id})
@@ -24,6 +24,7 @@ from services.web.risk.models import (
     Risk,
     RiskExperience,
     RiskRule,
+    RiskUserRelation,
     TicketNode,
     TicketPermission,
 )
@@ -111,3 +112,10 @@ class TicketPermissionAdmin(admin.ModelAdmin):
     list_display = ["id", "risk_id", "action", "user"]
     search_fields = ["risk_id", "user"]
     list_filter = ["action"]
+
+
+@admin.register(RiskUserRelation)
+class RiskUserRelationAdmin(admin.ModelAdmin):
+    list_display = ["id", "risk_id", "username", "role"]
+    search_fields = ["risk_id", "username"]
+    list_filter = ["role"]
@@ -36,6 +36,15 @@ BKAUDIT_EVENT_RT_INDEX_NAME_FORMAT = "BkAudit_Event_{result_table}"
 BKAUDIT_EVENT_RT_INDEX_SET_ID = "bkaudit_event_index_set_id"
 
 BULK_ADD_EVENT_SIZE = 500
+# 事件批量写入的并发数
+EVENT_BULK_WORKERS = int(os.getenv("BKAPP_EVENT_BULK_WORKERS", 4))
+# 事件批量写入的在途请求最大字节数
+EVENT_BULK_MAX_INFLIGHT_BYTES = int(os.getenv("BKAPP_EVENT_BULK_MAX_INFLIGHT_BYTES", 20 * 1024 * 1024))
+# 事件批量写入失败文档的最大尝试次数及首次重试间隔(秒)，重试间隔按指数退避
+EVENT_BULK_MAX_RETRY = int(os.getenv("BKAPP_EVENT_BULK_MAX_RETRY", 3))
+EVENT_BULK_RETRY_SLEEP = float(os.getenv("BKAPP_EVENT_BULK_RETRY_SLEEP", 1))
+# 事件结果表ID缓存时间(秒)
+EVENT_TABLE_ID_CACHE_TTL = int(os.getenv("BKAPP_EVENT_TABLE_ID_CACHE_TTL", 300))
 
 INDEX_TIME_FORMAT = "%Y%m%d"
 WRITE_INDEX_FORMAT = "write_{date}_{table_id}"
@@ -50,6 +59,8 @@ EVENT_ESQUERY_DELAY_TIME = int(os.getenv("BKAPP_EVENT_ESQUERY_DELAY_TIME", str(1
 
 # 需要考虑数据传输的限制 <5MB 避免网关报错
 RISK_SYNC_BATCH_SIZE = int(os.getenv("BKAPP_RISK_SYNC_BATCH_SIZE", 1000))
+RISK_BULK_CREATE_BATCH_SIZE = int(os.getenv("BKAPP_RISK_BULK_CREATE_BATCH_SIZE", 500))
+RISK_USER_RELATION_BATCH_SIZE = int(os.getenv("BKAPP_RISK_USER_RELATION_BATCH_SIZE", 1000))
 RISK_SYNC_SCROLL = os.getenv("BKAPP_RISK_SYNC_SCROLL", "5m")
 RISK_SYNC_START_TIME_KEY = "RISK_SYNC_START_TIME"
 RISK_ESQUERY_DELAY_TIME = int(os.getenv("BKAPP_RISK_ESQUERY_DELAY_TIME", str(10 * 60)))  # s
@@ -61,6 +72,10 @@ SECURITY_PERSON_KEY = "SECURITY_PERSON"
 RISK_OPERATE_NOTICE_CONFIG_KEY = "RISK_OPERATE_NOTICE_CONFIG"
 DEFAULT_RISK_OPERATE_NOTICE_CONFIG = [{"msg_type": "mail"}]
 
+# 风险处理规则编译缓存版本，规则保存时更新
+RISK_RULE_COMPILER_VERSION_KEY = "risk_rule_compiler_version"
+RISK_RULE_COMPILER_CACHE_SIZE = int(os.getenv("BKAPP_RISK_RULE_COMPILER_CACHE_SIZE", 1024))
+
 # 风险列表有些字段长度过长来给它一个限制长度
 LIST_RISK_FIELD_MAX_LENGTH = int(os.getenv("BKAPP_LIST_RISK_FIELD_MAX_LENGTH", 1024))
 
@@ -634,3 +649,19 @@ class RiskExportField(TextChoices):
 EVENT_EXPORT_FIELD_PREFIX = "event."
 # 风险导出文件名模板
 RISK_EXPORT_FILE_NAME_TMP = gettext_lazy("审计风险_{risk_view_type}_{datetime}.xlsx")
+# 风险导出时每条风险导出的关联事件数
+RISK_EXPORT_EVENTS_PER_RISK = 10
+# 风险导出时每批检索事件的风险数
+RISK_EXPORT_CHUNK_SIZE = int(os.getenv("BKAPP_RISK_EXPORT_CHUNK_SIZE", 200))
+# 同步导出的最大风险数，超过时需要使用异步导出任务
+RISK_EXPORT_SYNC_MAX_COUNT = 300
+# 异步导出任务的最大风险数
+RISK_EXPORT_TASK_MAX_COUNT = int(os.getenv("BKAPP_RISK_EXPORT_TASK_MAX_COUNT", 10000))
+# 异步导出文件存储路径
+RISK_EXPORT_FILE_PATH_FORMAT = "risk_export/{file_name}"
+# 异步导出文件保留天数，超过后删除文件并将任务标记为过期
+RISK_EXPORT_TASK_EXPIRE_DAYS = int(os.getenv("BKAPP_RISK_EXPORT_TASK_EXPIRE_DAYS", 7))
+# 异步导出任务记录保留天数，超过后删除已过期或失败的任务
+RISK_EXPORT_TASK_RETENTION_DAYS = int(os.getenv("BKAPP_RISK_EXPORT_TASK_RETENTION_DAYS", 90))
+# 执行中的导出任务超过该时间(秒)未更新进度时视为卡住并标记失败
+RISK_EXPORT_TASK_STUCK_TIMEOUT = int(os.getenv("BKAPP_RISK_EXPORT_TASK_STUCK_TIMEOUT", 60 * 60))
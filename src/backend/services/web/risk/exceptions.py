@@ -33,3 +33,18 @@ class ExportRiskNoPermission(RiskException):
     def __init__(self, risk_ids: str, *args, **kwargs):
         self.MESSAGE = self.MESSAGE.format(risk_ids=risk_ids)
         super().__init__(*args, **kwargs)
+
+
+class RiskExportTaskNoPermission(RiskException):
+    MESSAGE = gettext_lazy("您没有权限访问该风险导出任务")
+    STATUS_CODE = 403
+    ERROR_CODE = "002"
+
+
+class DownloadRiskExportTaskError(RiskException):
+    MESSAGE = gettext_lazy("风险导出任务下载失败: {msg}")
+    ERROR_CODE = "003"
+
+    def __init__(self, msg: str, *args, **kwargs):
+        self.MESSAGE = self.MESSAGE.format(msg=msg)
+        super().__init__(*args, **kwargs)
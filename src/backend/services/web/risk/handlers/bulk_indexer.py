@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from blueapps.utils.logger import logger
+from elasticsearch import Elasticsearch
+
+from services.web.risk.constants import (
+    BULK_ADD_EVENT_SIZE,
+    EVENT_BULK_MAX_INFLIGHT_BYTES,
+    EVENT_BULK_MAX_RETRY,
+    EVENT_BULK_RETRY_SLEEP,
+    EVENT_BULK_WORKERS,
+)
+
+# 可重试的写入状态码
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# 文档: (文档ID, 文档内容)
+Document = Tuple[str, dict]
+
+
+@dataclass
+class BulkChunk:
+    index: str
+    # 文档ID => 序列化后的 action 与文档
+    lines: Dict[str, str]
+    size: int = 0
+    attempts: int = 0
+
+    @property
+    def body(self) -> str:
+        return "".join(self.lines.values())
+
+
+@dataclass
+class BulkIndexResult:
+    success: int = 0
+    # (索引, 文档ID, 错误)
+    errors: List[Tuple[str, str, dict]] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def has_error(self) -> bool:
+        return bool(self.errors)
+
+
+class BulkIndexer:
+    """
+    ES 批量写入
+    按索引分块并发写入，限制在途请求的总字节数；解析每条文档的写入结果，仅对可重试的失败文档退避重试
+    """
+
+    def __init__(
+        self,
+        client: Elasticsearch,
+        chunk_size: int = BULK_ADD_EVENT_SIZE,
+        max_workers: int = EVENT_BULK_WORKERS,
+        max_inflight_bytes: int = EVENT_BULK_MAX_INFLIGHT_BYTES,
+        max_retry: int = EVENT_BULK_MAX_RETRY,
+        retry_sleep: float = EVENT_BULK_RETRY_SLEEP,
+    ):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_retry = max_retry
+        self.retry_sleep = retry_sleep
+        self.serializer = client.transport.serializer
+        self._inflight_bytes = 0
+        self._inflight = threading.Condition()
+
+    def build_chunks(self, documents: Dict[str, List[Document]]) -> List[BulkChunk]:
+        """
+        按索引与分块大小构造请求
+        """
+
+        chunks = []
+        for index, docs in documents.items():
+            for i in range(0, len(docs), self.chunk_size):
+                lines = {
+                    doc_id: f"{self.serializer.dumps({'index': {'_id': doc_id}})}\n{self.serializer.dumps(doc)}\n"
+                    for doc_id, doc in docs[i : i + self.chunk_size]
+                }
+                chunks.append(BulkChunk(index=index, lines=lines, size=sum(len(line) for line in lines.values())))
+        return chunks
+
+    def index(self, documents: Dict[str, List[Document]]) -> BulkIndexResult:
+        """
+        写入文档
+        :param documents: 索引 => 文档列表
+        """
+
+        result = BulkIndexResult()
+        chunks = self.build_chunks(documents)
+        if not chunks:
+            return result
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for chunk in chunks:
+                self._acquire(chunk.size)
+                future = executor.submit(self._send_chunk, chunk, result)
+                future.add_done_callback(lambda _, size=chunk.size: self._release(size))
+        return result
+
+    def _acquire(self, size: int) -> None:
+        """
+        等待在途字节数足够，单个请求超出上限时在无在途请求时发送
+        """
+
+        with self._inflight:
+            self._inflight.wait_for(
+                lambda: self._inflight_bytes == 0 or self._inflight_bytes + size <= self.max_inflight_bytes
+            )
+            self._inflight_bytes += size
+
+    def _release(self, size: int) -> None:
+        with self._inflight:
+            self._inflight_bytes -= size
+            self._inflight.notify_all()
+
+    def _send_chunk(self, chunk: BulkChunk, result: BulkIndexResult) -> None:
+        while chunk.lines:
+            chunk.attempts += 1
+            try:
+                resp = self.client.bulk(index=chunk.index, body=chunk.body)
+            except Exception as err:  # NOCC:broad-except(需要处理所有异常类型)
+                # 整个请求失败时重试全部文档
+                failed = {doc_id: {"type": err.__class__.__name__, "reason": str(err)} for doc_id in chunk.lines}
+                retryable = set(failed)
+            else:
+                failed, retryable = self._parse_response(resp)
+            with result.lock:
+                result.success += len(chunk.lines) - len(failed)
+            if not failed:
+                return
+            give_up = chunk.attempts >= self.max_retry
+            for doc_id, error in failed.items():
+                if give_up or doc_id not in retryable:
+                    with result.lock:
+                        result.errors.append((chunk.index, doc_id, error))
+            chunk.lines = {} if give_up else {doc_id: chunk.lines[doc_id] for doc_id in retryable}
+            if chunk.lines:
+                logger.warning(
+                    "[BulkIndexer] Retry Index => %s; Docs => %d; Attempts => %d",
+                    chunk.index,
+                    len(chunk.lines),
+                    chunk.attempts,
+                )
+                time.sleep(self.retry_sleep * 2 ** (chunk.attempts - 1))
+
+    @classmethod
+    def _parse_response(cls, resp: dict) -> Tuple[Dict[str, dict], set]:
+        """
+        解析每条文档的写入结果
+        return: 失败文档 => 错误, 可重试的文档ID
+        """
+
+        failed = {}
+        retryable = set()
+        if not resp.get("errors"):
+            return failed, retryable
+        for item in resp.get("items", []):
+            for _, item_result in item.items():
+                status = item_result.get("status", 0)
+                if "error" not in item_result and status < 300:
+                    continue
+                doc_id = item_result.get("_id")
+                failed[doc_id] = item_result.get("error") or {"status": status}
+                if status in RETRYABLE_STATUS:
+                    retryable.add(doc_id)
+        return failed, retryable
@@ -18,6 +18,8 @@ to the current version of the project delivered to anyone in the future.
 
 import datetime
 import os
+from collections import defaultdict
+from typing import Dict, List
 
 from bk_resource import api, resource
 from bk_resource.utils.common_utils import uniqid
@@ -30,6 +32,7 @@ from django.utils.translation import gettext
 from apps.exceptions import MetaConfigNotExistException
 from apps.meta.constants import ConfigLevelChoices, EtlConfigEnum
 from apps.meta.models import GlobalMetaConfig
+from core.utils.cache import LRUCache
 from core.utils.retry import FuncRunner
 from services.web.databus.constants import (
     DEFAULT_CATEGORY_ID,
@@ -48,13 +51,18 @@ from services.web.query.utils.formatter import HitsFormatter
 from services.web.risk.constants import (
     BKAUDIT_EVENT_RT_INDEX_NAME_FORMAT,
     BKAUDIT_EVENT_RT_INDEX_SET_ID,
-    BULK_ADD_EVENT_SIZE,
     EVENT_ES_CLUSTER_ID_KEY,
+    EVENT_TABLE_ID_CACHE_TTL,
     INDEX_TIME_FORMAT,
     RISK_SYNC_SCROLL,
     WRITE_INDEX_FORMAT,
     EventMappingFields,
 )
+from services.web.risk.handlers.bulk_indexer import (
+    BulkIndexer,
+    BulkIndexResult,
+    Document,
+)
 
 
 class EventHandler(ElasticHandler):
@@ -62,6 +70,9 @@ class EventHandler(ElasticHandler):
     Event
     """
 
+    # 事件结果表ID仅在创建采集插件时变化
+    table_id_cache = LRUCache(max_size=1, ttl=EVENT_TABLE_ID_CACHE_TTL)
+
     def __init__(self):
         try:
             cluster_id = GlobalMetaConfig.get(EVENT_ES_CLUSTER_ID_KEY)
@@ -109,6 +120,7 @@ class EventHandler(ElasticHandler):
         # 创建索引集
         self.create_index_set(collector_plugin, BKAUDIT_EVENT_RT_INDEX_NAME_FORMAT)
         GlobalMetaConfig.set(config_key=BKAUDIT_EVENT_RT_INDEX_SET_ID, config_value=collector_plugin.index_set_id)
+        self.table_id_cache.clear()
 
     @transaction.atomic()
     def update_result_table(self, collector_plugin: CollectorPlugin) -> None:
@@ -175,17 +187,19 @@ class EventHandler(ElasticHandler):
             params["collector_plugin_id"] = collector_plugin.collector_plugin_id
         return params
 
-    def add_event(self, data: list) -> None:
+    def add_event(self, data: list) -> BulkIndexResult:
         if not data:
             logger.warning("[CreateEvent] No Data")
-            return
-        index = self._get_write_index(data[0][EventMappingFields.EVENT_TIME.field_name])
-        for i in range(0, len(data), BULK_ADD_EVENT_SIZE):
-            request_data = self._build_request_data(data[i : i + BULK_ADD_EVENT_SIZE])
-            resp = self.client.bulk(index=index, body=request_data)
-            logger.info(
-                "[BulkAddEventResult] Index => %s; HasError => %s; Resp => %s", index, self._check_response(resp), resp
-            )
+            return BulkIndexResult()
+        documents = self._build_documents(data)
+        result = BulkIndexer(self.client).index(documents)
+        logger.info(
+            "[BulkAddEventResult] Indices => %s; Success => %d; Errors => %s",
+            {index: len(docs) for index, docs in documents.items()},
+            result.success,
+            result.errors,
+        )
+        return result
 
     def _get_write_index(self, timestamp: int) -> str:
         if not timestamp:
@@ -203,33 +217,33 @@ class EventHandler(ElasticHandler):
 
     @classmethod
     def get_table_id(cls) -> str:
-        collector_plugin = CollectorPlugin.objects.filter(plugin_scene=PluginSceneChoices.EVENT.value).first()
-        return CollectorPlugin.make_table_id(collector_plugin.bkdata_biz_id, collector_plugin.collector_plugin_name_en)
+        table_id = cls.table_id_cache.get(PluginSceneChoices.EVENT.value)
+        if table_id is None:
+            collector_plugin = CollectorPlugin.objects.filter(plugin_scene=PluginSceneChoices.EVENT.value).first()
+            table_id = CollectorPlugin.make_table_id(
+                collector_plugin.bkdata_biz_id, collector_plugin.collector_plugin_name_en
+            )
+            cls.table_id_cache.set(PluginSceneChoices.EVENT.value, table_id)
+        return table_id
 
     @classmethod
     def get_search_index_set_id(cls) -> int:
         return GlobalMetaConfig.get(config_key=BKAUDIT_EVENT_RT_INDEX_SET_ID)
 
-    def _build_request_data(self, data: list) -> list:
+    def _build_documents(self, data: list) -> Dict[str, List[Document]]:
+        """
+        按事件时间将事件分配到对应日期的索引
+        """
+
         now = int(datetime.datetime.now().timestamp() * 1000)
-        request_data = []
+        documents = defaultdict(list)
         for _data in data:
             event_id = _data["event_id"]
             event_time = _data[EventMappingFields.EVENT_TIME.field_name] or now
-            request_data.extend(
-                [
-                    {"index": {"_id": event_id}},
-                    {**_data, "event_id": event_id, "event_time": event_time, "dtEventTimeStamp": event_time},
-                ]
+            documents[self._get_write_index(event_time)].append(
+                (event_id, {**_data, "event_id": event_id, "event_time": event_time, "dtEventTimeStamp": event_time})
             )
-        return request_data
-
-    def _check_response(self, resp: dict) -> bool:
-        for data in resp.get("items", {}):
-            for _, result in data.items():
-                if result.get("_shards", {}).get("failed", 1) > 0:
-                    return True
-        return False
+        return documents
 
     @classmethod
     def search_all_event(cls, namespace: str, start_time: str, end_time: str, page: int, page_size: int, **kwargs):
@@ -19,12 +19,16 @@ to the current version of the project delivered to anyone in the future.
 import datetime
 import json
 import math
+import operator
 import re
-from typing import List, Optional, Set, Tuple, Union
+from collections import defaultdict
+from functools import reduce
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 from bk_resource import resource
 from blueapps.utils.logger import logger
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q, QuerySet
 from django.utils import timezone
 from django.utils.translation import gettext
@@ -39,12 +43,18 @@ from core.render import Jinja2Renderer, VariableUndefined
 from services.web.risk.constants import (
     EVENT_DATA_SORT_FIELD,
     EVENT_TYPE_SPLIT_REGEX,
+    RISK_BULK_CREATE_BATCH_SIZE,
     RISK_SYNC_BATCH_SIZE,
     RISK_SYNC_START_TIME_KEY,
     RiskStatus,
 )
 from services.web.risk.handlers import EventHandler
-from services.web.risk.models import Risk
+from services.web.risk.models import (
+    Risk,
+    RiskUserRelation,
+    RiskUserRole,
+    generate_risk_ids,
+)
 from services.web.risk.parser import RiskNoticeParser
 from services.web.risk.serializers import CreateRiskSerializer
 from services.web.strategy_v2.constants import StrategyStatusChoices
@@ -65,30 +75,64 @@ class RiskHandler:
             Strategy.objects.exclude(status=StrategyStatusChoices.DISABLED.value).values_list("strategy_id", flat=True)
         )
 
-    def generate_risk(self, event: dict, eligible_strategy_ids: Set[str]):
+    def generate_risk(self, event: dict, eligible_strategy_ids: Set[str], raise_exception: bool = False):
         """
         生成风险
         :param event: 事件
         :param eligible_strategy_ids: 可用策略ID集合
+        :param raise_exception: 风险写入失败时是否抛出异常，由调用方重试；写入成功后的通知与单据处理失败不抛出
         """
         try:
             is_create, risk = self.create_risk(event, eligible_strategy_ids)
-            if is_create:
-                self.send_risk_notice(risk)
+        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+            if raise_exception:
+                raise
+            self.send_create_risk_error(event, err)
+            return
+        if not is_create:
+            return
+        try:
+            self.process_created_risk(risk)
+        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+            self.send_create_risk_error(event, err)
+
+    def generate_risks_bulk(self, events: List[dict], eligible_strategy_ids: Set[str]) -> List[Risk]:
+        """
+        批量生成风险
+        风险在同一事务内批量写入，写入失败时抛出异常，由调用方决定是否重试；
+        写入成功后再逐个发送通知并处理单据
+        :param events: 事件列表
+        :param eligible_strategy_ids: 可用策略ID集合
+        """
+        risks = self.bulk_create_risks(events, eligible_strategy_ids)
+        for risk in risks:
+            try:
+                self.process_created_risk(risk)
+            except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+                self.send_create_risk_error({"strategy_id": risk.strategy_id, "raw_event_id": risk.raw_event_id}, err)
+        return risks
+
+    def process_created_risk(self, risk: Risk) -> None:
+        """
+        新建风险后发送通知并处理单据
+        """
+        self.send_risk_notice(risk)
 
-                from services.web.risk.tasks import process_risk_ticket
+        from services.web.risk.tasks import process_risk_ticket
 
-                process_risk_ticket(risk_id=risk.risk_id)
-        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
-            logger.exception("[CreateRiskFailed] Event: %s; Error: %s", json.dumps(event), err)
-            ErrorMsgHandler(
-                title=gettext("Create Risk Failed"),
-                content=gettext("Strategy ID: %s; Raw Event ID:\t%s")
-                % (
-                    event.get("strategy_id"),
-                    event.get("raw_event_id"),
-                ),
-            ).send()
+        process_risk_ticket(risk_id=risk.risk_id)
+
+    @classmethod
+    def send_create_risk_error(cls, event: dict, err: Exception) -> None:
+        logger.exception("[CreateRiskFailed] Event: %s; Error: %s", json.dumps(event), err)
+        ErrorMsgHandler(
+            title=gettext("Create Risk Failed"),
+            content=gettext("Strategy ID: %s; Raw Event ID:\t%s")
+            % (
+                event.get("strategy_id"),
+                event.get("raw_event_id"),
+            ),
+        ).send()
 
     def generate_risk_from_event(self, start_time: datetime.datetime, end_time: datetime.datetime) -> None:
         """
@@ -122,13 +166,15 @@ class RiskHandler:
         return data
 
     @classmethod
-    def render_risk_title(cls, create_params: dict) -> Optional[str]:
+    def render_risk_title(cls, create_params: dict, strategy: Optional[Strategy] = None) -> Optional[str]:
         """
         生成风险标题
         自动处理变量中的 list 类型，渲染为逗号拼接的字符串
+        :param strategy: 已加载的策略，为空时按 strategy_id 查询
         """
         create_params = create_params.copy()
-        strategy: Strategy = Strategy.objects.filter(strategy_id=create_params["strategy_id"]).first()
+        if strategy is None:
+            strategy = Strategy.objects.filter(strategy_id=create_params["strategy_id"]).first()
         if not strategy or not strategy.risk_title:
             return None
 
@@ -156,7 +202,7 @@ class RiskHandler:
             )
             return strategy.risk_title
 
-    def gen_risk_create_params(self, event: dict) -> dict:
+    def gen_risk_create_params(self, event: dict, strategy: Optional[Strategy] = None) -> dict:
         create_params = {
             "event_content": event.get("event_content"),
             "raw_event_id": event["raw_event_id"],
@@ -169,29 +215,48 @@ class RiskHandler:
             "event_source": event.get("event_source"),
             "operator": self.parse_operator(event.get("operator")),
         }
-        create_params["title"] = self.render_risk_title(create_params)
+        create_params["title"] = self.render_risk_title(create_params, strategy=strategy)
         return create_params
 
-    def create_risk(self, event: dict, eligible_strategy_ids: Set[str]) -> Tuple[bool, Optional[Risk]]:
+    def validate_event(self, event: dict, eligible_strategy_ids: Set[str]) -> Optional[dict]:
         """
-        创建或更新风险
+        校验事件，校验失败或关联策略已停用时返回 None
         """
 
         # 校验数据
         serializer = CreateRiskSerializer(data=event)
         if not serializer.is_valid():
             logger.error("[CreateRiskFailed] Event Invalid: %s", json.dumps(event))
-            return False, None
+            return None
         event = serializer.validated_data
 
         # 若关联策略已停用，则不生成风险
-        event_strategy_id = event["strategy_id"]
-        if event_strategy_id not in eligible_strategy_ids:
+        if event["strategy_id"] not in eligible_strategy_ids:
             logger.info(
                 "[SkipCreateRisk] Strategy not found. strategy_id=%s, raw_event_id=%s",
                 event["strategy_id"],
                 event.get("raw_event_id"),
             )
+            return None
+        return event
+
+    @classmethod
+    def is_risk_matched(cls, risk: Risk, event_time: int) -> bool:
+        """
+        判断事件是否应当收敛到已有风险
+        不为关单状态或事件时间小于最后发现时间
+        """
+        if risk.status != RiskStatus.CLOSED:
+            return True
+        return bool(risk.event_end_time) and int(risk.event_end_time.timestamp()) >= int(event_time / 1000)
+
+    def create_risk(self, event: dict, eligible_strategy_ids: Set[str]) -> Tuple[bool, Optional[Risk]]:
+        """
+        创建或更新风险
+        """
+
+        event = self.validate_event(event, eligible_strategy_ids)
+        if event is None:
             return False, None
 
         # 检查是否有已存在的
@@ -227,9 +292,96 @@ class RiskHandler:
 
         # 不存在则创建
         create_params = self.gen_risk_create_params(event)
-        risk: Risk = Risk.objects.create(**create_params)
+        with transaction.atomic():
+            risk: Risk = Risk.objects.create(**create_params)
+            risk.sync_user_relations(roles=[RiskUserRole.OPERATOR])
         return True, risk
 
+    def bulk_create_risks(self, events: List[dict], eligible_strategy_ids: Set[str]) -> List[Risk]:
+        """
+        批量创建或更新风险，返回新建的风险
+        收敛规则与 create_risk 一致，按事件顺序依次判断，同一批次内的重复事件收敛到本批次新建的风险
+        """
+
+        valid_events = [
+            event
+            for event in (self.validate_event(event, eligible_strategy_ids) for event in events)
+            if event is not None
+        ]
+        if not valid_events:
+            return []
+
+        # 按策略分组，一次性加载策略与可能收敛的已有风险
+        raw_event_ids_by_strategy: Dict[int, Set[str]] = defaultdict(set)
+        for event in valid_events:
+            raw_event_ids_by_strategy[event["strategy_id"]].add(event["raw_event_id"])
+        strategies = {
+            strategy.strategy_id: strategy
+            for strategy in Strategy.objects.filter(strategy_id__in=raw_event_ids_by_strategy.keys())
+        }
+        risks_by_key: Dict[Tuple[int, str], List[Risk]] = defaultdict(list)
+        existing_risks = (
+            Risk.objects.filter(
+                reduce(
+                    operator.or_,
+                    [
+                        Q(strategy_id=strategy_id, raw_event_id__in=raw_event_ids)
+                        for strategy_id, raw_event_ids in raw_event_ids_by_strategy.items()
+                    ],
+                )
+            )
+            # bulk_update 会读取创建人和创建时间，需要一并加载，避免逐条查询
+            .only(
+                "risk_id",
+                "strategy_id",
+                "raw_event_id",
+                "status",
+                "event_time",
+                "event_end_time",
+                "created_at",
+                "created_by",
+            )
+            .order_by("-event_time")
+        )
+        for risk in existing_risks:
+            risks_by_key[(risk.strategy_id, risk.raw_event_id)].append(risk)
+
+        to_create: List[Risk] = []
+        to_update: Dict[str, Risk] = {}
+        for event in valid_events:
+            key = (event["strategy_id"], event["raw_event_id"])
+            risk = next((r for r in risks_by_key[key] if self.is_risk_matched(r, event["event_time"])), None)
+
+            # 存在则更新结束时间
+            if risk:
+                last_end_time = int(event["event_time"] / 1000)
+                if int(risk.event_end_time.timestamp()) < last_end_time:
+                    risk.event_end_time = datetime.datetime.fromtimestamp(last_end_time)
+                    if not risk._state.adding:
+                        to_update[risk.risk_id] = risk
+                continue
+
+            # 不存在则创建，risk_id 在遍历结束后统一分配
+            risk = Risk(
+                risk_id=None, **self.gen_risk_create_params(event, strategy=strategies.get(event["strategy_id"]))
+            )
+            to_create.append(risk)
+            risks_by_key[key].insert(0, risk)
+
+        for risk, risk_id in zip(to_create, generate_risk_ids(len(to_create))):
+            risk.risk_id = risk_id
+
+        with transaction.atomic():
+            if to_create:
+                Risk.objects.bulk_create(to_create, batch_size=RISK_BULK_CREATE_BATCH_SIZE)
+                RiskUserRelation.sync(to_create, roles=[RiskUserRole.OPERATOR])
+            if to_update:
+                Risk.objects.bulk_update(
+                    to_update.values(), fields=["event_end_time"], batch_size=RISK_BULK_CREATE_BATCH_SIZE
+                )
+        logger.info("[BulkCreateRisk] Events %d; Created %d; Updated %d", len(events), len(to_create), len(to_update))
+        return to_create
+
     def parse_operator(self, operator: str) -> List[str]:
         operator = operator or ""
         return [j.strip() for i in operator.split(",") for j in i.split(";") if j]
@@ -259,6 +411,7 @@ class RiskHandler:
         # 更新风险的通知人员名单
         risk.notice_users = RiskNoticeParser(risk=risk).parse_groups(notice_groups)
         risk.save(update_fields=["notice_users"])
+        risk.sync_user_relations(roles=[RiskUserRole.NOTICE_USER])
 
     @classmethod
     def send_notice(cls, risk: Risk, notice_groups: Union[QuerySet, List[NoticeGroup]], is_todo: bool) -> None:
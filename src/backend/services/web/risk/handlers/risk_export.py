@@ -15,10 +15,35 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
-from typing import Any, Dict, List
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
+from bk_resource import resource
+from django.conf import settings
+from django.core.files import File
+from django.db.models import QuerySet
+from rest_framework.settings import api_settings
+
+from apps.meta.models import GlobalMetaConfig
 from core.exporter.constants import ExportField
 from core.exporter.export import BaseXlsxFileExporter
+from core.utils.data import data2string
+from core.utils.time import mstimestamp_to_date_string
+from services.web.query.resources.base import SearchDataParser
+from services.web.risk.constants import (
+    EVENT_ES_CLUSTER_ID_KEY,
+    EVENT_EXPORT_FIELD_PREFIX,
+    RISK_EXPORT_CHUNK_SIZE,
+    RISK_EXPORT_EVENTS_PER_RISK,
+    EventMappingFields,
+    RiskExportField,
+    RiskStatus,
+)
+from services.web.risk.handlers.event import EventHandler
+from services.web.risk.models import Risk
+from services.web.strategy_v2.constants import RiskLevel
+from services.web.strategy_v2.models import Strategy
 
 
 class MultiSheetRiskExporterXlsx(BaseXlsxFileExporter):
@@ -34,6 +59,8 @@ class MultiSheetRiskExporterXlsx(BaseXlsxFileExporter):
         super().__init__(*args, **kwargs)
         self.header_fmt = self.workbook.add_format(self.header_format)
         self.text_fmt = self.workbook.add_format({'num_format': '@'})
+        # sheet_name => (worksheet, 表头, 下一行行号)
+        self.sheets: Dict[str, Tuple[Any, List[ExportField], int]] = {}
 
     def write(self, sheets_data: Dict[str, List[Dict[str, Any]]], sheets_headers: Dict[str, List[ExportField]]):
         """
@@ -42,11 +69,17 @@ class MultiSheetRiskExporterXlsx(BaseXlsxFileExporter):
         :param sheets_headers: 每个 sheet 的表头. 格式: {"sheet_name": [ExportField_1, ExportField_2]}
         """
 
-        sheet_names = sorted(sheets_headers.keys())
+        self.add_sheets(sheets_headers)
+        for sheet_name, data_rows in sheets_data.items():
+            self.write_rows(sheet_name, data_rows)
+
+    def add_sheets(self, sheets_headers: Dict[str, List[ExportField]]):
+        """
+        按名称顺序创建 Sheet 并写入表头
+        """
 
-        for sheet_name in sheet_names:
+        for sheet_name in sorted(sheets_headers.keys()):
             headers = sheets_headers[sheet_name]
-            data_rows = sheets_data.get(sheet_name, [])
 
             # Excel 的 sheet 名称有长度限制 (31个字符)，并且不能包含某些特殊字符
             safe_sheet_name = (
@@ -68,12 +101,229 @@ class MultiSheetRiskExporterXlsx(BaseXlsxFileExporter):
             # 设置列宽
             worksheet.set_column(0, len(display_headers) - 1, 20)
 
-            # 写入数据
-            if not data_rows:
-                continue
+            self.sheets[sheet_name] = (worksheet, headers, 1)
+
+    def write_rows(self, sheet_name: str, data_rows: Iterable[Dict[str, Any]]):
+        """
+        向 Sheet 追加数据行
+        constant_memory 模式下每个 Sheet 只能按行号递增写入，写入后的行不再保留在内存中
+        """
+
+        worksheet, headers, row_num = self.sheets[sheet_name]
+        raw_field_names = [field.raw_name for field in headers]
+        for row_data in data_rows:
+            # 按表头顺序提取数据
+            row_values = [str(row_data.get(raw_name, "")) for raw_name in raw_field_names]
+            worksheet.write_row(row_num, 0, row_values, self.text_fmt)
+            row_num += 1
+        self.sheets[sheet_name] = (worksheet, headers, row_num)
+
+
+class RiskEventFetcher(SearchDataParser):
+    """
+    批量获取风险关联事件
+    一批风险只发起一次检索，按 strategy_id、raw_event_id 聚合并取每组最新的事件，在本地分配给对应风险
+    """
+
+    time_field = "dtEventTimeStamp"
+
+    def __init__(self, username: str = None, size: int = RISK_EXPORT_EVENTS_PER_RISK):
+        self.username = username
+        self.size = size
+
+    @classmethod
+    def build_event_key(cls, strategy_id: Any, raw_event_id: Any) -> Tuple[str, str]:
+        return str(strategy_id), str(raw_event_id)
+
+    def build_query(self, risks: List[Risk]) -> dict:
+        strategy_ids = sorted({str(risk.strategy_id) for risk in risks})
+        raw_event_ids = sorted({risk.raw_event_id for risk in risks})
+        start_time = min(risk.event_time for risk in risks)
+        return {
+            "namespace": settings.DEFAULT_NAMESPACE,
+            "start_time": mstimestamp_to_date_string(int(start_time.timestamp() * 1000)),
+            "end_time": mstimestamp_to_date_string(int(datetime.now().timestamp() * 1000)),
+            "query_string": "*",
+            "filter": [
+                {
+                    "field": EventMappingFields.STRATEGY_ID.field_name,
+                    "operator": "is one of",
+                    "value": strategy_ids,
+                    "condition": "and",
+                    "type": "field",
+                },
+                {
+                    "field": EventMappingFields.RAW_EVENT_ID.field_name,
+                    "operator": "is one of",
+                    "value": raw_event_ids,
+                    "condition": "and",
+                    "type": "field",
+                },
+            ],
+            "size": 0,
+            "aggs": {
+                "strategies": {
+                    "terms": {"field": EventMappingFields.STRATEGY_ID.field_name, "size": len(strategy_ids)},
+                    "aggs": {
+                        "raw_events": {
+                            "terms": {"field": EventMappingFields.RAW_EVENT_ID.field_name, "size": len(raw_event_ids)},
+                            "aggs": {
+                                "events": {
+                                    "top_hits": {
+                                        "size": self.size,
+                                        "sort": [{self.time_field: {"order": "desc"}}],
+                                    }
+                                }
+                            },
+                        }
+                    },
+                }
+            },
+            "index_set_id": EventHandler.get_search_index_set_id(),
+            "storage_cluster_id": GlobalMetaConfig.get(EVENT_ES_CLUSTER_ID_KEY),
+        }
+
+    def fetch(self, risks: List[Risk]) -> Dict[str, List[dict]]:
+        """
+        获取风险关联的事件
+        :return: {risk_id: [event, ...]}
+        """
+
+        if not risks:
+            return {}
+        resp = resource.query.es_query(**self.build_query(risks))
+
+        # 按 strategy_id、raw_event_id 分组
+        event_keys, sources = [], []
+        for strategy_bucket in resp.get("aggregations", {}).get("strategies", {}).get("buckets", []):
+            for raw_event_bucket in strategy_bucket.get("raw_events", {}).get("buckets", []):
+                event_key = self.build_event_key(strategy_bucket["key"], raw_event_bucket["key"])
+                for hit in raw_event_bucket.get("events", {}).get("hits", {}).get("hits", []):
+                    event_keys.append(event_key)
+                    sources.append(hit["_source"])
+        events_map = defaultdict(list)
+        for event_key, event in zip(event_keys, self.parse_data(sources, username=self.username)):
+            events_map[event_key].append(event)
+
+        # 同一组事件可能关联多个风险，按风险的事件时间过滤
+        return {
+            risk.risk_id: [
+                event
+                for event in events_map.get(self.build_event_key(risk.strategy_id, risk.raw_event_id), [])
+                if self.is_event_in_risk(event, risk)
+            ]
+            for risk in risks
+        }
+
+    def is_event_in_risk(self, event: dict, risk: Risk) -> bool:
+        event_timestamp = event.get(self.time_field)
+        if event_timestamp in [None, ""]:
+            return True
+        return int(event_timestamp) >= int(risk.event_time.timestamp() * 1000)
+
+
+class RiskExporter:
+    """
+    风险导出
+    按批读取风险并检索事件，逐批写入 Excel，内存占用与风险总数无关
+    """
+
+    def __init__(
+        self,
+        risk_ids: List[str],
+        username: str = None,
+        chunk_size: int = RISK_EXPORT_CHUNK_SIZE,
+        progress_callback: Callable[[int], None] = None,
+    ):
+        self.risk_ids = list(dict.fromkeys(risk_ids))
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.event_fetcher = RiskEventFetcher(username=username)
+
+    def build_sheets_headers(self) -> Dict[str, List[ExportField]]:
+        """
+        获取策略的导出字段
+        """
+
+        strategies = Strategy.objects.filter(
+            strategy_id__in=Risk.objects.filter(risk_id__in=self.risk_ids).values("strategy_id")
+        ).order_by("strategy_id")
+        sheets_headers: Dict[str, List[ExportField]] = {}
+        for strategy in strategies:
+            event_fields = [
+                ExportField(
+                    raw_name=f"{EVENT_EXPORT_FIELD_PREFIX}{field['field_name']}",
+                    display_name=field["display_name"] or field["field_name"],
+                )
+                for field in strategy.event_data_field_configs
+            ]
+            sheets_headers[strategy.build_sheet_name()] = RiskExportField.export_fields() + event_fields
+        return sheets_headers
+
+    def load_risks(self, risk_ids: List[str]) -> List[Risk]:
+        risks: QuerySet[Risk] = Risk.prefetch_strategy_tags(Risk.objects.filter(risk_id__in=risk_ids))
+        risk_map = {risk.risk_id: risk for risk in risks}
+        return [risk_map[risk_id] for risk_id in risk_ids if risk_id in risk_map]
+
+    @classmethod
+    def format_risk(cls, risk: Risk) -> Dict[str, Any]:
+        return {
+            RiskExportField.RISK_ID: risk.risk_id,
+            RiskExportField.RISK_TITLE: risk.title,
+            RiskExportField.EVENT_CONTENT: risk.event_content,
+            RiskExportField.RISK_TAGS: data2string([tag_rel.tag.tag_name for tag_rel in risk.strategy.prefetched_tags]),
+            RiskExportField.EVENT_TYPE: data2string(risk.event_type),
+            RiskExportField.RISK_LEVEL: str(RiskLevel.get_label(risk.strategy.risk_level)),
+            RiskExportField.STRATEGY_NAME: risk.strategy.strategy_name,
+            RiskExportField.STRATEGY_ID: risk.strategy.strategy_id,
+            RiskExportField.RAW_EVENT_ID: risk.raw_event_id,
+            RiskExportField.EVENT_END_TIME: risk.event_end_time.strftime(api_settings.DATETIME_FORMAT),
+            RiskExportField.EVENT_TIME: risk.event_time.strftime(api_settings.DATETIME_FORMAT),
+            RiskExportField.RISK_HAZARD: risk.strategy.risk_hazard,
+            RiskExportField.RISK_GUIDANCE: risk.strategy.risk_guidance,
+            RiskExportField.STATUS: str(RiskStatus.get_label(risk.status)),
+            RiskExportField.RULE_ID: risk.rule_id,
+            RiskExportField.OPERATOR: data2string(risk.operator),
+            RiskExportField.CURRENT_OPERATOR: data2string(risk.current_operator),
+            RiskExportField.NOTICE_USERS: data2string(risk.notice_users),
+        }
+
+    @classmethod
+    def format_rows(cls, risk: Risk, events: List[dict]) -> List[Dict[str, Any]]:
+        """
+        合并风险和事件字段，每个事件一行，事件字段增加前缀
+        """
+
+        risk_basic_data = cls.format_risk(risk)
+        if not events:
+            return [risk_basic_data]
+        rows = []
+        for event in events:
+            event_data = {
+                field["field_name"]: event.get("event_data", {}).get(field["field_name"], "")
+                for field in risk.strategy.event_data_field_configs
+            }
+            rows.append({**risk_basic_data, **{f"{EVENT_EXPORT_FIELD_PREFIX}{k}": v for k, v in event_data.items()}})
+        return rows
+
+    def export(self) -> File:
+        """
+        导出风险，返回临时文件，关闭文件后自动删除
+        """
 
-            raw_field_names = [field.raw_name for field in headers]
-            for row_num, row_data in enumerate(data_rows, start=1):
-                # 按表头顺序提取数据
-                row_values = [str(row_data.get(raw_name, "")) for raw_name in raw_field_names]
-                worksheet.write_row(row_num, 0, row_values, self.text_fmt)
+        exporter = MultiSheetRiskExporterXlsx()
+        try:
+            exporter.add_sheets(self.build_sheets_headers())
+            for offset in range(0, len(self.risk_ids), self.chunk_size):
+                risks = self.load_risks(self.risk_ids[offset : offset + self.chunk_size])
+                events_map = self.event_fetcher.fetch(risks)
+                for risk in risks:
+                    exporter.write_rows(
+                        risk.strategy.build_sheet_name(), self.format_rows(risk, events_map.get(risk.risk_id, []))
+                    )
+                if callable(self.progress_callback):
+                    self.progress_callback(min(offset + self.chunk_size, len(self.risk_ids)))
+            return exporter.save()
+        except Exception:
+            exporter.close()
+            raise
@@ -16,10 +16,214 @@ We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
 
+from typing import Any, Callable, List, Optional
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Field
+
 from core.exceptions import RiskRuleNotMatch
-from services.web.risk.constants import RiskRuleOperator
+from core.utils.cache import LRUCache
+from services.web.risk.constants import (
+    RISK_RULE_COMPILER_CACHE_SIZE,
+    RISK_RULE_COMPILER_VERSION_KEY,
+    EventMappingFields,
+    RiskRuleOperator,
+)
 from services.web.risk.models import Risk, RiskRule
 
+Predicate = Callable[[dict], bool]
+
+
+class RuleNotCompilable(Exception):
+    """
+    规则无法在内存中判断，需要回退到 SQL 匹配
+    """
+
+
+class RiskRuleCompiler:
+    """
+    风险处理规则编译器
+    将规则的适用范围编译为基于风险字段字典的判断函数，语义与 RiskRuleOperator.build_query_filter 保持一致；
+    编译结果按规则记录缓存在进程内，规则保存时更新版本号使所有进程的缓存失效
+    """
+
+    INTEGER_FIELD_TYPES = {
+        "AutoField",
+        "BigAutoField",
+        "SmallAutoField",
+        "IntegerField",
+        "BigIntegerField",
+        "SmallIntegerField",
+        "PositiveIntegerField",
+        "PositiveBigIntegerField",
+        "PositiveSmallIntegerField",
+    }
+    STRING_FIELD_TYPES = {"CharField", "TextField"}
+    JSON_CONTAINS_FIELDS = {EventMappingFields.OPERATOR.field_name, EventMappingFields.EVENT_TYPE.field_name}
+
+    _cache = LRUCache(max_size=RISK_RULE_COMPILER_CACHE_SIZE)
+    _version = None
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        更新编译版本，各进程在下次匹配时丢弃已编译的规则
+        """
+        try:
+            cache.incr(RISK_RULE_COMPILER_VERSION_KEY)
+        except ValueError:
+            cache.set(RISK_RULE_COMPILER_VERSION_KEY, 1, timeout=None)
+
+    @classmethod
+    def refresh(cls) -> None:
+        version = cache.get(RISK_RULE_COMPILER_VERSION_KEY, 0)
+        if version != cls._version:
+            cls._cache.clear()
+            cls._version = version
+
+    @classmethod
+    def get_predicate(cls, rule: RiskRule) -> Optional[Predicate]:
+        """
+        获取规则的判断函数，无法编译时返回 None
+        """
+        predicate = cls._cache.get(rule.pk)
+        if predicate is None:
+            try:
+                predicate = cls.compile(rule.scope)
+            except RuleNotCompilable:
+                predicate = False
+            cls._cache.set(rule.pk, predicate)
+        return predicate or None
+
+    @classmethod
+    def dump_risk(cls, risk: Risk) -> dict:
+        return {field.attname: getattr(risk, field.attname) for field in Risk._meta.concrete_fields}
+
+    @classmethod
+    def compile(cls, scope: List[dict]) -> Predicate:
+        """
+        按 build_query_filter 的组合方式编译：同一条件的多个值之间为 OR，条件之间按 connector 依次组合
+        """
+        predicate = None
+        for _scope in scope:
+            field, operator, value, connector = (
+                _scope["field"],
+                _scope["operator"],
+                _scope["value"],
+                _scope.get("connector", "AND"),
+            )
+            if not value:
+                continue
+            item = cls.any_of([cls.compile_condition(field, operator, v) for v in value])
+            if predicate is None:
+                predicate = item
+            elif connector.lower() == "and":
+                predicate = cls.all_of([predicate, item])
+            else:
+                predicate = cls.any_of([predicate, item])
+        return predicate or (lambda values: True)
+
+    @classmethod
+    def compile_condition(cls, field_name: str, operator: str, value: Any) -> Predicate:
+        try:
+            field: Field = Risk._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            raise RuleNotCompilable()
+        if not field.concrete or field.many_to_many:
+            raise RuleNotCompilable()
+
+        attname = field.attname
+        field_type = (field.target_field if field.is_relation else field).get_internal_type()
+        exclude = operator == RiskRuleOperator.NOT_EQUAL
+
+        if field_type == "JSONField":
+            # JSON 字段仅支持 operator / event_type 的 contains 匹配
+            if field_name not in cls.JSON_CONTAINS_FIELDS or operator not in [
+                RiskRuleOperator.EQUAL,
+                RiskRuleOperator.NOT_EQUAL,
+            ]:
+                raise RuleNotCompilable()
+            if not isinstance(value, str):
+                raise RuleNotCompilable()
+            return cls.negate(cls.json_contains(attname, value)) if exclude else cls.json_contains(attname, value)
+
+        if field_type in cls.INTEGER_FIELD_TYPES:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise RuleNotCompilable()
+            if exclude:
+                return cls.negate(cls.number_compare(attname, RiskRuleOperator.EQUAL, value))
+            return cls.number_compare(attname, operator, value)
+
+        if field_type in cls.STRING_FIELD_TYPES and operator in [RiskRuleOperator.EQUAL, RiskRuleOperator.NOT_EQUAL]:
+            equal = cls.string_equal(attname, str(value))
+            return cls.negate(equal) if exclude else equal
+
+        raise RuleNotCompilable()
+
+    @classmethod
+    def number_compare(cls, attname: str, operator: str, value: int) -> Predicate:
+        match operator:
+            case RiskRuleOperator.EQUAL:
+                compare = int.__eq__
+            case RiskRuleOperator.GREATER_THAN:
+                compare = int.__gt__
+            case RiskRuleOperator.GREATER_THAN_EQUAL:
+                compare = int.__ge__
+            case RiskRuleOperator.LESS_THAN:
+                compare = int.__lt__
+            case RiskRuleOperator.LESS_THAN_EQUAL:
+                compare = int.__le__
+            case _:
+                raise RuleNotCompilable()
+        return lambda values: values[attname] is not None and compare(int(values[attname]), value)
+
+    @classmethod
+    def json_contains(cls, attname: str, value: str) -> Predicate:
+        def predicate(values: dict) -> bool:
+            data = values[attname]
+            if isinstance(data, list):
+                return value in data
+            return data == value
+
+        return predicate
+
+    @classmethod
+    def string_equal(cls, attname: str, value: str) -> Predicate:
+        # MySQL 默认排序规则忽略大小写与尾部空格，非 ASCII 字符的比较规则无法等价实现，回退到 SQL
+        case_insensitive = connection.vendor == "mysql"
+        if case_insensitive:
+            if not value.isascii():
+                raise RuleNotCompilable()
+            value = value.rstrip(" ").lower()
+
+        def predicate(values: dict) -> bool:
+            data = values[attname]
+            if data is None:
+                return False
+            if not case_insensitive:
+                return data == value
+            if not data.isascii():
+                raise RuleNotCompilable()
+            return data.rstrip(" ").lower() == value
+
+        return predicate
+
+    @classmethod
+    def negate(cls, predicate: Predicate) -> Predicate:
+        return lambda values: not predicate(values)
+
+    @classmethod
+    def any_of(cls, predicates: List[Predicate]) -> Predicate:
+        return lambda values: any(p(values) for p in predicates)
+
+    @classmethod
+    def all_of(cls, predicates: List[Predicate]) -> Predicate:
+        return lambda values: all(p(values) for p in predicates)
+
 
 class RiskRuleHandler:
     """
@@ -46,10 +250,25 @@ class RiskRuleHandler:
     def match_rule(self) -> RiskRule:
         """
         获取风险处理规则
+        优先使用编译后的规则在内存中匹配，无法编译的规则回退到 SQL 匹配
         """
 
+        RiskRuleCompiler.refresh()
+        values = RiskRuleCompiler.dump_risk(self.risk)
         for r in self.rules:
-            q = RiskRuleOperator.build_query_filter(r.scope)
-            if Risk.objects.filter(risk_id=self.risk.risk_id).filter(q).exists():
+            if self.is_rule_matched(r, values):
                 return r
         raise RiskRuleNotMatch(message=RiskRuleNotMatch.MESSAGE % self.risk.risk_id)
+
+    def is_rule_matched(self, rule: RiskRule, values: dict) -> bool:
+        predicate = RiskRuleCompiler.get_predicate(rule)
+        if predicate is not None:
+            try:
+                return predicate(values)
+            except RuleNotCompilable:
+                pass
+        return self.is_rule_matched_by_sql(rule)
+
+    def is_rule_matched_by_sql(self, rule: RiskRule) -> bool:
+        q = RiskRuleOperator.build_query_filter(rule.scope)
+        return Risk.objects.filter(risk_id=self.risk.risk_id).filter(q).exists()
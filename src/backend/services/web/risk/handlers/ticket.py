@@ -144,6 +144,7 @@ class RiskFlowBaseHandler:
         process_result = self.process(*args, **kwargs)
         self.update_operator(process_result=process_result, *args, **kwargs)
         self.update_status(process_result=process_result, *args, **kwargs)
+        self.risk.sync_user_relations()
         self.record_history(process_result=process_result, *args, **kwargs)
         self.auth_current_operator()
         self.notice_current_operator()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bk_resource import api
+from blueapps.utils.logger import logger_celery
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+
+from apps.itsm.constants import TicketStatus
+from apps.sops.constants import SOPSTaskStatus
+from services.web.risk.constants import RiskStatus, TicketNodeStatus
+from services.web.risk.handlers.ticket import AutoProcess, ForApprove
+from services.web.risk.models import Risk, TicketNode
+
+# 节点变更: node_id => (节点状态, 最新的单据/任务状态，None 表示不更新)
+NodeChanges = Dict[str, Tuple[str, Optional[dict]]]
+
+
+class TicketNodeSyncHandler:
+    """
+    批量同步处理节点状态
+    ITSM 单据按批次查询审批结果，标准运维任务并发查询状态，仅锁定并更新状态发生变化的节点
+    """
+
+    itsm_finished_status = [TicketStatus.TERMINATED, TicketStatus.FINISHED, TicketStatus.FAILED, TicketStatus.REVOKED]
+    sops_finished_status = [
+        SOPSTaskStatus.EXPIRED,
+        SOPSTaskStatus.FINISHED,
+        SOPSTaskStatus.FAILED,
+        SOPSTaskStatus.REVOKED,
+    ]
+
+    def __init__(self, itsm_batch_size: int = None, sops_workers: int = None):
+        self.itsm_batch_size = itsm_batch_size or settings.SYNC_AUTO_RESULT_ITSM_BATCH_SIZE
+        self.sops_workers = sops_workers or settings.SYNC_AUTO_RESULT_SOPS_WORKERS
+
+    def sync(self, nodes: Iterable[TicketNode]) -> int:
+        """
+        同步节点状态，返回更新的节点数
+        """
+
+        nodes = list(nodes)
+        changes: NodeChanges = {}
+        changes.update(self.sync_approve_nodes([node for node in nodes if node.action == ForApprove.__name__]))
+        changes.update(self.sync_auto_process_nodes([node for node in nodes if node.action == AutoProcess.__name__]))
+        changes.update(
+            self.sync_other_nodes(
+                [node for node in nodes if node.action not in [ForApprove.__name__, AutoProcess.__name__]]
+            )
+        )
+        return self.save({node.id: node for node in nodes}, changes)
+
+    def sync_approve_nodes(self, nodes: List[TicketNode]) -> NodeChanges:
+        """
+        审批节点: 批量查询 ITSM 审批结果
+        """
+
+        changes: NodeChanges = {}
+        sn_nodes: Dict[str, List[TicketNode]] = {}
+        for node in nodes:
+            sn = node.process_result.get("ticket", {}).get("sn")
+            if sn:
+                sn_nodes.setdefault(sn, []).append(node)
+            else:
+                changes[node.id] = (TicketNodeStatus.FINISHED, None)
+
+        sns = list(sn_nodes.keys())
+        for index in range(0, len(sns), self.itsm_batch_size):
+            batch = sns[index : index + self.itsm_batch_size]
+            try:
+                results = api.bk_itsm.ticket_approve_result(sn=batch)
+            except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+                logger_celery.exception("[SyncAutoResult] Query ITSM Failed %s %s", batch, err)
+                continue
+            for status in results:
+                node_status = (
+                    TicketNodeStatus.FINISHED
+                    if status["current_status"] in self.itsm_finished_status
+                    else TicketNodeStatus.RUNNING
+                )
+                for node in sn_nodes.get(status.get("sn"), []):
+                    changes[node.id] = (node_status, status)
+        return changes
+
+    def sync_auto_process_nodes(self, nodes: List[TicketNode]) -> NodeChanges:
+        """
+        自动处理套餐节点: 并发查询标准运维任务状态
+        """
+
+        changes: NodeChanges = {}
+        task_nodes: List[Tuple[TicketNode, str]] = []
+        for node in nodes:
+            task_id = node.process_result.get("task", {}).get("task_id", "")
+            if task_id:
+                task_nodes.append((node, task_id))
+            else:
+                changes[node.id] = (TicketNodeStatus.FINISHED, None)
+        if not task_nodes:
+            return changes
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.sops_workers, len(task_nodes)), thread_name_prefix="sync_auto_result"
+        ) as executor:
+            statuses = list(executor.map(self.get_sops_task_status, [task_id for _, task_id in task_nodes]))
+        for (node, _), status in zip(task_nodes, statuses):
+            if status is None:
+                continue
+            node_status = (
+                TicketNodeStatus.FINISHED if status["state"] in self.sops_finished_status else TicketNodeStatus.RUNNING
+            )
+            changes[node.id] = (node_status, status)
+        return changes
+
+    @classmethod
+    def get_sops_task_status(cls, task_id: str) -> Optional[dict]:
+        # 工作线程使用独立的 db 连接，查询完成后关闭，避免连接泄漏
+        try:
+            return api.bk_sops.get_task_status(task_id=task_id, bk_biz_id=settings.DEFAULT_BK_BIZ_ID)
+        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+            logger_celery.exception("[SyncAutoResult] Query SOPS Failed %s %s", task_id, err)
+            return None
+        finally:
+            connections.close_all()
+
+    def sync_other_nodes(self, nodes: List[TicketNode]) -> NodeChanges:
+        """
+        其他节点: 不为最后一个节点或风险单已关闭时关闭
+        """
+
+        if not nodes:
+            return {}
+        risk_ids = {node.risk_id for node in nodes}
+        last_timestamps = dict(
+            TicketNode.objects.filter(risk_id__in=risk_ids)
+            .values("risk_id")
+            .annotate(last_timestamp=Max("timestamp"))
+            .values_list("risk_id", "last_timestamp")
+        )
+        closed_risk_ids = set(
+            Risk.objects.filter(risk_id__in=risk_ids, status=RiskStatus.CLOSED).values_list("risk_id", flat=True)
+        )
+        return {
+            node.id: (TicketNodeStatus.FINISHED, None)
+            for node in nodes
+            if last_timestamps.get(node.risk_id, node.timestamp) > node.timestamp or node.risk_id in closed_risk_ids
+        }
+
+    @classmethod
+    def save(cls, nodes: Dict[str, TicketNode], changes: NodeChanges) -> int:
+        """
+        锁定并更新状态发生变化的节点
+        加锁后节点状态与同步前不一致时，说明已被其他流程更新，不再覆盖
+        """
+
+        changed_ids = [
+            node_id
+            for node_id, (status, process_status) in changes.items()
+            if nodes[node_id].status != status
+            or (process_status is not None and nodes[node_id].process_result.get("status") != process_status)
+        ]
+        if not changed_ids:
+            return 0
+        with transaction.atomic():
+            locked_nodes = [
+                node
+                for node in TicketNode.objects.select_for_update().filter(id__in=changed_ids)
+                if node.status == nodes[node.id].status
+            ]
+            for node in locked_nodes:
+                status, process_status = changes[node.id]
+                if process_status is not None:
+                    node.process_result["status"] = process_status
+                node.status = status
+            TicketNode.objects.bulk_update(locked_nodes, fields=["process_result", "status"])
+        return len(locked_nodes)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from django.core.management.base import BaseCommand
+
+from services.web.risk.constants import RISK_USER_RELATION_BATCH_SIZE
+from services.web.risk.models import Risk, RiskUserRelation
+
+
+class Command(BaseCommand):
+    """
+    按风险的 operator、current_operator、notice_users 回填风险用户关系
+    升级到包含风险用户关系表(0031_riskuserrelation)的版本后，在发布完成后执行一次；中断后可通过 --start-risk-id 续跑
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=RISK_USER_RELATION_BATCH_SIZE, help="每批处理风险数")
+        parser.add_argument("--start-risk-id", type=str, default="", help="从指定风险ID之后开始回填，用于中断后续跑")
+
+    def handle(self, *args, **options):
+        last_risk_id = options["start_risk_id"]
+        total = 0
+        # 按主键游标分批，避免一次加载全部风险
+        while True:
+            risks = list(
+                Risk.objects.filter(risk_id__gt=last_risk_id)
+                .order_by("risk_id")
+                .only("risk_id", *RiskUserRelation.ROLE_FIELDS.values())[: options["batch_size"]]
+            )
+            if not risks:
+                break
+            RiskUserRelation.sync(risks)
+            total += len(risks)
+            last_risk_id = risks[-1].risk_id
+            self.stdout.write(f"[BackfillRiskUserRelation] Synced: {total}; LastRiskID: {last_risk_id}")
+        self.stdout.write(f"[BackfillRiskUserRelation] Finished; Total: {total}")
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.web.query.utils.elastic import ElasticHandler
+from services.web.risk.handlers.event import EventHandler
+
+
+class Command(BaseCommand):
+    """
+    对比复用客户端与每次新建客户端时，初始化事件处理器并向 ES 发起一次请求的耗时
+    ListEvent 经由日志平台查询，不直接使用 ES 客户端，这里按 add_event 路径测量处理器初始化与建连的开销
+    需要可访问的事件 ES 集群
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=50, help="每种方式请求次数")
+
+    def handle(self, *args, **options):
+        rounds = max(options["rounds"], 1)
+        cluster_id = EventHandler().cluster_id
+        es_config = ElasticHandler.get_es_config(cluster_id)
+
+        def pooled():
+            handler = EventHandler()
+            try:
+                handler.client.info()
+            finally:
+                handler.close()
+
+        def unpooled():
+            client = ElasticHandler.get_client(**es_config)
+            try:
+                client.info()
+            finally:
+                client.transport.close()
+
+        for name, func in [("unpooled", unpooled), ("pooled", pooled)]:
+            costs = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                func()
+                costs.append(time.perf_counter() - start)
+            costs.sort()
+            self.stdout.write(
+                f"[BenchmarkElasticClient] {name}: rounds={rounds}; "
+                f"avg={statistics.mean(costs) * 1000:.2f}ms; p50={costs[len(costs) // 2] * 1000:.2f}ms; "
+                f"p99={costs[min(int(len(costs) * 0.99), len(costs) - 1)] * 1000:.2f}ms"
+            )
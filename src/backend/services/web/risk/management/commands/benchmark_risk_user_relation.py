@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from services.web.risk.models import Risk, RiskUserRelation, RiskUserRole
+
+
+class Command(BaseCommand):
+    """对比按 JSON 字段与按风险用户关系表筛选用户相关风险的查询计划与耗时，只读取当前数据库，不写入数据"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True, help="筛选的用户名")
+        parser.add_argument(
+            "--role", default=RiskUserRole.CURRENT_OPERATOR.value, choices=RiskUserRole.values, help="用户角色"
+        )
+        parser.add_argument("--rounds", type=int, default=20, help="每种方式查询次数")
+
+    def handle(self, *args, **options):
+        username, role = options["username"], options["role"]
+        rounds = max(options["rounds"], 1)
+        field = RiskUserRelation.ROLE_FIELDS[role]
+        if connection.features.supports_json_field_contains:
+            json_filter = {f"{field}__contains": username}
+        else:
+            # 不支持 JSON contains 的数据库以 JSON 文本匹配模拟
+            json_filter = {f"{field}__icontains": json.dumps(username)}
+        querysets = {
+            "json_field": lambda: Risk.objects.filter(**json_filter),
+            "relation": lambda: Risk.objects.filter(
+                risk_id__in=RiskUserRelation.load_risk_ids(role=role, usernames=[username])
+            ),
+        }
+        for name, build_queryset in querysets.items():
+            plan = build_queryset().values("risk_id").explain()
+            start = time.perf_counter()
+            for _ in range(rounds):
+                rows = len(build_queryset().values_list("risk_id", flat=True))
+            cost = (time.perf_counter() - start) / rounds
+            self.stdout.write(
+                f"[BenchmarkRiskUserRelation] {name}: rows={rows}; per_query={cost * 1000:.3f}ms; "
+                f"plan={' '.join(plan.split())}"
+            )
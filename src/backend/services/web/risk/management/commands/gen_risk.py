@@ -17,6 +17,7 @@ to the current version of the project delivered to anyone in the future.
 """
 
 import json
+import time
 from time import sleep
 
 from blueapps.utils.logger import logger
@@ -30,16 +31,52 @@ from services.web.risk.handlers.risk import RiskHandler
 
 
 class AuditEventKafkaRecordConsumer(KafkaRecordConsumer):
-    def __init__(self, consumer: KafkaConsumer, timeout_ms: int, max_records: int, sleep_time: float, sleep_wait=True):
-        super().__init__(consumer, timeout_ms, max_records, sleep_time, sleep_wait)
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        timeout_ms: int,
+        max_records: int,
+        sleep_time: float,
+        sleep_wait=True,
+        batch_mode=False,
+        workers: int = 1,
+        record_max_retries: int = 3,
+        record_max_seeks: int = 3,
+    ):
+        super().__init__(
+            consumer,
+            timeout_ms,
+            max_records,
+            sleep_time,
+            sleep_wait,
+            batch_mode,
+            workers,
+            record_max_retries,
+            record_max_seeks,
+        )
         self.eligible_strategy_ids = RiskHandler.fetch_eligible_strategy_ids()
+        self.eligible_strategy_ids_updated_at = time.time()
 
     def process_records(self, records: list):
         self.eligible_strategy_ids = RiskHandler.fetch_eligible_strategy_ids()  # 更新 eligible_strategy_ids
         super().process_records(records)
 
     def process_record(self, record):
-        RiskHandler().generate_risk(record.value, self.eligible_strategy_ids)
+        # 批量模式下作为批次失败后的逐条重试，写入失败需要抛出异常，避免提交未写入的 offset
+        RiskHandler().generate_risk(record.value, self.eligible_strategy_ids, raise_exception=self.batch_mode)
+
+    def refresh_eligible_strategy_ids(self):
+        """
+        批量模式下按间隔刷新 eligible_strategy_ids，避免每次拉取都查询策略表
+        """
+        if time.time() - self.eligible_strategy_ids_updated_at < settings.EVENT_KAFKA_STRATEGY_REFRESH_INTERVAL:
+            return
+        self.eligible_strategy_ids = RiskHandler.fetch_eligible_strategy_ids()
+        self.eligible_strategy_ids_updated_at = time.time()
+
+    def process_batch(self, records: list):
+        self.refresh_eligible_strategy_ids()
+        RiskHandler().generate_risks_bulk([record.value for record in records], self.eligible_strategy_ids)
 
 
 class Command(BaseCommand):
@@ -62,5 +99,12 @@ class Command(BaseCommand):
         max_records = settings.EVENT_KAFKA_MAX_RECORDS
         sleep_time = settings.EVENT_KAFKA_SLEEP_TIME
         AuditEventKafkaRecordConsumer(
-            consumer=consumer, timeout_ms=timeout_ms, max_records=max_records, sleep_time=sleep_time
+            consumer=consumer,
+            timeout_ms=timeout_ms,
+            max_records=max_records,
+            sleep_time=sleep_time,
+            batch_mode=settings.EVENT_KAFKA_BATCH_MODE,
+            workers=settings.EVENT_KAFKA_WORKERS,
+            record_max_retries=settings.EVENT_KAFKA_RECORD_MAX_RETRIES,
+            record_max_seeks=settings.EVENT_KAFKA_RECORD_MAX_SEEKS,
         ).process()
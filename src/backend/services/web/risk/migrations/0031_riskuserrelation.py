@@ -0,0 +1,39 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('risk', '0030_alter_risk_operator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskUserRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('risk_id', models.CharField(max_length=255, verbose_name='Risk ID')),
+                ('username', models.CharField(max_length=255, verbose_name='Username')),
+                (
+                    'role',
+                    models.CharField(
+                        choices=[
+                            ('operator', 'Operator'),
+                            ('current_operator', 'Current Operator'),
+                            ('notice_user', 'Notice User'),
+                        ],
+                        max_length=32,
+                        verbose_name='Role',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Risk User Relation',
+                'verbose_name_plural': 'Risk User Relation',
+                'ordering': ['-id'],
+                'unique_together': {('risk_id', 'role', 'username')},
+                'index_together': {('username', 'role', 'risk_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.24 on 2026-10-18 19:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('risk', '0031_riskuserrelation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskExportTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                (
+                    'created_at',
+                    models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='创建时间'),
+                ),
+                (
+                    'created_by',
+                    models.CharField(
+                        blank=True, db_index=True, default='', max_length=32, null=True, verbose_name='创建者'
+                    ),
+                ),
+                ('updated_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='更新时间')),
+                (
+                    'updated_by',
+                    models.CharField(
+                        blank=True, db_index=True, default='', max_length=32, null=True, verbose_name='修改者'
+                    ),
+                ),
+                ('risk_ids', models.JSONField(default=list, verbose_name='Risk IDs')),
+                (
+                    'risk_view_type',
+                    models.CharField(blank=True, default='', max_length=32, verbose_name='Risk View Type'),
+                ),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('READY', '就绪'),
+                            ('RUNNING', '执行中'),
+                            ('SUCCESS', '成功'),
+                            ('FAILURE', '失败'),
+                            ('EXPIRED', '已过期'),
+                        ],
+                        db_index=True,
+                        max_length=32,
+                        verbose_name='Status',
+                    ),
+                ),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+                ('current', models.IntegerField(default=0, verbose_name='Current')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Result')),
+                ('error_msg', models.TextField(blank=True, default='', verbose_name='Error Message')),
+                ('task_start_time', models.DateTimeField(blank=True, null=True, verbose_name='Task Start Time')),
+                ('task_end_time', models.DateTimeField(blank=True, null=True, verbose_name='Task End Time')),
+            ],
+            options={
+                'verbose_name': 'Risk Export Task',
+                'verbose_name_plural': 'Risk Export Task',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
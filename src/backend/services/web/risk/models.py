@@ -17,6 +17,7 @@ to the current version of the project delivered to anyone in the future.
 """
 
 import datetime
+import threading
 from functools import cached_property
 from typing import List, Union
 
@@ -29,11 +30,13 @@ from django.db.models.functions import Substr
 from django.utils.translation import gettext_lazy
 
 from apps.meta.models import Tag
-from apps.permission.handlers.actions import ActionEnum, ActionMeta, get_action_by_id
+from apps.permission.handlers.actions import ActionEnum, ActionMeta
 from apps.permission.handlers.permission import Permission
 from core.models import OperateRecordModel, SoftDeleteModel, UUIDField
+from services.web.query.constants import TaskEnum
 from services.web.risk.constants import (
     LIST_RISK_FIELD_MAX_LENGTH,
+    RISK_USER_RELATION_BATCH_SIZE,
     EventMappingFields,
     RiskLabel,
     RiskStatus,
@@ -43,23 +46,63 @@ from services.web.risk.converter.queryset import RiskPathEqDjangoQuerySetConvert
 from services.web.strategy_v2.models import Strategy, StrategyTag
 
 
+def format_risk_id(dt: datetime.datetime) -> str:
+    return f"{dt.strftime('%Y%m%d%H%M%S')}{('%.6f' % dt.timestamp()).split('.')[1]}"
+
+
 def generate_risk_id() -> str:
     """ "
     年月日时分秒+6位随机码
     """
 
-    now = datetime.datetime.now()
-    risk_id = f"{now.strftime('%Y%m%d%H%M%S')}{('%.6f' % now.timestamp()).split('.')[1]}"
+    risk_id = format_risk_id(datetime.datetime.now())
     if Risk.objects.filter(risk_id=risk_id).exists():
         return generate_risk_id()
     return risk_id
 
 
+_risk_id_lock = threading.Lock()
+_risk_id_last_time = datetime.datetime.min
+
+
+def reserve_risk_id_times(count: int) -> datetime.datetime:
+    """
+    在进程内预留连续 count 个微秒，返回起始时间，避免并发批次生成相同的风险ID
+    """
+
+    global _risk_id_last_time
+
+    with _risk_id_lock:
+        start = max(datetime.datetime.now(), _risk_id_last_time + datetime.timedelta(microseconds=1))
+        _risk_id_last_time = start + datetime.timedelta(microseconds=count - 1)
+    return start
+
+
+def generate_risk_ids(count: int) -> List[str]:
+    """
+    批量生成风险ID，规则与 generate_risk_id 一致，每轮只查询一次已存在的ID
+    """
+
+    risk_ids = []
+    while len(risk_ids) < count:
+        start = reserve_risk_id_times(count - len(risk_ids))
+        candidates = [format_risk_id(start + datetime.timedelta(microseconds=i)) for i in range(count - len(risk_ids))]
+        existing_ids = set(Risk.objects.filter(risk_id__in=candidates).values_list("risk_id", flat=True))
+        risk_ids.extend(risk_id for risk_id in candidates if risk_id not in existing_ids)
+    return risk_ids
+
+
 class UserType(models.TextChoices):
     OPERATOR = "operator"
     NOTICE_USER = "notice_user"
 
 
+class RiskUserRole(models.TextChoices):
+    OPERATOR = "operator", gettext_lazy("Operator")
+    CURRENT_OPERATOR = "current_operator", gettext_lazy("Current Operator")
+    NOTICE_USER = "notice_user", gettext_lazy("Notice User")
+
+
 class Risk(OperateRecordModel):
     """
     Risk
@@ -181,11 +224,13 @@ class Risk(OperateRecordModel):
             ).values("risk_id")
         )
 
+        # 策略转换后的筛选条件按用户缓存，避免每次列表请求都查询权限中心
         permission = Permission(get_request_username())
-        request = permission.make_request(action=get_action_by_id(action), resources=[])
-        policies = permission.iam_client._do_policy_query(request)
-        if policies:
-            q |= RiskPathEqDjangoQuerySetConverter().convert(policies)
+        policy_q = permission.get_policy_filter(
+            action, cls.__name__, lambda policies: RiskPathEqDjangoQuerySetConverter().convert(policies)
+        )
+        if policy_q:
+            q |= policy_q
         return q
 
     @classmethod
@@ -215,6 +260,13 @@ class Risk(OperateRecordModel):
                 return node
         return TicketNode()
 
+    def sync_user_relations(self, roles: List[str] = None) -> None:
+        """
+        同步风险与用户关系
+        """
+
+        RiskUserRelation.sync([self], roles=roles)
+
     def auth_users(self, action: str, users: List[str], user_type: str = UserType.OPERATOR) -> None:
         """
         授权相关用户查询权限
@@ -311,6 +363,13 @@ class RiskRule(SoftDeleteModel):
         unique_together = [["rule_id", "version"]]
         index_together = [["priority_index", "rule_id", "version"]]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # 规则变更后使已编译的规则失效
+        from services.web.risk.handlers.rule import RiskRuleCompiler
+
+        RiskRuleCompiler.invalidate()
+
     @classmethod
     def get_rule_or_404(cls, **kwargs) -> "RiskRule":
         rule = cls.objects.filter(**kwargs).order_by("-version").first()
@@ -417,3 +476,141 @@ class TicketPermission(models.Model):
         verbose_name_plural = verbose_name
         ordering = ["-id"]
         unique_together = [["risk_id", "action", "user", "user_type"]]
+
+
+class RiskUserRelation(models.Model):
+    """
+    Risk User Relation
+    由风险的 operator、current_operator、notice_users 展开，用于按用户筛选风险
+    """
+
+    # 角色 => 风险字段
+    ROLE_FIELDS = {
+        RiskUserRole.OPERATOR: "operator",
+        RiskUserRole.CURRENT_OPERATOR: "current_operator",
+        RiskUserRole.NOTICE_USER: "notice_users",
+    }
+
+    risk_id = models.CharField(gettext_lazy("Risk ID"), max_length=255)
+    username = models.CharField(gettext_lazy("Username"), max_length=255)
+    role = models.CharField(gettext_lazy("Role"), choices=RiskUserRole.choices, max_length=32)
+
+    class Meta:
+        verbose_name = gettext_lazy("Risk User Relation")
+        verbose_name_plural = verbose_name
+        ordering = ["-id"]
+        unique_together = [["risk_id", "role", "username"]]
+        index_together = [["username", "role", "risk_id"]]
+
+    @classmethod
+    def build_relations(cls, risk: Risk, roles: List[str] = None) -> set:
+        relations = set()
+        for role in roles or cls.ROLE_FIELDS:
+            users = getattr(risk, cls.ROLE_FIELDS[role], None)
+            if not isinstance(users, list):
+                continue
+            relations.update((risk.risk_id, str(user), role) for user in users if user)
+        return relations
+
+    @classmethod
+    def sync(cls, risks: List[Risk], roles: List[str] = None) -> None:
+        """
+        按风险当前字段同步关系，仅写入差异
+        """
+
+        if not risks:
+            return
+        roles = list(roles or cls.ROLE_FIELDS)
+        expected = set()
+        for risk in risks:
+            expected.update(cls.build_relations(risk, roles))
+        existing = {
+            (risk_id, username, role): pk
+            for pk, risk_id, username, role in cls.objects.filter(
+                risk_id__in=[risk.risk_id for risk in risks], role__in=roles
+            ).values_list("pk", "risk_id", "username", "role")
+        }
+        to_delete = [pk for relation, pk in existing.items() if relation not in expected]
+        if to_delete:
+            cls.objects.filter(pk__in=to_delete).delete()
+        to_create = [
+            cls(risk_id=risk_id, username=username, role=role)
+            for risk_id, username, role in expected
+            if (risk_id, username, role) not in existing
+        ]
+        if to_create:
+            cls.objects.bulk_create(to_create, batch_size=RISK_USER_RELATION_BATCH_SIZE, ignore_conflicts=True)
+
+    @classmethod
+    def load_risk_ids(cls, role: str, usernames: List[str]) -> QuerySet:
+        """
+        获取用户相关的风险ID子查询
+        """
+
+        return cls.objects.filter(username__in=usernames, role=role).values("risk_id")
+
+
+class RiskExportTask(OperateRecordModel):
+    """
+    Risk Export Task
+    """
+
+    risk_ids = models.JSONField(gettext_lazy("Risk IDs"), default=list)
+    risk_view_type = models.CharField(gettext_lazy("Risk View Type"), max_length=32, blank=True, default="")
+    status = models.CharField(gettext_lazy("Status"), max_length=32, choices=TaskEnum.choices, db_index=True)
+    total = models.IntegerField(gettext_lazy("Total"), default=0)
+    current = models.IntegerField(gettext_lazy("Current"), default=0)
+    result = models.JSONField(gettext_lazy("Result"), default=dict, blank=True)
+    error_msg = models.TextField(gettext_lazy("Error Message"), blank=True, default="")
+    task_start_time = models.DateTimeField(gettext_lazy("Task Start Time"), null=True, blank=True)
+    task_end_time = models.DateTimeField(gettext_lazy("Task End Time"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = gettext_lazy("Risk Export Task")
+        verbose_name_plural = verbose_name
+        ordering = ["-id"]
+
+    def update_status(self, from_statuses: List[str], **kwargs) -> bool:
+        """
+        仅当任务仍处于 from_statuses 时更新，避免覆盖并发写入的状态（如清理任务已标记为失败）
+        """
+
+        updated = RiskExportTask.objects.filter(id=self.id, status__in=from_statuses).update(**kwargs)
+        if updated:
+            for key, value in kwargs.items():
+                setattr(self, key, value)
+        return bool(updated)
+
+    def update_task_running(self) -> bool:
+        return self.update_status(
+            [TaskEnum.READY.value],
+            status=TaskEnum.RUNNING.value,
+            current=0,
+            task_start_time=datetime.datetime.now(),
+        )
+
+    def update_current(self, current: int):
+        self.current = current
+        self.save(update_fields=["current"])
+
+    def update_task_success(self, result: dict) -> bool:
+        return self.update_status(
+            [TaskEnum.RUNNING.value],
+            status=TaskEnum.SUCCESS.value,
+            current=self.total,
+            result=result,
+            error_msg="",
+            task_end_time=datetime.datetime.now(),
+        )
+
+    def update_task_failed(self, error_msg: str) -> bool:
+        return self.update_status(
+            [TaskEnum.READY.value, TaskEnum.RUNNING.value],
+            status=TaskEnum.FAILURE.value,
+            error_msg=error_msg,
+            task_end_time=datetime.datetime.now(),
+        )
+
+    def update_task_expired(self):
+        self.status = TaskEnum.EXPIRED.value
+        self.save(update_fields=["status"])
@@ -18,49 +18,51 @@ to the current version of the project delivered to anyone in the future.
 
 import abc
 import json
-from collections import defaultdict
 from datetime import datetime
 from typing import Dict, List, Type
 
-from bk_resource import CacheResource, api, resource
+from bk_resource import CacheResource, api
 from bk_resource.settings import bk_resource_settings
 from bk_resource.utils.cache import CacheTypeItem
 from bk_resource.utils.common_utils import ignored
+from bkstorages.backends.bkrepo import BKRepoFile
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Count, Q, QuerySet
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext, gettext_lazy
-from rest_framework.settings import api_settings
 
 from apps.audit.resources import AuditMixinResource
 from apps.itsm.constants import TicketOperate, TicketStatus
 from apps.meta.models import Tag
+from apps.meta.utils.tools import is_system_admin
 from apps.permission.handlers.actions import ActionEnum
 from apps.permission.handlers.drf import wrapper_permission_field
 from apps.permission.handlers.resource_types import ResourceEnum
 from apps.sops.constants import SOPSTaskOperation, SOPSTaskStatus
 from core.exceptions import RiskStatusInvalid
-from core.exporter.constants import ExportField
 from core.models import get_request_username
-from core.utils.data import choices_to_dict, data2string
+from core.utils.data import choices_to_dict
 from core.utils.page import paginate_queryset
-from core.utils.time import mstimestamp_to_date_string
 from core.utils.tools import get_app_info
+from services.web.query.constants import TaskEnum
+from services.web.query.utils.storage import LogExportStorage
 from services.web.risk.constants import (
-    EVENT_EXPORT_FIELD_PREFIX,
     RISK_EXPORT_FILE_NAME_TMP,
     RISK_SHOW_FIELDS,
-    RiskExportField,
     RiskFields,
     RiskLabel,
     RiskStatus,
     RiskViewType,
     TicketNodeStatus,
 )
-from services.web.risk.exceptions import ExportRiskNoPermission
-from services.web.risk.handlers.risk_export import MultiSheetRiskExporterXlsx
+from services.web.risk.exceptions import (
+    DownloadRiskExportTaskError,
+    ExportRiskNoPermission,
+    RiskExportTaskNoPermission,
+)
+from services.web.risk.handlers.risk_export import RiskExporter
 from services.web.risk.handlers.ticket import (
     AutoProcess,
     CloseRisk,
@@ -76,10 +78,14 @@ from services.web.risk.models import (
     Risk,
     RiskAuditInstance,
     RiskExperience,
+    RiskExportTask,
+    RiskUserRelation,
+    RiskUserRole,
     TicketNode,
 )
 from services.web.risk.serializers import (
     BulkCustomTransRiskReqSerializer,
+    CreateRiskExportTaskReqSerializer,
     CustomAutoProcessReqSerializer,
     CustomCloseRiskRequestSerializer,
     CustomTransRiskReqSerializer,
@@ -96,12 +102,17 @@ from services.web.risk.serializers import (
     RetrieveRiskStrategyInfoResponseSerializer,
     RetryAutoProcessReqSerializer,
     RiskExportReqSerializer,
+    RiskExportTaskReqSerializer,
+    RiskExportTaskSerializer,
     RiskInfoSerializer,
     TicketNodeSerializer,
     UpdateRiskLabelReqSerializer,
 )
-from services.web.risk.tasks import process_one_risk, sync_auto_result
-from services.web.strategy_v2.constants import RiskLevel
+from services.web.risk.tasks import (
+    process_one_risk,
+    process_risk_export_task,
+    sync_auto_result,
+)
 from services.web.strategy_v2.models import Strategy, StrategyTag
 
 
@@ -151,6 +162,12 @@ class ListRisk(RiskMeta):
     RequestSerializer = ListRiskRequestSerializer
     bind_request = True
     audit_action = ActionEnum.LIST_RISK
+    # 人员筛选条件 => 风险用户角色，通过风险用户关系表筛选
+    user_filter_roles = {
+        "operator__contains": RiskUserRole.OPERATOR,
+        "current_operator__contains": RiskUserRole.CURRENT_OPERATOR,
+        "notice_users__contains": RiskUserRole.NOTICE_USER,
+    }
 
     def perform_request(self, validated_request_data):
         # 获取请求
@@ -188,6 +205,11 @@ class ListRisk(RiskMeta):
             strategy_ids = StrategyTag.objects.filter(tag_id__in=tag_filter).values_list('strategy_id', flat=True)
             q &= Q(strategy_id__in=strategy_ids)
 
+        # 人员筛选条件
+        for key, role in self.user_filter_roles.items():
+            if usernames := validated_request_data.pop(key, None):
+                q &= Q(risk_id__in=RiskUserRelation.load_risk_ids(role=role, usernames=usernames))
+
         for key, val in validated_request_data.items():
             if not val:
                 continue
@@ -205,7 +227,11 @@ class ListMineRisk(ListRisk):
 
     def load_risks(self, validated_request_data):
         queryset = super().load_risks(validated_request_data)
-        queryset = queryset.filter(Q(current_operator__contains=get_request_username()))
+        queryset = queryset.filter(
+            risk_id__in=RiskUserRelation.load_risk_ids(
+                role=RiskUserRole.CURRENT_OPERATOR, usernames=[get_request_username()]
+            )
+        )
         return queryset
 
 
@@ -214,7 +240,11 @@ class ListNoticingRisk(ListRisk):
 
     def load_risks(self, validated_request_data):
         queryset = super().load_risks(validated_request_data)
-        queryset = queryset.filter(Q(notice_users__contains=get_request_username()))
+        queryset = queryset.filter(
+            risk_id__in=RiskUserRelation.load_risk_ids(
+                role=RiskUserRole.NOTICE_USER, usernames=[get_request_username()]
+            )
+        )
         return queryset
 
 
@@ -515,6 +545,7 @@ class RetryAutoProcess(RiskMeta):
                 risk.status = RiskStatus.AUTO_PROCESS
                 risk.current_operator = []
                 risk.save(update_fields=["status", "current_operator"])
+                risk.sync_user_relations(roles=[RiskUserRole.CURRENT_OPERATOR])
         # 更新节点信息
         sync_auto_result.apply_async(countdown=60, kwargs={"node_id": node.id})
 
@@ -591,96 +622,29 @@ class RiskExport(RiskMeta):
     name = gettext_lazy("风险导出")
     RequestSerializer = RiskExportReqSerializer
 
-    def perform_request(self, validated_request_data):
-        risk_view_type: str = validated_request_data.get("risk_view_type", "")
-        risk_ids: List[str] = validated_request_data["risk_ids"]
+    def validate_export_permission(self, risk_ids: List[str]) -> None:
+        """
+        校验所有风险都有查看权限
+        """
 
-        # 1. 获取有权限的风险列表
-        risks: QuerySet[Risk] = Risk.prefetch_strategy_tags(Risk.load_authed_risks(action=ActionEnum.LIST_RISK)).filter(
-            risk_id__in=risk_ids
+        authed_risk_ids = set(
+            Risk.load_authed_risks(action=ActionEnum.LIST_RISK)
+            .filter(risk_id__in=risk_ids)
+            .values_list("risk_id", flat=True)
         )
-
-        authed_risk_ids = list(risks.values_list("risk_id", flat=True))
-        no_authed_risk_ids = set(risk_ids) - set(authed_risk_ids)
+        no_authed_risk_ids = set(risk_ids) - authed_risk_ids
         if no_authed_risk_ids:
             raise ExportRiskNoPermission(risk_ids=",".join(no_authed_risk_ids))
 
-        # 2. 按策略分组风险
-        strategies = list(
-            Strategy.objects.filter(strategy_id__in=risks.values_list("strategy_id", flat=True)).order_by("strategy_id")
-        )
+    def perform_request(self, validated_request_data):
+        risk_view_type: str = validated_request_data.get("risk_view_type", "")
+        risk_ids: List[str] = validated_request_data["risk_ids"]
 
-        # 3. 获取策略的导出字段
-        strategy_export_fields: Dict[str, List[ExportField]] = defaultdict(list)
-        for strategy in strategies:
-            risk_basic_fields = RiskExportField.export_fields()
-            event_fields = [
-                ExportField(
-                    raw_name=f"{EVENT_EXPORT_FIELD_PREFIX}{field['field_name']}",
-                    display_name=field["display_name"] or field["field_name"],
-                )
-                for field in strategy.event_data_field_configs
-            ]
-            strategy_export_fields[strategy.build_sheet_name()] = risk_basic_fields + event_fields
-
-        # 4. 获取风险关联的事件,按策略分组并格式化数据
-        bulk_events_params = []
-        formatted_risks_by_strategy = defaultdict(list)
-        risk_map = {risk.risk_id: risk for risk in risks}
-        for risk_id in risk_ids:
-            risk = risk_map[risk_id]
-            # 时间转为 +8 时间字符串
-            start_time = mstimestamp_to_date_string(int(risk.event_time.timestamp() * 1000))
-            end_time = mstimestamp_to_date_string(int(datetime.now().timestamp() * 1000))
-            risk_id = risk.risk_id
-            bulk_events_params.append(
-                {"risk_id": risk_id, "start_time": start_time, "end_time": end_time, "page": 1, "page_size": 10}
-            )
-        bulk_resp = resource.risk.list_event.bulk_request(bulk_events_params)
-        for risk_id, resp in zip(risk_ids, bulk_resp):
-            risk = risk_map[risk_id]
-            events = resp["results"]
-            risk_basic_data = {
-                RiskExportField.RISK_ID: risk_id,
-                RiskExportField.RISK_TITLE: risk.title,
-                RiskExportField.EVENT_CONTENT: risk.event_content,
-                RiskExportField.RISK_TAGS: data2string(
-                    [tag_rel.tag.tag_name for tag_rel in risk.strategy.prefetched_tags]
-                ),
-                RiskExportField.EVENT_TYPE: data2string(risk.event_type),
-                RiskExportField.RISK_LEVEL: str(RiskLevel.get_label(risk.strategy.risk_level)),
-                RiskExportField.STRATEGY_NAME: risk.strategy.strategy_name,
-                RiskExportField.STRATEGY_ID: risk.strategy.strategy_id,
-                RiskExportField.RAW_EVENT_ID: risk.raw_event_id,
-                RiskExportField.EVENT_END_TIME: risk.event_end_time.strftime(api_settings.DATETIME_FORMAT),
-                RiskExportField.EVENT_TIME: risk.event_time.strftime(api_settings.DATETIME_FORMAT),
-                RiskExportField.RISK_HAZARD: risk.strategy.risk_hazard,
-                RiskExportField.RISK_GUIDANCE: risk.strategy.risk_guidance,
-                RiskExportField.STATUS: str(RiskStatus.get_label(risk.status)),
-                RiskExportField.RULE_ID: risk.rule_id,
-                RiskExportField.OPERATOR: data2string(risk.operator),
-                RiskExportField.CURRENT_OPERATOR: data2string(risk.current_operator),
-                RiskExportField.NOTICE_USERS: data2string(risk.notice_users),
-            }
-            if not events:
-                formatted_risks_by_strategy[risk.strategy.build_sheet_name()].append(risk_basic_data)
-                continue
-            for event in events:
-                event_data = {
-                    field["field_name"]: event.get("event_data", {}).get(field["field_name"], "")
-                    for field in risk.strategy.event_data_field_configs
-                }
-                # 合并风险和事件字段，事件字段增加前缀
-                formatted_risk = {
-                    **risk_basic_data,
-                    **{f"{EVENT_EXPORT_FIELD_PREFIX}{k}": v for k, v in event_data.items()},
-                }
-                formatted_risks_by_strategy[risk.strategy.build_sheet_name()].append(formatted_risk)
+        # 1. 校验权限
+        self.validate_export_permission(risk_ids)
 
-        # 5. 导出 excel
-        exporter = MultiSheetRiskExporterXlsx()
-        exporter.write(sheets_data=formatted_risks_by_strategy, sheets_headers=strategy_export_fields)
-        excel_file = exporter.save()
+        # 2. 按批检索事件并写入 excel
+        excel_file = RiskExporter(risk_ids=risk_ids, username=get_request_username()).export()
         filename = RISK_EXPORT_FILE_NAME_TMP.format(
             risk_view_type=str(RiskViewType.get_label(risk_view_type)),
             datetime=datetime.now().strftime('%Y%m%d_%H%M%S'),
@@ -688,3 +652,69 @@ class RiskExport(RiskMeta):
         stream_response = FileResponse(excel_file, as_attachment=True, filename=filename)
         stream_response["Content-Type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         return stream_response
+
+
+class CreateRiskExportTask(RiskExport):
+    name = gettext_lazy("创建风险导出任务")
+    RequestSerializer = CreateRiskExportTaskReqSerializer
+    ResponseSerializer = RiskExportTaskSerializer
+
+    def perform_request(self, validated_request_data):
+        risk_ids: List[str] = list(dict.fromkeys(validated_request_data["risk_ids"]))
+        self.validate_export_permission(risk_ids)
+        task = RiskExportTask.objects.create(
+            risk_ids=risk_ids,
+            risk_view_type=validated_request_data.get("risk_view_type", ""),
+            status=TaskEnum.READY.value,
+            total=len(risk_ids),
+        )
+        transaction.on_commit(lambda: process_risk_export_task.delay(task_id=task.id))
+        return task
+
+
+class RiskExportTaskBase(RiskMeta, abc.ABC):
+    RequestSerializer = RiskExportTaskReqSerializer
+
+    def get_task(self, task_id: int) -> RiskExportTask:
+        """
+        获取导出任务，仅创建人和系统管理员可以访问
+        """
+
+        task: RiskExportTask = get_object_or_404(RiskExportTask, id=task_id)
+        username = get_request_username()
+        if not (is_system_admin(username) or username == task.created_by):
+            raise RiskExportTaskNoPermission()
+        return task
+
+
+class ListRiskExportTask(RiskMeta):
+    name = gettext_lazy("获取风险导出任务列表")
+    ResponseSerializer = RiskExportTaskSerializer
+    many_response_data = True
+
+    def perform_request(self, validated_request_data):
+        return RiskExportTask.objects.filter(created_by=get_request_username())
+
+
+class GetRiskExportTask(RiskExportTaskBase):
+    name = gettext_lazy("获取风险导出任务详情")
+    ResponseSerializer = RiskExportTaskSerializer
+
+    def perform_request(self, validated_request_data):
+        return self.get_task(validated_request_data["id"])
+
+
+class DownloadRiskExportTask(RiskExportTaskBase):
+    name = gettext_lazy("下载风险导出文件")
+
+    def perform_request(self, validated_request_data):
+        task = self.get_task(validated_request_data["id"])
+        if task.status != TaskEnum.SUCCESS.value:
+            raise DownloadRiskExportTaskError(msg=gettext("任务状态异常: %s") % dict(TaskEnum.choices).get(task.status))
+        stream_response = FileResponse(
+            BKRepoFile(task.result["storage_name"], storage=LogExportStorage()),
+            as_attachment=True,
+            filename=task.result["origin_name"],
+        )
+        stream_response["Content-Type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return stream_response
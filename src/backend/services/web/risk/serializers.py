@@ -28,6 +28,8 @@ from apps.meta.models import Tag
 from core.utils.distutils import strtobool
 from core.utils.time import mstimestamp_to_date_string
 from services.web.risk.constants import (
+    RISK_EXPORT_SYNC_MAX_COUNT,
+    RISK_EXPORT_TASK_MAX_COUNT,
     EventMappingFields,
     RiskLabel,
     RiskRuleOperator,
@@ -37,6 +39,7 @@ from services.web.risk.models import (
     ProcessApplication,
     Risk,
     RiskExperience,
+    RiskExportTask,
     RiskRule,
     TicketNode,
 )
@@ -695,8 +698,42 @@ class RiskExportReqSerializer(serializers.Serializer):
     """
 
     risk_ids = serializers.ListField(
-        label=gettext_lazy("Risk IDs"), child=serializers.CharField(), min_length=1, max_length=300
+        label=gettext_lazy("Risk IDs"),
+        child=serializers.CharField(),
+        min_length=1,
+        max_length=RISK_EXPORT_SYNC_MAX_COUNT,
     )
     risk_view_type = serializers.ChoiceField(
         label=gettext_lazy("Risk View Type"), required=False, choices=RiskViewType.choices
     )
+
+
+class CreateRiskExportTaskReqSerializer(RiskExportReqSerializer):
+    """
+    Create Risk Export Task Request Serializer
+    """
+
+    risk_ids = serializers.ListField(
+        label=gettext_lazy("Risk IDs"),
+        child=serializers.CharField(),
+        min_length=1,
+        max_length=RISK_EXPORT_TASK_MAX_COUNT,
+    )
+
+
+class RiskExportTaskReqSerializer(serializers.Serializer):
+    """
+    Risk Export Task Request Serializer
+    """
+
+    id = serializers.IntegerField(label=gettext_lazy("ID"))
+
+
+class RiskExportTaskSerializer(serializers.ModelSerializer):
+    """
+    Risk Export Task
+    """
+
+    class Meta:
+        model = RiskExportTask
+        exclude = ["risk_ids"]
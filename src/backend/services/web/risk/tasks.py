@@ -20,7 +20,6 @@ import datetime
 import os
 
 from billiard.exceptions import SoftTimeLimitExceeded
-from bk_resource import api
 from bk_resource.settings import bk_resource_settings
 from blueapps.contrib.celery_tools.periodic import periodic_task
 from blueapps.core.celery import celery_app
@@ -28,30 +27,38 @@ from blueapps.utils.logger import logger_celery
 from celery.schedules import crontab
 from django.conf import settings
 from django.core.cache import cache as _cache
-from django.db import transaction
+from django.utils import timezone
 from django.utils.translation import gettext
 from django_redis.client import DefaultClient
 
-from apps.itsm.constants import TicketStatus
 from apps.notice.handlers import ErrorMsgHandler
-from apps.sops.constants import SOPSTaskStatus
-from core.lock import lock
+from core.lock import CacheLock, lock
+from services.web.query.constants import FileExportResult, TaskEnum
+from services.web.query.utils.storage import LogExportStorage
 from services.web.risk.constants import (
     RISK_ESQUERY_DELAY_TIME,
     RISK_ESQUERY_SLICE_DURATION,
     RISK_EVENTS_SYNC_TIME,
+    RISK_EXPORT_FILE_NAME_TMP,
+    RISK_EXPORT_FILE_PATH_FORMAT,
+    RISK_EXPORT_TASK_EXPIRE_DAYS,
+    RISK_EXPORT_TASK_RETENTION_DAYS,
+    RISK_EXPORT_TASK_STUCK_TIMEOUT,
     RiskStatus,
+    RiskViewType,
     TicketNodeStatus,
 )
 from services.web.risk.handlers import BKMAlertSyncHandler, EventHandler
 from services.web.risk.handlers.risk import RiskHandler
+from services.web.risk.handlers.risk_export import RiskExporter
 from services.web.risk.handlers.ticket import (
     AutoProcess,
     ForApprove,
     NewRisk,
     TransOperator,
 )
-from services.web.risk.models import Risk, TicketNode
+from services.web.risk.handlers.ticket_sync import TicketNodeSyncHandler
+from services.web.risk.models import Risk, RiskExportTask, TicketNode
 
 cache: DefaultClient = _cache
 
@@ -69,7 +76,7 @@ def sync_bkm_alert():
 
 
 @celery_app.task(queue="risk", soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
-@lock(lock_name="celery:add_event")
+@lock(lock_name="celery:add_event", timeout=settings.CACHE_LOCK_HEARTBEAT_TIMEOUT, heartbeat=True)
 def add_event(data: list):
     """创建审计事件"""
 
@@ -211,68 +218,126 @@ def process_one_risk(*, risk_id: str):
     queue="risk",
     soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT,
 )
-@lock(lock_name="celery:sync_auto_result")
-def sync_auto_result(node_id: str = None):
+@lock(
+    lock_name="celery:sync_auto_result",
+    timeout=settings.CACHE_LOCK_HEARTBEAT_TIMEOUT,
+    heartbeat=True,
+    token_kwarg="fencing_token",
+)
+def sync_auto_result(node_id: str = None, fencing_token: int = None):
     """同步处理节点状态"""
 
-    # 筛选所有需要更新的节点
+    # 指定节点时直接同步
     if node_id:
-        nodes = TicketNode.objects.filter(id=node_id)
-    else:
-        nodes = TicketNode.objects.filter(status=TicketNodeStatus.RUNNING)
+        TicketNodeSyncHandler().sync(TicketNode.objects.filter(id=node_id))
+        return
+
+    # 按节点 ID 范围拆分子任务
+    node_ids = list(
+        TicketNode.objects.filter(status=TicketNodeStatus.RUNNING).order_by("id").values_list("id", flat=True)
+    )
+    for index in range(0, len(node_ids), settings.SYNC_AUTO_RESULT_SHARD_SIZE):
+        # 锁已被其他任务获取时停止下发，避免重复同步
+        if fencing_token and not CacheLock.is_owner("celery:sync_auto_result", fencing_token):
+            logger_celery.warning("[SyncAutoResult] Lock Lost; Token %s; Dispatched %s", fencing_token, index)
+            return
+        shard = node_ids[index : index + settings.SYNC_AUTO_RESULT_SHARD_SIZE]
+        sync_auto_result_shard.delay(start_id=shard[0], end_id=shard[-1])
+
+
+@celery_app.task(queue="risk", soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
+def sync_auto_result_shard(*, start_id: str, end_id: str):
+    """同步指定 ID 范围内的处理节点状态"""
 
-    # 逐个更新
-    for node in nodes:
+    nodes = TicketNode.objects.filter(status=TicketNodeStatus.RUNNING, id__gte=start_id, id__lte=end_id)
+    try:
+        updated = TicketNodeSyncHandler().sync(nodes)
+        logger_celery.info("[SyncAutoResult] Shard %s ~ %s Updated %s", start_id, end_id, updated)
+    except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+        logger_celery.exception("[SyncAutoResult] Shard %s ~ %s Error %s", start_id, end_id, err)
+
+
+@celery_app.task(queue="risk", soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
+@lock(load_lock_name=lambda task_id, **kwargs: f"celery:process_risk_export_task:{task_id}")
+def process_risk_export_task(task_id: int):
+    """执行风险导出任务，文件上传到制品库"""
+
+    task: RiskExportTask = RiskExportTask.objects.filter(id=task_id).first()
+    if not task or not task.update_task_running():
+        return
+    try:
+        excel_file = RiskExporter(
+            risk_ids=task.risk_ids, username=task.created_by, progress_callback=task.update_current
+        ).export()
         try:
-            with transaction.atomic():
-                node = TicketNode.objects.select_for_update().get(id=node.id)
-                # 审批节点
-                if node.action == ForApprove.__name__:
-                    sn = node.process_result.get("ticket", {}).get("sn")
-                    if sn:
-                        status = api.bk_itsm.ticket_approve_result(sn=[sn])[0]
-                        node.process_result["status"] = status
-                        node.status = (
-                            TicketNodeStatus.FINISHED
-                            if node.process_result["status"]["current_status"]
-                            in [
-                                TicketStatus.TERMINATED,
-                                TicketStatus.FINISHED,
-                                TicketStatus.FAILED,
-                                TicketStatus.REVOKED,
-                            ]
-                            else TicketNodeStatus.RUNNING
-                        )
-                    else:
-                        node.status = TicketNodeStatus.FINISHED
-                # 自动处理套餐节点
-                elif node.action == AutoProcess.__name__:
-                    task_id = node.process_result.get("task", {}).get("task_id", "")
-                    if task_id:
-                        status = api.bk_sops.get_task_status(task_id=task_id, bk_biz_id=settings.DEFAULT_BK_BIZ_ID)
-                        node.process_result["status"] = status
-                        node.status = (
-                            TicketNodeStatus.FINISHED
-                            if node.process_result["status"]["state"]
-                            in [
-                                SOPSTaskStatus.EXPIRED,
-                                SOPSTaskStatus.FINISHED,
-                                SOPSTaskStatus.FAILED,
-                                SOPSTaskStatus.REVOKED,
-                            ]
-                            else TicketNodeStatus.RUNNING
-                        )
-                    else:
-                        node.status = TicketNodeStatus.FINISHED
-                # 其他节点只需要判断不为最后一个，则关闭
-                # 或 该风险单已关闭，则关闭
-                else:
-                    last_node = TicketNode.objects.filter(risk_id=node.risk_id).order_by("-timestamp").first()
-                    risk = Risk.objects.filter(risk_id=node.risk_id).first()
-                    if (last_node and last_node.timestamp > node.timestamp) or (
-                        risk and risk.status == RiskStatus.CLOSED
-                    ):
-                        node.status = TicketNodeStatus.FINISHED
-                node.save(update_fields=["process_result", "status"])
+            file_name = RISK_EXPORT_FILE_NAME_TMP.format(
+                risk_view_type=str(RiskViewType.get_label(task.risk_view_type)),
+                datetime=datetime.datetime.now().strftime('%Y%m%d_%H%M%S'),
+            )
+            storage = LogExportStorage()
+            storage_name = storage.save(RISK_EXPORT_FILE_PATH_FORMAT.format(file_name=file_name), excel_file)
+            result = FileExportResult(
+                url=storage.url(storage_name),
+                size=storage.size(storage_name),
+                origin_name=file_name,
+                storage_name=storage_name,
+            )
+        finally:
+            excel_file.close()
+    except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+        logger_celery.exception("[ProcessRiskExportTask] Task %s Error %s", task_id, err)
+        task.update_task_failed(str(err))
+        return
+    if not task.update_task_success(result.dict()):
+        # 任务已被清理任务标记为失败，删除本次上传的文件
+        logger_celery.warning("[ProcessRiskExportTask] Task %s Not Running, Discard Result", task_id)
+        try:
+            storage.delete(storage_name)
         except Exception as err:  # NOCC:broad-except(需要处理所有错误)
-            logger_celery.exception("[SyncAutoResult] Error %s %s", node.id, err)
+            logger_celery.exception("[ProcessRiskExportTask] Task %s Delete File Error %s", task_id, err)
+
+
+@periodic_task(run_every=crontab(minute="30"), queue="risk", soft_time_limit=settings.DEFAULT_CACHE_LOCK_TIMEOUT)
+@lock(load_lock_name=lambda **kwargs: "celery:clean_risk_export_task")
+def clean_risk_export_task():
+    """
+    清理风险导出任务
+    1. 执行中且长时间未更新进度、或长时间未开始执行的任务标记为失败
+    2. 超过保留天数的导出文件删除，并将任务标记为过期
+    3. 超过保留天数的过期、失败任务删除
+    """
+
+    now = timezone.now()
+
+    # 卡住的任务，未开始执行的任务通常是 celery 消息丢失
+    stuck_tasks = RiskExportTask.objects.filter(
+        status__in=[TaskEnum.READY.value, TaskEnum.RUNNING.value],
+        updated_at__lt=now - datetime.timedelta(seconds=RISK_EXPORT_TASK_STUCK_TIMEOUT),
+    )
+    for task in stuck_tasks:
+        status = task.status
+        if task.update_task_failed(gettext("任务执行超时")):
+            logger_celery.warning("[CleanRiskExportTask] Task %s Stuck, Status %s", task.id, status)
+
+    # 过期的导出文件
+    storage = LogExportStorage()
+    expired_tasks = RiskExportTask.objects.filter(
+        status=TaskEnum.SUCCESS.value,
+        task_end_time__lt=now - datetime.timedelta(days=RISK_EXPORT_TASK_EXPIRE_DAYS),
+    )
+    for task in expired_tasks:
+        try:
+            if task.result.get("storage_name"):
+                storage.delete(task.result["storage_name"])
+            task.update_task_expired()
+        except Exception as err:  # NOCC:broad-except(需要处理所有错误)
+            logger_celery.exception("[CleanRiskExportTask] Task %s Expire Error %s", task.id, err)
+
+    # 过期的任务记录
+    deleted, _ = RiskExportTask.objects.filter(
+        status__in=[TaskEnum.EXPIRED.value, TaskEnum.FAILURE.value],
+        created_at__lt=now - datetime.timedelta(days=RISK_EXPORT_TASK_RETENTION_DAYS),
+    ).delete()
+    logger_celery.info(
+        "[CleanRiskExportTask] Stuck %s; Expired %s; Deleted %s", len(stuck_tasks), len(expired_tasks), deleted
+    )
@@ -157,6 +157,22 @@ class RisksViewSet(ResourceViewSet):
     ]
 
 
+class RiskExportTasksViewSet(ResourceViewSet):
+    """
+    Risk Export Tasks
+    """
+
+    def get_permissions(self):
+        return []
+
+    resource_routes = [
+        ResourceRoute("POST", resource.risk.create_risk_export_task),
+        ResourceRoute("GET", resource.risk.list_risk_export_task),
+        ResourceRoute("GET", resource.risk.get_risk_export_task, pk_field="id"),
+        ResourceRoute("GET", resource.risk.download_risk_export_task, pk_field="id", endpoint="download"),
+    ]
+
+
 class RiskExperiencesViewSet(ResourceViewSet):
     def get_permissions(self):
         if self.action in ["retrieve"]:
@@ -214,6 +214,7 @@ class SQLDataSearchConfig(BaseModel):
     referenced_tables: List[Table]  # RT表
     input_variable: List[SQLDataSearchInputVariable]  # 输入变量
     output_fields: List[SQLDataSearchOutputField]  # 输出字段
+    result_cache_ttl: int = PydanticField(0, title="结果缓存时间(秒)", ge=0)  # 为 0 时不缓存
 
 
 class BkVisionConfig(BaseModel):
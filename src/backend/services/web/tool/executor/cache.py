@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+import json
+import time
+from typing import Callable, Optional, Tuple
+
+from blueapps.utils.base import md5_sum
+from blueapps.utils.logger import logger
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.lock import CacheLock
+from services.web.tool.executor.model import DataSearchCacheInfo
+
+
+class ToolResultCache:
+    """
+    工具查询结果缓存
+    同一个 key 同时只有一个请求查询数据源，其他请求等待其写入缓存后直接读取，超时后自行查询
+    查询期间锁由心跳续期，查询耗时超过等待时间或锁超时时间时锁仍被持有；持有者异常退出后锁在 lock_timeout 内过期
+    """
+
+    key_prefix = "tool_result"
+
+    def __init__(
+        self,
+        ttl: int,
+        max_bytes: int = settings.TOOL_RESULT_CACHE_MAX_BYTES,
+        wait_timeout: int = settings.TOOL_RESULT_CACHE_WAIT_TIMEOUT,
+        poll_interval: float = 0.2,
+        lock_timeout: float = settings.CACHE_LOCK_HEARTBEAT_TIMEOUT,
+    ):
+        self.ttl = min(ttl, settings.TOOL_RESULT_CACHE_MAX_TTL)
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+
+    @classmethod
+    def build_key(cls, *parts) -> str:
+        return f"{cls.key_prefix}:{md5_sum(json.dumps(parts, cls=DjangoJSONEncoder))}"
+
+    def get(self, key: str) -> Tuple[Optional[dict], Optional[DataSearchCacheInfo]]:
+        cached = cache.get(key)
+        if cached is None:
+            return None, None
+        return cached["data"], DataSearchCacheInfo(hit=True, cached_at=cached["cached_at"], ttl=self.ttl)
+
+    def set(self, key: str, data: dict) -> DataSearchCacheInfo:
+        payload = {"data": data, "cached_at": int(time.time())}
+        size = len(json.dumps(payload, cls=DjangoJSONEncoder))
+        if size > self.max_bytes:
+            logger.info(f"[{self.__class__.__name__}] Skip Cache; Key: {key}; Size: {size}; MaxBytes: {self.max_bytes}")
+            return DataSearchCacheInfo(hit=False, ttl=self.ttl)
+        cache.set(key, payload, timeout=self.ttl)
+        return DataSearchCacheInfo(hit=False, cached_at=payload["cached_at"], ttl=self.ttl)
+
+    def get_or_load(self, key: str, loader: Callable[[], dict]) -> Tuple[dict, DataSearchCacheInfo]:
+        """
+        读取缓存，未命中时加锁查询并写入缓存
+        """
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            data, cache_info = self.get(key)
+            if cache_info:
+                return data, cache_info
+            _lock = CacheLock(
+                lock_name=f"{key}:lock", timeout=self.lock_timeout, heartbeat=True, metric_name="tool_result_cache"
+            )
+            if not _lock.locked:
+                try:
+                    # 加锁期间其他请求可能已经写入缓存
+                    data, cache_info = self.get(key)
+                    if cache_info:
+                        return data, cache_info
+                    data = loader()
+                    return data, self.set(key, data)
+                finally:
+                    _lock.release()
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        # 等待超时，直接查询
+        logger.warning(f"[{self.__class__.__name__}] Wait Timeout; Key: {key}")
+        return loader(), DataSearchCacheInfo(hit=False, ttl=self.ttl)
@@ -15,7 +15,7 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
-from typing import Any, List
+from typing import Any, List, Optional
 
 from pydantic import BaseModel
 from pydantic import Field as PydanticField
@@ -42,6 +42,16 @@ class DataSearchToolExecuteParams(BaseModel):
     page_size: int = PydanticField(DATA_SEARCH_TOOL_DEFAULT_PAGE_SIZE, title="每页条数")
 
 
+class DataSearchCacheInfo(BaseModel):
+    """
+    数据查询结果缓存信息
+    """
+
+    hit: bool = PydanticField(..., title="是否命中缓存")
+    cached_at: Optional[int] = PydanticField(None, title="缓存写入时间(秒级时间戳)")
+    ttl: int = PydanticField(..., title="缓存时间(秒)")
+
+
 class DataSearchToolExecuteResult(BaseModel):
     """
     数据查询工具执行结果
@@ -53,6 +63,7 @@ class DataSearchToolExecuteResult(BaseModel):
     results: List[dict]
     query_sql: str
     count_sql: str
+    cache: Optional[DataSearchCacheInfo] = None  # 未开启缓存时为空
 
 
 class BkVisionExecuteResult(BaseModel):
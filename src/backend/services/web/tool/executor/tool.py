@@ -30,6 +30,7 @@ from core.models import get_request_username
 from core.sql.parser.model import RangeVariableData
 from core.sql.parser.praser import SqlQueryAnalysis
 from core.utils.time import parse_datetime
+from services.web.common.bkbase_auth import batch_check_user_auth
 from services.web.tool.constants import (
     BkVisionConfig,
     DataSearchConfigTypeEnum,
@@ -47,6 +48,7 @@ from services.web.tool.exceptions import (
     ParseVariableError,
     VariableHasNoParseFunction,
 )
+from services.web.tool.executor.cache import ToolResultCache
 from services.web.tool.executor.model import (
     BkVisionExecuteResult,
     DataSearchToolExecuteParams,
@@ -223,11 +225,18 @@ class SqlDataSearchExecutor(
     def _parse_params(self, params):
         return DataSearchToolExecuteParams.model_validate(params)
 
+    def get_permission_user(self) -> str:
+        """
+        数据查询使用的权限用户: 工具更新人 or 当前请求用户
+        """
+
+        return self.tool.get_permission_owner() if self.tool else get_request_username()
+
     def validate_permission(self, params: DataSearchToolExecuteParams):
         """
         校验权限: 校验工具更新人 or 当前请求用户有表查询条件
         """
-        user_id = self.tool.get_permission_owner() if self.tool else get_request_username()
+        user_id = self.get_permission_user()
         parsed_def = self.analyzer.get_parsed_def()
         permissions = [
             {
@@ -237,7 +246,7 @@ class SqlDataSearchExecutor(
             }
             for table in parsed_def.referenced_tables
         ]
-        bulk_resp = api.bk_base.user_auth_batch_check({"permissions": permissions})
+        bulk_resp = batch_check_user_auth(permissions)
         for rt in bulk_resp:
             if rt.get("result"):
                 continue
@@ -287,6 +296,33 @@ class SqlDataSearchExecutor(
         logger.info(f"{[self.__class__.__name__]} Execute SQL: {sql_result}")
         executable_sql = sql_result["data"]
         count_sql = sql_result["count"]
+        cache_info = None
+        if self.config.result_cache_ttl:
+            # 缓存按工具、权限用户和最终 SQL 区分
+            result_cache = ToolResultCache(ttl=self.config.result_cache_ttl)
+            cache_key = result_cache.build_key(
+                self.tool.uid if self.tool else "", self.get_permission_user(), executable_sql, count_sql
+            )
+            query_result, cache_info = result_cache.get_or_load(
+                cache_key, lambda: self.query(executable_sql=executable_sql, count_sql=count_sql)
+            )
+        else:
+            query_result = self.query(executable_sql=executable_sql, count_sql=count_sql)
+        return DataSearchToolExecuteResult(
+            page=params.page,
+            num_pages=params.page_size,
+            total=query_result["total"],
+            results=query_result["results"],
+            query_sql=executable_sql,
+            count_sql=count_sql,
+            cache=cache_info,
+        )
+
+    def query(self, executable_sql: str, count_sql: str) -> dict:
+        """
+        请求 BKBASE 查询数据和总数
+        """
+
         bulk_req_params = [
             {
                 "sql": executable_sql,
@@ -295,7 +331,6 @@ class SqlDataSearchExecutor(
                 "sql": count_sql,
             },
         ]
-        # 请求 BKBASE
         try:
             bulk_resp = api.bk_base.query_sync.bulk_request(bulk_req_params)
         except APIRequestError as e:
@@ -303,14 +338,7 @@ class SqlDataSearchExecutor(
             raise BkbaseApiRequestError(sql=executable_sql)
         data_resp, count_resp = bulk_resp
         total = count_resp.get("list", [{}])[0].get("count", 0)
-        return DataSearchToolExecuteResult(
-            page=params.page,
-            num_pages=params.page_size,
-            total=total,
-            results=data_resp.get("list", []),
-            query_sql=executable_sql,
-            count_sql=count_sql,
-        )
+        return {"total": total, "results": data_resp.get("list", [])}
 
 
 class BkVisionExecutor(BaseToolExecutor[BkVisionConfig, None, BkVisionExecuteResult]):
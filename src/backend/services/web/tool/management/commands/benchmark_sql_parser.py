@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.sql.parser.model import RangeVariableData
+from core.sql.parser.praser import SqlQueryAnalysis
+
+DEFAULT_SQL = (
+    "SELECT id, name FROM events WHERE TIME_RANGE(ts, :time_range) "
+    "AND SKIP_NULL_CLAUSE(status, 'eq', :st) AND type = :t"
+)
+
+
+class Command(BaseCommand):
+    """对比每次解析与使用解析缓存生成 SQL 的耗时，不访问数据库"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=200, help="每种方式生成 SQL 的次数")
+        parser.add_argument("--sql", default=DEFAULT_SQL, help="待生成的 SQL，变量取值使用内置样例")
+
+    def handle(self, *args, **options):
+        rounds = max(options["rounds"], 1)
+        params = {"time_range": RangeVariableData(start=1700000000000, end=1700003600000), "t": "login"}
+        analyzer = SqlQueryAnalysis(options["sql"])
+        analyzer.generate_sql_with_values(params, with_count=True)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            SqlQueryAnalysis.parsed_cache.clear()
+            analyzer.generate_sql_with_values(params, with_count=True)
+        uncached_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            analyzer.generate_sql_with_values(params, with_count=True)
+        cached_cost = time.perf_counter() - start
+
+        self.stdout.write(
+            f"[BenchmarkSqlParser] rounds={rounds}; parse_each_time={uncached_cost / rounds * 1000:.3f}ms; "
+            f"cached={cached_cost / rounds * 1000:.3f}ms"
+        )
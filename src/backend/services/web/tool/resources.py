@@ -22,7 +22,7 @@ from collections import defaultdict
 from copy import deepcopy
 from typing import List
 
-from bk_resource import Resource, api, resource
+from bk_resource import Resource, resource
 from blueapps.utils.logger import logger
 from django.db import transaction
 from django.db.models import Count, Q
@@ -39,6 +39,7 @@ from core.models import get_request_username
 from core.sql.parser.model import ParsedSQLInfo
 from core.sql.parser.praser import SqlQueryAnalysis
 from core.utils.page import paginate_data
+from services.web.common.bkbase_auth import batch_check_user_auth
 from services.web.common.caller_permission import (
     CurrentType,
     should_skip_permission_from,
@@ -925,4 +926,4 @@ class UserQueryTableAuthCheck(ToolBase):
             }
             for table in tables
         ]
-        return api.bk_base.user_auth_batch_check({"permissions": permissions})
+        return batch_check_user_auth(permissions)
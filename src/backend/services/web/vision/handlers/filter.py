@@ -28,7 +28,7 @@ from django.db.models import QuerySet
 from iam.contrib.converter.queryset import DjangoQuerySetConverter
 
 from apps.meta.models import System, Tag
-from apps.permission.handlers.actions import ActionEnum, ActionMeta, get_action_by_id
+from apps.permission.handlers.actions import ActionEnum, ActionMeta
 from apps.permission.handlers.permission import Permission
 from apps.permission.handlers.resource_types import ResourceEnum
 from core.exceptions import PermissionException
@@ -99,8 +99,7 @@ class DeptFilter(DataFilter):
 
         # 获取有权限的组织架构
         permission = Permission(username)
-        request = permission.make_request(action=get_action_by_id(ActionEnum.VIEW_PANEL), resources=[])
-        policies = permission.iam_client._do_policy_query(request)
+        policies = permission.get_policies_for_action(ActionEnum.VIEW_PANEL)
         if policies:
             try:
                 result = DeptConvertor().convert(policies)
@@ -168,8 +167,7 @@ class TagBasedPermissionFilter(DataFilter):
 
         # 获取有权限的标签
         permission = Permission(username)
-        request = permission.make_request(action=get_action_by_id(self.iam_action), resources=[])
-        policies = permission.iam_client._do_policy_query(request)
+        policies = permission.get_policies_for_action(self.iam_action)
         if policies:
             condition = DjangoQuerySetConverter({"tag.id": "tag_id"}).convert(policies)
             authed_tag = Tag.objects.filter(condition)
@@ -242,8 +240,7 @@ class SystemDiagnosisFilter(DataFilter):
         username = self.get_request_username()
         # 获取有权限的系统
         permission = Permission(username)
-        request = permission.make_request(action=get_action_by_id(self.iam_action), resources=[])
-        policies = permission.iam_client._do_policy_query(request)
+        policies = permission.get_policies_for_action(self.iam_action)
         if policies:
             q = DjangoQuerySetConverter({"system.id": "system_id"}).convert(policies)
             return System.objects.filter(q)
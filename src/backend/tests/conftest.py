@@ -34,6 +34,17 @@ def pytest_configure(config: pytest.Config) -> None:
     importlib.import_module(settings.ROOT_URLCONF)
 
 
+@pytest.fixture(autouse=True)
+def flush_bkbase_user_auth_cache():
+    """
+    BKBase 鉴权结果缓存在进程内共享，每个用例前刷新避免互相影响
+    """
+
+    from services.web.common.bkbase_auth import flush_user_auth_cache
+
+    flush_user_auth_cache()
+
+
 def mock_bk_base_get_flow_graph():
     return mock.patch.object(
         GetFlowGraph,
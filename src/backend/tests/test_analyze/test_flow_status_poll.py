@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.poll.constants import POLL_NEXT_TICK_CACHE_KEY, PollStatusChoices
+from apps.poll.handlers import PollScheduler
+from apps.poll.models import PollTask
+from services.web.analyze.constants import FlowStatusChoices
+from services.web.analyze.tasks import check_flow_status
+from services.web.strategy_v2.constants import StrategyStatusChoices
+from services.web.strategy_v2.models import Strategy
+from tests.base import TestCase
+
+
+class FlowStatusPollTest(TestCase):
+    def setUp(self):
+        cache.delete(POLL_NEXT_TICK_CACHE_KEY)
+        self.addCleanup(cache.delete, POLL_NEXT_TICK_CACHE_KEY)
+        self.strategies = [
+            Strategy.objects.create(
+                namespace=self.namespace,
+                strategy_name=f"flow_{index}",
+                status=StrategyStatusChoices.STARTING.value,
+                backend_data={"flow_id": index},
+            )
+            for index in range(3)
+        ]
+        patchers = [
+            mock.patch("apps.poll.tasks.run_poll_tasks.apply_async"),
+            mock.patch("services.web.analyze.poll.ErrorMsgHandler"),
+        ]
+        self.apply_async, self.error_msg_handler = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def register(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for strategy in self.strategies:
+                check_flow_status(
+                    strategy.strategy_id,
+                    success_status=StrategyStatusChoices.RUNNING.value,
+                    failed_status=StrategyStatusChoices.START_FAILED.value,
+                    other_status=StrategyStatusChoices.STARTING.value,
+                )
+        PollTask.objects.update(next_poll_at=timezone.now() - datetime.timedelta(seconds=1))
+
+    def test_check_in_one_sweep(self):
+        """到期的 Flow 在一次调度中并发检查"""
+        self.register()
+        deploy_data = [
+            {"status": FlowStatusChoices.SUCCESS.value},
+            {"status": FlowStatusChoices.FAILURE.value, "logs": [{"level": "ERROR", "message": "oom"}]},
+            {"status": "running"},
+        ]
+        with mock.patch(
+            "services.web.analyze.poll.api.bk_base.get_flow_deploy_data.bulk_request", return_value=deploy_data
+        ) as bulk_request:
+            PollScheduler().tick()
+
+        bulk_request.assert_called_once()
+        self.assertEqual(bulk_request.call_args.args[0], [{"flow_id": index} for index in range(3)])
+        statuses = dict(Strategy.objects.values_list("strategy_id", "status"))
+        self.assertEqual(
+            [statuses[strategy.strategy_id] for strategy in self.strategies],
+            [
+                StrategyStatusChoices.RUNNING.value,
+                StrategyStatusChoices.START_FAILED.value,
+                StrategyStatusChoices.STARTING.value,
+            ],
+        )
+        self.assertEqual(Strategy.objects.get(strategy_id=self.strategies[1].strategy_id).status_msg, "oom")
+        self.error_msg_handler.assert_called_once()
+        self.assertEqual(
+            list(PollTask.objects.order_by("id").values_list("status", flat=True)),
+            [PollStatusChoices.SUCCESS.value, PollStatusChoices.FAILED.value, PollStatusChoices.PENDING.value],
+        )
+
+    def test_expired(self):
+        """超过最长检查时间后置为失败"""
+        self.register()
+        PollTask.objects.update(expired_at=timezone.now())
+
+        with mock.patch("services.web.analyze.poll.api.bk_base.get_flow_deploy_data.bulk_request") as bulk_request:
+            PollScheduler().tick()
+
+        bulk_request.assert_not_called()
+        self.assertFalse(Strategy.objects.exclude(status=StrategyStatusChoices.START_FAILED.value).exists())
+        self.assertEqual(self.error_msg_handler.call_count, len(self.strategies))
@@ -1,6 +1,10 @@
+from unittest import mock
+
+import sqlglot
 from django.test import TestCase
 
 from core.sql.exceptions import SQLParseError
+from core.sql.parser.functions import function_visitors
 from core.sql.parser.model import ParsedSQLInfo, RangeVariableData
 from core.sql.parser.praser import SqlQueryAnalysis
 
@@ -241,3 +245,60 @@ class TestSqlQueryAnalysis(TestCase):
         vars_ = analyzer.get_parsed_def().sql_variables
         assert vars_[0].raw_name == "st" and vars_[0].required is False
         assert vars_[1].raw_name == "t" and vars_[1].required is True
+
+
+class TestSqlQueryAnalysisCache(TestCase):
+    """测试 SQL 解析结果缓存"""
+
+    sql = (
+        "SELECT id, name FROM events WHERE TIME_RANGE(ts, :time_range) "
+        "AND SKIP_NULL_CLAUSE(status, 'eq', :st) AND type = :t"
+    )
+    params = {"time_range": RangeVariableData(start=1700000000000, end=1700003600000), "t": "login"}
+
+    def setUp(self):
+        SqlQueryAnalysis.parsed_cache.clear()
+
+    def test_parse_once(self):
+        with mock.patch("core.sql.parser.praser.sqlglot.parse_one", wraps=sqlglot.parse_one) as parse_one:
+            for _ in range(3):
+                analyzer = SqlQueryAnalysis(self.sql)
+                analyzer.get_parsed_def()
+                analyzer.generate_sql_with_values(self.params, with_count=True)
+        parse_one.assert_called_once()
+
+    def test_cached_tree_not_modified(self):
+        first = SqlQueryAnalysis(self.sql).generate_sql_with_values(self.params, limit=10, with_count=True)
+        second = SqlQueryAnalysis(self.sql).generate_sql_with_values({**self.params, "st": "ok"}, limit=10)
+        third = SqlQueryAnalysis(self.sql).generate_sql_with_values(self.params, limit=10, with_count=True)
+
+        assert first == third
+        assert "status = 'ok'" in second["data"]
+        assert first["data"].endswith("LIMIT 10")
+        assert "LIMIT" not in first["count"]
+
+    def test_metadata_copied(self):
+        analyzer = SqlQueryAnalysis(self.sql)
+        analyzer.parse_sql()
+        analyzer.sql_variables[0].display_name = "changed"
+        assert SqlQueryAnalysis(self.sql).get_parsed_def().sql_variables[0].display_name == "time_range"
+
+    def test_custom_function_expand_order(self):
+        """嵌套的自定义函数先展开外层，外层展开后的结果不再继续展开"""
+        expanded = []
+
+        def record(func_cls, visitor):
+            def wrapper(node, **kwargs):
+                expanded.append(func_cls.__name__)
+                return visitor(node, **kwargs)
+
+            return wrapper
+
+        sql = "SELECT id FROM events WHERE SKIP_NULL_CLAUSE(TIME_RANGE(ts, :time_range), 'eq', :st)"
+        params = {"time_range": RangeVariableData(start=1, end=100), "st": "ok"}
+        recorders = {func_cls: record(func_cls, visitor) for func_cls, visitor in function_visitors.items()}
+        with mock.patch.dict(function_visitors, recorders):
+            data_sql = SqlQueryAnalysis(sql).generate_sql_with_values(params)["data"]
+
+        assert expanded == ["SkipNullClause"]
+        assert "= 'ok'" in data_sql
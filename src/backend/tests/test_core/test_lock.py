@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import threading
+import time
+import unittest
+import uuid
+from unittest import mock
+
+from django.core.cache import cache as _cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+from django_redis.cache import RedisCache
+
+from core.lock import CacheLock, LockMetrics, lock
+
+REDIS_LOCATION = "redis://127.0.0.1:6379/0"
+# 心跳锁超时时间（秒），心跳间隔为其 1/3
+HEARTBEAT_TIMEOUT = 0.3
+
+
+def build_redis_cache():
+    redis_cache = RedisCache(
+        REDIS_LOCATION,
+        {
+            "KEY_PREFIX": f"test_lock_{uuid.uuid4().hex}",
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        },
+    )
+    try:
+        redis_cache.client.get_client().ping()
+    except Exception:  # pylint: disable=broad-except
+        return None
+    return redis_cache
+
+
+REDIS_CACHE = build_redis_cache()
+
+
+class CacheLockTest(SimpleTestCase):
+    cache = _cache
+
+    def setUp(self):
+        self.lock_name = f"test_lock:{uuid.uuid4().hex}"
+        CacheLock.metrics.clear()
+        self.addCleanup(CacheLock.metrics.clear)
+
+    def test_fencing_token(self):
+        """每次获取锁的 token 单调递增，锁被占用时获取失败"""
+        first = CacheLock(self.lock_name)
+        self.assertFalse(first.locked)
+        self.assertTrue(CacheLock(self.lock_name).locked)
+        first.release()
+        second = CacheLock(self.lock_name)
+        self.assertFalse(second.locked)
+        self.assertGreater(second.token, first.token or 0)
+        self.assertTrue(CacheLock.is_owner(self.lock_name, second.token))
+        second.release()
+
+        stats = CacheLock.metrics.get_stats(CacheLock.default_metric_name)
+        self.assertEqual(stats["acquired"], 2)
+        self.assertEqual(stats["contended"], 1)
+
+    def test_release_by_owner(self):
+        """锁过期后被其他任务获取，原持有者释放时不会删除新锁"""
+        expired = CacheLock(self.lock_name)
+        self.cache.delete(self.lock_name)
+        current = CacheLock(self.lock_name)
+        self.assertFalse(current.locked)
+
+        self.assertFalse(expired.release())
+        self.assertTrue(CacheLock.is_owner(self.lock_name, current.token))
+        self.assertTrue(current.release())
+
+    def test_wait_timeout(self):
+        """等待期间锁被释放后获取成功，并记录等待耗时"""
+        holder = CacheLock(self.lock_name)
+        threading.Timer(0.2, holder.release).start()
+
+        waiter = CacheLock(self.lock_name, wait_timeout=2)
+        self.assertFalse(waiter.locked)
+        waiter.release()
+        self.assertGreaterEqual(CacheLock.metrics.get_stats(CacheLock.default_metric_name)["max_wait_seconds"], 0.15)
+
+    def test_heartbeat(self):
+        """心跳续期使锁在超过超时时间后仍被持有"""
+        holder = CacheLock(self.lock_name, timeout=HEARTBEAT_TIMEOUT, heartbeat=True)
+        time.sleep(HEARTBEAT_TIMEOUT * 3)
+        self.assertTrue(CacheLock(self.lock_name).locked)
+        holder.release()
+        self.assertFalse(CacheLock(self.lock_name).locked)
+
+    def test_heartbeat_lost(self):
+        """锁被其他任务获取后心跳停止并标记丢锁"""
+        holder = CacheLock(self.lock_name, timeout=HEARTBEAT_TIMEOUT, heartbeat=True)
+        self.cache.delete(self.lock_name)
+        other = CacheLock(self.lock_name)
+        time.sleep(HEARTBEAT_TIMEOUT)
+
+        self.assertTrue(holder.lost)
+        self.assertEqual(CacheLock.metrics.get_stats(CacheLock.default_metric_name)["lost"], 1)
+        holder.release()
+        self.assertTrue(CacheLock.is_owner(self.lock_name, other.token))
+        other.release()
+
+    def test_metric_names_bounded(self):
+        """动态锁名默认聚合统计，超过指标名上限后计入溢出指标"""
+        CacheLock(self.lock_name).release()
+        CacheLock(f"{self.lock_name}:other", metric_name="other").release()
+        self.assertEqual(set(CacheLock.metrics.get_stats()), {CacheLock.default_metric_name, "other"})
+
+        with mock.patch.object(LockMetrics, "max_names", 2):
+            CacheLock(self.lock_name, metric_name="extra").release()
+        stats = CacheLock.metrics.get_stats()
+        self.assertNotIn("extra", stats)
+        self.assertEqual(stats[LockMetrics.overflow_name]["acquired"], 1)
+
+    def test_decorator(self):
+        """装饰器传入 fencing token，被占用时跳过执行"""
+
+        @lock(lock_name=self.lock_name, token_kwarg="fencing_token")
+        def run(fencing_token=None):
+            self.assertIsNone(run_nested())
+            return fencing_token
+
+        @lock(lock_name=self.lock_name)
+        def run_nested():
+            return True
+
+        token = run()
+        self.assertTrue(token)
+        self.assertFalse(CacheLock.is_owner(self.lock_name, token))
+        self.assertGreater(run(), token)
+
+    @override_settings(CACHE_LOCK_FENCING_TIMEOUT=5)
+    def test_fencing_timeout(self):
+        """token 计数器按锁超时时间的 10 倍过期，长期不使用后不会保留"""
+        local_cache = LocMemCache(f"test_lock_{uuid.uuid4().hex}", {})
+        with mock.patch("core.lock.cache", local_cache):
+            holder = CacheLock(self.lock_name, timeout=1)
+            self.assertEqual(holder.fencing_timeout, 10)
+            holder.release()
+
+        fencing_key = CacheLock.build_fencing_key(self.lock_name)
+        now = time.time()
+        with mock.patch("time.time", return_value=now + 9):
+            self.assertIsNotNone(local_cache.get(fencing_key))
+        with mock.patch("time.time", return_value=now + 11):
+            self.assertIsNone(local_cache.get(fencing_key))
+
+
+@unittest.skipIf(REDIS_CACHE is None, "redis is not available")
+class RedisCacheLockTest(CacheLockTest):
+    """Redis 后端通过 Lua 脚本获取、续期、释放锁"""
+
+    cache = REDIS_CACHE
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("core.lock.cache", REDIS_CACHE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(REDIS_CACHE.delete_many, [self.lock_name, CacheLock.build_fencing_key(self.lock_name)])
+
+    def test_lua_script(self):
+        holder = CacheLock(self.lock_name, timeout=10)
+        self.assertIsNotNone(CacheLock.get_redis_client())
+        self.assertEqual(REDIS_CACHE.get(self.lock_name), holder.token)
+        self.assertTrue(holder.extend())
+        self.assertGreater(REDIS_CACHE.ttl(self.lock_name), 0)
+        self.assertTrue(holder.release())
+        self.assertIsNone(REDIS_CACHE.get(self.lock_name))
+
+    @override_settings(CACHE_LOCK_FENCING_TIMEOUT=5)
+    def test_fencing_timeout(self):
+        holder = CacheLock(self.lock_name, timeout=1)
+        fencing_key = CacheLock.build_fencing_key(self.lock_name)
+        self.assertTrue(0 < REDIS_CACHE.ttl(fencing_key) <= 10)
+        REDIS_CACHE.persist(fencing_key)
+        self.assertTrue(holder.extend())
+        self.assertTrue(0 < REDIS_CACHE.ttl(fencing_key) <= 10)
+        holder.release()
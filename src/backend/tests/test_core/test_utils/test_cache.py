@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import uuid
+from unittest import mock
+
+from apps.meta.models import GlobalMetaConfig
+from core.utils.cache import LRUCache, TwoLevelCache
+from tests.base import TestCase
+
+
+class TestLRUCache(TestCase):
+    """测试进程内 LRU 缓存"""
+
+    def test_evict_least_recently_used(self):
+        lru = LRUCache(max_size=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
+
+    @mock.patch("core.utils.cache.time.monotonic")
+    def test_ttl(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        lru = LRUCache(max_size=10, ttl=5)
+        lru.set("a", 1)
+        mock_monotonic.return_value = 104
+        self.assertEqual(lru.get("a"), 1)
+        mock_monotonic.return_value = 106
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual((lru.hits, lru.misses), (1, 1))
+
+
+class TestTwoLevelCache(TestCase):
+    """测试两级缓存"""
+
+    def setUp(self):
+        self.namespace = f"test_two_level_cache:{uuid.uuid1().hex}"
+        self.source = {"a": 1, "b": None}
+        self.loader = mock.Mock(side_effect=lambda keys: {k: self.source[k] for k in keys if k in self.source})
+
+    def build_cache(self) -> TwoLevelCache:
+        return TwoLevelCache(namespace=self.namespace, max_size=10, local_ttl=60, remote_ttl=60)
+
+    def test_get_many_caches_values_and_missing_keys(self):
+        two_level_cache = self.build_cache()
+        self.assertEqual(two_level_cache.get_many(["a", "b", "c"], self.loader), {"a": 1, "b": None})
+        self.assertEqual(two_level_cache.get_many(["a", "b", "c"], self.loader), {"a": 1, "b": None})
+        self.loader.assert_called_once_with(["a", "b", "c"])
+        self.assertEqual(two_level_cache.get_stats()["local_hits"], 3)
+
+    def test_remote_cache_shared_between_processes(self):
+        self.build_cache().get_many(["a"], self.loader)
+        other = self.build_cache()
+        self.assertEqual(other.get_many(["a"], self.loader), {"a": 1})
+        self.loader.assert_called_once()
+        self.assertEqual(other.get_stats()["remote_hits"], 1)
+
+    def test_invalidate(self):
+        two_level_cache = self.build_cache()
+        two_level_cache.get_many(["a"], self.loader)
+        self.source["a"] = 2
+        two_level_cache.invalidate()
+        self.assertEqual(two_level_cache.get_many(["a"], self.loader), {"a": 2})
+        # 其他进程本地缓存过期后读取到新版本
+        other = self.build_cache()
+        self.assertEqual(other.get_many(["a"], self.loader), {"a": 2})
+
+    def test_get_with_default(self):
+        two_level_cache = self.build_cache()
+
+        def loader():
+            raise KeyError()
+
+        self.assertEqual(two_level_cache.get("x", loader, default="default"), "default")
+
+
+class TestGlobalMetaConfigCache(TestCase):
+    """测试全局配置缓存"""
+
+    def test_get_many(self):
+        GlobalMetaConfig.set("TEST_CACHE_KEY_A", 1)
+        GlobalMetaConfig.set("TEST_CACHE_KEY_B", {"b": 2})
+        self.assertEqual(
+            GlobalMetaConfig.get_many(["TEST_CACHE_KEY_A", "TEST_CACHE_KEY_B", "TEST_CACHE_KEY_C"]),
+            {"TEST_CACHE_KEY_A": 1, "TEST_CACHE_KEY_B": {"b": 2}},
+        )
+        self.assertEqual(GlobalMetaConfig.get("TEST_CACHE_KEY_C", default=3), 3)
+
+    def test_set_invalidates_cache_on_commit(self):
+        with mock.patch.object(GlobalMetaConfig.config_cache, "invalidate") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                GlobalMetaConfig.set("TEST_CACHE_KEY_A", 1)
+            invalidate.assert_called()
+
+    def test_cache_bypassed_in_transaction(self):
+        GlobalMetaConfig.set("TEST_CACHE_KEY_A", 1)
+        with mock.patch("core.utils.cache.cache") as remote_cache:
+            self.assertEqual(GlobalMetaConfig.get("TEST_CACHE_KEY_A"), 1)
+        remote_cache.get_many.assert_not_called()
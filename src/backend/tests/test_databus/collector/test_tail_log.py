@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+import json
+import threading
+from unittest import mock
+
+from bk_resource.exceptions import APIRequestError
+from django.conf import settings
+from django.utils import timezone
+
+from api.bk_base.default import GetRawdataTail
+from api.bk_log.default import GetCollectorTailLog
+from services.web.databus.collector.handlers import TailLogSyncer
+from services.web.databus.constants import SourcePlatformChoices
+from services.web.databus.models import CollectorConfig
+from tests.base import TestCase
+
+LOG_TIME = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+class TailLogSyncerTest(TestCase):
+    def setUp(self):
+        self.slow_event = threading.Event()
+        self.addCleanup(self.slow_event.set)
+        self.bklog_calls = []
+        patchers = [
+            mock.patch(
+                "services.web.databus.collector.handlers.api.bk_log.get_collector_tail_log",
+                side_effect=self.get_collector_tail_log,
+            ),
+            mock.patch(
+                "services.web.databus.collector.handlers.api.bk_base.get_rawdata_tail",
+                side_effect=self.get_rawdata_tail,
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_collector_tail_log(self, collector_config_id: int):
+        self.bklog_calls.append(threading.current_thread().name)
+        return [{"origin": {"datetime": LOG_TIME.strftime("%Y-%m-%d %H:%M:%S")}}]
+
+    def get_rawdata_tail(self, bk_data_id: int):
+        # 模拟响应缓慢的平台，请求超时后抛出异常
+        if not self.slow_event.wait(timeout=0.5):
+            raise APIRequestError(module_name="bk_base", url="tail", result="timeout")
+        return [{"value": json.dumps({"start_time": int(LOG_TIME.timestamp() * 1000)})}]
+
+    def create_collectors(self, count: int, source_platform: str, start: int = 0) -> list:
+        return [
+            CollectorConfig.objects.create(
+                system_id="system",
+                bk_biz_id=1,
+                bk_data_id=index,
+                collector_plugin_id=1,
+                collector_config_id=index,
+                collector_config_name=f"collector_{index}",
+                source_platform=source_platform,
+            )
+            for index in range(start, start + count)
+        ]
+
+    def test_concurrent_sync(self):
+        """并发获取，结果批量保存"""
+        self.create_collectors(10, SourcePlatformChoices.BKLOG.value)
+
+        with mock.patch.object(CollectorConfig, "save") as save:
+            updated = TailLogSyncer(workers=5, timeout=10).sync(CollectorConfig.objects.all())
+
+        save.assert_not_called()
+        self.assertEqual(updated, 10)
+        self.assertEqual(len(self.bklog_calls), 10)
+        self.assertTrue(all(name.startswith("tail_log_bk_log") for name in self.bklog_calls))
+        expected = LOG_TIME.replace(tzinfo=timezone.get_default_timezone())
+        self.assertTrue(all(c.tail_log_time == expected for c in CollectorConfig.objects.all()))
+
+    def test_platform_timeout(self):
+        """响应缓慢的平台超时后不影响其他平台"""
+        self.create_collectors(2, SourcePlatformChoices.BKLOG.value)
+        slow = self.create_collectors(2, SourcePlatformChoices.BKBASE.value, start=2)
+
+        syncer = TailLogSyncer(workers=2, timeout=10, platform_timeouts={SourcePlatformChoices.BKBASE.value: 0.1})
+        updated = syncer.sync(CollectorConfig.objects.all())
+
+        self.assertEqual(updated, 2)
+        # 同步返回前等待执行中的请求结束，不遗留工作线程
+        self.assertFalse([t for t in threading.enumerate() if t.name.startswith("tail_log_")])
+        self.assertFalse(CollectorConfig.objects.filter(id__in=[c.id for c in slow], tail_log_time__isnull=False))
+        self.assertEqual(CollectorConfig.objects.filter(tail_log_time__isnull=False).count(), 2)
+
+    def test_request_timeout(self):
+        """获取最近日志的接口使用独立的请求超时时间"""
+        self.assertEqual(GetCollectorTailLog.TIMEOUT, settings.TAIL_LOG_REQUEST_TIMEOUT)
+        self.assertEqual(GetRawdataTail.TIMEOUT, settings.TAIL_LOG_REQUEST_TIMEOUT)
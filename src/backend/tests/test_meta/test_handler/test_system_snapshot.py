@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+
+from apps.meta.constants import SYSTEM_LIST_SNAPSHOT_REFRESH_CACHE_KEY
+from apps.meta.handlers.system_snapshot import SystemListSnapshot
+from apps.meta.models import System
+from tests.base import TestCase
+
+
+def wrapper_permission_field(systems, actions, id_field, always_allowed, **kwargs):
+    """
+    仅 system_b 有权限
+    """
+
+    for system in systems:
+        system["permission"] = {action.id: id_field(system) == "system_b" for action in actions}
+    return systems
+
+
+class SystemListSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for system_id, name in [("system_a", "Alpha"), ("system_b", "Beta"), ("system_c", "Alpha")]:
+            System.objects.create(
+                system_id=system_id, instance_id=system_id, namespace=self.namespace, name=name, name_en=name
+            )
+        patchers = [
+            mock.patch("meta.resources.wrapper_permission_field", wrapper_permission_field),
+            mock.patch("apps.meta.handlers.system_snapshot.resource.meta.system_role_list", mock.Mock(return_value=[])),
+            mock.patch("services.web.databus.handler.system_status.fetch_system_status", mock.Mock(return_value={})),
+        ]
+        self.mocks = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+
+    def list_system_ids(self, **kwargs) -> list:
+        return [system["system_id"] for system in self.resource.meta.system_list(namespace=self.namespace, **kwargs)]
+
+    def test_reuse_snapshot(self):
+        """多次请求复用快照，只叠加权限"""
+        self.list_system_ids()
+        self.list_system_ids(keyword="alpha")
+        self.mocks[1].assert_called_once()
+        self.mocks[2].assert_called_once()
+
+    def test_refresh_on_system_change(self):
+        """系统变更后在事务提交时调度一次延迟刷新，刷新前继续使用原快照"""
+        self.assertEqual(len(self.list_system_ids()), 3)
+        cache.delete(SYSTEM_LIST_SNAPSHOT_REFRESH_CACHE_KEY)
+        with mock.patch("apps.meta.tasks.refresh_system_list_snapshot.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for system_id in ["system_d", "system_e"]:
+                    System.objects.create(
+                        system_id=system_id, instance_id=system_id, namespace=self.namespace, name=system_id
+                    )
+                self.assertEqual(len(self.list_system_ids()), 3)
+        apply_async.assert_called_once()
+        SystemListSnapshot.refresh_all()
+        self.assertEqual(len(self.list_system_ids()), 5)
+
+    def test_sort(self):
+        """按名次排序，取值相同时有权限的系统在前"""
+        system_ids = self.list_system_ids(order_field="name")
+        self.assertEqual(sorted(system_ids[:2]), ["system_a", "system_c"])
+        self.assertEqual(system_ids[2], "system_b")
+        self.assertEqual(self.list_system_ids(order_field="name", order_type="desc")[0], "system_b")
+        # 名称相同时有权限的系统在前
+        System.objects.filter(system_id="system_b").update(name="Alpha")
+        SystemListSnapshot.invalidate()
+        self.assertEqual(self.list_system_ids(order_field="name")[0], "system_b")
+        self.assertEqual(self.list_system_ids(order_field="system_id", order_type="desc")[0], "system_c")
+
+    def test_filter_keyword(self):
+        self.assertEqual(sorted(self.list_system_ids(keyword="ALP")), ["system_a", "system_c"])
+        self.assertEqual(self.list_system_ids(keyword="system_b"), ["system_b"])
+
+    def test_build_sort_ranks(self):
+        ranks = SystemListSnapshot.build_sort_ranks(
+            [
+                {"system_id": "a", "name": None, "clients": []},
+                {"system_id": "b", "name": "x", "clients": ["c"]},
+            ]
+        )
+        self.assertEqual(ranks, {"a": {"system_id": 0, "name": 0}, "b": {"system_id": 1, "name": 1}})
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import copy
+from unittest import mock
+
+from django.core.cache import cache
+
+from apps.meta.constants import SystemSourceTypeEnum
+from apps.meta.handlers.system_sync import (
+    ActionSyncEngine,
+    IamSystemSyncer,
+    IAMV4SystemSyncer,
+    ResourceTypeSyncEngine,
+)
+from apps.meta.models import Action, ResourceType, ResourceTypeActionRelation, System
+from tests.base import TestCase
+
+INSTANCE_ID = "sync_system"
+SYSTEM_ID = System.build_system_id(SystemSourceTypeEnum.IAM_V4.value, INSTANCE_ID)
+RESOURCES_ACTIONS = {
+    INSTANCE_ID: {
+        # 子节点在前，验证同步树时父节点优先
+        "resource_types": [
+            {"id": "task", "name": "任务", "name_en": "任务", "ancestors": ["project"]},
+            {"id": "project", "name": "项目", "name_en": "项目", "ancestors": []},
+        ],
+        "actions": [
+            {"id": "task_view", "name": "查询任务", "name_en": "查询任务", "resource_type_ids": ["task"]},
+            {"id": "project_view", "name": "查看项目", "name_en": "查看项目", "resource_type_ids": ["project"]},
+        ],
+    }
+}
+
+
+class IamObjectSyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        System.objects.create(
+            namespace=self.namespace,
+            instance_id=INSTANCE_ID,
+            source_type=SystemSourceTypeEnum.IAM_V4.value,
+            name="同步测试系统",
+        )
+        self.resources_actions = copy.deepcopy(RESOURCES_ACTIONS)
+        patcher = mock.patch.object(
+            IAMV4SystemSyncer, "get_resources_actions", side_effect=lambda *args: self.resources_actions
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IamSystemSyncer(IAMV4SystemSyncer.cls_name()).sync_resources_actions()
+
+    def test_sync_tree_and_relations(self):
+        """批量新增后按父节点优先同步树，并批量同步操作关联的资源类型"""
+        self.sync()
+
+        self.assertEqual(ResourceType.objects.get(system_id=SYSTEM_ID, resource_type_id="task").ancestors, ["project"])
+        self.assertTrue(Action.objects.filter(unique_id=Action.gen_unique_id(SYSTEM_ID, "task_view")).exists())
+        self.assertEqual(
+            set(
+                ResourceTypeActionRelation.objects.filter(system_id=SYSTEM_ID).values_list(
+                    "action_id", "resource_type_id"
+                )
+            ),
+            {("task_view", "task"), ("project_view", "project")},
+        )
+
+    def test_diff_by_content_hash(self):
+        """仅更新内容变化的记录，上游删除的记录及其关联一并删除"""
+        self.sync()
+        actions = self.resources_actions[INSTANCE_ID]["actions"]
+        actions[0]["name"] = "查询任务详情"
+        actions.pop(1)
+
+        with mock.patch.object(ActionSyncEngine, "apply", autospec=True, side_effect=ActionSyncEngine.apply) as apply:
+            self.sync()
+        _, to_insert, to_update, to_delete = apply.call_args.args
+        self.assertEqual((len(to_insert), len(to_update), len(to_delete)), (0, 1, 1))
+
+        self.assertEqual(Action.objects.get(system_id=SYSTEM_ID, action_id="task_view").name, "查询任务详情")
+        self.assertFalse(Action.objects.filter(system_id=SYSTEM_ID, action_id="project_view").exists())
+        self.assertFalse(ResourceTypeActionRelation.objects.filter(system_id=SYSTEM_ID, action_id="project_view"))
+
+    def test_skip_unchanged_system(self):
+        """上游模型哈希未变化时跳过系统"""
+        self.sync()
+
+        with mock.patch.object(ResourceTypeSyncEngine, "sync") as sync_resource_types:
+            self.sync()
+        sync_resource_types.assert_not_called()
+
+        # 本地数据被删除时仍然重新同步
+        Action.objects.filter(system_id=SYSTEM_ID, action_id="task_view").delete()
+        self.sync()
+        self.assertTrue(Action.objects.filter(system_id=SYSTEM_ID, action_id="task_view").exists())
+
+    def test_update_ancestor(self):
+        """父节点变化时同步树"""
+        self.sync()
+        self.resources_actions[INSTANCE_ID]["resource_types"][0]["ancestors"] = []
+
+        self.sync()
+
+        task = ResourceType.objects.get(system_id=SYSTEM_ID, resource_type_id="task")
+        self.assertEqual(task.ancestor, [])
+        self.assertEqual(task.ancestors, [])
+
+    def test_move_child_and_delete_parent(self):
+        """同一次同步中子节点迁移到新的父节点并删除原父节点"""
+        resource_types = self.resources_actions[INSTANCE_ID]["resource_types"]
+        resource_types.append({"id": "group", "name": "分组", "name_en": "分组", "ancestors": []})
+        self.sync()
+        resource_types[0]["ancestors"] = ["group"]
+        resource_types.pop(1)
+
+        self.sync()
+
+        self.assertFalse(ResourceType.objects.filter(system_id=SYSTEM_ID, resource_type_id="project").exists())
+        task = ResourceType.objects.get(system_id=SYSTEM_ID, resource_type_id="task")
+        self.assertEqual(task.ancestor, ["group"])
+        self.assertEqual(task.ancestors, ["group"])
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.notice.constants import RelateType
+from apps.notice.handlers import NoticeHandler
+from apps.notice.models import NoticeLogV2, NoticePendingAgg
+from apps.notice.tasks import send_notice_from_db
+from tests.base import TestCase
+
+
+class NoticePendingAggTest(TestCase):
+    def send_notice(self, relate_type: str, agg_key: str = None) -> None:
+        self.resource.notice.send_notice(
+            relate_type=relate_type,
+            relate_id="1",
+            agg_key=agg_key,
+            msg_type=["mail"],
+            receivers=["admin"],
+            title="title",
+            content="content",
+        )
+
+    def test_enqueue(self):
+        """写入通知时登记聚合，相同聚合只登记一次"""
+        self.send_notice(RelateType.RISK, "strategy_1")
+        self.send_notice(RelateType.RISK, "strategy_1")
+        self.send_notice(RelateType.ERROR)
+        self.send_notice(RelateType.ERROR)
+        self.assertEqual(
+            sorted(NoticePendingAgg.objects.values_list("relate_type", "agg_key")),
+            [(RelateType.ERROR.value, ""), (RelateType.RISK.value, "strategy_1")],
+        )
+
+    def test_drain(self):
+        """发送完成的聚合被移除，未发送的聚合保留"""
+        self.send_notice(RelateType.RISK, "strategy_1")
+        self.send_notice(RelateType.RISK, "strategy_2")
+        self.send_notice(RelateType.ERROR)
+        handled = []
+
+        def send(handler: NoticeHandler):
+            notice_logs = list(handler.notice_logs)
+            handled.append((handler.relate_type, handler.agg_key, len(notice_logs)))
+            # 模拟未达到聚合周期
+            if handler.agg_key == "strategy_2":
+                return
+            for notice_log in notice_logs:
+                NoticeHandler.done(notice_log=notice_log)
+
+        with mock.patch.object(NoticeHandler, "send", autospec=True, side_effect=send):
+            send_notice_from_db()
+
+        self.assertEqual(
+            sorted(handled),
+            [
+                (RelateType.ERROR.value, None, 1),
+                (RelateType.RISK.value, "strategy_1", 1),
+                (RelateType.RISK.value, "strategy_2", 1),
+            ],
+        )
+        self.assertEqual(list(NoticePendingAgg.objects.values_list("agg_key", flat=True)), ["strategy_2"])
+        self.assertEqual(NoticeLogV2.objects.filter(schedule_at__isnull=True).count(), 1)
+
+
+class CleanNoticeLogTest(TestCase):
+    def test_clean_expired(self):
+        """只清理过期且已发送的通知"""
+        now = timezone.now()
+        expired = now - datetime.timedelta(days=40)
+        logs = [NoticeLogV2.objects.create(relate_type=RelateType.RISK) for _ in range(4)]
+        NoticeLogV2.objects.filter(id__in=[logs[0].id, logs[1].id]).update(create_at=expired, schedule_at=expired)
+        NoticeLogV2.objects.filter(id=logs[2].id).update(create_at=expired)
+        NoticeLogV2.objects.filter(id=logs[3].id).update(schedule_at=now)
+
+        call_command("clean_notice_log", days=30, batch_size=1, dry_run=True)
+        self.assertEqual(NoticeLogV2.objects.count(), 4)
+
+        call_command("clean_notice_log", days=30, batch_size=1)
+        self.assertEqual(sorted(NoticeLogV2.objects.values_list("id", flat=True)), [logs[2].id, logs[3].id])
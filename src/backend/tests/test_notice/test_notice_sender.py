@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from apps.notice.constants import MsgType, RelateType
+from apps.notice.handlers import NoticeHandler
+from apps.notice.models import NoticeLogV2
+from apps.notice.senders.executor import RateLimiter, SenderExecutor
+from apps.notice.senders.rtx import RTXSender
+from apps.notice.senders.voice import VoiceSender
+from apps.notice.senders.weixin import WeixinSender
+from tests.base import TestCase
+
+# 桩服务单次请求耗时(秒)
+STUB_LATENCY = 0.05
+
+CHANNELS = {MsgType.RTX.value: RTXSender, MsgType.WEIXIN.value: WeixinSender, MsgType.VOICE.value: VoiceSender}
+
+
+class SenderCrash(BaseException):
+    """模拟发送过程中进程中断"""
+
+
+class StubCMSIHandler(BaseHTTPRequestHandler):
+    """
+    CMSI 桩服务，每个请求按 server.latency 模拟接口耗时
+    """
+
+    def do_POST(self):
+        params = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, time.monotonic(), params))
+        time.sleep(self.server.latency)
+        body = json.dumps({"result": True, "receivers": params["receiver__username"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class NoticeSenderTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.calls_lock = threading.Lock()
+        for msg_type, sender_cls in CHANNELS.items():
+            patcher = mock.patch.object(sender_cls, "api_resource", side_effect=self.build_api(msg_type))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build_api(self, msg_type: str):
+        def api(**params):
+            with self.calls_lock:
+                self.calls.append((msg_type, threading.current_thread().name, params["receiver__username"]))
+            if msg_type == MsgType.VOICE.value:
+                raise ConnectionError("voice unavailable")
+            return {"msg_type": msg_type}
+
+        return api
+
+    def create_logs(self, count: int, msg_type: list, receivers: list) -> list:
+        return [
+            NoticeLogV2.objects.create(
+                relate_type=RelateType.ERROR,
+                msg_type=msg_type,
+                receivers=receivers,
+                title=f"title-{index}",
+                content="Key: Value",
+            )
+            for index in range(count)
+        ]
+
+    def send(self, executor: SenderExecutor) -> None:
+        NoticeHandler(
+            schedule_time=time.time(),
+            relate_type=RelateType.ERROR.value,
+            agg_key=None,
+            notice_logs=NoticeLogV2.objects.filter(schedule_at__isnull=True).order_by("create_at"),
+            executor=executor,
+        ).send()
+
+    def test_concurrent_send(self):
+        """按渠道与接收人拆分并发发送"""
+        self.create_logs(2, [MsgType.RTX.value, MsgType.WEIXIN.value], ["a", "b", "c"])
+
+        self.send(SenderExecutor(max_workers=4, receiver_chunk_size=2, rate_limits={}))
+
+        # 2 条通知 * 2 个渠道 * 2 组接收人
+        self.assertEqual(len(self.calls), 8)
+        self.assertTrue(all(name.startswith("notice_sender") for _, name, _ in self.calls))
+        self.assertCountEqual([receivers for _, _, receivers in self.calls], [["a", "b"], ["c"]] * 4)
+        for notice_log in NoticeLogV2.objects.all():
+            self.assertTrue(notice_log.schedule_result)
+            self.assertEqual(len(json.loads(notice_log.debug_info)), 4)
+
+    def test_partial_failure(self):
+        """部分渠道失败时仍视为发送成功，全部失败时标记失败"""
+        partial, failed = self.create_logs(1, [MsgType.RTX.value, MsgType.VOICE.value], ["a"]) + self.create_logs(
+            1, [MsgType.VOICE.value], ["a"]
+        )
+
+        self.send(SenderExecutor(max_workers=4, receiver_chunk_size=0, rate_limits={}))
+
+        partial.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertTrue(partial.schedule_result)
+        self.assertEqual(json.loads(partial.debug_info)[1]["Error"], "voice unavailable")
+        self.assertFalse(failed.schedule_result)
+
+    def test_save_each_log_after_send(self):
+        """每条通知发送完成后立即保存，中断后不会重复发送已完成的通知"""
+        first, second = self.create_logs(2, [MsgType.RTX.value], ["a"])
+        api = self.build_api(MsgType.RTX.value)
+
+        def crash_on_second(**params):
+            if len(self.calls) >= 1:
+                raise SenderCrash()
+            return api(**params)
+
+        with mock.patch.object(RTXSender, "api_resource", side_effect=crash_on_second):
+            with self.assertRaises(SenderCrash):
+                self.send(SenderExecutor(max_workers=1, receiver_chunk_size=0, rate_limits={}))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNotNone(first.schedule_at)
+        self.assertTrue(first.schedule_result)
+        self.assertIsNone(second.schedule_at)
+
+        self.send(SenderExecutor(max_workers=1, receiver_chunk_size=0, rate_limits={}))
+        self.assertEqual(len(self.calls), 2)
+        self.assertFalse(NoticeLogV2.objects.filter(schedule_at__isnull=True).exists())
+
+    @mock.patch("apps.notice.senders.executor.time")
+    @mock.patch.dict(RateLimiter._limiters, clear=True)
+    def test_rate_limit(self, mock_time):
+        """同一渠道按限流间隔发送"""
+        mock_time.monotonic.return_value = 100.0
+        self.create_logs(5, [MsgType.RTX.value], ["a"])
+        self.send(SenderExecutor(max_workers=5, receiver_chunk_size=0, rate_limits={MsgType.RTX.value: 50}))
+        self.assertEqual(len(self.calls), 5)
+        self.assertEqual(
+            sorted(round(call.args[0], 6) for call in mock_time.sleep.call_args_list), [0.02, 0.04, 0.06, 0.08]
+        )
+        self.assertIs(RateLimiter.get(MsgType.RTX.value, 50), RateLimiter.get(MsgType.RTX.value, 50))
+        self.assertIsNone(RateLimiter.get(MsgType.RTX.value, 0))
+
+    @mock.patch.dict(RateLimiter._limiters, clear=True)
+    def test_stub_cmsi(self):
+        """本地 CMSI 桩服务模拟接口耗时，并发发送提升吞吐，限流时单渠道吞吐不超过限流值"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubCMSIHandler)
+        server.latency = STUB_LATENCY
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+        def build_stub(msg_type: str):
+            def call_stub(**params):
+                request = urllib.request.Request(
+                    url + msg_type, data=json.dumps(params).encode(), headers={"Content-Type": "application/json"}
+                )
+                with urllib.request.urlopen(request) as resp:
+                    return json.loads(resp.read())
+
+            return call_stub
+
+        def run(max_workers: int, rate_limits: dict) -> tuple:
+            NoticeLogV2.objects.all().delete()
+            server.requests.clear()
+            self.create_logs(10, [MsgType.RTX.value, MsgType.WEIXIN.value], ["a", "b", "c"])
+            start = time.monotonic()
+            self.send(SenderExecutor(max_workers=max_workers, receiver_chunk_size=0, rate_limits=rate_limits))
+            elapsed = time.monotonic() - start
+            self.assertEqual(len(server.requests), 20)
+            self.assertTrue(all(params["receiver__username"] == ["a", "b", "c"] for _, _, params in server.requests))
+            self.assertEqual(NoticeLogV2.objects.filter(schedule_result=True).count(), 10)
+            return start, elapsed
+
+        with mock.patch.object(RTXSender, "api_resource", side_effect=build_stub(MsgType.RTX.value)), mock.patch.object(
+            WeixinSender, "api_resource", side_effect=build_stub(MsgType.WEIXIN.value)
+        ):
+            _, serial_elapsed = run(max_workers=1, rate_limits={})
+            self.assertGreaterEqual(serial_elapsed, 20 * STUB_LATENCY)
+
+            _, concurrent_elapsed = run(max_workers=8, rate_limits={})
+            self.assertLess(concurrent_elapsed, serial_elapsed / 2)
+
+            rate = 20
+            rate_limits = {MsgType.RTX.value: rate, MsgType.WEIXIN.value: rate}
+            start, limited_elapsed = run(max_workers=8, rate_limits=rate_limits)
+            self.assertLess(limited_elapsed, serial_elapsed)
+            for msg_type in [MsgType.RTX.value, MsgType.WEIXIN.value]:
+                arrived = [arrived_at for path, arrived_at, _ in server.requests if path == f"/{msg_type}"]
+                self.assertEqual(len(arrived), 10)
+                # 首个请求不等待，其余请求按限流间隔依次放行
+                self.assertLessEqual((len(arrived) - 1) / (max(arrived) - start), rate)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from unittest import mock
+
+from iam.exceptions import AuthAPIError
+
+from apps.permission.handlers.actions import ActionEnum
+from apps.permission.handlers.permission import Permission
+from apps.permission.handlers.resource_types import ResourceEnum
+from services.web.risk.models import Risk
+from tests.base import TestCase
+
+
+class PermissionCacheTest(TestCase):
+    def setUp(self) -> None:
+        Permission.flush_cache()
+        self.iam_client = mock.MagicMock()
+        patcher = mock.patch.object(Permission, "get_iam_client", return_value=self.iam_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_iam_client(self):
+        """同一进程内复用 IAM 客户端"""
+        mock.patch.stopall()
+        self.assertIs(Permission("admin").iam_client, Permission("other").iam_client)
+
+    def test_is_allowed_cached(self):
+        """鉴权结果按用户、动作、资源缓存"""
+        self.iam_client.is_allowed.return_value = True
+        resources = [ResourceEnum.STRATEGY.create_simple_instance("1")]
+
+        self.assertTrue(Permission("admin").is_allowed(ActionEnum.EDIT_STRATEGY, resources))
+        self.assertTrue(Permission("admin").is_allowed(ActionEnum.EDIT_STRATEGY, resources))
+        self.assertEqual(self.iam_client.is_allowed.call_count, 1)
+
+        # 不同资源、不同用户不共享结果
+        Permission("admin").is_allowed(ActionEnum.EDIT_STRATEGY, [ResourceEnum.STRATEGY.create_simple_instance("2")])
+        Permission("other").is_allowed(ActionEnum.EDIT_STRATEGY, resources)
+        self.assertEqual(self.iam_client.is_allowed.call_count, 3)
+
+    def test_flush_cache(self):
+        """刷新后重新请求权限中心"""
+        self.iam_client.is_allowed.return_value = False
+        self.assertFalse(Permission("admin").is_allowed(ActionEnum.CREATE_STRATEGY))
+
+        Permission.flush_cache()
+        self.iam_client.is_allowed.return_value = True
+        self.assertTrue(Permission("admin").is_allowed(ActionEnum.CREATE_STRATEGY))
+
+    def test_flush_user_cache(self):
+        """按用户、动作刷新时不影响其他用户及动作的缓存"""
+        self.iam_client.is_allowed.return_value = False
+        for username in ["admin", "other"]:
+            for action in [ActionEnum.CREATE_STRATEGY, ActionEnum.LIST_RISK]:
+                Permission(username).is_allowed(action)
+        self.assertEqual(self.iam_client.is_allowed.call_count, 4)
+
+        self.iam_client.is_allowed.return_value = True
+        Permission.flush_cache("admin", [ActionEnum.CREATE_STRATEGY.id])
+        self.assertTrue(Permission("admin").is_allowed(ActionEnum.CREATE_STRATEGY))
+        self.assertFalse(Permission("admin").is_allowed(ActionEnum.LIST_RISK))
+        self.assertFalse(Permission("other").is_allowed(ActionEnum.CREATE_STRATEGY))
+        self.assertEqual(self.iam_client.is_allowed.call_count, 5)
+
+        Permission.flush_cache("admin")
+        self.assertTrue(Permission("admin").is_allowed(ActionEnum.LIST_RISK))
+        self.assertFalse(Permission("other").is_allowed(ActionEnum.LIST_RISK))
+        self.assertEqual(self.iam_client.is_allowed.call_count, 6)
+
+    def test_error_not_cached(self):
+        """权限中心异常时不缓存结果"""
+        self.iam_client.is_allowed.side_effect = [AuthAPIError("error"), True]
+        self.assertFalse(Permission("admin").is_allowed(ActionEnum.CREATE_STRATEGY))
+        self.assertTrue(Permission("admin").is_allowed(ActionEnum.CREATE_STRATEGY))
+
+    def test_authed_risk_filter_cached(self):
+        """风险筛选条件缓存转换后的策略"""
+        self.iam_client._do_policy_query.return_value = {"op": "eq", "field": "risk.id", "value": "risk-1"}
+
+        with mock.patch("services.web.risk.models.get_request_username", return_value="admin"):
+            first = Risk.authed_risk_filter(ActionEnum.LIST_RISK)
+            second = Risk.authed_risk_filter(ActionEnum.LIST_RISK)
+
+        self.assertEqual(self.iam_client._do_policy_query.call_count, 1)
+        self.assertEqual(str(first), str(second))
+        self.assertIn("risk-1", str(first))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.poll.constants import POLL_NEXT_TICK_CACHE_KEY, PollStatusChoices
+from apps.poll.handlers import PollHandler, PollResult, PollScheduler
+from apps.poll.models import PollTask
+from tests.base import TestCase
+
+
+class FakePollHandler(PollHandler):
+    """
+    按 poll_key 返回预设结果
+    """
+
+    initial_delay = 5
+    initial_interval = 10
+    max_interval = 30
+    max_age = 600
+    max_attempts = 4
+
+    calls = []
+    expired = []
+    results = {}
+    on_poll = None
+
+    def poll(self, tasks):
+        self.calls.append([task.poll_key for task in tasks])
+        if FakePollHandler.on_poll:
+            FakePollHandler.on_poll(tasks)
+        return {
+            task.id: PollResult(status=self.results[task.poll_key]) for task in tasks if task.poll_key in self.results
+        }
+
+    def on_expired(self, tasks):
+        self.expired.extend(task.poll_key for task in tasks)
+
+
+class PollSchedulerTest(TestCase):
+    def setUp(self):
+        cache.delete(POLL_NEXT_TICK_CACHE_KEY)
+        FakePollHandler.calls = []
+        FakePollHandler.expired = []
+        FakePollHandler.results = {}
+        FakePollHandler.on_poll = None
+        patcher = mock.patch("apps.poll.tasks.run_poll_tasks.apply_async")
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.delete, POLL_NEXT_TICK_CACHE_KEY)
+
+    def register(self, *poll_keys):
+        with self.captureOnCommitCallbacks(execute=True):
+            for poll_key in poll_keys:
+                PollScheduler.register(FakePollHandler, poll_key=poll_key, params={"key": poll_key})
+
+    def make_due(self, **kwargs):
+        # 模拟已投递的调度到期
+        cache.delete(POLL_NEXT_TICK_CACHE_KEY)
+        PollTask.objects.update(next_poll_at=timezone.now() - datetime.timedelta(seconds=1), **kwargs)
+
+    def test_register_schedule_once(self):
+        """多次注册只投递一次调度，countdown 为首次轮询延迟"""
+        self.register("a", "b", "c")
+        self.assertEqual(PollTask.objects.filter(status=PollStatusChoices.PENDING.value).count(), 3)
+        self.apply_async.assert_called_once()
+        self.assertAlmostEqual(self.apply_async.call_args.kwargs["countdown"], FakePollHandler.initial_delay, delta=1)
+
+    def test_schedule_after_past_tick(self):
+        """已过执行时间的调度可能已被跳过，需要重新投递"""
+        cache.set(POLL_NEXT_TICK_CACHE_KEY, timezone.now().timestamp() - 1)
+        self.assertTrue(PollScheduler.schedule(timezone.now() + datetime.timedelta(seconds=5)))
+        self.apply_async.assert_called_once()
+        self.assertFalse(PollScheduler.schedule(timezone.now() + datetime.timedelta(seconds=10)))
+
+    def test_tick_batch_and_backoff(self):
+        """到期任务一次性交给处理器，未完成的按指数退避"""
+        self.register("a", "b", "c")
+        self.make_due()
+        FakePollHandler.results = {"a": PollStatusChoices.SUCCESS.value}
+
+        PollScheduler().tick()
+
+        self.assertEqual(len(FakePollHandler.calls), 1)
+        self.assertCountEqual(FakePollHandler.calls[0], ["a", "b", "c"])
+        self.assertEqual(PollTask.objects.get(poll_key="a").status, PollStatusChoices.SUCCESS.value)
+        task = PollTask.objects.get(poll_key="b")
+        self.assertEqual(task.status, PollStatusChoices.PENDING.value)
+        self.assertEqual(task.attempt, 1)
+        self.assertEqual(task.backoff, 20)
+        self.assertAlmostEqual((task.next_poll_at - timezone.now()).total_seconds(), 10, delta=1)
+        # 按最近的轮询时间重新投递
+        self.assertAlmostEqual(self.apply_async.call_args.kwargs["countdown"], 10, delta=1)
+
+        self.make_due()
+        PollScheduler().tick()
+        PollScheduler().tick()
+        task.refresh_from_db()
+        self.assertEqual(task.attempt, 2)
+        self.assertEqual(task.backoff, FakePollHandler.max_interval)
+        self.assertEqual(len(FakePollHandler.calls), 2)
+
+    def test_batch_size(self):
+        """超过批量大小的到期任务立即投递下一次调度"""
+        self.register("a", "b", "c")
+        self.make_due()
+
+        PollScheduler(batch_size=2).tick()
+
+        self.assertEqual(len(FakePollHandler.calls[0]), 2)
+        self.assertAlmostEqual(self.apply_async.call_args.kwargs["countdown"], 0, delta=1)
+
+    def test_expire(self):
+        """超过最长轮询时间或最大次数后超时"""
+        self.register("a", "b")
+        self.make_due()
+        PollTask.objects.filter(poll_key="a").update(expired_at=timezone.now())
+        PollTask.objects.filter(poll_key="b").update(attempt=FakePollHandler.max_attempts - 1)
+
+        PollScheduler().tick()
+
+        self.assertCountEqual(FakePollHandler.expired, ["a", "b"])
+        self.assertEqual(FakePollHandler.calls, [["b"]])
+        self.assertEqual(PollTask.objects.filter(status=PollStatusChoices.EXPIRED.value).count(), 2)
+        self.assertFalse(PollTask.objects.filter(status=PollStatusChoices.PENDING.value).exists())
+
+    def test_handler_error(self):
+        """处理器异常时继续轮询"""
+        self.register("a")
+        self.make_due()
+        FakePollHandler.on_poll = mock.Mock(side_effect=ValueError("failed"))
+
+        PollScheduler().tick()
+
+        task = PollTask.objects.get(poll_key="a")
+        self.assertEqual(task.status, PollStatusChoices.PENDING.value)
+        self.assertEqual(task.attempt, 1)
+
+    def test_register_during_poll(self):
+        """轮询期间被重新注册的任务保留注册状态"""
+        self.register("a")
+        self.make_due()
+        FakePollHandler.results = {"a": PollStatusChoices.SUCCESS.value}
+        FakePollHandler.on_poll = lambda tasks: self.register("a")
+
+        PollScheduler().tick()
+
+        task = PollTask.objects.get(poll_key="a")
+        self.assertEqual(task.status, PollStatusChoices.PENDING.value)
+        self.assertEqual(task.attempt, 0)
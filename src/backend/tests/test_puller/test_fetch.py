@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.meta.models import Action, ResourceType
+from services.puller.puller.serializers import (
+    FetchActionSerializer,
+    FetchResourceTypeSerializer,
+)
+from services.puller.puller.utils.fetch import (
+    ActionFetchHandler,
+    ResourceTypeFetchHandler,
+)
+from services.puller.puller.views import ResourcesView
+from tests.base import TestCase
+
+PAGE_SIZE = 4
+
+
+class FetchHandlerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for index in range(10):
+            Action.objects.create(system_id="puller", action_id=f"action_{index}", name=f"操作{index}")
+        ResourceType.objects.create(system_id="puller", resource_type_id="project", name="项目")
+
+    def fetch_all(self, handler_class=ActionFetchHandler):
+        pages = []
+        offset = 0
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                data = handler_class(page={"offset": offset, "limit": PAGE_SIZE}).fetch_instance_list()
+            pages.append((data, [query["sql"] for query in ctx.captured_queries]))
+            if len(data["results"]) < PAGE_SIZE:
+                return pages
+            offset += PAGE_SIZE
+
+    def test_serialize_compatible(self):
+        """values 序列化结果与序列化器一致"""
+        for handler_class, serializer_class, model in [
+            (ActionFetchHandler, FetchActionSerializer, Action),
+            (ResourceTypeFetchHandler, FetchResourceTypeSerializer, ResourceType),
+        ]:
+            results = handler_class().fetch_instance_list()["results"]
+            expected = serializer_class(model.objects.all(), many=True).data
+            self.assertEqual([item["data"] for item in results], [dict(item) for item in expected])
+
+    def test_keyset_pagination(self):
+        """顺序翻页时使用游标，总数只查询一次"""
+        pages = self.fetch_all()
+
+        ids = [item["id"] for data, _ in pages for item in data["results"]]
+        self.assertEqual(ids, list(Action.objects.order_by("-id").values_list("action_id", flat=True)))
+        self.assertTrue(all(data["count"] == 10 for data, _ in pages))
+        for _, sqls in pages[1:]:
+            self.assertFalse(any("OFFSET" in sql or "COUNT(" in sql for sql in sqls))
+
+    def test_cursor_mismatch(self):
+        """游标对应的记录被删除时回退到 OFFSET 分页"""
+        ActionFetchHandler(page={"offset": 0, "limit": PAGE_SIZE}).fetch_instance_list()
+        Action.objects.order_by("-id")[PAGE_SIZE - 1].delete()
+        with CaptureQueriesContext(connection) as ctx:
+            second_page = ActionFetchHandler(page={"offset": PAGE_SIZE, "limit": PAGE_SIZE}).fetch_instance_list()
+
+        self.assertTrue(any("OFFSET" in query["sql"] for query in ctx.captured_queries))
+        self.assertEqual(
+            [item["id"] for item in second_page["results"]],
+            list(Action.objects.order_by("-id").values_list("action_id", flat=True)[PAGE_SIZE : PAGE_SIZE * 2]),
+        )
+
+    def test_fallback_to_offset(self):
+        """游标失效时回退到 OFFSET 分页"""
+        first_page = ActionFetchHandler(page={"offset": 0, "limit": PAGE_SIZE}).fetch_instance_list()
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            second_page = ActionFetchHandler(page={"offset": PAGE_SIZE, "limit": PAGE_SIZE}).fetch_instance_list()
+
+        self.assertTrue(any("OFFSET" in query["sql"] for query in ctx.captured_queries))
+        self.assertEqual(
+            [item["id"] for item in first_page["results"] + second_page["results"]],
+            list(Action.objects.order_by("-id").values_list("action_id", flat=True)[: PAGE_SIZE * 2]),
+        )
+
+
+class ResourcesViewLogTest(TestCase):
+    @override_settings(FETCH_INSTANCE_LOG_MAX_LENGTH=10)
+    def test_truncate_log(self):
+        content = ResourcesView.build_log_content({"results": ["x" * 20]})
+        self.assertTrue(content.startswith('{"results"'))
+        self.assertIn("truncated", content)
+        self.assertEqual(ResourcesView.build_log_content([1]), "[1]")
+
+    @override_settings(FETCH_INSTANCE_LOG_SAMPLE_RATE=0)
+    def test_sample_log(self):
+        """未采样的请求不序列化响应日志"""
+        request = mock.MagicMock(data={"method": "fetch_resource_type_schema", "type": "action"})
+        with mock.patch.object(ResourcesView, "build_log_content") as build_log_content:
+            response = ResourcesView().post(request)
+        self.assertIn("properties", response.data)
+        build_log_content.assert_not_called()
+
+    def test_log_failed_request(self):
+        """失败的请求总是记录日志"""
+        request = mock.MagicMock(data={"method": "fetch_instance_list", "type": "unknown"})
+        with mock.patch("services.puller.puller.views.logger") as logger:
+            with self.assertRaises(NotImplementedError):
+                ResourcesView().post(request)
+        logger.exception.assert_called_once()
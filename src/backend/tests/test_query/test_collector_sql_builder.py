@@ -240,45 +240,39 @@ class TestDorisSQLBuilder(TestCase):
         )
         self.assertEqual(count_sql, expect)
 
-    def test_build_data_statistic_sql(self):
-        """测试 build_data_statistic_sql 方法"""
-
-        # 测试文本字段（STRING）
+    def test_build_single_statistic_sql(self):
+        """单条统计查询"""
         builder = self._get_builder(type='statistic')
-        field_name = "event_type"
-        field_type = FieldType.STRING
-        stats_sql = builder.build_statistic_sql(field_name, field_type)
-        expected_text_sql = {
-            "avg_value": None,
-            "max_value": None,
-            "median_value": None,
-            "min_value": None,
-            "non_empty_ratio": "SELECT COUNT(`event_table`.`event_type`)/COUNT(*) `non_empty_ratio` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "non_empty_rows": "SELECT COUNT(`event_table`.`event_type`) `non_empty_rows` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "top_5_time_series": "SELECT `event_table`.`event_type`,DATE_TRUNC(FROM_UNIXTIME(`event_table`.`dteventtimestamp`/1000),'HOUR') `time_interval`,COUNT(`event_table`.`event_type`) `count` FROM test_rt.doris `event_table` JOIN (SELECT `event_table`.`event_type`,COUNT(`event_table`.`event_type`) `count` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000 GROUP BY `event_table`.`event_type` ORDER BY `count` DESC LIMIT 5) `sq0` ON `event_table`.`event_type`=`sq0`.`event_type` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000 GROUP BY DATE_TRUNC(FROM_UNIXTIME(`event_table`.`dteventtimestamp`/1000),'HOUR'),`event_table`.`event_type` ORDER BY DATE_TRUNC(FROM_UNIXTIME(`event_table`.`dteventtimestamp`/1000),'HOUR') DESC",
-            "top_5_values": "SELECT `event_table`.`event_type`,COUNT(`event_table`.`event_type`) `count` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000 GROUP BY `event_table`.`event_type` ORDER BY `count` DESC LIMIT 5",
-            "total_rows": "SELECT COUNT(*) `total_rows` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-        }
-
-        for key, expected_sql in expected_text_sql.items():
-            self.assertEqual(stats_sql[key], expected_sql)
+        where = (
+            "WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' "
+            "AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000"
+        )
+        time_interval = "DATE_TRUNC(FROM_UNIXTIME(`event_table`.`dteventtimestamp`/1000),'HOUR')"
 
-        # 测试数值字段（NUMERIC）
-        field_name = "amount"
-        field_type = FieldType.LONG
-        stats_sql = builder.build_statistic_sql(field_name, field_type)
+        # 文本字段
+        self.assertEqual(
+            builder.build_single_statistic_sql("event_type", FieldType.STRING),
+            "WITH field_counts AS ("
+            f"SELECT `event_table`.`event_type` `event_type`,{time_interval} `time_interval`,COUNT(*) `count` "
+            f"FROM test_rt.doris `event_table` {where} GROUP BY `event_table`.`event_type`,{time_interval}) "
+            ",total_stats AS (SELECT SUM(`field_counts`.`count`) `total_rows`,"
+            "SUM(CASE WHEN NOT `field_counts`.`event_type` IS NULL THEN `field_counts`.`count` ELSE 0 END) "
+            "`non_empty_rows` FROM field_counts) "
+            ",top_values AS (SELECT `field_counts`.`event_type`,SUM(`field_counts`.`count`) `count` FROM field_counts "
+            "WHERE NOT `field_counts`.`event_type` IS NULL GROUP BY `field_counts`.`event_type` "
+            "ORDER BY `count` DESC LIMIT 5) "
+            "SELECT `total_stats`.`total_rows`,`total_stats`.`non_empty_rows`,`top_values`.`event_type`,"
+            "`top_values`.`count` `top_count`,`field_counts`.`time_interval`,`field_counts`.`count` "
+            "FROM total_stats LEFT JOIN top_values ON 1=1 "
+            "LEFT JOIN field_counts ON `field_counts`.`event_type`=`top_values`.`event_type` "
+            "ORDER BY `top_count` DESC,`field_counts`.`time_interval` DESC",
+        )
 
-        # 对应的期望 SQL 查询
-        expected_numeric_sql = {
-            "avg_value": "SELECT AVG(`event_table`.`amount`) `avg_value` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "max_value": "SELECT MAX(`event_table`.`amount`) `max_value` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "median_value": "SELECT PERCENTILE_APPROX(`event_table`.`amount`,0.5) `median_value` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "min_value": "SELECT MIN(`event_table`.`amount`) `min_value` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "non_empty_ratio": "SELECT COUNT(`event_table`.`amount`)/COUNT(*) `non_empty_ratio` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "non_empty_rows": "SELECT COUNT(`event_table`.`amount`) `non_empty_rows` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-            "top_5_time_series": None,
-            "top_5_values": None,
-            "total_rows": "SELECT COUNT(*) `total_rows` FROM test_rt.doris `event_table` WHERE `event_table`.`thedate`>='20250219' AND `event_table`.`thedate`<='20250220' AND `event_table`.`dtEventTimeStamp`>=1739973600000 AND `event_table`.`dtEventTimeStamp`<=1739995200000",
-        }
-        for key, expected_sql in expected_numeric_sql.items():
-            self.assertEqual(stats_sql[key], expected_sql)
+        # 数值字段
+        self.assertEqual(
+            builder.build_single_statistic_sql("amount", FieldType.LONG),
+            "SELECT COUNT(*) `total_rows`,COUNT(`event_table`.`amount`) `non_empty_rows`,"
+            "COUNT(`event_table`.`amount`)/COUNT(*) `non_empty_ratio`,MAX(`event_table`.`amount`) `max_value`,"
+            "MIN(`event_table`.`amount`) `min_value`,AVG(`event_table`.`amount`) `avg_value`,"
+            f"PERCENTILE_APPROX(`event_table`.`amount`,0.5) `median_value` FROM test_rt.doris `event_table` {where}",
+        )
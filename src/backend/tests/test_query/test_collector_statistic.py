@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.sql.constants import FieldType
+from services.web.query.management.commands.benchmark_collector_statistic import extract_time_series_by_scan
+from services.web.query.resources.doris import (
+    CollectorSearchAllStatisticResource,
+    CollectorSearchBaseResource,
+)
+from services.web.query.utils.doris import DorisStatisticSQLBuilder
+
+SERIES_NAMES = 5
+SERIES_HOURS = 24 * 14
+
+
+class CollectorStatisticTest(SimpleTestCase):
+    def setUp(self):
+        self.resource = CollectorSearchAllStatisticResource()
+
+    def test_parse_text_result(self):
+        rows = [
+            {
+                "total_rows": 10,
+                "non_empty_rows": 8,
+                "event_type": "login",
+                "top_count": 5,
+                "time_interval": "2025-02-20 01:00:00",
+                "count": 3,
+            },
+            {
+                "total_rows": 10,
+                "non_empty_rows": 8,
+                "event_type": "login",
+                "top_count": 5,
+                "time_interval": "2025-02-20 00:00:00",
+                "count": 2,
+            },
+            {
+                "total_rows": 10,
+                "non_empty_rows": 8,
+                "event_type": "logout",
+                "top_count": 3,
+                "time_interval": "2025-02-20 02:00:00",
+                "count": 3,
+            },
+        ]
+        results = DorisStatisticSQLBuilder.parse_single_statistic_result(rows, "event_type", FieldType.STRING)
+
+        self.assertEqual(results["total_rows"], [{"total_rows": 10}])
+        self.assertEqual(results["non_empty_ratio"], [{"non_empty_ratio": 0.8}])
+        self.assertEqual(
+            results["top_5_values"], [{"event_type": "login", "count": 5}, {"event_type": "logout", "count": 3}]
+        )
+        self.assertEqual(
+            [item["time_interval"] for item in results["top_5_time_series"]],
+            ["2025-02-20 02:00:00", "2025-02-20 01:00:00", "2025-02-20 00:00:00"],
+        )
+        self.assertIsNone(results["max_value"])
+
+        # 没有数据时仍返回总数
+        results = DorisStatisticSQLBuilder.parse_single_statistic_result(
+            [{"total_rows": None, "non_empty_rows": None, "event_type": None}], "event_type", FieldType.STRING
+        )
+        self.assertEqual(results["total_rows"], [{"total_rows": 0}])
+        self.assertEqual(results["non_empty_ratio"], [{"non_empty_ratio": None}])
+        self.assertIsNone(results["top_5_values"])
+
+        # 查询没有返回结果时所有指标为 None
+        results = DorisStatisticSQLBuilder.parse_single_statistic_result([], "event_type", FieldType.STRING)
+        self.assertTrue(all(value is None for value in results.values()))
+
+    def test_perform_request_single_query(self):
+        """统计只发起一次查询"""
+        row = {
+            "total_rows": 4,
+            "non_empty_rows": 2,
+            "non_empty_ratio": 0.5,
+            "max_value": 9,
+            "min_value": 1,
+            "avg_value": 5,
+            "median_value": 5,
+        }
+        with mock.patch.object(CollectorSearchBaseResource, "get_sql_builder") as get_sql_builder, mock.patch(
+            "services.web.query.resources.doris.api.bk_base.query_sync", return_value={"list": [row]}
+        ) as query_sync:
+            get_sql_builder.return_value.build_single_statistic_sql.return_value = "SELECT 1"
+            resp = self.resource.perform_request({"field_name": "result_code"})
+
+        query_sync.assert_called_once()
+        self.assertTrue(resp["numeric"])
+        self.assertEqual(resp["results"]["max_value"], [{"max_value": 9}])
+        self.assertEqual(resp["sqls"]["max_value"], "SELECT 1")
+        self.assertIsNone(resp["sqls"]["top_5_values"])
+
+    def test_extract_time_series(self):
+        """按索引提取的时间序列与逐个扫描一致，缺失的时间段补 0"""
+        raw = [
+            {"event_type": f"type_{name}", "time_interval": hour, "count": name + hour}
+            for hour in range(SERIES_HOURS)
+            for name in range(SERIES_NAMES)
+            # 部分时间段缺失数据
+            if (name + hour) % 7
+        ]
+
+        expected = extract_time_series_by_scan(raw, "event_type")
+        result = self.resource.extract_time_series({"top_5_time_series": raw})
+
+        self.assertEqual(result, expected)
+        self.assertEqual(len(result["times"]), SERIES_HOURS)
+        self.assertEqual(len(result["series"]), SERIES_NAMES)
+        # type_0 在第 0、7、14 小时没有数据
+        series = {item["name"]: item["data"] for item in result["series"]}
+        self.assertEqual(series["type_0"][:8], [0, 1, 2, 3, 4, 5, 6, 0])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import copy
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.meta.models import DataMap, DataMapIndex
+from services.web.query.resources.base import SearchDataParser
+from services.web.query.utils.formatter import (
+    HitsFormatter,
+    build_snapshot_user_info_data_field,
+)
+from tests.base import TestCase
+
+FORMAT_HITS = 500
+
+
+def build_hits(count: int) -> list:
+    return [
+        {
+            "username": f"user_{index}",
+            "snapshot_user_info": json.dumps(
+                {"department": str(index % 5), "status": str(index % 2), "username": f"user_{index}"}
+            ),
+        }
+        for index in range(count)
+    ]
+
+
+@mock.patch("services.web.query.utils.formatter.asymmetric_cipher.encrypt", lambda val: val)
+class TestDataMapIndex(TestCase):
+    def setUp(self):
+        DataMap.objects.bulk_create(
+            [
+                *[
+                    DataMap(
+                        data_field=build_snapshot_user_info_data_field("department"),
+                        data_key=str(index),
+                        data_alias=f"部门{index}",
+                    )
+                    for index in range(5)
+                ],
+                DataMap(data_field=build_snapshot_user_info_data_field("status"), data_key="1", data_alias="在职"),
+            ]
+        )
+
+    def test_translate_many_matches_trans_data(self):
+        rows = [json.loads(hit["snapshot_user_info"]) for hit in build_hits(10)]
+        expected = [
+            DataMap.trans_data(copy.deepcopy(row), list(row.keys()), build_snapshot_user_info_data_field)
+            for row in rows
+        ]
+        fields = ["department", "status", "username", "not_exists"]
+        self.assertEqual(
+            DataMapIndex().translate_many(rows, fields, build_data_field=build_snapshot_user_info_data_field), expected
+        )
+
+    def test_parse_data_loads_data_map_once(self):
+        with CaptureQueriesContext(connection) as context:
+            data = SearchDataParser().parse_data(build_hits(50))
+        data_map_queries = [q for q in context.captured_queries if "meta_datamap" in q["sql"]]
+        self.assertEqual(len(data_map_queries), 1)
+        self.assertEqual(data[3]["snapshot_user_info"], {"department": "部门3", "status": "在职", "username": "user_3"})
+
+    def test_hits_formatter_translates_by_default(self):
+        hit = HitsFormatter(build_hits(1)[0], []).value
+        self.assertEqual(hit["snapshot_user_info"], {"department": "部门0", "status": "0", "username": "user_0"})
+
+    def test_per_hit_formatting_queries(self):
+        """
+        对比逐条查询数据字典与批量索引的查询次数
+        """
+
+        def format_with_trans_data(hits: list) -> list:
+            result = []
+            for hit in hits:
+                value = json.loads(hit["snapshot_user_info"])
+                DataMap.trans_data(value, list(value.keys()), build_snapshot_user_info_data_field)
+                result.append(value)
+            return result
+
+        def format_with_index(hits: list) -> list:
+            return [hit["snapshot_user_info"] for hit in SearchDataParser().parse_data(hits)]
+
+        results = {}
+        for name, func in [("trans_data", format_with_trans_data), ("data_map_index", format_with_index)]:
+            with CaptureQueriesContext(connection) as context:
+                formatted = func(build_hits(FORMAT_HITS))
+            results[name] = {"formatted": formatted, "queries": len(context.captured_queries)}
+
+        self.assertEqual(results["trans_data"]["formatted"], results["data_map_index"]["formatted"])
+        self.assertGreaterEqual(results["trans_data"]["queries"], FORMAT_HITS)
+        self.assertLessEqual(results["data_map_index"]["queries"], 3)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import gc
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from services.web.query.utils.elastic import ElasticClientRegistry, ElasticHandler
+
+ES_CONFIG = {"username": "admin", "password": "admin", "hosts": ["es.example.com"], "port": 9200}
+HANDLER_COUNT = 200
+MONOTONIC_PATH = "services.web.query.utils.elastic.time.monotonic"
+
+
+class ElasticClientRegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = mock.Mock(side_effect=lambda **kwargs: mock.MagicMock())
+
+    def test_reuse_client(self):
+        """相同配置复用客户端"""
+        registry = ElasticClientRegistry()
+        client = registry.get(1, ES_CONFIG, self.factory)
+        self.assertIs(registry.get(1, dict(ES_CONFIG), self.factory), client)
+        self.assertIs(registry.get(2, ES_CONFIG, self.factory), client)
+        self.assertEqual(self.factory.call_count, 1)
+
+    def test_rebuild_on_config_change(self):
+        """集群配置变化时重建客户端，旧客户端归还后关闭"""
+        registry = ElasticClientRegistry()
+        old_client = registry.get(1, ES_CONFIG, self.factory)
+        new_client = registry.get(1, {**ES_CONFIG, "password": "changed"}, self.factory)
+        self.assertIsNot(new_client, old_client)
+        self.assertEqual(len(registry), 1)
+        # 旧客户端仍在使用，不能关闭
+        old_client.transport.close.assert_not_called()
+        registry.release(old_client)
+        old_client.transport.close.assert_called_once()
+        new_client.transport.close.assert_not_called()
+
+    def test_close_released_client_on_config_change(self):
+        """已归还的旧客户端在配置变化时立即关闭"""
+        registry = ElasticClientRegistry()
+        old_client = registry.get(1, ES_CONFIG, self.factory)
+        registry.release(old_client)
+        registry.get(1, {**ES_CONFIG, "password": "changed"}, self.factory)
+        old_client.transport.close.assert_called_once()
+
+    def test_evict_idle_client(self):
+        """已归还且空闲超时的客户端被关闭"""
+        registry = ElasticClientRegistry(idle_timeout=10)
+        with mock.patch(MONOTONIC_PATH, return_value=0):
+            old_client = registry.get(1, ES_CONFIG, self.factory)
+            registry.release(old_client)
+        with mock.patch(MONOTONIC_PATH, return_value=100):
+            new_client = registry.get(1, ES_CONFIG, self.factory)
+        self.assertIsNot(new_client, old_client)
+        old_client.transport.close.assert_called_once()
+
+    def test_keep_in_use_client(self):
+        """未归还的客户端即使超过空闲时间也不会被回收"""
+        registry = ElasticClientRegistry(idle_timeout=10)
+        with mock.patch(MONOTONIC_PATH, return_value=0):
+            client = registry.get(1, ES_CONFIG, self.factory)
+        with mock.patch(MONOTONIC_PATH, return_value=100):
+            self.assertIs(registry.get(1, ES_CONFIG, self.factory), client)
+        client.transport.close.assert_not_called()
+        self.assertEqual(self.factory.call_count, 1)
+
+
+class ElasticHandlerTest(SimpleTestCase):
+    def setUp(self):
+        ElasticHandler.es_config_cache.clear()
+        ElasticHandler.client_registry.clear()
+        self.addCleanup(ElasticHandler.es_config_cache.clear)
+        self.addCleanup(ElasticHandler.client_registry.clear)
+
+    def test_handler_shares_client(self):
+        with mock.patch.object(ElasticHandler, "get_es_config", return_value=ES_CONFIG) as get_es_config:
+            first = ElasticHandler(cluster_id=1)
+            second = ElasticHandler(cluster_id=1)
+        self.assertIs(first.client, second.client)
+        get_es_config.assert_called_once_with(1)
+
+    def test_handlers_reuse_config_and_client(self):
+        """多次初始化处理器只获取一次集群配置、只创建一个客户端"""
+        with mock.patch.object(ElasticHandler, "get_es_config", return_value=ES_CONFIG) as get_es_config:
+            with mock.patch.object(ElasticHandler, "get_client", return_value=mock.MagicMock()) as get_client:
+                clients = {id(ElasticHandler(cluster_id=1).client) for _ in range(HANDLER_COUNT)}
+        self.assertEqual(len(clients), 1)
+        get_es_config.assert_called_once_with(1)
+        get_client.assert_called_once()
+
+    def test_handler_releases_client(self):
+        """处理器关闭或被回收后归还客户端"""
+        with mock.patch.object(ElasticHandler, "get_es_config", return_value=ES_CONFIG):
+            with mock.patch.object(ElasticHandler, "get_client", side_effect=lambda **kwargs: mock.MagicMock()):
+                handler = ElasticHandler(cluster_id=1)
+                other = ElasticHandler(cluster_id=1)
+                client = handler.client
+                handler.close()
+                del other
+                gc.collect()
+                ElasticHandler.es_config_cache.clear()
+                with mock.patch.object(ElasticHandler, "get_es_config", return_value={**ES_CONFIG, "port": 9300}):
+                    new_client = ElasticHandler(cluster_id=1).client
+        self.assertIsNot(new_client, client)
+        client.transport.close.assert_called_once()
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import gzip
+import io
+from datetime import datetime, timedelta
+from typing import Tuple
+from unittest import mock
+
+import openpyxl
+import pyarrow.parquet
+from django.conf import settings
+from django.core.files import File
+from django.test import TestCase
+
+from services.web.query.constants import FileExportResult, TaskEnum
+from services.web.query.export.data_fetcher import DataFetcher
+from services.web.query.export.data_processor import DataProcessor
+from services.web.query.export.export import CollectorLogExporter
+from services.web.query.export.file_exporter import (
+    CSVExporter,
+    GzipCSVExporter,
+    ParquetExporter,
+    XLSXExporter,
+)
+from services.web.query.export.file_uploader import FileUploader
+from services.web.query.export.model import ExportConfig
+from services.web.query.models import LogExportTask
+from services.web.query.tasks import clean_failed_log_export_parts
+from tests.test_query.test_export_fetcher import END_TIME, START_TIME, FakeDoris
+
+
+class MemoryUploader(FileUploader):
+    """
+    内存存储，可指定第几次上传失败
+    """
+
+    def __init__(self, config: ExportConfig, files: dict, fail_at: int = None):
+        super().__init__(config=config)
+        self.files = files
+        self.fail_at = fail_at
+        self.upload_count = 0
+        self.complete_count = 0
+
+    def upload(self, file_obj: File, file_name: str) -> FileExportResult:
+        self.upload_count += 1
+        if self.upload_count == self.fail_at:
+            raise ConnectionError("upload failed")
+        file_obj.seek(0)
+        self.files[file_name] = file_obj.read()
+        return FileExportResult(
+            url=f"memory://{file_name}",
+            size=len(self.files[file_name]),
+            origin_name=file_name,
+            storage_name=file_name,
+        )
+
+    def open(self, storage_name: str) -> File:
+        return File(io.BytesIO(self.files[storage_name]))
+
+    def delete(self, storage_name: str) -> None:
+        self.files.pop(storage_name)
+
+    def create_multipart(self, file_name: str) -> Tuple[str, str]:
+        return file_name, f"upload:{file_name}"
+
+    def upload_part(self, storage_name: str, upload_id: str, sequence: int, file_obj: File) -> None:
+        self.upload_count += 1
+        if self.upload_count == self.fail_at:
+            raise ConnectionError("upload failed")
+        file_obj.seek(0)
+        self.files[(upload_id, sequence)] = file_obj.read()
+
+    def complete_multipart(self, storage_name: str, upload_id: str, file_name: str) -> FileExportResult:
+        self.complete_count += 1
+        blocks = sorted(key for key in self.files if isinstance(key, tuple) and key[0] == upload_id)
+        self.files[storage_name] = b"".join(self.files.pop(key) for key in blocks)
+        return FileExportResult(
+            url=f"memory://{storage_name}",
+            size=len(self.files[storage_name]),
+            origin_name=file_name,
+            storage_name=storage_name,
+        )
+
+    def abort_multipart(self, storage_name: str, upload_id: str) -> None:
+        for key in [key for key in self.files if isinstance(key, tuple) and key[0] == upload_id]:
+            self.files.pop(key)
+
+
+class CollectorLogExporterTest(TestCase):
+    def setUp(self):
+        start_ms = 1704038400000
+        self.rows = [
+            {"dtEventTimeStamp": start_ms + i * 1000, "event_id": f"e{i:05d}", "username": "admin"} for i in range(250)
+        ]
+        self.fake_doris = FakeDoris(self.rows)
+        self.files = {}
+        self.task = LogExportTask.objects.create(
+            namespace="default",
+            status=TaskEnum.RUNNING.value,
+            query_params={
+                "namespace": "default",
+                "start_time": START_TIME,
+                "end_time": END_TIME,
+                "conditions": [{"field": {"raw_name": "username"}, "operator": "eq", "filters": ["admin"]}],
+                "page": 1,
+                "page_size": 10,
+                "bind_system_info": False,
+            },
+            export_config={
+                "field_scope": "specified",
+                "fields": [{"raw_name": "event_id", "display_name": "ID", "keys": []}],
+            },
+        )
+        patchers = [
+            mock.patch.object(DataFetcher, "get_total", return_value=len(self.rows)),
+            mock.patch(
+                "services.web.query.resources.doris.CollectorSearchAllResource.get_collector_rt_id",
+                return_value="1_rt",
+            ),
+            mock.patch("services.web.query.export.data_fetcher.api.bk_base.query_sync", self.fake_doris.query_sync),
+            mock.patch.object(LogExportTask, "send_notify"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_export(self, fail_at: int = None, file_exporter_class=XLSXExporter) -> MemoryUploader:
+        self.task.refresh_from_db()
+        config = ExportConfig(task=self.task)
+        uploader = MemoryUploader(config=config, files=self.files, fail_at=fail_at)
+        CollectorLogExporter(
+            config=config,
+            data_fetcher=DataFetcher(config=config, page_size=30, workers=2, slices=3),
+            data_processor=DataProcessor(config=config),
+            file_exporter_class=file_exporter_class,
+            file_uploader=uploader,
+            part_rows=100,
+        ).export()
+        self.task.refresh_from_db()
+        return uploader
+
+    def read_event_ids(self, content: bytes) -> list:
+        worksheet = openpyxl.load_workbook(io.BytesIO(content), read_only=True).active
+        rows = list(worksheet.iter_rows(values_only=True))
+        # 前三行为表头
+        self.assertEqual(rows[2], ("event_id",))
+        return [row[0] for row in rows[3:]]
+
+    def test_single_part(self):
+        """数据不足一个分片时直接使用分片文件"""
+        self.rows[100:] = []
+        self.run_export()
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual(self.task.checkpoint, {})
+        self.assertTrue(self.task.result["origin_name"].endswith(".xlsx"))
+        self.assertEqual(len(self.read_event_ids(self.files[self.task.result["storage_name"]])), 100)
+
+    def test_xlsx_single_pass(self):
+        """不可拼接的格式不分片，单次写入完整文件后上传，不会下载重写"""
+        with mock.patch.object(MemoryUploader, "open", side_effect=AssertionError("part reopened")):
+            uploader = self.run_export()
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual(uploader.upload_count, 1)
+        self.assertTrue(self.task.result["origin_name"].endswith(".xlsx"))
+        self.assertEqual(list(self.files), [self.task.result["storage_name"]])
+        event_ids = self.read_event_ids(self.files[self.task.result["storage_name"]])
+        self.assertEqual(event_ids, [row["event_id"] for row in reversed(self.rows)])
+
+    def test_xlsx_retry_after_upload_failure(self):
+        """不可拼接的格式上传失败后重试，重新导出完整文件"""
+        self.run_export(fail_at=1)
+        self.assertEqual(self.task.status, TaskEnum.FAILURE.value)
+        self.assertFalse(self.task.checkpoint.get("parts"))
+
+        uploader = self.run_export()
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual(uploader.upload_count, 1)
+        self.assertEqual(self.task.current_records, len(self.rows))
+        event_ids = self.read_event_ids(self.files[self.task.result["storage_name"]])
+        self.assertEqual(event_ids, [row["event_id"] for row in reversed(self.rows)])
+
+    def test_resume_after_merge_failure(self):
+        """拼接失败后重试只重新拼接"""
+        with mock.patch.object(MemoryUploader, "complete_multipart", side_effect=ConnectionError("complete failed")):
+            self.run_export(file_exporter_class=CSVExporter)
+        self.assertEqual(self.task.status, TaskEnum.FAILURE.value)
+        self.assertTrue(self.task.checkpoint["fetch_finished"])
+        queries_before_resume = len(self.fake_doris.sqls)
+
+        uploader = self.run_export(file_exporter_class=CSVExporter)
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual((uploader.upload_count, uploader.complete_count), (0, 1))
+        self.assertEqual(len(self.fake_doris.sqls), queries_before_resume)
+
+    def test_resume_after_success_update_failure(self):
+        """合并结果已保存时，重试不再合并，也不会读取已删除的分片"""
+        with mock.patch.object(LogExportTask, "update_task_success", side_effect=Exception("db down")):
+            self.run_export()
+        self.assertEqual(self.task.status, TaskEnum.FAILURE.value)
+        checkpoint = self.task.checkpoint
+        self.assertEqual(checkpoint["parts"], [])
+        self.assertEqual(list(self.files), [checkpoint["result"]["storage_name"]])
+
+        with mock.patch.object(MemoryUploader, "open", side_effect=AssertionError("part reopened")):
+            uploader = self.run_export()
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual(uploader.upload_count, 0)
+        self.assertEqual(self.task.result, checkpoint["result"])
+
+    def test_gzip_csv_parts(self):
+        """可拼接的格式分块上传后在服务端拼接，只保留一行表头"""
+        uploader = self.run_export(file_exporter_class=GzipCSVExporter)
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual((uploader.upload_count, uploader.complete_count), (3, 1))
+        self.assertTrue(self.task.result["origin_name"].endswith(".csv.gz"))
+        self.assertEqual(list(self.files), [self.task.result["storage_name"]])
+        lines = gzip.decompress(self.files[self.task.result["storage_name"]]).decode("utf-8-sig").splitlines()
+        self.assertEqual(lines[0], "ID")
+        self.assertEqual(lines[1:], [row["event_id"] for row in reversed(self.rows)])
+
+    def test_csv_resume_after_block_failure(self):
+        """分块上传失败后重试，只上传剩余分块，BOM 与表头只出现一次"""
+        self.run_export(fail_at=2, file_exporter_class=CSVExporter)
+        self.assertEqual(self.task.status, TaskEnum.FAILURE.value)
+        self.assertEqual(len(self.task.checkpoint["parts"]), 1)
+        self.assertTrue(self.task.checkpoint["upload_id"])
+
+        uploader = self.run_export(file_exporter_class=CSVExporter)
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual(uploader.upload_count, 2)
+        content = self.files[self.task.result["storage_name"]]
+        self.assertEqual(content.count(b"\xef\xbb\xbf"), 1)
+        lines = content.decode("utf-8-sig").splitlines()
+        self.assertEqual(lines[0], "ID")
+        self.assertEqual(lines[1:], [row["event_id"] for row in reversed(self.rows)])
+
+    def test_parquet_single_pass(self):
+        """parquet 单次写入完整文件，元数据只写入一次"""
+        uploader = self.run_export(file_exporter_class=ParquetExporter)
+
+        self.assertEqual(self.task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual(uploader.upload_count, 1)
+        self.assertEqual(list(self.files), [self.task.result["storage_name"]])
+        table = pyarrow.parquet.read_table(io.BytesIO(self.files[self.task.result["storage_name"]]))
+        self.assertEqual(table.column("event_id").to_pylist(), [row["event_id"] for row in reversed(self.rows)])
+
+    def test_clean_blocks_when_no_retry(self):
+        """任务不再重试时取消分块上传"""
+        self.task.repeat_times = settings.PROCESS_LOG_EXPORT_TASK_MAX_REPEAT_TIMES + 1
+        self.task.save(update_fields=["repeat_times"])
+        self.run_export(fail_at=3, file_exporter_class=CSVExporter)
+
+        self.assertEqual(self.task.status, TaskEnum.FAILURE.value)
+        self.assertEqual(self.task.checkpoint, {})
+        self.assertEqual(self.files, {})
+
+    def test_clean_result_when_no_retry(self):
+        """任务不再重试时删除已上传的文件"""
+        self.task.repeat_times = settings.PROCESS_LOG_EXPORT_TASK_MAX_REPEAT_TIMES + 1
+        self.task.save(update_fields=["repeat_times"])
+        with mock.patch.object(LogExportTask, "update_task_success", side_effect=Exception("db down")):
+            self.run_export()
+
+        self.assertEqual(self.task.status, TaskEnum.FAILURE.value)
+        self.assertEqual(self.task.checkpoint, {})
+        self.assertEqual(self.files, {})
+
+    @mock.patch("services.web.query.tasks.LogExportStorage")
+    def test_clean_failed_log_export_parts(self, mock_storage):
+        """超出调度周期的失败任务由周期任务清理分片"""
+        with mock.patch.object(LogExportTask, "update_task_success", side_effect=Exception("db down")):
+            self.run_export()
+        storage_names = [self.task.checkpoint["result"]["storage_name"]]
+        LogExportTask.objects.filter(id=self.task.id).update(
+            updated_at=datetime.now() - timedelta(seconds=settings.LOG_EXPORT_TASK_MAX_PERIODIC_TIME + 60)
+        )
+
+        clean_failed_log_export_parts()
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.checkpoint, {})
+        self.assertEqual(
+            [call.args[0] for call in mock_storage.return_value.delete.call_args_list],
+            storage_names,
+        )
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import csv
+import gzip
+import io
+
+import openpyxl
+import pyarrow.parquet
+from django.test import TestCase
+
+from services.web.query.constants import LogExportFormat, TaskEnum
+from services.web.query.export.data_processor import DataProcessor
+from services.web.query.export.file_exporter import (
+    CSVExporter,
+    GzipCSVExporter,
+    ParquetExporter,
+    XLSXExporter,
+    get_file_exporter_class,
+)
+from services.web.query.export.model import ExportConfig
+from services.web.query.models import LogExportTask
+from services.web.query.serializers import LogExportConfigSerializer
+
+MULTI_BATCH_ROWS = 20000
+MULTI_BATCH_SIZE = 1000
+
+
+class ExportWriterTest(TestCase):
+    def setUp(self):
+        self.task = LogExportTask.objects.create(
+            namespace="default",
+            status=TaskEnum.RUNNING.value,
+            query_params={},
+            export_config={
+                "field_scope": "specified",
+                # 按字段分类顺序排列
+                "fields": [
+                    {"raw_name": "event_data", "display_name": "", "keys": ["user", "name"]},
+                    {"raw_name": "event_id", "display_name": "ID", "keys": []},
+                    {"raw_name": "username", "display_name": "用户名", "keys": []},
+                ],
+            },
+        )
+        self.config = ExportConfig(task=self.task)
+        self.logs = [
+            {"event_id": f"e{i}", "event_data": {"user": {"name": f"user,{i}"}}, "username": "管理员"} for i in range(5)
+        ]
+        self.expected = [[f"user,{i}", f"e{i}", "管理员"] for i in range(5)]
+
+    def write_file(self, exporter_class) -> bytes:
+        exporter = exporter_class(config=self.config)
+        columns = DataProcessor(config=self.config).batch_format_columns(self.logs)
+        exporter.write(columns)
+        exporter.write(DataProcessor(config=self.config).batch_format_columns([]))
+        file_obj = exporter.save()
+        file_obj.seek(0)
+        content = file_obj.read()
+        exporter.close()
+        return content
+
+    def test_batch_format_columns(self):
+        columns = DataProcessor(config=self.config).batch_format_columns(self.logs)
+        self.assertEqual(list(columns), ["event_data/user/name", "event_id", "username"])
+        self.assertEqual(columns["event_data/user/name"], [row[0] for row in self.expected])
+
+    def test_xlsx(self):
+        worksheet = openpyxl.load_workbook(io.BytesIO(self.write_file(XLSXExporter)), read_only=True).active
+        rows = [list(row) for row in worksheet.iter_rows(min_row=4, values_only=True)]
+        self.assertEqual(rows, self.expected)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.write_file(CSVExporter).decode("utf-8-sig"))))
+        self.assertEqual(rows[0], ["event_data/user/name", "ID", "用户名"])
+        self.assertEqual(rows[1:], self.expected)
+
+    def test_gzip_csv(self):
+        content = gzip.decompress(self.write_file(GzipCSVExporter)).decode("utf-8-sig")
+        self.assertEqual(list(csv.reader(io.StringIO(content)))[1:], self.expected)
+
+    def test_parquet(self):
+        table = pyarrow.parquet.read_table(io.BytesIO(self.write_file(ParquetExporter)))
+        self.assertEqual(table.column_names, ["event_data/user/name", "event_id", "username"])
+        self.assertEqual([list(row.values()) for row in table.to_pylist()], self.expected)
+
+    def test_export_format(self):
+        """历史任务未指定格式时使用 xlsx"""
+        self.assertEqual(get_file_exporter_class(self.config.export_format), XLSXExporter)
+        self.task.export_config["export_format"] = LogExportFormat.CSV_GZIP.value
+        self.assertEqual(get_file_exporter_class(ExportConfig(task=self.task).export_format), GzipCSVExporter)
+
+        serializer = LogExportConfigSerializer(data={"field_scope": "all"})
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.validated_data["export_format"], LogExportFormat.XLSX.value)
+        serializer = LogExportConfigSerializer(data={"field_scope": "all", "export_format": "parquet"})
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(get_file_exporter_class(serializer.validated_data["export_format"]), ParquetExporter)
+
+    def test_multi_batch_formats(self):
+        """多批次写入后各格式的数据行数完整"""
+        processor = DataProcessor(config=self.config)
+        batch = [
+            {"event_id": f"e{i}", "event_data": {"user": {"name": f"user{i}"}}, "username": "admin"}
+            for i in range(MULTI_BATCH_SIZE)
+        ]
+        readers = {
+            XLSXExporter: lambda content: list(
+                openpyxl.load_workbook(io.BytesIO(content), read_only=True).active.iter_rows(min_row=4)
+            ),
+            CSVExporter: lambda content: list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))[1:],
+            GzipCSVExporter: lambda content: list(
+                csv.reader(io.StringIO(gzip.decompress(content).decode("utf-8-sig")))
+            )[1:],
+            ParquetExporter: lambda content: pyarrow.parquet.read_table(io.BytesIO(content)).to_pylist(),
+        }
+        for exporter_class, read_rows in readers.items():
+            exporter = exporter_class(config=self.config)
+            for _ in range(MULTI_BATCH_ROWS // MULTI_BATCH_SIZE):
+                exporter.write(processor.batch_format_columns(batch))
+            file_obj = exporter.save()
+            file_obj.seek(0)
+            content = file_obj.read()
+            exporter.close()
+            self.assertEqual(len(read_rows(content)), MULTI_BATCH_ROWS, exporter_class.suffix)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+from elasticsearch.serializer import JSONSerializer
+
+from services.web.databus.models import CollectorPlugin
+from services.web.risk.handlers.bulk_indexer import BulkIndexer
+from services.web.risk.handlers.event import EventHandler
+
+
+class FakeESClient:
+    """
+    记录 bulk 请求，可按文档ID指定失败状态
+    """
+
+    def __init__(self, failures: dict = None, latency: float = 0):
+        self.transport = mock.Mock(serializer=JSONSerializer())
+        # 文档ID => 依次返回的失败状态
+        self.failures = failures or {}
+        self.latency = latency
+        self.requests = []
+        self.inflight = 0
+        self.max_inflight = 0
+        self.lock = threading.Lock()
+
+    def bulk(self, index: str, body: str):
+        size = len(body)
+        with self.lock:
+            self.inflight += size
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        time.sleep(self.latency)
+        lines = body.splitlines()
+        doc_ids = [JSONSerializer().loads(line)["index"]["_id"] for line in lines[::2]]
+        items = []
+        with self.lock:
+            self.requests.append((index, doc_ids))
+            for doc_id in doc_ids:
+                statuses = self.failures.get(doc_id)
+                status = statuses.pop(0) if statuses else 201
+                item = {"_index": index, "_id": doc_id, "status": status}
+                if status >= 300:
+                    item["error"] = {"type": "error", "reason": str(status)}
+                items.append({"index": item})
+            self.inflight -= size
+        return {"errors": any("error" in item["index"] for item in items), "items": items}
+
+
+class BulkIndexerTest(SimpleTestCase):
+    def test_retry_failed_items(self):
+        """仅重试可重试的失败文档，不可重试的直接返回错误"""
+        client = FakeESClient(failures={"e1": [429, 503], "e2": [400]})
+        documents = {"index_a": [(f"e{i}", {"value": i}) for i in range(5)]}
+
+        result = BulkIndexer(client, chunk_size=10, retry_sleep=0).index(documents)
+
+        self.assertEqual(result.success, 4)
+        self.assertEqual([(index, doc_id) for index, doc_id, _ in result.errors], [("index_a", "e2")])
+        self.assertEqual([doc_ids for _, doc_ids in client.requests], [[f"e{i}" for i in range(5)], ["e1"], ["e1"]])
+
+    def test_give_up_after_max_retry(self):
+        client = FakeESClient(failures={"e0": [429, 429]})
+
+        result = BulkIndexer(client, max_retry=2, retry_sleep=0).index({"index_a": [("e0", {})]})
+
+        self.assertEqual(result.success, 0)
+        self.assertEqual(len(client.requests), 2)
+        self.assertTrue(result.has_error)
+
+    def test_bound_inflight_bytes(self):
+        """并发请求的在途字节数不超过上限"""
+        client = FakeESClient(latency=0.01)
+        documents = {f"index_{i}": [(f"e{i}_{j}", {"value": "x" * 100}) for j in range(10)] for i in range(8)}
+        indexer = BulkIndexer(client, chunk_size=5, max_workers=8)
+        chunk_size = max(chunk.size for chunk in indexer.build_chunks(documents))
+        indexer.max_inflight_bytes = chunk_size * 2
+
+        result = indexer.index(documents)
+
+        self.assertEqual(result.success, 80)
+        self.assertEqual(len(client.requests), 16)
+        self.assertLessEqual(client.max_inflight, chunk_size * 2)
+
+
+class EventHandlerBulkTest(SimpleTestCase):
+    def setUp(self):
+        EventHandler.table_id_cache.clear()
+        self.addCleanup(EventHandler.table_id_cache.clear)
+        self.handler = EventHandler.__new__(EventHandler)
+        self.handler.client = FakeESClient()
+        plugin = CollectorPlugin(bkdata_biz_id=2, collector_plugin_name_en="bkaudit_event")
+        patcher = mock.patch.object(CollectorPlugin, "objects")
+        self.objects = patcher.start()
+        self.objects.filter.return_value.first.return_value = plugin
+        self.addCleanup(patcher.stop)
+
+    def test_route_by_event_time(self):
+        """跨天及延迟到达的事件写入各自日期的索引，结果表ID只查询一次"""
+        now = int(datetime.datetime.now().timestamp() * 1000)
+        day = 86400 * 1000
+        events = [
+            {"event_id": "today", "event_time": now},
+            {"event_id": "tomorrow", "event_time": now + day},
+            {"event_id": "late", "event_time": now - day},
+        ]
+
+        result = self.handler.add_event(events)
+
+        self.assertEqual(result.success, 3)
+        self.assertEqual(
+            sorted(self.handler.client.requests),
+            sorted((self.handler._get_write_index(event["event_time"]), [event["event_id"]]) for event in events),
+        )
+        self.assertEqual(len({index for index, _ in self.handler.client.requests}), 3)
+        self.assertEqual(self.objects.filter.call_count, 1)
@@ -15,21 +15,106 @@ specific language governing permissions and limitations under the License.
 We undertake not to change the open source license (MIT license) applicable
 to the current version of the project delivered to anyone in the future.
 """
+import copy
 import datetime
 import io
 from unittest import mock
 
 import openpyxl
 from bk_resource import resource
+from django.utils import timezone
 
-from services.web.risk.constants import RiskExportField, RiskStatus
-from services.web.risk.models import Risk
-from services.web.risk.resources import ListEvent
+from apps.meta.models import GlobalMetaConfig
+from services.web.query.constants import TaskEnum
+from services.web.risk.constants import (
+    BKAUDIT_EVENT_RT_INDEX_SET_ID,
+    EVENT_ES_CLUSTER_ID_KEY,
+    RiskExportField,
+    RiskStatus,
+)
+from services.web.risk.exceptions import RiskExportTaskNoPermission
+from services.web.risk.handlers.risk_export import RiskEventFetcher, RiskExporter
+from services.web.risk.models import Risk, RiskExportTask
+from services.web.risk.tasks import clean_risk_export_task, process_risk_export_task
 from services.web.strategy_v2.constants import RiskLevel
 from services.web.strategy_v2.models import Strategy
 from tests.base import TestCase
 
 
+class FakeEventSearch:
+    """
+    按过滤条件在内存中筛选事件，并按 strategy_id、raw_event_id 聚合返回最新事件
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.queries = []
+
+    def es_query(self, **kwargs):
+        self.queries.append(kwargs)
+        filters = {item["field"]: set(item["value"]) for item in kwargs["filter"]}
+        events = [
+            event for event in self.events if all(str(event[field]) in values for field, values in filters.items())
+        ]
+        events.sort(key=lambda event: event["dtEventTimeStamp"], reverse=True)
+        top_hits_size = kwargs["aggs"]["strategies"]["aggs"]["raw_events"]["aggs"]["events"]["top_hits"]["size"]
+        groups = {}
+        for event in events:
+            groups.setdefault(event["strategy_id"], {}).setdefault(event["raw_event_id"], []).append(event)
+        return {
+            "hits": {"total": len(events), "hits": []},
+            "aggregations": {
+                "strategies": {
+                    "buckets": [
+                        {
+                            "key": strategy_id,
+                            "raw_events": {
+                                "buckets": [
+                                    {
+                                        "key": raw_event_id,
+                                        "events": {
+                                            "hits": {
+                                                "hits": [
+                                                    {"_source": copy.deepcopy(event)}
+                                                    for event in raw_events[:top_hits_size]
+                                                ]
+                                            }
+                                        },
+                                    }
+                                    for raw_event_id, raw_events in raw_events_map.items()
+                                ]
+                            },
+                        }
+                        for strategy_id, raw_events_map in groups.items()
+                    ]
+                }
+            },
+        }
+
+
+class MemoryStorage:
+    """
+    内存文件存储
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def save(self, name, content):
+        content.seek(0)
+        self.files[name] = content.read()
+        return name
+
+    def url(self, name):
+        return f"memory://{name}"
+
+    def size(self, name):
+        return len(self.files[name])
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+
 class TestRiskExport(TestCase):
     """
     测试风险导出
@@ -57,6 +142,7 @@ class TestRiskExport(TestCase):
         # 创建风险
         self.risk_1 = Risk.objects.create(
             risk_id="risk001",
+            raw_event_id="raw001",
             title="Risk 1 Title",
             strategy=self.strategy_1,
             status=RiskStatus.NEW,
@@ -69,6 +155,7 @@ class TestRiskExport(TestCase):
         )
         self.risk_2 = Risk.objects.create(
             risk_id="risk002",
+            raw_event_id="raw002",
             title="Risk 2 Title",
             strategy=self.strategy_1,
             status=RiskStatus.AWAIT_PROCESS,
@@ -81,6 +168,7 @@ class TestRiskExport(TestCase):
         )
         self.risk_3 = Risk.objects.create(
             risk_id="risk003",
+            raw_event_id="raw003",
             title="Risk 3 Title",
             strategy=self.strategy_2,
             status=RiskStatus.CLOSED,
@@ -94,6 +182,7 @@ class TestRiskExport(TestCase):
         # 风险4没有关联事件
         self.risk_4 = Risk.objects.create(
             risk_id="risk004",
+            raw_event_id="raw004",
             title="Risk 4 Title",
             strategy=self.strategy_2,
             status=RiskStatus.NEW,
@@ -104,26 +193,46 @@ class TestRiskExport(TestCase):
             current_operator=["user_e"],
             notice_users=[],
         )
+        GlobalMetaConfig.set(config_key=BKAUDIT_EVENT_RT_INDEX_SET_ID, config_value=1)
+        GlobalMetaConfig.set(config_key=EVENT_ES_CLUSTER_ID_KEY, config_value=1)
+        self.fake_search = FakeEventSearch(self.build_events())
+        patcher = mock.patch(
+            "services.web.risk.handlers.risk_export.resource.query.es_query", self.fake_search.es_query
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            process_risk_export_task, "delay", side_effect=lambda **kwargs: process_risk_export_task(**kwargs)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build_events(self):
+        """
+        风险4没有关联事件，同一风险的事件按时间倒序导出
+        """
+
+        def event(risk: Risk, minutes: int, event_data: dict) -> dict:
+            timestamp = risk.event_time + datetime.timedelta(minutes=minutes)
+            return {
+                "strategy_id": risk.strategy_id,
+                "raw_event_id": risk.raw_event_id,
+                "dtEventTimeStamp": int(timestamp.timestamp() * 1000),
+                "event_data": event_data,
+            }
 
-    def mock_get_event_list(self, risk_id, **kwargs):
         return [
-            {
-                "results": [
-                    {"event_data": {"user": "alice", "action": "login_success"}},
-                    {"event_data": {"user": "alice", "action": "login_fail"}},
-                ]
-            },
-            {"results": [{"event_data": {"user": "bob", "action": "delete_file"}}]},
-            {"results": [{"event_data": {"ip": "127.0.0.1"}}, {"event_data": {"ip": "192.168.1.1"}}]},
-            {"results": []},
+            event(self.risk_1, 1, {"user": "alice", "action": "login_fail"}),
+            event(self.risk_1, 2, {"user": "alice", "action": "login_success"}),
+            event(self.risk_2, 1, {"user": "bob", "action": "delete_file"}),
+            event(self.risk_3, 2, {"ip": "127.0.0.1"}),
+            event(self.risk_3, 1, {"ip": "192.168.1.1"}),
         ]
 
     @mock.patch("services.web.risk.models.Risk.load_authed_risks")
-    @mock.patch.object(ListEvent, "bulk_request")
-    def test_risk_export(self, mock_get_event_list, mock_load_authed_risks):
+    def test_risk_export(self, mock_load_authed_risks):
         # Mock
         mock_load_authed_risks.return_value = Risk.objects.all()
-        mock_get_event_list.side_effect = self.mock_get_event_list
 
         # Call resource
         risk_ids = ["risk001", "risk002", "risk003", "risk004"]
@@ -182,3 +291,112 @@ class TestRiskExport(TestCase):
         # Row 3 (risk004, no events)
         self.assertEqual(sheet2.cell(row=4, column=header_map2[str(RiskExportField.RISK_ID.label)]).value, "risk004")
         self.assertEqual(sheet2.cell(row=4, column=header_map2["Source IP"]).value, None)
+
+    def test_fetch_events_by_chunk(self):
+        """每批风险只检索一次，事件按风险分组"""
+        progress = []
+        exporter = RiskExporter(
+            risk_ids=["risk001", "risk002", "risk003", "risk004"], chunk_size=3, progress_callback=progress.append
+        )
+        exporter.export().close()
+
+        self.assertEqual(len(self.fake_search.queries), 2)
+        self.assertEqual(progress, [3, 4])
+        events_map = RiskEventFetcher().fetch([self.risk_1, self.risk_4])
+        self.assertEqual(
+            [event["event_data"]["action"] for event in events_map["risk001"]], ["login_success", "login_fail"]
+        )
+        self.assertEqual(events_map["risk004"], [])
+
+    # created_by 由 OperateRecordModel 通过 core.models.get_request_username 写入，需要同时 patch
+    @mock.patch("core.models.get_request_username", return_value="admin")
+    @mock.patch("services.web.risk.resources.risk.get_request_username", return_value="admin")
+    @mock.patch("services.web.risk.models.Risk.load_authed_risks")
+    def test_risk_export_task(self, mock_load_authed_risks, *_):
+        mock_load_authed_risks.return_value = Risk.objects.all()
+        storage = MemoryStorage()
+        with mock.patch("services.web.risk.tasks.LogExportStorage", return_value=storage):
+            with self.captureOnCommitCallbacks(execute=True):
+                task = resource.risk.create_risk_export_task(risk_ids=["risk001", "risk002", "risk003", "risk004"])
+
+        task = RiskExportTask.objects.get(id=task["id"])
+        self.assertEqual(task.status, TaskEnum.SUCCESS.value)
+        self.assertEqual((task.current, task.total), (4, 4))
+        self.assertEqual(len(self.fake_search.queries), 1)
+        workbook = openpyxl.load_workbook(io.BytesIO(storage.files[task.result["storage_name"]]))
+        self.assertEqual([workbook[name].max_row for name in workbook.sheetnames], [4, 4])
+        self.assertEqual(task.result["url"], f"memory://{task.result['storage_name']}")
+
+        # 仅创建人和管理员可以查看任务
+        self.assertEqual(task.created_by, "admin")
+        self.assertEqual(resource.risk.get_risk_export_task(id=task.id)["status"], TaskEnum.SUCCESS.value)
+        with mock.patch("services.web.risk.resources.risk.get_request_username", return_value="other"):
+            with self.assertRaises(RiskExportTaskNoPermission):
+                resource.risk.get_risk_export_task(id=task.id)
+
+    @mock.patch("services.web.risk.models.Risk.load_authed_risks")
+    def test_risk_export_task_failed(self, mock_load_authed_risks):
+        mock_load_authed_risks.return_value = Risk.objects.all()
+        self.fake_search.events = None
+        with self.captureOnCommitCallbacks(execute=True):
+            task = resource.risk.create_risk_export_task(risk_ids=["risk001"])
+
+        task = RiskExportTask.objects.get(id=task["id"])
+        self.assertEqual(task.status, TaskEnum.FAILURE.value)
+        self.assertTrue(task.error_msg)
+
+    def test_clean_risk_export_task(self):
+        """卡住的任务标记失败，过期文件删除并标记过期，过期任务记录删除"""
+        now = datetime.datetime.now()
+        storage = MemoryStorage()
+        storage.files = {"risk_export/old.xlsx": b"old", "risk_export/new.xlsx": b"new"}
+        stuck = RiskExportTask.objects.create(status=TaskEnum.RUNNING.value)
+        running = RiskExportTask.objects.create(status=TaskEnum.RUNNING.value)
+        lost = RiskExportTask.objects.create(status=TaskEnum.READY.value)
+        ready = RiskExportTask.objects.create(status=TaskEnum.READY.value)
+        old = RiskExportTask.objects.create(
+            status=TaskEnum.SUCCESS.value,
+            task_end_time=now - datetime.timedelta(days=30),
+            result={"storage_name": "risk_export/old.xlsx"},
+        )
+        new = RiskExportTask.objects.create(
+            status=TaskEnum.SUCCESS.value, task_end_time=now, result={"storage_name": "risk_export/new.xlsx"}
+        )
+        outdated = RiskExportTask.objects.create(
+            status=TaskEnum.FAILURE.value, created_at=timezone.now() - datetime.timedelta(days=365)
+        )
+        RiskExportTask.objects.filter(id__in=[stuck.id, lost.id]).update(
+            updated_at=timezone.now() - datetime.timedelta(days=1)
+        )
+
+        with mock.patch("services.web.risk.tasks.LogExportStorage", return_value=storage):
+            clean_risk_export_task()
+
+        status = dict(RiskExportTask.objects.values_list("id", "status"))
+        self.assertEqual(status[stuck.id], TaskEnum.FAILURE.value)
+        self.assertEqual(status[running.id], TaskEnum.RUNNING.value)
+        self.assertEqual(status[lost.id], TaskEnum.FAILURE.value)
+        self.assertEqual(status[ready.id], TaskEnum.READY.value)
+        self.assertEqual(status[old.id], TaskEnum.EXPIRED.value)
+        self.assertEqual(status[new.id], TaskEnum.SUCCESS.value)
+        self.assertNotIn(outdated.id, status)
+        self.assertEqual(list(storage.files), ["risk_export/new.xlsx"])
+
+    @mock.patch("services.web.risk.models.Risk.load_authed_risks")
+    def test_process_risk_export_task_after_cleanup(self, mock_load_authed_risks):
+        """清理任务已标记失败时，慢任务完成后不覆盖失败状态并删除上传的文件"""
+        mock_load_authed_risks.return_value = Risk.objects.all()
+        task = RiskExportTask.objects.create(status=TaskEnum.READY.value, risk_ids=["risk001"], total=1)
+        storage = MemoryStorage()
+
+        def progress_callback(current):
+            RiskExportTask.objects.filter(id=task.id).update(status=TaskEnum.FAILURE.value)
+
+        with mock.patch("services.web.risk.tasks.LogExportStorage", return_value=storage), mock.patch.object(
+            RiskExportTask, "update_current", side_effect=progress_callback
+        ):
+            process_risk_export_task(task_id=task.id)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, TaskEnum.FAILURE.value)
+        self.assertEqual(storage.files, {})
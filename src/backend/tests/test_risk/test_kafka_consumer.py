@@ -20,10 +20,13 @@ import datetime
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from kafka.structs import OffsetAndMetadata
 
 from services.web.risk.management.commands.gen_risk import AuditEventKafkaRecordConsumer
-from services.web.risk.models import Risk
+from services.web.risk.models import Risk, format_risk_id, generate_risk_ids
 from services.web.strategy_v2.constants import StrategyStatusChoices
 from services.web.strategy_v2.models import Strategy
 
@@ -56,8 +59,8 @@ class TestAuditEventKafkaRecordConsumer(TestCase):
         # After refresh, eligible ids should be updated to second value
         self.assertEqual(consumer.eligible_strategy_ids, {20})
         # And generate_risk called with each record value and refreshed eligible set
-        mock_generate.assert_any_call({"event": 1}, {20})
-        mock_generate.assert_any_call({"event": 2}, {20})
+        mock_generate.assert_any_call({"event": 1}, {20}, raise_exception=False)
+        mock_generate.assert_any_call({"event": 2}, {20}, raise_exception=False)
         self.assertEqual(mock_generate.call_count, 2)
 
     @patch("services.web.risk.management.commands.gen_risk.RiskHandler.generate_risk")
@@ -68,7 +71,7 @@ class TestAuditEventKafkaRecordConsumer(TestCase):
         consumer.eligible_strategy_ids = {99}
         record = SimpleNamespace(value={"hello": "world"})
         consumer.process_record(record)
-        mock_generate.assert_called_once_with({"hello": "world"}, {99})
+        mock_generate.assert_called_once_with({"hello": "world"}, {99}, raise_exception=False)
 
     @patch("services.web.risk.tasks.process_risk_ticket")
     @patch("services.web.risk.handlers.risk.RiskHandler.send_risk_notice")
@@ -110,3 +113,274 @@ class TestAuditEventKafkaRecordConsumer(TestCase):
         # Only the running strategy event should create a risk
         self.assertEqual(Risk.objects.filter(strategy_id=201, raw_event_id="k-001").count(), 1)
         self.assertEqual(Risk.objects.filter(strategy_id=202, raw_event_id="k-002").count(), 0)
+
+
+class TestAuditEventKafkaBatchConsumer(TestCase):
+    def setUp(self):
+        Strategy.objects.create(strategy_id=301, status=StrategyStatusChoices.RUNNING.value)
+        Strategy.objects.create(strategy_id=302, status=StrategyStatusChoices.DISABLED.value)
+        self.now_ms = int(datetime.datetime.now().timestamp() * 1000)
+
+    def _event(self, strategy_id, raw_event_id, event_time):
+        return {
+            "strategy_id": strategy_id,
+            "raw_event_id": raw_event_id,
+            "event_time": event_time,
+            "event_data": {},
+            "event_evidence": "[]",
+        }
+
+    @patch("services.web.risk.tasks.process_risk_ticket")
+    @patch("services.web.risk.handlers.risk.RiskHandler.send_risk_notice")
+    @patch("core.kafka.ping_db")
+    def test_process_batch_creates_and_converges_risks(self, mock_ping_db, mock_send_notice, mock_process_ticket):
+        records = [
+            SimpleNamespace(offset=0, value=self._event(301, "b-001", self.now_ms)),
+            SimpleNamespace(offset=1, value=self._event(301, "b-001", self.now_ms + 60_000)),
+            SimpleNamespace(offset=2, value=self._event(301, "b-002", self.now_ms)),
+            SimpleNamespace(offset=3, value=self._event(302, "b-003", self.now_ms)),
+        ]
+        mock_consumer = MagicMock()
+        mock_consumer.poll.side_effect = [{"tp": records}, {}]
+
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=mock_consumer, timeout_ms=1000, max_records=100, sleep_time=0.01, sleep_wait=False, batch_mode=True
+        )
+        consumer.process()
+
+        # 同一批次内的重复事件收敛到同一个风险，并更新结束时间
+        risk = Risk.objects.get(strategy_id=301, raw_event_id="b-001")
+        self.assertEqual(int(risk.event_end_time.timestamp()), int((self.now_ms + 60_000) / 1000))
+        self.assertEqual(Risk.objects.filter(strategy_id=301).count(), 2)
+        self.assertFalse(Risk.objects.filter(strategy_id=302).exists())
+        self.assertEqual(mock_send_notice.call_count, 2)
+        self.assertEqual(mock_process_ticket.call_count, 2)
+        mock_consumer.seek.assert_not_called()
+        mock_consumer.commit.assert_called_once_with(offsets={"tp": OffsetAndMetadata(4, "")})
+
+    @patch("services.web.risk.tasks.process_risk_ticket")
+    @patch("services.web.risk.handlers.risk.RiskHandler.send_risk_notice")
+    def test_process_batch_updates_existing_risk(self, mock_send_notice, mock_process_ticket):
+        handler_consumer = AuditEventKafkaRecordConsumer(
+            consumer=object(), timeout_ms=1000, max_records=100, sleep_time=0.01, batch_mode=True
+        )
+        handler_consumer.process_batch([SimpleNamespace(offset=0, value=self._event(301, "b-004", self.now_ms))])
+        handler_consumer.process_batch(
+            [SimpleNamespace(offset=1, value=self._event(301, "b-004", self.now_ms + 120_000))]
+        )
+
+        risks = Risk.objects.filter(strategy_id=301, raw_event_id="b-004")
+        self.assertEqual(risks.count(), 1)
+        self.assertEqual(int(risks[0].event_end_time.timestamp()), int((self.now_ms + 120_000) / 1000))
+        self.assertEqual(mock_send_notice.call_count, 1)
+
+    @patch("services.web.risk.tasks.process_risk_ticket")
+    @patch("services.web.risk.handlers.risk.RiskHandler.send_risk_notice")
+    @patch("services.web.risk.handlers.risk.RiskHandler.bulk_create_risks", side_effect=Exception("db down"))
+    @patch("core.kafka.ping_db")
+    def test_process_batch_failure_falls_back_to_records(
+        self, mock_ping_db, mock_bulk_create, mock_send_notice, mock_process_ticket
+    ):
+        records = [
+            SimpleNamespace(offset=10, value=self._event(301, "b-005", self.now_ms)),
+            SimpleNamespace(offset=11, value=self._event(301, "b-006", self.now_ms)),
+        ]
+        mock_consumer = MagicMock()
+        mock_consumer.poll.side_effect = [{"tp": records}, {}]
+
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=mock_consumer, timeout_ms=1000, max_records=100, sleep_time=0.01, sleep_wait=False, batch_mode=True
+        )
+        consumer.process()
+
+        # 批次失败后逐条生成风险，全部写入后提交 offset
+        mock_consumer.seek.assert_not_called()
+        mock_consumer.commit.assert_called_once_with(offsets={"tp": OffsetAndMetadata(12, "")})
+        self.assertEqual(Risk.objects.filter(strategy_id=301).count(), 2)
+
+    @patch("core.kafka.time.sleep")
+    @patch("services.web.risk.handlers.risk.RiskHandler.send_create_risk_error")
+    @patch("services.web.risk.handlers.risk.RiskHandler.create_risk", side_effect=Exception("db down"))
+    @patch("services.web.risk.handlers.risk.RiskHandler.bulk_create_risks", side_effect=Exception("db down"))
+    @patch("core.kafka.ping_db")
+    def test_process_batch_write_failure_not_committed(
+        self, mock_ping_db, mock_bulk_create, mock_create_risk, mock_send_error, mock_sleep
+    ):
+        records = [
+            SimpleNamespace(offset=30, value=self._event(301, "b-009", self.now_ms)),
+            SimpleNamespace(offset=31, value=self._event(301, "b-010", self.now_ms)),
+        ]
+        mock_consumer = MagicMock()
+        mock_consumer.poll.side_effect = [{"tp": records}, {}]
+
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=mock_consumer,
+            timeout_ms=1000,
+            max_records=100,
+            sleep_time=0.01,
+            sleep_wait=False,
+            batch_mode=True,
+            record_max_retries=2,
+        )
+        consumer.process()
+
+        # 逐条重试仍写入失败时不提交 offset，回退到失败的消息
+        self.assertEqual(mock_create_risk.call_count, 2)
+        mock_send_error.assert_not_called()
+        mock_consumer.commit.assert_not_called()
+        mock_consumer.seek.assert_called_once_with("tp", 30)
+
+    @patch("core.kafka.time.sleep")
+    @patch("core.kafka.ping_db")
+    def test_poison_record_skipped_after_retries(self, mock_ping_db, mock_sleep):
+        records = [
+            SimpleNamespace(offset=20, value=self._event(301, "b-007", self.now_ms)),
+            SimpleNamespace(offset=21, value=self._event(301, "b-008", self.now_ms)),
+        ]
+        mock_consumer = MagicMock()
+        mock_consumer.poll.side_effect = [{"tp": records}, {}]
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=mock_consumer,
+            timeout_ms=1000,
+            max_records=100,
+            sleep_time=0.01,
+            sleep_wait=False,
+            batch_mode=True,
+            record_max_retries=3,
+        )
+
+        def process_record(record):
+            if record.offset == 20:
+                raise ValueError("poison")
+
+        with patch.object(consumer, "process_batch", side_effect=Exception("batch failed")), patch.object(
+            consumer, "process_record", side_effect=process_record
+        ) as mock_process_record:
+            consumer.process()
+
+        # 异常消息重试 3 次后仍失败，不提交 offset 并回退到该消息，之后的消息不再处理
+        self.assertEqual(mock_process_record.call_count, 3)
+        mock_consumer.commit.assert_not_called()
+        mock_consumer.seek.assert_called_once_with("tp", 20)
+
+    @patch("core.kafka.time.sleep")
+    @patch("core.kafka.ping_db")
+    def test_failed_record_commits_processed_records(self, mock_ping_db, mock_sleep):
+        records = [
+            SimpleNamespace(offset=40, value=self._event(301, "b-011", self.now_ms)),
+            SimpleNamespace(offset=41, value=self._event(301, "b-012", self.now_ms)),
+            SimpleNamespace(offset=42, value=self._event(301, "b-013", self.now_ms)),
+        ]
+        mock_consumer = MagicMock()
+        mock_consumer.poll.side_effect = [{"tp": records}, {}]
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=mock_consumer,
+            timeout_ms=1000,
+            max_records=100,
+            sleep_time=0.01,
+            sleep_wait=False,
+            batch_mode=True,
+            record_max_retries=2,
+        )
+
+        def process_record(record):
+            if record.offset == 41:
+                raise ValueError("db down")
+
+        with patch.object(consumer, "process_batch", side_effect=Exception("batch failed")), patch.object(
+            consumer, "process_record", side_effect=process_record
+        ) as mock_process_record:
+            consumer.process()
+
+        # 失败消息之后的消息不再处理，等待回退后重新消费
+        self.assertEqual(mock_process_record.call_count, 3)
+        mock_consumer.commit.assert_called_once_with(offsets={"tp": OffsetAndMetadata(41, "")})
+        mock_consumer.seek.assert_called_once_with("tp", 41)
+
+    @patch("core.kafka.time.sleep")
+    @patch("core.kafka.ping_db")
+    def test_failed_record_skipped_after_seeks(self, mock_ping_db, mock_sleep):
+        records = [
+            SimpleNamespace(offset=50, value=self._event(301, "b-014", self.now_ms)),
+            SimpleNamespace(offset=51, value=self._event(301, "b-015", self.now_ms)),
+        ]
+        mock_consumer = MagicMock()
+        # 回退后重新拉取到失败的消息
+        mock_consumer.poll.side_effect = [{"tp": records}, {"tp": records}, {"tp": records[1:]}, {}]
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=mock_consumer,
+            timeout_ms=1000,
+            max_records=100,
+            sleep_time=0.01,
+            sleep_wait=False,
+            batch_mode=True,
+            record_max_retries=1,
+            record_max_seeks=2,
+        )
+
+        def process_record(record):
+            if record.offset == 50:
+                raise ValueError("poison")
+
+        with patch.object(consumer, "process_batch", side_effect=Exception("batch failed")), patch.object(
+            consumer, "process_record", side_effect=process_record
+        ):
+            consumer.process()
+
+        # 连续回退 2 次后跳过该消息，之后的消息回退后继续消费
+        self.assertEqual(
+            [c.args for c in mock_consumer.seek.call_args_list],
+            [("tp", 50), ("tp", 51)],
+        )
+        self.assertEqual(
+            [c.kwargs["offsets"] for c in mock_consumer.commit.call_args_list],
+            [{"tp": OffsetAndMetadata(51, "")}, {"tp": OffsetAndMetadata(52, "")}],
+        )
+
+    @patch("services.web.risk.tasks.process_risk_ticket")
+    @patch("services.web.risk.handlers.risk.RiskHandler.send_risk_notice")
+    def test_bulk_update_queries_constant(self, mock_send_notice, mock_process_ticket):
+        consumer = AuditEventKafkaRecordConsumer(
+            consumer=object(), timeout_ms=1000, max_records=100, sleep_time=0.01, batch_mode=True
+        )
+        raw_event_ids = [f"b-q{i}" for i in range(3)]
+        consumer.process_batch(
+            [SimpleNamespace(offset=i, value=self._event(301, r, self.now_ms)) for i, r in enumerate(raw_event_ids)]
+        )
+
+        def update_queries(count):
+            records = [
+                SimpleNamespace(offset=i, value=self._event(301, r, self.now_ms + (count + 1) * 60_000))
+                for i, r in enumerate(raw_event_ids[:count])
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                consumer.process_batch(records)
+            return len(ctx.captured_queries)
+
+        # 更新已有风险的查询数与风险数量无关
+        self.assertEqual(update_queries(1), update_queries(3))
+
+
+class TestGenerateRiskIds(TestCase):
+    def test_generate_risk_ids_unique(self):
+        risk_ids = generate_risk_ids(100)
+        self.assertEqual(len(risk_ids), 100)
+        self.assertEqual(len(set(risk_ids)), 100)
+        self.assertTrue(set(risk_ids).isdisjoint(generate_risk_ids(100)))
+
+    @patch("services.web.risk.models.reserve_risk_id_times")
+    def test_generate_risk_ids_skip_existing(self, mock_reserve):
+        start = datetime.datetime(2024, 1, 1, 0, 0, 0)
+        mock_reserve.side_effect = [start, start + datetime.timedelta(microseconds=3)]
+        strategy = Strategy.objects.create(strategy_id=401, status=StrategyStatusChoices.RUNNING.value)
+        Risk.objects.create(
+            risk_id=format_risk_id(start + datetime.timedelta(microseconds=1)),
+            strategy=strategy,
+            event_time=start,
+            raw_event_id="ids-001",
+        )
+        risk_ids = generate_risk_ids(3)
+        self.assertEqual(
+            risk_ids,
+            [format_risk_id(start + datetime.timedelta(microseconds=i)) for i in (0, 2, 3)],
+        )
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import uuid
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from services.web.risk.handlers.ticket import NewRisk, TransOperator
+from services.web.risk.models import Risk, RiskUserRelation, RiskUserRole
+from services.web.risk.resources.risk import ListMineRisk, ListNoticingRisk, ListRisk
+from tests.base import TestCase
+from tests.test_risk.test_tickets.constants import RISK_INFO
+
+
+def build_risk(index: int, **kwargs) -> Risk:
+    return Risk(
+        **{
+            **RISK_INFO,
+            "risk_id": f"risk{index:08d}",
+            "raw_event_id": uuid.uuid1().hex,
+            "event_time": timezone.now(),
+            **kwargs,
+        }
+    )
+
+
+class RiskUserRelationTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(Risk, "load_authed_risks", side_effect=lambda action: Risk.objects.all())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def relations(self, risk_id: str) -> set:
+        return set(RiskUserRelation.objects.filter(risk_id=risk_id).values_list("username", "role"))
+
+    def test_sync_diff(self):
+        """按风险字段同步关系，仅保留当前人员"""
+        risk = build_risk(1, current_operator=["a", "b"], notice_users=["c"])
+        risk.save()
+        risk.sync_user_relations()
+        self.assertEqual(
+            self.relations(risk.risk_id),
+            {
+                ("admin", RiskUserRole.OPERATOR),
+                ("a", RiskUserRole.CURRENT_OPERATOR),
+                ("b", RiskUserRole.CURRENT_OPERATOR),
+                ("c", RiskUserRole.NOTICE_USER),
+            },
+        )
+
+        risk.current_operator = ["b", "d"]
+        risk.notice_users = []
+        risk.sync_user_relations(roles=[RiskUserRole.CURRENT_OPERATOR])
+        self.assertEqual(
+            self.relations(risk.risk_id),
+            {
+                ("admin", RiskUserRole.OPERATOR),
+                ("b", RiskUserRole.CURRENT_OPERATOR),
+                ("d", RiskUserRole.CURRENT_OPERATOR),
+                ("c", RiskUserRole.NOTICE_USER),
+            },
+        )
+
+    @mock.patch("services.web.risk.handlers.ticket.RiskFlowBaseHandler.auth_current_operator", mock.Mock())
+    @mock.patch("services.web.risk.handlers.ticket.RiskFlowBaseHandler.notice_current_operator", mock.Mock())
+    def test_ticket_flow(self):
+        """单据流转时同步当前处理人"""
+        risk = build_risk(1)
+        risk.save()
+        with mock.patch.object(NewRisk, "load_processor", return_value=["processor"]):
+            NewRisk(risk_id=risk.risk_id, operator="admin").run()
+        self.assertIn(("processor", RiskUserRole.CURRENT_OPERATOR), self.relations(risk.risk_id))
+
+        TransOperator(risk_id=risk.risk_id, operator="processor").run(new_operators=["new_processor"])
+        current_operators = RiskUserRelation.objects.filter(risk_id=risk.risk_id, role=RiskUserRole.CURRENT_OPERATOR)
+        self.assertEqual(list(current_operators.values_list("username", flat=True)), ["new_processor"])
+
+    def test_list_risks(self):
+        """我的风险、关注风险及人员筛选通过关系表查询"""
+        Risk.objects.bulk_create(
+            [
+                build_risk(1, current_operator=["admin"]),
+                build_risk(2, notice_users=["admin"], operator=["other"]),
+                build_risk(3, current_operator=["other"]),
+            ]
+        )
+        call_command("backfill_risk_user_relation", batch_size=2, stdout=mock.MagicMock())
+
+        with mock.patch("services.web.risk.resources.risk.get_request_username", return_value="admin"):
+            self.assertEqual([r.risk_id for r in ListMineRisk().load_risks({})], ["risk00000001"])
+            self.assertEqual([r.risk_id for r in ListNoticingRisk().load_risks({})], ["risk00000002"])
+        risks = ListRisk().load_risks({"operator__contains": ["other"], "current_operator__contains": ["admin"]})
+        self.assertEqual(list(risks), [])
+        risks = ListRisk().load_risks({"current_operator__contains": ["admin", "other"]})
+        self.assertEqual(sorted(r.risk_id for r in risks), ["risk00000001", "risk00000003"])
+
+    def test_load_risk_ids(self):
+        """关系表子查询与 JSON 字段筛选返回相同的风险"""
+        risks = [
+            build_risk(index, current_operator=[f"user{index % 10}"], notice_users=[f"user{index % 5}"])
+            for index in range(50)
+        ]
+        Risk.objects.bulk_create(risks)
+        RiskUserRelation.sync(risks)
+
+        risk_ids = Risk.objects.filter(
+            risk_id__in=RiskUserRelation.load_risk_ids(role=RiskUserRole.CURRENT_OPERATOR, usernames=["user7"])
+        ).values_list("risk_id", flat=True)
+        expected = [risk.risk_id for risk in risks if risk.current_operator == ["user7"]]
+        self.assertEqual(sorted(risk_ids), expected)
+        self.assertEqual(len(expected), 5)
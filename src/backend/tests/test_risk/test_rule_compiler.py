@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from services.web.risk.constants import RiskRuleOperator, RiskStatus
+from services.web.risk.handlers.rule import (
+    RiskRuleCompiler,
+    RiskRuleHandler,
+    RuleNotCompilable,
+)
+from services.web.risk.models import Risk, RiskRule
+from services.web.strategy_v2.models import Strategy
+
+
+def _cond(field, operator, value, connector="AND"):
+    return {"field": field, "operator": operator, "value": value, "connector": connector}
+
+
+# 不依赖 JSON contains 的规则，可在所有数据库上验证
+SCALAR_SCOPES = [
+    [],
+    [_cond("strategy_id", RiskRuleOperator.EQUAL, [1001])],
+    [_cond("strategy_id", RiskRuleOperator.EQUAL, ["1001", "1002"])],
+    [_cond("strategy_id", RiskRuleOperator.NOT_EQUAL, [1001])],
+    [_cond("strategy_id", RiskRuleOperator.NOT_EQUAL, [1001, 1002])],
+    [_cond("strategy_id", RiskRuleOperator.GREATER_THAN, [1001])],
+    [_cond("strategy_id", RiskRuleOperator.GREATER_THAN_EQUAL, [1002])],
+    [_cond("strategy_id", RiskRuleOperator.LESS_THAN, [1002])],
+    [_cond("strategy_id", RiskRuleOperator.LESS_THAN_EQUAL, [1001])],
+    [_cond("rule_id", RiskRuleOperator.EQUAL, [7])],
+    [_cond("rule_id", RiskRuleOperator.NOT_EQUAL, [7])],
+    [_cond("rule_id", RiskRuleOperator.GREATER_THAN, [1])],
+    [_cond("status", RiskRuleOperator.EQUAL, [RiskStatus.NEW])],
+    [_cond("event_source", RiskRuleOperator.EQUAL, ["source_a"])],
+    [_cond("event_source", RiskRuleOperator.NOT_EQUAL, ["source_a"])],
+    [
+        _cond("strategy_id", RiskRuleOperator.EQUAL, [1001]),
+        _cond("event_source", RiskRuleOperator.EQUAL, ["source_b"], "OR"),
+    ],
+    [
+        _cond("strategy_id", RiskRuleOperator.EQUAL, [1002]),
+        _cond("rule_id", RiskRuleOperator.EQUAL, [7], "AND"),
+        _cond("event_source", RiskRuleOperator.NOT_EQUAL, ["source_a"], "OR"),
+    ],
+    [
+        _cond("strategy_id", RiskRuleOperator.EQUAL, []),
+        _cond("rule_id", RiskRuleOperator.LESS_THAN_EQUAL, [7], "OR"),
+    ],
+]
+
+JSON_SCOPES = [
+    [_cond("operator", RiskRuleOperator.EQUAL, ["admin"])],
+    [_cond("operator", RiskRuleOperator.NOT_EQUAL, ["admin"])],
+    [_cond("operator", RiskRuleOperator.EQUAL, ["admin", "guest"])],
+    [_cond("event_type", RiskRuleOperator.EQUAL, ["login"])],
+    [
+        _cond("operator", RiskRuleOperator.EQUAL, ["admin"]),
+        _cond("event_type", RiskRuleOperator.NOT_EQUAL, ["login"], "AND"),
+    ],
+]
+
+
+class TestRiskRuleCompiler(TestCase):
+    def setUp(self):
+        Strategy.objects.create(strategy_id=1001)
+        Strategy.objects.create(strategy_id=1002)
+        now = datetime.datetime.now()
+        risk_infos = [
+            {"strategy_id": 1001, "rule_id": 7, "event_source": "source_a", "operator": ["admin"]},
+            {"strategy_id": 1002, "rule_id": None, "event_source": None, "operator": None, "event_type": ["login"]},
+            {"strategy_id": 1002, "rule_id": 1, "event_source": "source_b", "operator": ["guest", "admin"]},
+            {"strategy_id": 1001, "rule_id": 8, "status": RiskStatus.CLOSED, "event_type": ["logout", "login"]},
+        ]
+        self.risks = [
+            Risk.objects.create(raw_event_id=f"raw-{index}", event_time=now, **info)
+            for index, info in enumerate(risk_infos)
+        ]
+
+    def assert_equivalent(self, scope):
+        predicate = RiskRuleCompiler.compile(scope)
+        q = RiskRuleOperator.build_query_filter(scope)
+        for risk in self.risks:
+            risk = Risk.objects.get(risk_id=risk.risk_id)
+            expected = Risk.objects.filter(risk_id=risk.risk_id).filter(q).exists()
+            self.assertEqual(
+                predicate(RiskRuleCompiler.dump_risk(risk)), expected, f"scope={scope}; risk={risk.raw_event_id}"
+            )
+
+    def test_scalar_scopes_equivalent(self):
+        for scope in SCALAR_SCOPES:
+            self.assert_equivalent(scope)
+
+    def test_json_scopes_equivalent(self):
+        if not connection.features.supports_json_field_contains:
+            self.skipTest("json contains is not supported on this database backend")
+        for scope in JSON_SCOPES:
+            self.assert_equivalent(scope)
+
+    def test_uncompilable_scopes(self):
+        for scope in [
+            [_cond("event_time", RiskRuleOperator.GREATER_THAN, ["2024-01-01 00:00:00"])],
+            [_cond("tag_objs", RiskRuleOperator.EQUAL, [1])],
+            [_cond("event_data", RiskRuleOperator.EQUAL, ["x"])],
+            [_cond("event_source", RiskRuleOperator.GREATER_THAN, ["a"])],
+            [_cond("not_exist_field", RiskRuleOperator.EQUAL, ["a"])],
+        ]:
+            with self.assertRaises(RuleNotCompilable):
+                RiskRuleCompiler.compile(scope)
+
+    def test_match_rule_falls_back_to_sql(self):
+        rule = RiskRule.objects.create(
+            name="fallback",
+            scope=[_cond("event_time", RiskRuleOperator.LESS_THAN_EQUAL, [datetime.datetime.now().isoformat()])],
+            rule_id=1,
+            version=1,
+        )
+        handler = RiskRuleHandler(risk_id=self.risks[0].risk_id)
+        with mock.patch.object(RiskRuleHandler, "is_rule_matched_by_sql", return_value=True) as sql_match:
+            self.assertEqual(handler.match_rule(), rule)
+        sql_match.assert_called_once_with(rule)
+
+    def test_match_rule_in_memory(self):
+        RiskRule.objects.create(
+            name="high", scope=[_cond("strategy_id", RiskRuleOperator.EQUAL, [1002])], rule_id=1, version=1
+        )
+        low = RiskRule.objects.create(
+            name="low",
+            scope=[_cond("strategy_id", RiskRuleOperator.EQUAL, [1001])],
+            rule_id=2,
+            version=1,
+            priority_index=-1,
+        )
+        handler = RiskRuleHandler(risk_id=self.risks[0].risk_id)
+        with mock.patch.object(RiskRuleHandler, "is_rule_matched_by_sql") as sql_match:
+            self.assertEqual(handler.match_rule(), low)
+        sql_match.assert_not_called()
+
+    def test_invalidate_on_save(self):
+        rule = RiskRule.objects.create(
+            name="rule", scope=[_cond("strategy_id", RiskRuleOperator.EQUAL, [1001])], rule_id=1, version=1
+        )
+        RiskRuleCompiler.refresh()
+        self.assertTrue(RiskRuleCompiler.get_predicate(rule)(RiskRuleCompiler.dump_risk(self.risks[0])))
+
+        rule.scope = [_cond("strategy_id", RiskRuleOperator.EQUAL, [1002])]
+        rule.save()
+        RiskRuleCompiler.refresh()
+        self.assertFalse(RiskRuleCompiler.get_predicate(rule)(RiskRuleCompiler.dump_risk(self.risks[0])))
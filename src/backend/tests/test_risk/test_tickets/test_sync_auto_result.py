@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.test import override_settings
+
+from apps.itsm.constants import TicketStatus
+from apps.sops.constants import SOPSTaskStatus
+from services.web.risk.constants import TicketNodeStatus
+from services.web.risk.handlers.ticket import AutoProcess, ForApprove, TransOperator
+from services.web.risk.handlers.ticket_sync import TicketNodeSyncHandler
+from services.web.risk.models import TicketNode
+from services.web.risk.tasks import sync_auto_result, sync_auto_result_shard
+from tests.base import TestCase
+
+
+class TicketNodeSyncTest(TestCase):
+    def setUp(self):
+        self.itsm_status = {}
+        self.sops_status = {}
+        self.itsm_calls = []
+        patchers = [
+            mock.patch(
+                "services.web.risk.handlers.ticket_sync.api.bk_itsm.ticket_approve_result",
+                side_effect=self.ticket_approve_result,
+            ),
+            mock.patch(
+                "services.web.risk.handlers.ticket_sync.api.bk_sops.get_task_status", side_effect=self.get_task_status
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def ticket_approve_result(self, sn: list):
+        self.itsm_calls.append(sn)
+        return [{"sn": item, "current_status": self.itsm_status[item]} for item in sn if item in self.itsm_status]
+
+    def get_task_status(self, task_id: str, **kwargs):
+        return {"state": self.sops_status[task_id], "thread": threading.current_thread().name}
+
+    def create_node(self, action: str, process_result: dict = None, risk_id: str = "risk", timestamp: float = None):
+        return TicketNode.objects.create(
+            id=uuid.uuid1().hex,
+            risk_id=risk_id,
+            operator="admin",
+            action=action,
+            timestamp=timestamp or time.time(),
+            time="",
+            process_result=process_result or {},
+        )
+
+    def create_approve_node(self, sn: str, current_status: str) -> TicketNode:
+        self.itsm_status[sn] = current_status
+        return self.create_node(ForApprove.__name__, {"ticket": {"sn": sn}})
+
+    def create_auto_process_node(self, task_id: str, state: str) -> TicketNode:
+        self.sops_status[task_id] = state
+        return self.create_node(AutoProcess.__name__, {"task": {"task_id": task_id}})
+
+    def test_bulk_sync(self):
+        """ITSM 单据分批查询，标准运维任务并发查询"""
+        finished = [self.create_approve_node(f"sn{i}", TicketStatus.FINISHED) for i in range(3)]
+        running = [self.create_approve_node(f"sn{i}", TicketStatus.RUNNING) for i in range(3, 5)]
+        sops_finished = self.create_auto_process_node("1", SOPSTaskStatus.FINISHED)
+        sops_running = self.create_auto_process_node("2", SOPSTaskStatus.RUNNING)
+        no_ticket = self.create_node(ForApprove.__name__)
+
+        updated = TicketNodeSyncHandler(itsm_batch_size=2, sops_workers=2).sync(TicketNode.objects.all())
+
+        self.assertEqual(updated, 8)
+        self.assertEqual([len(sn) for sn in self.itsm_calls], [2, 2, 1])
+        statuses = dict(TicketNode.objects.values_list("id", "status"))
+        for node in finished + [sops_finished, no_ticket]:
+            self.assertEqual(statuses[node.id], TicketNodeStatus.FINISHED)
+        for node in running + [sops_running]:
+            self.assertEqual(statuses[node.id], TicketNodeStatus.RUNNING)
+        sops_running.refresh_from_db()
+        self.assertTrue(sops_running.process_result["status"]["thread"].startswith("sync_auto_result"))
+
+    def test_only_update_changed(self):
+        """状态未变化的节点不加锁也不更新"""
+        node = self.create_approve_node("sn", TicketStatus.RUNNING)
+        handler = TicketNodeSyncHandler()
+        self.assertEqual(handler.sync(TicketNode.objects.all()), 1)
+
+        with mock.patch.object(TicketNode.objects, "select_for_update") as select_for_update:
+            self.assertEqual(handler.sync(TicketNode.objects.all()), 0)
+        select_for_update.assert_not_called()
+
+        self.itsm_status["sn"] = TicketStatus.FINISHED
+        self.assertEqual(handler.sync(TicketNode.objects.all()), 1)
+        node.refresh_from_db()
+        self.assertEqual(node.status, TicketNodeStatus.FINISHED)
+        self.assertEqual(node.process_result["status"]["current_status"], TicketStatus.FINISHED)
+
+    def test_skip_node_changed_during_sync(self):
+        """同步期间节点已被其他流程更新时不覆盖"""
+        node = self.create_approve_node("sn", TicketStatus.FINISHED)
+        handler = TicketNodeSyncHandler()
+        nodes = {node.id: node}
+        changes = handler.sync_approve_nodes([node])
+        TicketNode.objects.filter(id=node.id).update(status=TicketNodeStatus.FINISHED, process_result={})
+
+        self.assertEqual(handler.save(nodes, changes), 0)
+        node.refresh_from_db()
+        self.assertEqual(node.process_result, {})
+
+    def test_other_nodes(self):
+        """非最后一个节点被关闭"""
+        old = self.create_node(TransOperator.__name__, timestamp=1)
+        last = self.create_node(TransOperator.__name__, timestamp=2)
+        self.assertEqual(TicketNodeSyncHandler().sync(TicketNode.objects.all()), 1)
+        self.assertEqual(TicketNode.objects.get(id=old.id).status, TicketNodeStatus.FINISHED)
+        self.assertEqual(TicketNode.objects.get(id=last.id).status, TicketNodeStatus.RUNNING)
+
+    @override_settings(SYNC_AUTO_RESULT_SHARD_SIZE=2)
+    def test_shard_by_id_range(self):
+        """按节点 ID 范围拆分子任务"""
+        for i in range(5):
+            self.create_approve_node(f"sn{i}", TicketStatus.FINISHED)
+
+        with mock.patch("services.web.risk.tasks.sync_auto_result_shard.delay") as delay:
+            sync_auto_result()
+        self.assertEqual(delay.call_count, 3)
+        for call in delay.call_args_list:
+            sync_auto_result_shard(**call.kwargs)
+        self.assertFalse(TicketNode.objects.filter(status=TicketNodeStatus.RUNNING).exists())
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - 审计中心 (BlueKing - Audit Center) available.
+Copyright (C) 2023 THL A29 Limited,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from unittest import mock
+
+from api.bk_base.constants import UserAuthActionEnum
+from services.web.analyze.controls.auth import BaseAuthHandler
+from services.web.common.bkbase_auth import (
+    batch_check_user_auth,
+    flush_user_auth_cache,
+    user_auth_cache,
+)
+from tests.base import TestCase
+
+
+def build_permissions(user_id: str, tables: list) -> list:
+    return [{"user_id": user_id, "action_id": UserAuthActionEnum.RT_QUERY.value, "object_id": t} for t in tables]
+
+
+class BkBaseUserAuthCacheTest(TestCase):
+    def setUp(self) -> None:
+        flush_user_auth_cache()
+        self.granted = {("admin", "1_rt_a")}
+        patcher = mock.patch(
+            "services.web.common.bkbase_auth.api.bk_base.user_auth_batch_check", side_effect=self.batch_check
+        )
+        self.batch_check_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def batch_check(self, params: dict) -> list:
+        return [
+            {
+                "user_id": p["user_id"],
+                "object_id": p["object_id"],
+                "result": (p["user_id"], p["object_id"]) in self.granted,
+            }
+            for p in params["permissions"]
+        ]
+
+    def test_only_query_missing(self):
+        """仅向 BKBase 查询未命中的权限"""
+        result = batch_check_user_auth(build_permissions("admin", ["1_rt_a", "1_rt_b"]))
+        self.assertEqual([item["result"] for item in result], [True, False])
+
+        result = batch_check_user_auth(build_permissions("admin", ["1_rt_b", "1_rt_c", "1_rt_a"]))
+        self.assertEqual([item["result"] for item in result], [False, False, True])
+        self.assertEqual(self.batch_check_mock.call_count, 2)
+        self.assertEqual(
+            [p["object_id"] for p in self.batch_check_mock.call_args[0][0]["permissions"]],
+            ["1_rt_c"],
+        )
+
+        # 全部命中时不再请求
+        batch_check_user_auth(build_permissions("admin", ["1_rt_a", "1_rt_c"]))
+        self.assertEqual(self.batch_check_mock.call_count, 2)
+        self.assertGreater(user_auth_cache.get_stats()["local_hits"], 0)
+
+    def test_match_reordered_response(self):
+        """返回结果乱序时按 user_id/object_id 匹配"""
+        self.batch_check_mock.side_effect = lambda params: list(reversed(self.batch_check(params)))
+        result = batch_check_user_auth(build_permissions("admin", ["1_rt_a", "1_rt_b", "1_rt_c"]))
+        self.assertEqual(
+            [(item["object_id"], item["result"]) for item in result],
+            [
+                ("1_rt_a", True),
+                ("1_rt_b", False),
+                ("1_rt_c", False),
+            ],
+        )
+
+    def test_missing_result_not_cached(self):
+        """接口未返回的权限视为无权限且不缓存，下次重新查询"""
+        self.batch_check_mock.side_effect = lambda params: self.batch_check(params)[1:]
+        result = batch_check_user_auth(build_permissions("admin", ["1_rt_a", "1_rt_b"]))
+        self.assertEqual([item["result"] for item in result], [False, False])
+
+        self.batch_check_mock.side_effect = self.batch_check
+        result = batch_check_user_auth(build_permissions("admin", ["1_rt_a", "1_rt_b"]))
+        self.assertEqual([item["result"] for item in result], [True, False])
+        self.assertEqual(
+            [p["object_id"] for p in self.batch_check_mock.call_args[0][0]["permissions"]],
+            ["1_rt_a"],
+        )
+
+    def test_match_by_position_without_echo(self):
+        """返回结果未回显 user_id/object_id 时按请求顺序匹配"""
+        self.batch_check_mock.side_effect = lambda params: [
+            {"result": item["result"]} for item in self.batch_check(params)
+        ]
+        result = batch_check_user_auth(build_permissions("admin", ["1_rt_a", "1_rt_b"]))
+        self.assertEqual([item["result"] for item in result], [True, False])
+
+    def test_key_by_user(self):
+        """不同用户不共享结果"""
+        batch_check_user_auth(build_permissions("admin", ["1_rt_a"]))
+        result = batch_check_user_auth(build_permissions("other", ["1_rt_a"]))
+        self.assertFalse(result[0]["result"])
+        self.assertEqual(self.batch_check_mock.call_count, 2)
+
+    def test_flush_after_grant(self):
+        """通过应用授权后刷新缓存"""
+        self.assertFalse(batch_check_user_auth(build_permissions("admin", ["1_rt_b"]))[0]["result"])
+        self.granted.add(("admin", "1_rt_b"))
+
+        handler = mock.Mock(spec=BaseAuthHandler)
+        handler.build_result_table_id.return_value = "1_rt_b"
+        with mock.patch("services.web.analyze.controls.auth.api.bk_base.auth_tickets", return_value={}), mock.patch(
+            "services.web.analyze.controls.auth.settings"
+        ):
+            BaseAuthHandler.auth(handler)
+
+        handler.post_auth.assert_called_once_with(result=True)
+        self.assertTrue(batch_check_user_auth(build_permissions("admin", ["1_rt_b"]))[0]["result"])
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import time
 from unittest import mock
 
+from django.core.cache import cache
 from django.test import TestCase
 
 from api.bk_base.default import QuerySyncResource, UserAuthBatchCheck
@@ -19,6 +21,7 @@ from services.web.tool.exceptions import (
     InvalidVariableStructureError,
     ParseVariableError,
 )
+from services.web.tool.executor.cache import ToolResultCache
 from services.web.tool.executor.model import (
     BkVisionExecuteResult,
     DataSearchToolExecuteParams,
@@ -33,6 +36,15 @@ from services.web.tool.models import BkVisionToolConfig, DataSearchToolConfig, T
 from services.web.vision.models import VisionPanel
 
 
+def echo_user_auth(result: bool):
+    """模拟 BKBase 鉴权接口，按请求回显 user_id/object_id"""
+
+    def perform_request(params):
+        return [{"result": result, "user_id": p["user_id"], "object_id": p["object_id"]} for p in params["permissions"]]
+
+    return perform_request
+
+
 class TestSqlDataSearchExecutor(TestCase):
     def setUp(self):
         """设置SQL查询执行器的测试环境和mock对象"""
@@ -74,7 +86,7 @@ class TestSqlDataSearchExecutor(TestCase):
         self.patcher_auth = mock.patch.object(
             UserAuthBatchCheck,
             "perform_request",
-            return_value=[{"result": True, "user_id": "test_user", "object_id": "mocked_table"}],
+            side_effect=echo_user_auth(True),
         )
         self.mock_auth_api = self.patcher_auth.start()
 
@@ -94,6 +106,7 @@ class TestSqlDataSearchExecutor(TestCase):
                 "query_sql": "SELECT a FROM table LIMIT 100",
                 "results": [{"field1": "value1"}, {"field2": "value2"}],
                 "total": 2,
+                "cache": None,
             },
         )
 
@@ -116,6 +129,7 @@ class TestSqlDataSearchExecutor(TestCase):
                 "query_sql": "SELECT a FROM config_table LIMIT 100",
                 "results": [{"field1": "value1"}, {"field2": "value2"}],
                 "total": 2,
+                "cache": None,
             },
         )
 
@@ -124,7 +138,7 @@ class TestSqlDataSearchExecutor(TestCase):
         with mock.patch.object(
             UserAuthBatchCheck,
             "perform_request",
-            return_value=[{"result": False, "user_id": "test_user", "object_id": "mocked_table"}],
+            side_effect=echo_user_auth(False),
         ):
             executor = SqlDataSearchExecutor(source=self.sql_tool, analyzer_cls=self.analyzer_cls)
             with self.assertRaises(DataSearchTablePermission):
@@ -259,6 +273,7 @@ class TestSqlDataSearchExecutor(TestCase):
             "query_sql": "SELECT a FROM table WHERE a = 'test' LIMIT 10",
             "results": [{"field1": "value1"}, {"field2": "value2"}],
             "total": 2,
+            "cache": None,
         }
         self.assertDictEqual(expected, result)
 
@@ -288,6 +303,7 @@ class TestSqlDataSearchExecutor(TestCase):
             "query_sql": "SELECT a FROM table WHERE a = 123 LIMIT 10",
             "results": [{"field1": "value1"}, {"field2": "value2"}],
             "total": 2,
+            "cache": None,
         }
         self.assertDictEqual(expected, result)
 
@@ -325,6 +341,7 @@ class TestSqlDataSearchExecutor(TestCase):
             "query_sql": f"SELECT a FROM table WHERE a = {ts} LIMIT 10",
             "results": [{"field1": "value1"}, {"field2": "value2"}],
             "total": 2,
+            "cache": None,
         }
         self.assertDictEqual(expected, result)
 
@@ -366,6 +383,7 @@ class TestSqlDataSearchExecutor(TestCase):
             "query_sql": f"SELECT a FROM table WHERE x >= {ts_start} AND x < {ts_end} LIMIT 10",
             "results": [{"field1": "value1"}, {"field2": "value2"}],
             "total": 2,
+            "cache": None,
         }
         self.assertDictEqual(expected, result)
 
@@ -400,10 +418,118 @@ class TestSqlDataSearchExecutor(TestCase):
             "query_sql": f"SELECT a FROM table WHERE a IN {in_str} LIMIT 10",
             "results": [{"field1": "value1"}, {"field2": "value2"}],
             "total": 2,
+            "cache": None,
         }
         self.assertDictEqual(expected, result)
 
 
+class TestSqlDataSearchExecutorCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.config = SQLDataSearchConfig(
+            sql="SELECT a FROM table",
+            referenced_tables=[{"table_name": "table"}],
+            input_variable=[],
+            output_fields=[],
+            result_cache_ttl=60,
+        )
+        self.params = DataSearchToolExecuteParams(tool_variables=[], page=1, page_size=10)
+        self.mock_bkbase_api = mock.patch.object(
+            QuerySyncResource,
+            "bulk_request",
+            return_value=[{"list": [{"a": 1}]}, {"list": [{"count": 1}]}],
+        ).start()
+        mock.patch.object(
+            UserAuthBatchCheck,
+            "perform_request",
+            side_effect=echo_user_auth(True),
+        ).start()
+        self.mock_username = mock.patch(
+            "services.web.tool.executor.tool.get_request_username", return_value="admin"
+        ).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        cache.clear()
+
+    def execute(self):
+        return SqlDataSearchExecutor(source=self.config, analyzer_cls=SqlQueryAnalysis).execute(self.params)
+
+    def test_cache_hit(self):
+        first = self.execute()
+        second = self.execute()
+
+        self.assertEqual(self.mock_bkbase_api.call_count, 1)
+        self.assertFalse(first.cache.hit)
+        self.assertTrue(second.cache.hit)
+        self.assertEqual(second.cache.cached_at, first.cache.cached_at)
+        self.assertEqual(second.results, first.results)
+
+    def test_cache_scoped_by_user_and_sql(self):
+        self.execute()
+        self.mock_username.return_value = "other"
+        self.assertFalse(self.execute().cache.hit)
+        self.params.page = 2
+        self.assertFalse(self.execute().cache.hit)
+        self.assertEqual(self.mock_bkbase_api.call_count, 3)
+
+    def test_cache_disabled(self):
+        self.config.result_cache_ttl = 0
+        self.assertIsNone(self.execute().cache)
+        self.execute()
+        self.assertEqual(self.mock_bkbase_api.call_count, 2)
+
+    def test_payload_too_large(self):
+        result_cache = ToolResultCache(ttl=60, max_bytes=10)
+        data, cache_info = result_cache.get_or_load("key", lambda: {"results": ["x" * 100]})
+        self.assertIsNone(cache_info.cached_at)
+        self.assertEqual(result_cache.get("key"), (None, None))
+
+    def test_single_flight(self):
+        """其他请求查询中时等待其写入缓存，不重复查询"""
+        result_cache = ToolResultCache(ttl=60, poll_interval=0)
+        key = result_cache.build_key("sql")
+        loader = mock.Mock(return_value={"total": 1})
+        cache.add(f"{key}:lock", True)
+
+        with mock.patch(
+            "services.web.tool.executor.cache.time.sleep", side_effect=lambda _: result_cache.set(key, {"total": 2})
+        ):
+            data, cache_info = result_cache.get_or_load(key, loader)
+
+        loader.assert_not_called()
+        self.assertEqual(data, {"total": 2})
+        self.assertTrue(cache_info.hit)
+
+    def test_wait_timeout(self):
+        """等待超时后自行查询"""
+        result_cache = ToolResultCache(ttl=60, wait_timeout=0)
+        key = result_cache.build_key("sql")
+        cache.add(f"{key}:lock", True)
+
+        data, cache_info = result_cache.get_or_load(key, lambda: {"total": 1})
+
+        self.assertEqual(data, {"total": 1})
+        self.assertFalse(cache_info.hit)
+
+    def test_lock_held_while_loading(self):
+        """查询耗时超过等待时间和锁超时时间时，心跳续期使锁仍被持有，其他请求不会重复查询"""
+        result_cache = ToolResultCache(ttl=60, wait_timeout=0, lock_timeout=0.3)
+        key = result_cache.build_key("sql")
+        lock_states = []
+
+        def loader():
+            time.sleep(0.9)
+            lock_states.append(cache.get(f"{key}:lock") is not None)
+            return {"total": 1}
+
+        data, cache_info = result_cache.get_or_load(key, loader)
+
+        self.assertEqual(data, {"total": 1})
+        self.assertEqual(lock_states, [True])
+        self.assertIsNone(cache.get(f"{key}:lock"))
+
+
 class TestBkVisionExecutor(TestCase):
     def setUp(self):
         """设置BK Vision执行器的测试环境"""